@@ -23,11 +23,27 @@ Usage:
     files = swarm.search_by_tag("python")
 """
 
-from .swarm_controller import SwarmController
-from .agents.base_agent import BaseAgent
-from .agents.code_agent import CodeAgent
-from .agents.doc_agent import DocAgent
-from .agents.data_agent import DataAgent
+from importlib import import_module
 
 __version__ = "0.1.0"
-__all__ = ['SwarmController', 'BaseAgent', 'CodeAgent', 'DocAgent', 'DataAgent'] 
\ No newline at end of file
+__all__ = ['SwarmController', 'BaseAgent', 'CodeAgent', 'DocAgent', 'DataAgent']
+
+# Public names are imported on first access so that light entry points
+# (such as a tag search) do not pay for agents and their dependencies.
+_LAZY_IMPORTS = {
+    'SwarmController': '.swarm_controller',
+    'BaseAgent': '.agents.base_agent',
+    'CodeAgent': '.agents.code_agent',
+    'DocAgent': '.agents.doc_agent',
+    'DataAgent': '.agents.data_agent',
+}
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        value = getattr(import_module(_LAZY_IMPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals()) + __all__) 
\ No newline at end of file
@@ -1,45 +1,266 @@
 import argparse
+import sys
+from itertools import islice
 from pathlib import Path
-from .swarm_controller import SwarmController
 
-def main():
+def merge(argv):
+    from .storage import open_store
+    from .sharding import merge_stores
+    
+    parser = argparse.ArgumentParser(prog='auto_tagger merge',
+                                     description='Merge shard metadata into one store (newest last_modified wins)')
+    parser.add_argument('sources', nargs='+', help='Shard metadata files (.json, or .db/.sqlite for SQLite)')
+    parser.add_argument('--metadata', type=str, default='metadata.json', help='Metadata file to merge into')
+    parser.add_argument('--store', choices=['json', 'sqlite'],
+                        help='Storage backend of the target (default: inferred from its suffix)')
+    args = parser.parse_args(argv)
+    
+    missing = [source for source in args.sources if not Path(source).exists()]
+    if missing:
+        print(f"Error: Shard metadata '{missing[0]}' does not exist")
+        return 1
+    sources = [open_store(source) for source in args.sources]
+    target = open_store(args.metadata, args.store)
+    try:
+        counts = merge_stores(sources, target)
+    finally:
+        for store in sources + [target]:
+            store.close()
+    print(f"Merged {counts['merged']} entries from {len(sources)} shards into {args.metadata} "
+          f"({counts['skipped']} older duplicates skipped)")
+    return 0
+
+def report_metrics(swarm, args):
+    """Print and/or write the run's metrics as requested on the command line"""
+    if args.stats:
+        print("\n" + swarm.metrics.format_summary())
+    if args.stats_json:
+        swarm.metrics.write_report(args.stats_json)
+        print(f"Wrote run statistics to {args.stats_json}")
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['merge']:
+        sys.exit(merge(argv[1:]))
+    if argv[:1] == ['query']:
+        from .query import main as query
+        sys.exit(query(argv[1:]))
+    from .backends import BACKENDS
+    
     parser = argparse.ArgumentParser(description='Auto-tag files using a swarm of specialized agents')
     parser.add_argument('directory', type=str, help='Directory to process')
     parser.add_argument('--recursive', '-r', action='store_true', help='Process directories recursively')
-    parser.add_argument('--search', '-s', type=str, help='Search for files with a specific tag')
-    
-    args = parser.parse_args()
-    
-    swarm = SwarmController()
+    parser.add_argument('--search', '-s', type=str,
+                        help='Search for files with a tag or a query such as "python AND NOT test" or "pyth*"')
+    parser.add_argument('--workers', '-w', type=int, default=1, help='Number of files to analyze concurrently')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='Use the asyncio pipeline; --workers then sets the number of in-flight requests')
+    parser.add_argument('--batch-tokens', type=int, default=0,
+                        help='Pack small files for the same agent into shared requests up to this many tokens')
+    parser.add_argument('--backend', choices=sorted(BACKENDS),
+                        help='Tagging backend (default: $AUTO_TAGGER_BACKEND or openai); '
+                             'heuristic and transformers run locally without API calls')
+    parser.add_argument('--rpm', type=float, help='Requests per minute allowed by your OpenAI rate limit')
+    parser.add_argument('--tpm', type=float, help='Tokens per minute allowed by your OpenAI rate limit')
+    parser.add_argument('--ignore', action='append', metavar='PATTERN',
+                        help='Additional .gitignore-style pattern to skip (repeatable)')
+    parser.add_argument('--no-gitignore', action='store_true', help='Do not honour .gitignore files')
+    parser.add_argument('--cache-size', type=int, default=64,
+                        help='Size limit in MB of the content-hash result cache (0 disables it)')
+    parser.add_argument('--cache-file', type=str,
+                        help='Result cache file; a .db/.sqlite file is shared safely by concurrent processes '
+                             '(default: tag_cache.json, or tag_cache.db with --shard and --processes)')
+    parser.add_argument('--store', choices=['json', 'sqlite'], default='json',
+                        help='Metadata storage backend')
+    parser.add_argument('--metadata', type=str,
+                        help='Metadata file (default: metadata.json or metadata.db depending on --store)')
+    parser.add_argument('--migrate', action='store_true',
+                        help='Import metadata.json into the SQLite store given by --metadata and exit')
+    parser.add_argument('--shard', type=str, metavar='I/N',
+                        help='Process only shard I of N (by path hash) and write metadata.shard-I-of-N.*; '
+                             'combine shards with "python -m auto_tagger merge"')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='Run this many local shard processes and merge their metadata')
+    parser.add_argument('--watch', action='store_true',
+                        help='After processing, keep running and re-tag files as they change (inotify on Linux)')
+    parser.add_argument('--debounce', type=float, default=0.5,
+                        help='Seconds of quiet before a burst of changes is processed in --watch mode')
+    parser.add_argument('--poll', type=float, metavar='SECONDS',
+                        help='In --watch mode, poll the tree every SECONDS instead of using inotify')
+    parser.add_argument('--stats', action='store_true',
+                        help='Print per-stage timings, token usage, cost, cache hit rates and errors after the run')
+    parser.add_argument('--stats-json', type=str, metavar='FILE', help='Write the run statistics to FILE as JSON')
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help='Serve Prometheus metrics on http://0.0.0.0:PORT/metrics while running')
+    parser.add_argument('--similar', type=str, metavar='FILE_OR_TEXT',
+                        help='Find the files most similar to a file or a free-text description')
+    parser.add_argument('--top-k', type=int, default=10, help='Number of --similar results')
+    parser.add_argument('--embed', action='store_true',
+                        help='Keep the similarity index (<metadata>.vec) up to date while processing')
+    parser.add_argument('--embedder', choices=['auto', 'transformers', 'hashing'],
+                        help='Embedding model of the similarity index (default: $AUTO_TAGGER_EMBEDDER or auto, '
+                             'the transformers model with a model-free fallback)')
+    parser.add_argument('--quantize', action='store_true',
+                        help='Store the similarity index as int8 vectors, a quarter of the size')
+    parser.add_argument('--git', action='store_true',
+                        help="Inside a git work tree, ask git which files changed since the last run "
+                             "instead of checking every file")
+    parser.add_argument('--full-scan', action='store_true',
+                        help='List every directory and check every file, ignoring what the last run recorded')
+                        
+    args = parser.parse_args(argv)
+    metadata = args.metadata or ("metadata.db" if args.store == 'sqlite' else "metadata.json")
     
-    if args.search:
-        # Search mode
-        results = swarm.search_by_tag(args.search)
+    if args.search and not args.migrate:
+        # Search mode is answered by the read-only query engine, without the tagging pipeline
+        from .query import QueryEngine
+        from .tag_index import QuerySyntaxError
+        engine = QueryEngine(metadata, args.store)
+        try:
+            results = engine.search(args.search)
+        except QuerySyntaxError as e:
+            print(f"Error: invalid search query: {e}")
+            return
+        finally:
+            engine.close()
         if results:
             print(f"\nFiles tagged with '{args.search}':")
             for file_path in results:
                 print(f"  - {file_path}")
         else:
             print(f"\nNo files found with tag '{args.search}'")
-    else:
-        # Processing mode
+        return
+        
+    # Imported here so that searches and queries start without these modules and their dependencies
+    from .swarm_controller import SwarmController
+    from .storage import JSONMetadataStore, SQLiteMetadataStore, migrate_json_to_sqlite
+    from .walker import DEFAULT_IGNORE_PATTERNS
+    from .scheduler import RequestScheduler
+    from .sharding import parse_shard, run_local_shards, shard_path
+    from .metrics import serve_metrics
+    from .cache import DEFAULT_CACHE_FILE, DEFAULT_SHARED_CACHE_FILE
+    
+    try:
+        shard = parse_shard(args.shard) if args.shard else None
+    except ValueError as e:
+        parser.error(str(e))
+        
+    if args.migrate:
+        target = args.metadata or "metadata.db"
+        count = migrate_json_to_sqlite("metadata.json", target)
+        print(f"Migrated {count} entries from metadata.json to {target}")
+        return
+        
+    # Shards running side by side must not overwrite each other's JSON cache
+    sharded = args.processes > 1 or shard is not None
+    cache_file = args.cache_file or (DEFAULT_SHARED_CACHE_FILE if sharded else DEFAULT_CACHE_FILE)
+    
+    if args.processes > 1:
         directory = Path(args.directory)
         if not directory.exists():
             print(f"Error: Directory '{directory}' does not exist")
             return
-            
-        print(f"\nProcessing directory: {directory}")
-        results = swarm.process_directory(directory, args.recursive)
-        
+        print(f"\nProcessing directory: {directory} with {args.processes} processes")
+        summary = run_local_shards(
+            directory, args.processes, metadata, args.store,
+            recursive=args.recursive, max_workers=args.workers, batch_tokens=args.batch_tokens,
+            use_async=args.use_async, cache_max_bytes=args.cache_size * 1024 * 1024, cache_file=cache_file,
+            ignore_patterns=DEFAULT_IGNORE_PATTERNS + (args.ignore or []),
+            use_gitignore=not args.no_gitignore, backend=args.backend, rpm=args.rpm, tpm=args.tpm,
+            use_git=args.git, full_scan=args.full_scan
+        )
         print("\nProcessing complete!")
-        print(f"Processed {len(results)} files")
-        
-        # Show sample of results
-        print("\nSample of tagged files:")
-        for file_path, data in list(results.items())[:5]:
-            print(f"\n{file_path}:")
-            print(f"  Tags: {', '.join(data.get('tags', []))}")
-            print(f"  Agent: {data.get('agent', 'Unknown')}")
+        print(f"Processed {summary['files']} files; merged {summary['merged']} entries into {metadata}")
+        return
+        
+    if shard is not None:
+        metadata = shard_path(metadata, *shard)
+    if args.store == 'sqlite':
+        store = SQLiteMetadataStore(metadata)
+    else:
+        store = JSONMetadataStore(metadata)
+    swarm = SwarmController(
+        cache_max_bytes=args.cache_size * 1024 * 1024,
+        cache_file=cache_file,
+        store=store,
+        ignore_patterns=DEFAULT_IGNORE_PATTERNS + (args.ignore or []),
+        use_gitignore=not args.no_gitignore,
+        scheduler=RequestScheduler(args.rpm, args.tpm),
+        backend=args.backend,
+        embeddings=args.embed,
+        embedder=args.embedder,
+        quantize_embeddings=args.quantize,
+        use_git=args.git
+    )
+    
+    if args.similar:
+        # Brings the index up to date first (unless --embed keeps it current) and embeds the query
+        results = swarm.search_similar(args.similar, args.top_k)
+        if results:
+            print(f"\nFiles most similar to '{args.similar}':")
+            for file_path, score in results:
+                print(f"  {score:6.3f}  {file_path}")
+        else:
+            print("\nNo files indexed yet; process a directory first")
+        return
+        
+        
+    # Processing mode
+    directory = Path(args.directory)
+    if not directory.exists():
+        print(f"Error: Directory '{directory}' does not exist")
+        return
+        
+    if args.metrics_port is not None:
+        serve_metrics(swarm.metrics, args.metrics_port)
+        print(f"Serving metrics on port {args.metrics_port}")
+        
+    if args.watch:
+        from .watcher import watch
+        try:
+            watch(swarm, directory, args.recursive, debounce=args.debounce, poll_interval=args.poll,
+                  max_workers=args.workers)
+        except KeyboardInterrupt:
+            print("\nStopped watching")
+        report_metrics(swarm, args)
+        return
+        
+    print(f"\nProcessing directory: {directory}")
+    try:
+        if args.use_async:
+            import asyncio
+            results = asyncio.run(
+                swarm.process_directory_async(directory, args.recursive, max_concurrency=args.workers,
+                                              shard=shard, full_scan=args.full_scan)
+            )
+        else:
+            results = swarm.process_directory(directory, args.recursive, max_workers=args.workers,
+                                              batch_tokens=args.batch_tokens, shard=shard,
+                                              full_scan=args.full_scan)
+    except KeyboardInterrupt:
+        # Completed analyses were saved by the controller; the next run resumes from them
+        report_metrics(swarm, args)
+        sys.exit(130)
+        
+    print("\nProcessing complete!")
+    print(f"Processed {len(results)} files")
+    if swarm.batch_stats.requests:
+        stats = swarm.batch_stats.summary()
+        print(f"Batched {stats['batched_files']} files into {stats['requests']} requests "
+              f"({stats['prompt_token_savings']:.0%} fewer prompt tokens, "
+              f"{stats['retried_files']} retried individually)")
+    requests = swarm.scheduler.summary()
+    if requests['retries'] or requests['failures']:
+        print(f"Sent {requests['requests']} requests: {requests['retries']} retries "
+              f"({requests['rate_limited']} rate limited), {requests['failures']} failed")
+              
+    # Show sample of results
+    print("\nSample of tagged files:")
+    for file_path, data in islice(results.items(), 5):
+        print(f"\n{file_path}:")
+        print(f"  Tags: {', '.join(data.get('tags', []))}")
+        print(f"  Agent: {data.get('agent', 'Unknown')}")
+    report_metrics(swarm, args)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
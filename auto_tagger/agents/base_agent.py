@@ -1,13 +1,59 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import os
 from pathlib import Path
+from ..scheduler import default_scheduler, estimate_request_tokens
+from ..metrics import default_metrics
+from ..backends import get_backend
+from .. import sampling
+from ..schema import SchemaError, correction_messages, dump_analysis, parse_analysis, response_format
+
+_dotenv_loaded = False
+
+def _load_dotenv():
+    """Load .env once, the first time an API client is needed"""
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _dotenv_loaded = True
 
 class BaseAgent(ABC):
+    # Chat completion settings shared by the model-backed agents; the model must support
+    # structured outputs (response_format json_schema)
+    model = "gpt-4o-mini"
+    temperature = 0.3
+    # Room for the schema's fields (see schema.py), which typically take 60-100 tokens
+    max_tokens = 150
+    # Requests sent to fix an answer that fails schema validation
+    max_corrections = 1
+    # Bump when the prompt changes so cached answers for the old prompt are not reused
+    prompt_version = "3"
+    # Prompt pieces; model-backed agents fill these in and implement build_sample
+    system_prompt = ""
+    analysis_request = ""
+    sample_label = "Content"
+    # Sampling budget in characters and strategy ("head", "head_tail" or "windows") for read_sample
+    sample_chars = 1500
+    sample_strategy = "head"
+    sample_windows = 4
+    
     def __init__(self, name: str):
         self.name = name
         self.supported_extensions: List[str] = []
-    
+        # Upper bound on concurrent analyze_file calls when the swarm runs with workers (None = unbounded)
+        self.max_concurrency: Optional[int] = None
+        self._client = None
+        self._async_client = None
+        # Shared ResultCache assigned by the swarm controller (None disables caching)
+        self.result_cache = None
+        # RequestScheduler every model request is submitted through; the swarm shares one across agents
+        self.scheduler = default_scheduler()
+        # Metrics registry for stage timings and counters; the swarm shares one across agents
+        self.metrics = default_metrics()
+        # Backend that turns samples into tags (openai unless configured otherwise)
+        self.backend = get_backend()
+        
     @abstractmethod
     def analyze_file(self, file_path: Path) -> Dict[str, Any]:
         """
@@ -18,16 +64,308 @@ class BaseAgent(ABC):
             Dictionary containing tags and metadata
         """
         pass
-    
+        
+    async def analyze_file_async(self, file_path: Path) -> Dict[str, Any]:
+        """
+        Asynchronous counterpart of analyze_file
+        Agents that implement build_sample await the async client directly,
+        so many requests can be in flight on one event loop. Other agents, and
+        agents on a local backend, run analyze_file in a worker thread.
+        Args:
+            file_path: Path to the file to analyze
+        Returns:
+            Dictionary containing tags and metadata
+        """
+        if not self.is_model_backed() or not self.backend.remote:
+            import asyncio
+            return await asyncio.to_thread(self.analyze_file, file_path)
+        try:
+            messages = await self.build_messages_async(file_path)
+            if messages is None:
+                return self.empty_result()
+            key = self.cache_key(messages)
+            analysis = self.cached_analysis(key)
+            if analysis is None:
+                analysis = await self.shared_analysis_async(key, messages)
+            with self.metrics.timer("parse", self.name):
+                return self.parse_response(file_path, analysis)
+        except Exception as e:
+            return self.error_result(e)
+            
     def can_handle_file(self, file_path: Path) -> bool:
         """Check if this agent can handle the given file type"""
         return file_path.suffix.lower() in self.supported_extensions
-    
-    def get_file_content(self, file_path: Path) -> str:
-        """Read and return file content"""
+        
+    def get_file_content(self, file_path: Path, max_chars: Optional[int] = None) -> str:
+        """Read and return file content, or only its first max_chars characters"""
+        if max_chars is not None:
+            return self.read_sample(file_path, max_chars, "head")
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 return f.read()
         except Exception as e:
             print(f"Error reading file {file_path}: {str(e)}")
-            return "" 
\ No newline at end of file
+            return ""
+            
+    def read_sample(self, file_path: Path, chars: Optional[int] = None, strategy: Optional[str] = None) -> str:
+        """
+        Read a bounded text sample, decoding only the bytes that end up in it
+        Args:
+            file_path: File to sample
+            chars: Character budget (defaults to sample_chars)
+            strategy: "head", "head_tail" or "windows" (defaults to sample_strategy)
+        Returns:
+            The sample, or "" for empty, binary or unreadable files
+        """
+        try:
+            sample = sampling.read_sample(file_path, chars or self.sample_chars,
+                                          strategy or self.sample_strategy, self.sample_windows)
+        except Exception as e:
+            print(f"Error reading file {file_path}: {str(e)}")
+            return ""
+        return sample or ""
+        
+    @property
+    def client(self):
+        """OpenAI client, created (and openai imported) on first use"""
+        if self._client is None:
+            from openai import OpenAI
+            _load_dotenv()
+            # Retries are left to the scheduler, which shares rate-limit backoff across agents
+            self._client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'), max_retries=0)
+        return self._client
+        
+    @client.setter
+    def client(self, client):
+        self._client = client
+        
+    @property
+    def async_client(self):
+        """AsyncOpenAI client, created on first use"""
+        if self._async_client is None:
+            from openai import AsyncOpenAI
+            _load_dotenv()
+            self._async_client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'), max_retries=0)
+        return self._async_client
+        
+    @async_client.setter
+    def async_client(self, client):
+        self._async_client = client
+        
+    def is_model_backed(self) -> bool:
+        """Whether this agent builds prompts through build_sample (and so supports async and batching)"""
+        return type(self).build_sample is not BaseAgent.build_sample
+        
+    def build_sample(self, file_path: Path) -> Optional[str]:
+        """
+        Extract the part of a file that is sent to the model
+        Args:
+            file_path: Path to the file to analyze
+        Returns:
+            Sample text, or None if the file has nothing to analyze
+        """
+        raise NotImplementedError
+        
+    def build_prompt(self, sample: str) -> str:
+        """User prompt for a single file sample"""
+        return f"{self.analysis_request}\n\n{self.sample_label}:\n{sample}"
+        
+    def build_messages(self, file_path: Path) -> Optional[List[Dict[str, str]]]:
+        """
+        Build the chat messages sent to the model for a file
+        Args:
+            file_path: Path to the file to analyze
+        Returns:
+            List of chat messages, or None if the file has nothing to analyze
+        """
+        with self.metrics.timer("sample", self.name):
+            sample = self.build_sample(file_path)
+        if not sample:
+            return None
+        with self.metrics.timer("prompt", self.name):
+            return self.messages_for_sample(sample)
+            
+    async def build_messages_async(self, file_path: Path) -> Optional[List[Dict[str, str]]]:
+        """
+        build_messages for the asyncio pipeline
+        Samples are cheap to build for most files, so this runs on the event
+        loop; agents whose samples block (e.g. on a process pool) override it.
+        """
+        return self.build_messages(file_path)
+        
+    def messages_for_sample(self, sample: str) -> List[Dict[str, str]]:
+        """Chat messages for an already extracted sample"""
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": self.build_prompt(sample)}
+        ]
+        
+    def request_params(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Keyword arguments for chat.completions.create"""
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "response_format": response_format()
+        }
+        
+    def request_analysis(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Ask the model for an analysis and validate it against the schema
+        An invalid answer is sent back with the validation error, without the
+        file sample, up to max_corrections times.
+        Returns:
+            The validated fields as compact JSON
+        Raises:
+            SchemaError if no valid answer was obtained
+        """
+        response = self.complete(self.request_params(messages))
+        answer = response.choices[0].message.content
+        for attempt in range(self.max_corrections + 1):
+            try:
+                return dump_analysis(parse_analysis(answer))
+            except SchemaError as e:
+                if attempt == self.max_corrections:
+                    raise SchemaError(f"Invalid model output: {e}")
+                self.metrics.count(self.name, "corrections")
+                response = self.complete(self.request_params(correction_messages(self.system_prompt, answer or "", e)))
+                answer = response.choices[0].message.content
+                
+    async def request_analysis_async(self, messages: List[Dict[str, str]]) -> str:
+        """Asynchronous counterpart of request_analysis"""
+        response = await self.complete_async(self.request_params(messages))
+        answer = response.choices[0].message.content
+        for attempt in range(self.max_corrections + 1):
+            try:
+                return dump_analysis(parse_analysis(answer))
+            except SchemaError as e:
+                if attempt == self.max_corrections:
+                    raise SchemaError(f"Invalid model output: {e}")
+                self.metrics.count(self.name, "corrections")
+                response = await self.complete_async(
+                    self.request_params(correction_messages(self.system_prompt, answer or "", e))
+                )
+                answer = response.choices[0].message.content
+                
+    def complete(self, params: Dict[str, Any]):
+        """Send a chat completion through the scheduler, waiting for rate budgets and retrying throttled requests"""
+        attempts = 0
+        def call():
+            nonlocal attempts
+            attempts += 1
+            # Only time on the wire counts as api latency, not rate-limit waits or backoff
+            with self.metrics.timer("api", self.name):
+                return self.client.chat.completions.create(**params)
+        try:
+            response = self.scheduler.submit(call, estimate_request_tokens(params))
+        finally:
+            self.metrics.count(self.name, "retries", max(0, attempts - 1))
+        self.metrics.record_usage(self.name, params.get("model", self.model), response)
+        return response
+        
+    async def complete_async(self, params: Dict[str, Any]):
+        """Asynchronous counterpart of complete"""
+        attempts = 0
+        async def call():
+            nonlocal attempts
+            attempts += 1
+            with self.metrics.timer("api", self.name):
+                return await self.async_client.chat.completions.create(**params)
+        try:
+            response = await self.scheduler.submit_async(call, estimate_request_tokens(params))
+        finally:
+            self.metrics.count(self.name, "retries", max(0, attempts - 1))
+        self.metrics.record_usage(self.name, params.get("model", self.model), response)
+        return response
+        
+    def cache_key(self, messages: List[Dict[str, str]]) -> Optional[str]:
+        """Content-addressed key for a request, or None when no cache is attached"""
+        if self.result_cache is None:
+            return None
+        return self.result_cache.make_key(self.name, self.prompt_version, self.model, messages,
+                                          self.temperature, self.max_tokens)
+                                          
+    def cached_analysis(self, key: Optional[str]) -> Optional[str]:
+        """Look up a cached answer, counting the hit or miss; None without a key or on a miss"""
+        if not key:
+            return None
+        analysis = self.result_cache.get(key)
+        self.metrics.count(self.name, "cache_misses" if analysis is None else "cache_hits")
+        return analysis
+        
+    def shared_analysis(self, key: Optional[str], messages: List[Dict[str, str]]) -> str:
+        """
+        Request an analysis that missed the cache and cache the answer
+        Identical requests in flight at the same time, in this process or in
+        another one sharing a SQLiteResultCache, are answered by one call.
+        """
+        if not key:
+            return self.request_analysis(messages)
+        analysis, shared = self.result_cache.coalesce(key, lambda: self.request_analysis(messages))
+        if shared:
+            self.metrics.count(self.name, "coalesced")
+        return analysis
+        
+    async def shared_analysis_async(self, key: Optional[str], messages: List[Dict[str, str]]) -> str:
+        """Asynchronous counterpart of shared_analysis"""
+        if not key:
+            return await self.request_analysis_async(messages)
+        analysis, shared = await self.result_cache.coalesce_async(key, lambda: self.request_analysis_async(messages))
+        if shared:
+            self.metrics.count(self.name, "coalesced")
+        return analysis
+        
+    def analyze_with_model(self, file_path: Path) -> Dict[str, Any]:
+        """Synchronous build -> complete -> parse pipeline used by the model-backed agents"""
+        try:
+            if not self.backend.remote:
+                with self.metrics.timer("sample", self.name):
+                    sample = self.build_sample(file_path)
+                if not sample:
+                    return self.empty_result()
+                with self.metrics.timer("inference", self.name):
+                    return self.backend.analyze(self, [(file_path, sample)])[0]
+            messages = self.build_messages(file_path)
+            if messages is None:
+                return self.empty_result()
+            key = self.cache_key(messages)
+            analysis = self.cached_analysis(key)
+            if analysis is None:
+                analysis = self.shared_analysis(key, messages)
+            with self.metrics.timer("parse", self.name):
+                return self.parse_response(file_path, analysis)
+        except Exception as e:
+            return self.error_result(e)
+            
+    def parse_response(self, file_path: Path, analysis: str) -> Dict[str, Any]:
+        """
+        Turn the model's JSON answer into tags and metadata
+        Raises:
+            SchemaError if the answer does not match the analysis schema
+        """
+        fields = parse_analysis(analysis)
+        return {
+            "tags": fields["tags"],
+            "metadata": {
+                "file_type": file_path.suffix,
+                "language": fields["language"],
+                "purpose": fields["purpose"],
+                "components": fields["components"],
+                "size": os.path.getsize(file_path)
+            }
+        }
+        
+    def empty_result(self) -> Dict[str, Any]:
+        """Result for a file with no content to analyze"""
+        return {"tags": [], "metadata": {"error": "Empty file or error reading file"}}
+        
+    def error_result(self, error: Exception) -> Dict[str, Any]:
+        """Result for a failed analysis"""
+        self.metrics.count(self.name, "errors")
+        return {
+            "tags": [],
+            "metadata": {
+                "error": str(error)
+            }
+        }
@@ -1,66 +1,34 @@
 from pathlib import Path
-from typing import Dict, Any
-import os
-from dotenv import load_dotenv
-from openai import OpenAI
+from typing import Dict, Any, Optional
 from .base_agent import BaseAgent
-
-load_dotenv()
+from .registry import CODE_EXTENSIONS
+from ..condense import condense
 
 class CodeAgent(BaseAgent):
+    system_prompt = "You are a code analysis expert. Provide concise, relevant tags and metadata for code files."
+    analysis_request = """Analyze this code file and provide:
+- language: programming language
+- purpose: main functionality, in one sentence
+- components: key classes, functions and important dependencies
+- tags: relevant tags (max 5)"""
+    sample_label = "Code"
+    # Source read to build the sample; the sample itself is condensed to sample_tokens (see condense.py)
+    sample_chars = 256 * 1024
+    sample_strategy = "head"
+    # Token budget of the condensed skeleton sent for each file
+    sample_tokens = 400
+    
     def __init__(self):
         super().__init__("CodeAgent")
-        self.supported_extensions = ['.py', '.js', '.java', '.cpp', '.ts', '.go', '.rs']
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.supported_extensions = list(CODE_EXTENSIONS)
         
     def analyze_file(self, file_path: Path) -> Dict[str, Any]:
         """Analyze a code file and generate relevant tags"""
-        content = self.get_file_content(file_path)
-        if not content:
-            return {"tags": [], "metadata": {"error": "Empty file or error reading file"}}
-            
-        # Create a prompt for the language model
-        prompt = f"""Analyze this code file and provide:
-        1. Programming language
-        2. Main functionality/purpose
-        3. Key components/classes
-        4. Important dependencies
-        5. Relevant tags (max 5)
-        
-        Code:
-        {content[:1500]}  # Limit content length for API
-        """
+        return self.analyze_with_model(file_path)
         
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a code analysis expert. Provide concise, relevant tags and metadata for code files."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=200
-            )
-            
-            analysis = response.choices[0].message.content
-            
-            # Parse the response into structured data
-            # This is a simple implementation - you might want to make it more robust
-            tags = [word.strip() for word in analysis.lower().split() if len(word) > 3][:5]
-            
-            return {
-                "tags": tags,
-                "metadata": {
-                    "file_type": file_path.suffix,
-                    "analysis": analysis,
-                    "size": os.path.getsize(file_path)
-                }
-            }
-            
-        except Exception as e:
-            return {
-                "tags": [],
-                "metadata": {
-                    "error": str(e)
-                }
-            } 
\ No newline at end of file
+    def build_sample(self, file_path: Path) -> Optional[str]:
+        """Skeleton of the source file within sample_tokens, or the whole file if it fits"""
+        source = self.read_sample(file_path)
+        if not source:
+            return None
+        return condense(source, file_path.suffix, self.sample_tokens) or None
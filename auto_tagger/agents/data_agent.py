@@ -1,75 +1,50 @@
 from pathlib import Path
-from typing import Dict, Any
-import os
-import json
-import pandas as pd
-from dotenv import load_dotenv
-from openai import OpenAI
+from typing import Dict, Any, Optional
 from .base_agent import BaseAgent
-
-load_dotenv()
+from .registry import DATA_EXTENSIONS
+from ..sampling import sample_json, sample_xml, sample_xlsx
 
 class DataAgent(BaseAgent):
+    system_prompt = "You are a data analysis expert. Provide concise, relevant tags and metadata for data files."
+    analysis_request = """Analyze this data file and provide:
+- language: data format/structure
+- purpose: what the data describes, in one sentence
+- components: key data fields/columns
+- tags: relevant tags (max 5)"""
+    sample_label = "Sample data"
+    # Longest sample sent to the model; unstructured files are sampled from head and tail
+    sample_chars = 1500
+    sample_strategy = "head_tail"
+    
     def __init__(self):
         super().__init__("DataAgent")
-        self.supported_extensions = ['.json', '.csv', '.xlsx', '.xml', '.yaml', '.yml']
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.supported_extensions = list(DATA_EXTENSIONS)
         
     def analyze_file(self, file_path: Path) -> Dict[str, Any]:
         """Analyze a data file and generate relevant tags"""
-        try:
-            # Handle different file types
-            if file_path.suffix == '.json':
-                with open(file_path, 'r') as f:
-                    data = json.load(f)
-                sample = str(dict(list(data.items())[:5])) if isinstance(data, dict) else str(data[:5])
-            elif file_path.suffix == '.csv':
-                df = pd.read_csv(file_path)
-                sample = f"Columns: {', '.join(df.columns[:10])}\nSample data:\n{df.head(3).to_string()}"
-            else:
-                content = self.get_file_content(file_path)
-                sample = content[:1500]
-                
-            # Create a prompt for the language model
-            prompt = f"""Analyze this data file and provide:
-            1. Data format/structure
-            2. Key data fields/columns
-            3. Data purpose/content type
-            4. Data characteristics
-            5. Relevant tags (max 5)
-            
-            Sample data:
-            {sample}
-            """
-            
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a data analysis expert. Provide concise, relevant tags and metadata for data files."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=200
-            )
-            
-            analysis = response.choices[0].message.content
-            
-            # Extract tags from the analysis
-            tags = [word.strip() for word in analysis.lower().split() if len(word) > 3][:5]
-            
-            return {
-                "tags": tags,
-                "metadata": {
-                    "file_type": file_path.suffix,
-                    "analysis": analysis,
-                    "size": os.path.getsize(file_path)
-                }
-            }
-            
-        except Exception as e:
-            return {
-                "tags": [],
-                "metadata": {
-                    "error": str(e)
-                }
-            } 
\ No newline at end of file
+        return self.analyze_with_model(file_path)
+        
+    def build_sample(self, file_path: Path) -> Optional[str]:
+        """Short structural sample of the data file, read without loading the whole file"""
+        suffix = file_path.suffix.lower()
+        sample = None
+        # Handle different file types
+        if suffix in ('.json', '.jsonl', '.ndjson'):
+            sample = sample_json(file_path, lines=suffix != '.json')
+        elif suffix == '.csv':
+            # pandas is only imported once a CSV actually needs sampling
+            import pandas as pd
+            try:
+                df = pd.read_csv(file_path, nrows=3)
+                sample = f"Columns: {', '.join(map(str, df.columns[:10]))}\nSample data:\n{df.to_string()}"
+            except ValueError:
+                # ParserError, EmptyDataError and UnicodeDecodeError are all ValueErrors
+                pass
+        elif suffix == '.xml':
+            sample = sample_xml(file_path)
+        elif suffix == '.xlsx':
+            sample = sample_xlsx(file_path)
+        if sample is None and suffix != '.xlsx':
+            # Unstructured or unparseable data: a text sample of the file
+            sample = self.read_sample(file_path)
+        return sample[:self.sample_chars] if sample else None
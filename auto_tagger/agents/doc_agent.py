@@ -1,65 +1,72 @@
 from pathlib import Path
-from typing import Dict, Any
-import os
-from dotenv import load_dotenv
-from openai import OpenAI
+from typing import Dict, Any, List, Optional
 from .base_agent import BaseAgent
-
-load_dotenv()
+from .registry import DOC_EXTENSIONS
+from ..documents import DOCUMENT_SUFFIXES, EXTRACTOR_VERSION, content_digest, extract_text, pool_extract
 
 class DocAgent(BaseAgent):
+    system_prompt = "You are a documentation analysis expert. Provide concise, relevant tags and metadata for documentation files."
+    analysis_request = """Analyze this documentation file and provide:
+- language: document type/format
+- purpose: main topic and target audience, in one sentence
+- components: key concepts covered
+- tags: relevant tags (max 5)"""
+    sample_label = "Content"
+    # Titles and introductions come first
+    sample_chars = 2000
+    sample_strategy = "head"
+    # Pages of PDFs and paragraphs of Word documents that text is extracted from
+    max_pages = 5
+    max_paragraphs = 80
+    # Processes parsing PDF and Word documents (None = the shared pool's default, 0 = parse in the calling thread)
+    extract_processes: Optional[int] = None
+    
     def __init__(self):
         super().__init__("DocAgent")
-        self.supported_extensions = ['.md', '.txt', '.rst', '.pdf', '.doc', '.docx']
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.supported_extensions = list(DOC_EXTENSIONS)
         
     def analyze_file(self, file_path: Path) -> Dict[str, Any]:
         """Analyze a documentation file and generate relevant tags"""
-        content = self.get_file_content(file_path)
-        if not content:
-            return {"tags": [], "metadata": {"error": "Empty file or error reading file"}}
-            
-        # Create a prompt for the language model
-        prompt = f"""Analyze this documentation file and provide:
-        1. Document type/format
-        2. Main topic/subject
-        3. Key concepts covered
-        4. Target audience
-        5. Relevant tags (max 5)
+        return self.analyze_with_model(file_path)
         
-        Content:
-        {content[:2000]}  # Limit content length for API
-        """
+    def build_sample(self, file_path: Path) -> Optional[str]:
+        """Leading part of the document, extracted first for PDF and Word files"""
+        if file_path.suffix.lower() in DOCUMENT_SUFFIXES:
+            return self.document_text(file_path) or None
+        return self.read_sample(file_path) or None
+        
+    async def build_messages_async(self, file_path: Path) -> Optional[List[Dict[str, str]]]:
+        """Build messages off the event loop for documents, which wait on the extraction pool"""
+        if file_path.suffix.lower() in DOCUMENT_SUFFIXES:
+            import asyncio
+            return await asyncio.to_thread(self.build_messages, file_path)
+        return self.build_messages(file_path)
         
+    def document_text(self, file_path: Path) -> Optional[str]:
+        """
+        Text of the first pages or paragraphs of a PDF or Word document
+        Extraction runs in the shared process pool, and its result is kept in
+        the result cache under the hash of the file's content, so unchanged,
+        touched or copied documents are not parsed again.
+        Returns:
+            The text ("" for documents without usable text), or None if extraction failed
+        """
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a documentation analysis expert. Provide concise, relevant tags and metadata for documentation files."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=200
-            )
-            
-            analysis = response.choices[0].message.content
-            
-            # Extract tags from the analysis
-            tags = [word.strip() for word in analysis.lower().split() if len(word) > 3][:5]
-            
-            return {
-                "tags": tags,
-                "metadata": {
-                    "file_type": file_path.suffix,
-                    "analysis": analysis,
-                    "size": os.path.getsize(file_path)
-                }
-            }
-            
+            key = None
+            if self.result_cache is not None:
+                key = f"text:{EXTRACTOR_VERSION}:{self.max_pages}:{self.max_paragraphs}:{content_digest(file_path)}"
+                cached = self.result_cache.get(key)
+                if cached is not None:
+                    return cached
+            arguments = (file_path, self.max_pages, self.max_paragraphs, self.sample_chars)
+            if self.extract_processes == 0:
+                text = extract_text(*arguments)
+            else:
+                text = pool_extract(*arguments, processes=self.extract_processes)
         except Exception as e:
-            return {
-                "tags": [],
-                "metadata": {
-                    "error": str(e)
-                }
-            } 
\ No newline at end of file
+            print(f"Error extracting text from {file_path}: {str(e)}")
+            return None
+        text = text or ""
+        if key:
+            self.result_cache.put(key, text)
+        return text
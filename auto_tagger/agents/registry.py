@@ -0,0 +1,105 @@
+"""
+Registry of agent types and the file extensions they handle.
+
+Agents are registered by import path rather than by class, so building the
+extension -> agent dispatch table never imports an agent module or its heavy
+dependencies. The SwarmController only imports and instantiates an agent the
+first time a file with one of its extensions shows up.
+
+Third-party agents can register themselves with register_agent(), or through
+the "auto_tagger.agents" entry point group. An entry point may resolve to an
+AgentSpec, an iterable of AgentSpecs, or a callable returning either.
+"""
+from dataclasses import dataclass
+from importlib import import_module
+from typing import Callable, Dict, Iterable, List, Tuple, Union
+import threading
+
+ENTRY_POINT_GROUP = "auto_tagger.agents"
+
+# Suffixes of the built-in agents, kept here so the dispatch table is built without importing
+# them; each agent's supported_extensions is read from the same tuple
+CODE_EXTENSIONS = ('.py', '.js', '.java', '.cpp', '.ts', '.go', '.rs')
+DOC_EXTENSIONS = ('.md', '.txt', '.rst', '.pdf', '.doc', '.docx')
+DATA_EXTENSIONS = ('.json', '.jsonl', '.ndjson', '.csv', '.xlsx', '.xml', '.yaml', '.yml')
+
+@dataclass(frozen=True)
+class AgentSpec:
+    """How to build an agent and which suffixes it handles"""
+    name: str
+    extensions: Tuple[str, ...]
+    # "package.module:ClassName", or a zero-argument callable returning an agent
+    factory: Union[str, Callable[[], object]]
+    
+    def create(self):
+        """Import (if needed) and instantiate the agent"""
+        factory = self.factory
+        if isinstance(factory, str):
+            module_name, _, attribute = factory.partition(":")
+            factory = getattr(import_module(module_name), attribute)
+        return factory()
+
+_registry: Dict[str, AgentSpec] = {}
+_lock = threading.Lock()
+_entry_points_loaded = False
+
+def register_agent(name: str, extensions: Iterable[str], factory: Union[str, Callable[[], object]],
+                   replace: bool = False) -> AgentSpec:
+    """
+    Register an agent type
+    Args:
+        name: Agent name, unique in the registry
+        extensions: File suffixes (with leading dot) the agent handles
+        factory: "module:ClassName" import path or zero-argument callable
+        replace: Allow overriding an existing registration with the same name
+    Returns:
+        The registered AgentSpec
+    """
+    spec = AgentSpec(name, tuple(extension.lower() for extension in extensions), factory)
+    with _lock:
+        if name in _registry and not replace:
+            raise ValueError(f"Agent '{name}' is already registered")
+        _registry[name] = spec
+    return spec
+
+def unregister_agent(name: str):
+    """Remove an agent type from the registry"""
+    with _lock:
+        _registry.pop(name, None)
+
+def _load_entry_points():
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+    from importlib.metadata import entry_points
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        try:
+            loaded = entry_point.load()
+            if callable(loaded) and not isinstance(loaded, AgentSpec):
+                loaded = loaded()
+            specs = [loaded] if isinstance(loaded, AgentSpec) else list(loaded)
+        except Exception as e:
+            print(f"Error loading agent plugin {entry_point.name}: {str(e)}")
+            continue
+        for spec in specs:
+            with _lock:
+                _registry.setdefault(spec.name, spec)
+
+def registered_agents() -> List[AgentSpec]:
+    """All registered agent types, built-ins first, then in registration order"""
+    _load_entry_points()
+    with _lock:
+        return list(_registry.values())
+
+def build_dispatch_table(specs: Iterable[AgentSpec]) -> Dict[str, AgentSpec]:
+    """Map each lower-case suffix to the first agent type registered for it"""
+    table: Dict[str, AgentSpec] = {}
+    for spec in specs:
+        for extension in spec.extensions:
+            table.setdefault(extension, spec)
+    return table
+
+register_agent("CodeAgent", CODE_EXTENSIONS, "auto_tagger.agents.code_agent:CodeAgent")
+register_agent("DocAgent", DOC_EXTENSIONS, "auto_tagger.agents.doc_agent:DocAgent")
+register_agent("DataAgent", DATA_EXTENSIONS, "auto_tagger.agents.data_agent:DataAgent")
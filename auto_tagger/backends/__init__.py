@@ -0,0 +1,50 @@
+"""
+Tagging backends the agents can run their samples through.
+
+- openai: chat completions through the OpenAI API (default)
+- heuristic: format tag plus frequent keywords; no network and no model
+- transformers: a small local embedding model on CPU, batched across files
+
+The backend is chosen per swarm (SwarmController(backend=...), --backend) or
+process-wide with the AUTO_TAGGER_BACKEND environment variable. Backend
+modules are imported on first use, so torch and transformers are only
+loaded when the transformers backend is selected.
+"""
+from importlib import import_module
+from typing import Dict, Optional, Union
+import os
+import threading
+from .base import TaggingBackend
+
+DEFAULT_BACKEND = "openai"
+
+# Backend name -> "module:Class"
+BACKENDS = {
+    "openai": ".openai_backend:OpenAIBackend",
+    "heuristic": ".heuristic:HeuristicBackend",
+    "transformers": ".transformers_backend:TransformersBackend",
+}
+
+_instances: Dict[str, TaggingBackend] = {}
+_lock = threading.Lock()
+
+def get_backend(backend: Union[str, TaggingBackend, None] = None) -> TaggingBackend:
+    """
+    Resolve a backend by name, sharing one instance (and loaded model) per name
+    Args:
+        backend: Backend name, an instance (returned as is), or None for $AUTO_TAGGER_BACKEND / openai
+    Returns:
+        The backend instance
+    """
+    if isinstance(backend, TaggingBackend):
+        return backend
+    name = (backend or os.getenv("AUTO_TAGGER_BACKEND") or DEFAULT_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}' (choose from {', '.join(BACKENDS)})")
+    with _lock:
+        instance = _instances.get(name)
+        if instance is None:
+            module_name, _, attribute = BACKENDS[name].partition(":")
+            instance = getattr(import_module(module_name, __name__), attribute)()
+            _instances[name] = instance
+        return instance
@@ -0,0 +1,41 @@
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Tuple
+import os
+from pathlib import Path
+from ..schema import validate
+
+class TaggingBackend(ABC):
+    """Turns file samples extracted by an agent into tags"""
+    name = ""
+    # Remote backends go through the request scheduler, the result cache and prompt batching;
+    # local backends are handed lists of samples and run inference on them directly
+    remote = False
+    # Number of files a local backend processes per call
+    batch_size = 32
+    
+    @abstractmethod
+    def analyze(self, agent, items: List[Tuple[Path, str]]) -> List[Dict[str, Any]]:
+        """
+        Tag a batch of files
+        Args:
+            agent: Agent that extracted the samples
+            items: (file_path, sample) pairs
+        Returns:
+            One analysis result per item, in order
+        """
+        pass
+        
+    def result(self, file_path: Path, language: str, purpose: str, components: List[str],
+               tags: List[str]) -> Dict[str, Any]:
+        """Analysis result in the same shape, and with the same tag normalization, as the model-backed agents"""
+        fields = validate({"language": language, "purpose": purpose, "components": components, "tags": tags})
+        return {
+            "tags": fields["tags"],
+            "metadata": {
+                "file_type": file_path.suffix,
+                "language": fields["language"],
+                "purpose": fields["purpose"],
+                "components": fields["components"],
+                "size": os.path.getsize(file_path)
+            }
+        }
@@ -0,0 +1,77 @@
+from collections import Counter
+from typing import List, Dict, Any, Tuple
+from pathlib import Path
+import re
+from .base import TaggingBackend
+
+# Tag naming the language or format of each handled suffix
+FORMAT_TAGS = {
+    '.py': 'python', '.js': 'javascript', '.ts': 'typescript', '.java': 'java',
+    '.cpp': 'cpp', '.go': 'golang', '.rs': 'rust',
+    '.md': 'markdown', '.txt': 'text', '.rst': 'restructuredtext',
+    '.pdf': 'pdf', '.doc': 'word', '.docx': 'word',
+    '.json': 'json', '.jsonl': 'json', '.ndjson': 'json', '.csv': 'csv', '.xlsx': 'excel', '.xml': 'xml', '.yaml': 'yaml', '.yml': 'yaml'
+}
+
+# Words too common in prose or source code to say anything about a file
+STOPWORDS = frozenset("""
+about above after again also because been before being below between both cannot could does doing down during
+each from further have having here into itself just more most once only other over same should some such than
+that their them then there these they this those through under until very were what when where which while
+will with would your yours
+self return import from class def elif else none true false null void public private protected static final
+const function this that var let new package func struct impl println print printf string list dict
+args kwargs self init main value values data type types file files name names path
+""".split())
+
+# Identifier pieces: runs of capitalised/lowercase letters, so camelCase and snake_case split into words
+WORD_PATTERN = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])")
+
+class HeuristicBackend(TaggingBackend):
+    """
+    Model-free backend: a format tag from the suffix plus the most frequent
+    meaningful words of the sample. Needs no network and no model weights.
+    """
+    name = "heuristic"
+    batch_size = 256
+    
+    def __init__(self, max_tags: int = 5, min_length: int = 4):
+        """
+        Args:
+            max_tags: Number of tags per file, including the format tag
+            min_length: Shortest word considered as a keyword
+        """
+        self.max_tags = max_tags
+        self.min_length = min_length
+        
+    def keywords(self, sample: str, count: int) -> List[str]:
+        """Most frequent non-stopword words of a sample, ties broken by first occurrence"""
+        words = (word.lower() for word in WORD_PATTERN.findall(sample))
+        counts = Counter(word for word in words if len(word) >= self.min_length and word not in STOPWORDS)
+        return [word for word, _ in counts.most_common(count)]
+        
+    def language(self, file_path: Path) -> str:
+        """Format tag of the file's suffix, or the bare suffix when it has none"""
+        suffix = file_path.suffix.lower()
+        return FORMAT_TAGS.get(suffix, suffix.lstrip("."))
+        
+    def tag(self, file_path: Path, sample: str) -> List[str]:
+        tags = []
+        format_tag = FORMAT_TAGS.get(file_path.suffix.lower())
+        if format_tag:
+            tags.append(format_tag)
+        for word in self.keywords(sample, self.max_tags):
+            if len(tags) >= self.max_tags:
+                break
+            if word not in tags:
+                tags.append(word)
+        return tags
+        
+    def analyze(self, agent, items: List[Tuple[Path, str]]) -> List[Dict[str, Any]]:
+        results = []
+        for file_path, sample in items:
+            tags = self.tag(file_path, sample)
+            keywords = [tag for tag in tags if tag != FORMAT_TAGS.get(file_path.suffix.lower())]
+            results.append(self.result(file_path, self.language(file_path), f"Keywords: {', '.join(keywords)}",
+                                       keywords, tags))
+        return results
@@ -0,0 +1,15 @@
+from typing import List, Dict, Any, Tuple
+from pathlib import Path
+from .base import TaggingBackend
+
+class OpenAIBackend(TaggingBackend):
+    """
+    Chat completion backend (the default)
+    Agents send their prompts through their OpenAI client themselves, so
+    that requests share the scheduler, the result cache and prompt batching.
+    """
+    name = "openai"
+    remote = True
+    
+    def analyze(self, agent, items: List[Tuple[Path, str]]) -> List[Dict[str, Any]]:
+        return [agent.analyze_with_model(file_path) for file_path, _ in items]
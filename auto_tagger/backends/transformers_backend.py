@@ -0,0 +1,109 @@
+from typing import List, Dict, Any, Optional, Tuple
+from pathlib import Path
+import os
+import threading
+from .base import TaggingBackend
+from .heuristic import HeuristicBackend
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Candidate topics; each file is tagged with the labels its embedding is closest to
+DEFAULT_LABELS = [
+    "web development", "api", "command line tool", "database", "machine learning", "data analysis",
+    "testing", "configuration", "documentation", "tutorial", "networking", "security", "authentication",
+    "user interface", "build system", "deployment", "logging", "file processing", "mathematics",
+    "image processing", "natural language processing", "concurrency", "finance", "scientific computing"
+]
+
+class TransformersBackend(TaggingBackend):
+    """
+    Local embedding backend running a small sentence-embedding model on CPU
+    Samples are embedded in batches and tagged with the candidate labels they
+    are most similar to, next to the format tag of the heuristic backend.
+    torch and transformers are imported on first use; when they (or the model
+    weights) are unavailable the backend falls back to HeuristicBackend.
+    """
+    name = "transformers"
+    batch_size = 32
+    
+    def __init__(self, model_name: Optional[str] = None, labels: Optional[List[str]] = None,
+                 top_k: int = 3, threshold: float = 0.15, max_length: int = 256, device: str = "cpu"):
+        """
+        Args:
+            model_name: Hugging Face model id or local path (defaults to $AUTO_TAGGER_MODEL or MiniLM)
+            labels: Candidate tags
+            top_k: Most labels attached to one file
+            threshold: Lowest cosine similarity for a label to be attached
+            max_length: Tokens of each sample fed to the model
+            device: Torch device to run on
+        """
+        self.model_name = model_name or os.getenv("AUTO_TAGGER_MODEL", DEFAULT_MODEL)
+        self.labels = list(labels or DEFAULT_LABELS)
+        self.top_k = top_k
+        self.threshold = threshold
+        self.max_length = max_length
+        self.device = device
+        # Supplies the format tag, and every tag when no model is available
+        self.heuristic = HeuristicBackend(max_tags=1)
+        self.fallback = HeuristicBackend()
+        self._model = None
+        self._tokenizer = None
+        self._label_vectors = None
+        self._unavailable = False
+        self._load_lock = threading.Lock()
+        
+    def _load(self) -> bool:
+        """Load the model and embed the labels once; False if no model can be loaded"""
+        with self._load_lock:
+            if self._unavailable:
+                return False
+            if self._label_vectors is None:
+                try:
+                    from transformers import AutoModel, AutoTokenizer
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                    self._model = AutoModel.from_pretrained(self.model_name).to(self.device).eval()
+                    self._label_vectors = self.encode(self.labels)
+                except (ImportError, OSError) as e:
+                    print(f"Local model {self.model_name} unavailable, using heuristic tags: {str(e)}")
+                    self._unavailable = True
+                    return False
+            return True
+            
+    def available(self) -> bool:
+        """Whether the model can be loaded (loading it on first call)"""
+        return self._load()
+        
+    def encode(self, texts: List[str]):
+        """L2-normalised mean-pooled embeddings of texts, one row per text"""
+        import torch
+        vectors = []
+        with torch.no_grad():
+            for start in range(0, len(texts), self.batch_size):
+                encoded = self._tokenizer(texts[start:start + self.batch_size], padding=True, truncation=True,
+                                          max_length=self.max_length, return_tensors="pt").to(self.device)
+                hidden = self._model(**encoded).last_hidden_state
+                mask = encoded["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+                vectors.append(torch.nn.functional.normalize(pooled, dim=1))
+        return torch.cat(vectors)
+        
+    def rank(self, scores: List[float]) -> List[Tuple[str, float]]:
+        """Labels above the threshold, best first, for one file's similarity row"""
+        ranked = sorted(zip(self.labels, scores), key=lambda pair: pair[1], reverse=True)
+        return [(label, score) for label, score in ranked[:self.top_k] if score >= self.threshold]
+        
+    def analyze(self, agent, items: List[Tuple[Path, str]]) -> List[Dict[str, Any]]:
+        if not items:
+            return []
+        if not self._load():
+            return self.fallback.analyze(agent, items)
+        vectors = self.encode([sample for _, sample in items])
+        scores = (vectors @ self._label_vectors.T).tolist()
+        results = []
+        for (file_path, sample), row in zip(items, scores):
+            ranked = self.rank(row)
+            tags = self.heuristic.tag(file_path, sample) + [label for label, _ in ranked]
+            purpose = "Topics: " + ", ".join(f"{label} ({score:.2f})" for label, score in ranked)
+            results.append(self.result(file_path, self.heuristic.language(file_path), purpose,
+                                       [label for label, _ in ranked], tags))
+        return results
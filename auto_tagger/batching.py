@@ -0,0 +1,249 @@
+"""
+Batching of small files into shared chat completions.
+
+Most files in a typical tree are small, so a one-file-per-request run spends
+much of its budget on repeated system prompts, instructions and per-request
+latency. The batching stage packs samples of small files handled by the same
+agent into one request up to a token budget, asks for a JSON answer with one
+schema-shaped entry per file and splits it back into per-file results. Files
+the model's answer cannot be attributed to, or whose entry fails validation,
+are retried individually.
+"""
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import json
+import re
+import threading
+from .schema import ANALYSIS_FIELDS, SchemaError, dump_analysis, parse_analysis, response_format
+
+# Rough characters-per-token ratio of English text and source code for OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for packing and reporting"""
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+@dataclass
+class BatchItem:
+    """A pending file together with its extracted sample"""
+    file_key: str
+    file_path: Path
+    last_modified: float
+    sample: str
+    cache_key: Optional[str] = None
+    # (size, mtime_ns, inode) of the file when it was sampled
+    fingerprint: Optional[Tuple[int, int, int]] = None
+    
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.sample)
+
+@dataclass
+class BatchStats:
+    """Counters comparing batched requests with the one-file-per-request mode"""
+    requests: int = 0
+    batched_files: int = 0
+    retried_files: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # Prompt tokens the same files would have cost as individual requests
+    single_prompt_tokens: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+    
+    def record(self, files: int, prompt_tokens: int, completion_tokens: int, single_prompt_tokens: int):
+        with self._lock:
+            self.requests += 1
+            self.batched_files += files
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.single_prompt_tokens += single_prompt_tokens
+            
+    def record_retry(self, files: int):
+        with self._lock:
+            self.retried_files += files
+            
+    def summary(self) -> Dict[str, Any]:
+        saved = self.single_prompt_tokens - self.prompt_tokens
+        return {
+            "requests": self.requests,
+            "batched_files": self.batched_files,
+            "requests_saved": self.batched_files - self.requests,
+            "retried_files": self.retried_files,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "single_request_prompt_tokens": self.single_prompt_tokens,
+            "prompt_tokens_saved": saved,
+            "prompt_token_savings": saved / self.single_prompt_tokens if self.single_prompt_tokens else 0.0
+        }
+
+class BatchPacker:
+    """Greedy packing of items, in the order they arrive, into batches that fit a budget"""
+    def __init__(self, budget: int, cost: Callable[[BatchItem], int] = lambda item: item.tokens):
+        """
+        Args:
+            budget: Most a batch may cost; a single item costing more still gets its own batch
+            cost: Cost of an item, its estimated sample tokens by default
+        """
+        self.budget = budget
+        self.cost = cost
+        self.items: List[BatchItem] = []
+        self._used = 0
+        
+    def add(self, item: BatchItem) -> List[List[BatchItem]]:
+        """Queue an item, returning the batches it closed: the one it did not fit in, or its own once full"""
+        closed = []
+        cost = self.cost(item)
+        if self.items and self._used + cost > self.budget:
+            closed.append(self.flush())
+        self.items.append(item)
+        self._used += cost
+        if self._used >= self.budget:
+            closed.append(self.flush())
+        return closed
+        
+    def flush(self) -> List[BatchItem]:
+        """Take the open batch, which may be empty"""
+        batch, self.items, self._used = self.items, [], 0
+        return batch
+
+def pack_batches(items: Iterable[BatchItem], token_budget: int) -> List[List[BatchItem]]:
+    """Greedily pack items, in order, into batches whose samples fit the token budget"""
+    packer = BatchPacker(token_budget)
+    batches = [batch for item in items for batch in packer.add(item)]
+    if packer.items:
+        batches.append(packer.flush())
+    return batches
+
+def build_batch_messages(agent, items: List[BatchItem]) -> List[Dict[str, str]]:
+    """Chat messages asking an agent's model to analyze several files at once"""
+    sections = [
+        f"=== FILE {index}: {item.file_path.name} ===\n{item.sample}"
+        for index, item in enumerate(items)
+    ]
+    prompt = (
+        f"You are given {len(items)} files, each introduced by a line '=== FILE <id>: <name> ==='.\n"
+        f"For each file, answer the following:\n{agent.analysis_request}\n\n"
+        'Respond with only a JSON object of the form {"files": [{"id": <id>, '
+        '"language": "...", "purpose": "...", "components": ["..."], "tags": ["..."]}]} '
+        "with exactly one entry per file.\n\n"
+        + "\n\n".join(sections)
+    )
+    return [
+        {"role": "system", "content": agent.system_prompt},
+        {"role": "user", "content": prompt}
+    ]
+
+def split_batch_response(text: str, count: int) -> Dict[int, str]:
+    """
+    Attribute a batched answer back to its files
+    Args:
+        text: Raw model output
+        count: Number of files in the batch
+    Returns:
+        Mapping of file index to that file's analysis as JSON text; unattributable files are missing
+    """
+    # Tolerate a Markdown code fence around the JSON
+    text = re.sub(r"^\s*```(?:json)?\s*|\s*```\s*$", "", text)
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        return {}
+    entries = payload.get("files") if isinstance(payload, dict) else payload
+    if not isinstance(entries, list):
+        return {}
+    answers: Dict[int, str] = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            index = int(entry.get("id"))
+        except (TypeError, ValueError):
+            continue
+        if 0 <= index < count and index not in answers:
+            # Validation happens per file, so one malformed entry does not sink the batch
+            answers[index] = json.dumps({key: value for key, value in entry.items() if key in ANALYSIS_FIELDS})
+    return answers
+
+def analyze_batch(agent, items: List[BatchItem], stats: Optional[BatchStats] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Analyze a batch of small files with a single request
+    Args:
+        agent: Model-backed agent handling every file in the batch
+        items: Files to analyze, with their samples
+        stats: Optional counters to update
+    Returns:
+        Mapping of file key to analysis result for every item
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    if not agent.backend.remote:
+        # Local backends run inference on the whole batch at once; there is no prompt to share
+        try:
+            with agent.metrics.timer("inference", agent.name):
+                analyses = agent.backend.analyze(agent, [(item.file_path, item.sample) for item in items])
+        except Exception as e:
+            analyses = [agent.error_result(e) for _ in items]
+        return {item.file_key: analysis for item, analysis in zip(items, analyses)}
+    uncached = []
+    # Files whose prompt is identical to an earlier item's share its answer instead of a slot in the batch
+    duplicates: Dict[str, List[BatchItem]] = {}
+    for item in items:
+        cached = agent.cached_analysis(item.cache_key) if agent.result_cache is not None else None
+        if cached is not None:
+            results[item.file_key] = agent.parse_response(item.file_path, cached)
+        elif item.cache_key in duplicates:
+            duplicates[item.cache_key].append(item)
+            agent.metrics.count(agent.name, "coalesced")
+        else:
+            uncached.append(item)
+            if item.cache_key:
+                duplicates[item.cache_key] = []
+    items = uncached
+    
+    answers: Dict[int, str] = {}
+    if len(items) > 1:
+        messages = build_batch_messages(agent, items)
+        params = agent.request_params(messages)
+        params["max_tokens"] = agent.max_tokens * len(items)
+        params["response_format"] = response_format(batch=True)
+        try:
+            response = agent.complete(params)
+            answers = split_batch_response(response.choices[0].message.content or "", len(items))
+            if stats is not None:
+                usage = getattr(response, "usage", None)
+                prompt_tokens = getattr(usage, "prompt_tokens", None)
+                completion_tokens = getattr(usage, "completion_tokens", None)
+                if not isinstance(prompt_tokens, int):
+                    prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+                if not isinstance(completion_tokens, int):
+                    completion_tokens = estimate_tokens(response.choices[0].message.content or "")
+                single = sum(
+                    sum(estimate_tokens(m["content"]) for m in agent.messages_for_sample(item.sample))
+                    for item in items
+                )
+                stats.record(len(items), prompt_tokens, completion_tokens, single)
+        except Exception:
+            answers = {}
+            
+    retry = []
+    for index, item in enumerate(items):
+        try:
+            analysis = dump_analysis(parse_analysis(answers.get(index)))
+        except SchemaError:
+            retry.append(item)
+            continue
+        if item.cache_key and agent.result_cache is not None:
+            agent.result_cache.put(item.cache_key, analysis)
+        for target in [item] + duplicates.get(item.cache_key, []):
+            try:
+                with agent.metrics.timer("parse", agent.name):
+                    results[target.file_key] = agent.parse_response(target.file_path, analysis)
+            except Exception as e:
+                results[target.file_key] = agent.error_result(e)
+                
+    if stats is not None and retry and len(items) > 1:
+        stats.record_retry(len(retry))
+    for item in retry:
+        for target in [item] + duplicates.get(item.cache_key, []):
+            results[target.file_key] = agent.analyze_file(target.file_path)
+    return results
@@ -0,0 +1,394 @@
+"""
+Content-addressed cache of model answers.
+
+Entries are keyed by a hash of the exact messages an agent sends, together
+with the agent name, its prompt version and the model, temperature and
+max_tokens of the request. Identical, touched, renamed or copied files, and
+different files that reduce to the same prompt (generated stubs, vendored
+copies, CSVs sharing a header), therefore resolve to the same entry and are
+re-tagged without an API call. Identical requests that miss the cache at the
+same time are coalesced into one call. The cache is bounded by the total
+size of its entries and evicts the least recently used ones first.
+
+ResultCache keeps entries in memory and persists them to a JSON file, which
+suits a single process. SQLiteResultCache writes entries through to a SQLite
+database so that worker processes (--processes, --shard) share answers and
+in-flight requests as they happen.
+"""
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from .fileio import atomic_write
+from .storage import SQLITE_SUFFIXES
+
+DEFAULT_CACHE_FILE = "tag_cache.json"
+# Cache shared by the worker processes of sharded runs
+DEFAULT_SHARED_CACHE_FILE = "tag_cache.db"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+class ResultCache:
+    def __init__(self, cache_file: Optional[str] = DEFAULT_CACHE_FILE, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            cache_file: JSON file the cache is persisted to, or None to keep it in memory only
+            max_bytes: Upper bound on the combined size of cached keys and answers
+        """
+        self.cache_file = cache_file
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._size = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        # Futures of the requests being made for keys that missed, shared by identical requests
+        self._inflight: Dict[str, Future] = {}
+        self.load()
+        
+    @staticmethod
+    def make_key(agent_name: str, prompt_version: str, model: str, messages: List[Dict[str, str]],
+                 temperature: Optional[float] = None, max_tokens: Optional[int] = None) -> str:
+        """Hash the request an agent is about to send"""
+        digest = hashlib.blake2b(digest_size=16)
+        parts = [agent_name, prompt_version, model]
+        if temperature is not None or max_tokens is not None:
+            parts += [repr(temperature), repr(max_tokens)]
+        for part in parts:
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        for message in messages:
+            digest.update(message["role"].encode('utf-8'))
+            digest.update(b'\0')
+            digest.update(message["content"].encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+        
+    @staticmethod
+    def _entry_size(key: str, value: str) -> int:
+        return len(key) + len(value.encode('utf-8'))
+        
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached answer for a key, marking it most recently used"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+            
+    def put(self, key: str, value: str):
+        """Store an answer, evicting least recently used entries to stay within max_bytes"""
+        size = self._entry_size(key, value)
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entry_size(key, self._entries.pop(key))
+            if size > self.max_bytes:
+                return
+            self._entries[key] = value
+            self._size += size
+            while self._size > self.max_bytes:
+                old_key, old_value = self._entries.popitem(last=False)
+                self._size -= self._entry_size(old_key, old_value)
+            self._dirty = True
+            
+    def coalesce(self, key: str, compute: Callable[[], str]) -> Tuple[str, bool]:
+        """
+        Answer a request that missed the cache with one call per key
+        The first caller for a key runs compute and stores the answer; callers
+        with the same key that arrive while it runs wait for that answer
+        instead of making their own call, and fail with its error if it fails.
+        Args:
+            key: Key from make_key
+            compute: Makes the request and returns the answer to cache
+        Returns:
+            The answer, and whether it came from another caller's request
+        """
+        future, owner = self._join(key)
+        if not owner:
+            return future.result(), True
+        try:
+            value, shared = self._compute(key, compute)
+        except BaseException as e:
+            self._leave(key, future, error=e)
+            raise
+        self._leave(key, future, value)
+        return value, shared
+        
+    async def coalesce_async(self, key: str, compute: Callable[[], Awaitable[str]]) -> Tuple[str, bool]:
+        """Asynchronous counterpart of coalesce; compute returns an awaitable"""
+        import asyncio
+        future, owner = self._join(key)
+        if not owner:
+            return await asyncio.wrap_future(future), True
+        try:
+            value, shared = await self._compute_async(key, compute)
+        except BaseException as e:
+            self._leave(key, future, error=e)
+            raise
+        self._leave(key, future, value)
+        return value, shared
+        
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """The in-flight future for a key, and whether the caller created it and must resolve it"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+            
+    def _leave(self, key: str, future: Future, value: Optional[str] = None, error: Optional[BaseException] = None):
+        with self._lock:
+            del self._inflight[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+            
+    def _lookup(self, key: str) -> Optional[str]:
+        """Cached answer without counting a hit or miss"""
+        with self._lock:
+            return self._entries.get(key)
+            
+    def _compute(self, key: str, compute: Callable[[], str]) -> Tuple[str, bool]:
+        # Another caller may have stored the answer between our miss and joining
+        value = self._lookup(key)
+        if value is not None:
+            return value, True
+        value = compute()
+        self.put(key, value)
+        return value, False
+        
+    async def _compute_async(self, key: str, compute: Callable[[], Awaitable[str]]) -> Tuple[str, bool]:
+        value = self._lookup(key)
+        if value is not None:
+            return value, True
+        value = await compute()
+        self.put(key, value)
+        return value, False
+        
+    def __len__(self) -> int:
+        return len(self._entries)
+        
+    @property
+    def size(self) -> int:
+        """Combined size in bytes of all cached entries"""
+        return self._size
+        
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current occupancy"""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self), "bytes": self.size}
+        
+    def load(self):
+        """Load persisted entries, oldest first"""
+        if not self.cache_file:
+            return
+        try:
+            with open(self.cache_file, 'r') as f:
+                entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        for key, value in entries:
+            self.put(key, value)
+        self._dirty = False
+        
+    def save(self):
+        """Persist entries in LRU order if anything changed"""
+        if not self.cache_file or not self._dirty:
+            return
+        with self._lock:
+            entries = list(self._entries.items())
+            self._dirty = False
+        atomic_write(self.cache_file, lambda f: json.dump(entries, f), 'w')
+            
+    def close(self):
+        """Persist pending changes; the cache should not be used afterwards"""
+        self.save()
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+class SQLiteResultCache(ResultCache):
+    """
+    ResultCache kept in SQLite, shared by concurrent processes
+    Answers are written through as they are stored, so a request answered in
+    one process is a hit in every other process from then on. Identical
+    requests in flight in different processes are coalesced through a lease
+    table: the first process to claim a key makes the call and the others
+    poll for its answer, taking the call over if the holder gives up or its
+    lease expires. Least recently used entries beyond max_bytes are evicted
+    when the cache is saved.
+    """
+    def __init__(self, cache_file: str = DEFAULT_SHARED_CACHE_FILE, max_bytes: int = DEFAULT_MAX_BYTES,
+                 lease_seconds: float = 120.0, poll_interval: float = 0.05):
+        """
+        Args:
+            cache_file: SQLite database file, created if missing
+            max_bytes: Upper bound on the combined size of cached keys and answers
+            lease_seconds: How long another process waits on a claimed request before making it itself
+            poll_interval: Seconds between checks for an answer being produced by another process
+        """
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._owner = uuid.uuid4().hex
+        self._db_lock = threading.RLock()
+        # Last-use times of hits, written in bulk on save rather than on every read
+        self._touched: Dict[str, float] = {}
+        # Autocommit mode; multi-statement updates use explicit IMMEDIATE transactions
+        self._conn = sqlite3.connect(cache_file, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript(CACHE_SCHEMA)
+        super().__init__(cache_file, max_bytes)
+        
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached answer for a key, marking it most recently used"""
+        value = self._lookup(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = time.time()
+        return value
+        
+    def put(self, key: str, value: str):
+        """Store an answer; it is visible to other processes immediately"""
+        size = self._entry_size(key, value)
+        with self._db_lock:
+            if size > self.max_bytes:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return
+            self._conn.execute("INSERT OR REPLACE INTO entries (key, value, size, used) VALUES (?, ?, ?, ?)",
+                               (key, value, size, time.time()))
+                               
+    def _lookup(self, key: str) -> Optional[str]:
+        with self._db_lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+        
+    def _acquire(self, key: str) -> Tuple[Optional[str], bool]:
+        """
+        Look up a key and claim it if nobody has answered or is answering it
+        Returns:
+            The stored answer if there is one, and whether this process now holds the lease
+        """
+        now = time.time()
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+                if row:
+                    return row[0], False
+                self._conn.execute("DELETE FROM leases WHERE key = ? AND expires < ?", (key, now))
+                claimed = self._conn.execute("INSERT OR IGNORE INTO leases (key, owner, expires) VALUES (?, ?, ?)",
+                                             (key, self._owner, now + self.lease_seconds)).rowcount == 1
+                return None, claimed
+            finally:
+                self._conn.execute("COMMIT")
+                
+    def _release(self, key: str):
+        with self._db_lock:
+            self._conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self._owner))
+            
+    def _compute(self, key: str, compute: Callable[[], str]) -> Tuple[str, bool]:
+        while True:
+            value, claimed = self._acquire(key)
+            if value is not None:
+                return value, True
+            if claimed:
+                break
+            time.sleep(self.poll_interval)
+        try:
+            value = compute()
+            self.put(key, value)
+        finally:
+            self._release(key)
+        return value, False
+        
+    async def _compute_async(self, key: str, compute: Callable[[], Awaitable[str]]) -> Tuple[str, bool]:
+        import asyncio
+        while True:
+            value, claimed = self._acquire(key)
+            if value is not None:
+                return value, True
+            if claimed:
+                break
+            await asyncio.sleep(self.poll_interval)
+        try:
+            value = await compute()
+            self.put(key, value)
+        finally:
+            self._release(key)
+        return value, False
+        
+    def __len__(self) -> int:
+        with self._db_lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            
+    @property
+    def size(self) -> int:
+        with self._db_lock:
+            return int(self._conn.execute("SELECT TOTAL(size) FROM entries").fetchone()[0])
+            
+    def load(self):
+        """Entries are read from the database on demand"""
+        
+    def save(self):
+        """Record the last use of hits and evict least recently used entries beyond max_bytes"""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("UPDATE entries SET used = MAX(used, ?) WHERE key = ?",
+                                       [(used, key) for key, used in touched.items()])
+                excess = self._conn.execute("SELECT TOTAL(size) FROM entries").fetchone()[0] - self.max_bytes
+                if excess > 0:
+                    stale = []
+                    for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY used"):
+                        if excess <= 0:
+                            break
+                        stale.append((key,))
+                        excess -= size
+                    self._conn.executemany("DELETE FROM entries WHERE key = ?", stale)
+                self._conn.execute("DELETE FROM leases WHERE expires < ?", (time.time(),))
+            finally:
+                self._conn.execute("COMMIT")
+                
+    def close(self):
+        self.save()
+        with self._db_lock:
+            self._conn.close()
+
+def open_cache(cache_file: Optional[str], max_bytes: int = DEFAULT_MAX_BYTES) -> ResultCache:
+    """
+    Open the cache for a file, choosing SQLite by its suffix
+    Args:
+        cache_file: .json file, .db/.sqlite file for a cache shared across processes, or None for memory only
+        max_bytes: Upper bound on the combined size of cached keys and answers
+    """
+    if cache_file and Path(cache_file).suffix.lower() in SQLITE_SUFFIXES:
+        return SQLiteResultCache(cache_file, max_bytes)
+    return ResultCache(cache_file, max_bytes)
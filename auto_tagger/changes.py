@@ -0,0 +1,351 @@
+"""
+Cheap change detection for repeated scans of the same tree.
+
+A rescan has to find the few files that changed among many that did not.
+
+- fingerprint(): files are compared by (size, mtime in nanoseconds, inode)
+  rather than by float mtime alone, so a rewrite that changes the size
+  within one mtime tick, or a file replaced by another, is noticed.
+- DirectoryCache (walker.py): directories whose mtime has not changed are
+  not listed again; their files and subdirectories come from the last walk.
+- GitChanges: inside a git work tree, git's index already knows which files
+  differ from HEAD, and the commit of the last scan says which were changed
+  by commits since. Files in neither are not stat'ed at all.
+- UnchangedDirectories: the files of a directory whose listing is reused
+  and which git or digests of their fingerprints vouch for are passed over
+  in runs (walker.CachedRun), so a rescan does no Python work per unchanged
+  file. Only files whose stored entries were written since the last scan
+  started are still checked one by one; that needs a store that can tell
+  which those are (JSONMetadata.modified_since), so SQLite stores keep
+  checking every file.
+
+ScanState keeps the directory listings, the git commit and the directory
+digests of the last complete scan next to the metadata store (<store>.scan),
+for one walk root.
+"""
+from operator import attrgetter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import hashlib
+import json
+import os
+import subprocess
+import time
+from .fileio import atomic_write
+from .walker import DirectoryCache, RACY_WINDOW_NS
+
+SCAN_SUFFIX = ".scan"
+SCAN_VERSION = 1
+# Files per digest of a directory, so a change sends only its neighbours back to being checked one by one
+DIGEST_CHUNK = 64
+
+_FINGERPRINT = attrgetter("st_size", "st_mtime_ns", "st_ino")
+
+def fingerprint(stat: os.stat_result) -> Tuple[int, int, int]:
+    """(size, mtime_ns, inode) of a stat result, stored with each analysis"""
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+def chunk_digests(fingerprints: List[Tuple[int, int, int]]) -> List[str]:
+    """Digests of the fingerprints of a directory's files, in listing order, DIGEST_CHUNK files each"""
+    return [hashlib.blake2b(repr(fingerprints[start:start + DIGEST_CHUNK]).encode("ascii"),
+                            digest_size=8).hexdigest()
+            for start in range(0, len(fingerprints), DIGEST_CHUNK)]
+
+def stat_digests(base: str, names: List[str]) -> Optional[List[str]]:
+    """chunk_digests of the current fingerprints of the files base + name, or None if one cannot be stat'ed"""
+    try:
+        return chunk_digests(list(map(_FINGERPRINT, map(os.stat, map(base.__add__, names)))))
+    except OSError:
+        return None
+
+class GitChanges:
+    """Paths of a git work tree that may differ from what the last complete scan saw"""
+    def __init__(self, commit: str, started_ns: int, paths: Iterable[str], directories: Iterable[str],
+                 dirty: List[str], since_ns: Optional[int]):
+        """
+        Args:
+            commit: HEAD when this scan started
+            started_ns: Wall-clock time just before git was asked, in nanoseconds
+            paths: Files relative to the walk root that differ from the last scanned commit,
+                or from HEAD, or did at the last scan
+            directories: Directories relative to the walk root whose files git does not track
+                (untracked, ignored or submodules)
+            dirty: Tracked files git reported as modified, relative to the work tree, for the next scan
+            since_ns: When the last complete scan started; None if there is nothing to compare with
+        """
+        self.commit = commit
+        self.started_ns = started_ns
+        self.paths: Set[str] = set(paths)
+        self.directories: Set[str] = set(directories)
+        self.dirty = dirty
+        self.since_ns = since_ns
+        self._untracked: Dict[str, bool] = {}
+        
+    def _untracked_directory(self, relative_dir: str) -> bool:
+        untracked = self._untracked.get(relative_dir)
+        if untracked is None:
+            untracked = relative_dir in self.directories or (
+                bool(relative_dir) and self._untracked_directory(relative_dir.rpartition("/")[0]))
+            self._untracked[relative_dir] = untracked
+        return untracked
+        
+    def unchanged(self, relative_path: str, stored_mtime: Optional[float]) -> bool:
+        """
+        Whether a file's stored analysis is known to be current without stat'ing it
+        Args:
+            relative_path: "/"-separated path relative to the walk root
+            stored_mtime: last_modified of its stored analysis, None if there is none
+        """
+        if self.since_ns is None or stored_mtime is None or relative_path in self.paths:
+            return False
+        # Analyses of files modified since the last scan started (by tag_file, the watcher or a
+        # write racing that scan) may describe contents that have been reverted since
+        if stored_mtime * 1e9 >= self.since_ns - RACY_WINDOW_NS:
+            return False
+        return not self._untracked_directory(relative_path.rpartition("/")[0])
+
+def _git(directory: str, *args: str) -> str:
+    return subprocess.run(["git", "-C", directory, *args], check=True, stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL, text=True, encoding="utf-8",
+                          errors="surrogateescape").stdout
+
+def git_changes(directory: str, since: Optional[str] = None, since_ns: Optional[int] = None,
+                dirty: Iterable[str] = ()) -> Optional[GitChanges]:
+    """
+    Ask git which files under a directory may have changed since an earlier scan
+    Args:
+        directory: Walk root, anywhere inside a work tree
+        since: HEAD when the earlier scan started
+        since_ns: When the earlier scan started
+        dirty: Files (relative to the work tree) the earlier scan was told were modified
+    Returns:
+        The changes, or None if the directory is not in a git work tree with commits
+    """
+    started_ns = time.time_ns()
+    try:
+        toplevel, prefix, head = _git(directory, "rev-parse", "--show-toplevel", "--show-prefix",
+                                      "HEAD").split("\n")[:3]
+        # Paths are relative to the top of the work tree and NUL-terminated; "XY path", with the
+        # source path as an extra field for renames and copies
+        fields = iter(_git(directory, "status", "--porcelain", "-z", "--untracked-files=normal",
+                           "--ignored", "--ignore-submodules=all", "--", ".").split("\0"))
+        changed = set(dirty)
+        directories = set()
+        modified = []
+        for field in fields:
+            if not field:
+                continue
+            status, path = field[:2], field[3:]
+            if status[0] in "RC":
+                changed.add(next(fields, ""))
+            if path.endswith("/"):
+                directories.add(path[:-1])
+                continue
+            changed.add(path)
+            if status not in ("??", "!!"):
+                modified.append(path)
+        if since is not None and since != head:
+            changed.update(_git(directory, "diff", "--name-only", "-z", "--no-renames", since, head,
+                                "--", ".").split("\0"))
+        if os.path.exists(os.path.join(toplevel, ".gitmodules")):
+            # Files of submodules are tracked by their own index
+            listing = subprocess.run(["git", "config", "-z", "--file", os.path.join(toplevel, ".gitmodules"),
+                                      "--get-regexp", r"^submodule\..*\.path$"],
+                                     stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+            directories.update(item.partition("\n")[2] for item in listing.split("\0") if item)
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        # Not a work tree, no commits yet, git missing, or the earlier commit is gone
+        return None
+        
+    # An untracked or ignored directory holding the whole walk root is reported as itself or an ancestor
+    if any(prefix.startswith(path + "/") for path in directories):
+        directories.add(prefix)
+    return GitChanges(head, started_ns,
+                      [path[len(prefix):] for path in changed if path.startswith(prefix) and path != prefix],
+                      [path[len(prefix):].rstrip("/") for path in directories if path.startswith(prefix)],
+                      modified, since_ns if since is not None else None)
+
+class ScanState:
+    """What the last scan of a root recorded: directory listings, the git commit it started at and directory digests"""
+    def __init__(self, root: str, directories: Optional[DirectoryCache] = None, commit: Optional[str] = None,
+                 started_ns: Optional[int] = None, dirty: Iterable[str] = (), scanned_ns: Optional[int] = None,
+                 key_root: Optional[str] = None, digests: Optional[Dict[str, List[str]]] = None):
+        """
+        Args:
+            root: Absolute walk root the state belongs to
+            directories: Listings of its directories
+            commit: HEAD when the last complete scan using git started
+            started_ns: When that scan started
+            dirty: Tracked files git reported as modified at that point
+            scanned_ns: When the last complete scan started
+            key_root: The root as that scan was given it, which its file keys start with
+            digests: Directory relative to the root -> chunk_digests of its files' fingerprints as that
+                scan left them; None unless that scan covered every file (it was not sharded)
+        """
+        self.root = root
+        self.directories = directories if directories is not None else DirectoryCache()
+        self.commit = commit
+        self.started_ns = started_ns
+        self.dirty = list(dirty)
+        self.scanned_ns = scanned_ns
+        self.key_root = key_root
+        self.digests = digests
+        self.git: Optional[GitChanges] = None
+        # Recorded by save as the start of this scan
+        self.scanning_ns = time.time_ns()
+        
+    @classmethod
+    def load(cls, path: str, root: str, walk: str) -> "ScanState":
+        """
+        State recorded for a root
+        Args:
+            path: State file
+            root: Absolute walk root
+            walk: Walk settings (see walker.walk_settings)
+        Returns:
+            The recorded state, or an empty one if there is none for this root and these settings,
+            since a scan only vouches for the files its walk visited
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = None
+        if (not isinstance(data, dict) or data.get("version") != SCAN_VERSION or data.get("root") != root
+                or data.get("walk") != walk):
+            return cls(root, DirectoryCache(walk))
+        git = data.get("git") or {}
+        return cls(root, DirectoryCache(walk, data.get("directories", {})),
+                   git.get("commit"), git.get("started_ns"), git.get("dirty", []),
+                   data.get("scanned_ns"), data.get("key_root"), data.get("digests"))
+        
+    def check_git(self) -> Optional[GitChanges]:
+        """Ask git what changed since the recorded commit; None outside a work tree"""
+        self.git = git_changes(self.root, self.commit, self.started_ns, self.dirty)
+        return self.git
+        
+    def save(self, path: str):
+        """Atomically record the finished scan; its git commit becomes the one later scans compare with"""
+        if self.git is not None:
+            self.commit, self.started_ns, self.dirty = self.git.commit, self.git.started_ns, self.git.dirty
+        data = {
+            "version": SCAN_VERSION,
+            "root": self.root,
+            "git": {"commit": self.commit, "started_ns": self.started_ns, "dirty": self.dirty}
+                   if self.commit is not None else None,
+            "walk": self.directories.key,
+            "directories": self.directories.snapshot(),
+            "scanned_ns": self.scanning_ns,
+            "key_root": self.key_root,
+            "digests": self.digests
+        }
+        atomic_write(path, lambda f: json.dump(data, f, separators=(",", ":")), 'w', encoding='utf-8')
+
+class UnchangedDirectories:
+    """
+    Decides which files of a rescan's reused directory listings need no look of their own
+    The last complete scan left a current analysis for every file of every
+    directory it listed, and a reused listing means the directory has the
+    same files. They are all still current when git reports none of them
+    (and the directory is tracked); otherwise the files are stat'ed in bulk
+    and only those in a chunk whose digest differs from the one the last
+    scan recorded are checked one by one. Files whose stored entries were
+    written since that scan started, by it or by tag_file or a watcher, are
+    checked one by one anyway, since the digests and git's view predate them.
+    """
+    def __init__(self, state: ScanState, key_root: str, recent: Optional[Set[str]]):
+        """
+        Args:
+            state: State of the last scan, with this scan's git changes; its digests and
+                key_root are replaced with this scan's
+            key_root: The root as this scan was given it
+            recent: Keys of the stored entries written since the last scan started, or None if the
+                store cannot tell, in which case every file is checked one by one
+        """
+        self.state = state
+        self.enabled = (recent is not None and state.digests is not None and state.key_root == key_root
+                        and state.scanned_ns is not None)
+        self.digests = state.digests or {}
+        self.git = state.git if state.git is not None and state.git.since_ns is not None else None
+        # Directory prefix of the keys -> names of their files
+        self.recent: Dict[str, Set[str]] = {}
+        for key in recent or ():
+            separator = key.rfind(os.sep) + 1
+            self.recent.setdefault(key[:separator], set()).add(key[separator:])
+        # Directory relative to the root -> names of its files git reports
+        self.reported: Dict[str, Set[str]] = {}
+        if self.git is not None:
+            for path in self.git.paths:
+                relative_dir, _, name = path.rpartition("/")
+                self.reported.setdefault(relative_dir, set()).add(name)
+        self.fresh: Dict[str, List[str]] = {}
+        self.vouched: Set[str] = set()
+        self._directory: Optional[str] = None
+        self._fingerprints: Optional[List[Tuple[int, int, int]]] = None
+        state.key_root = key_root
+        
+    def reuse(self, relative_dir: str, base: str, names: List[str], symlinks: Set[str]) -> Optional[Set[str]]:
+        """
+        on_reuse callback of walker.walk_entries
+        Args:
+            relative_dir: "/"-separated directory relative to the root
+            base: Prefix of the keys of its files
+            names: Names of its files
+            symlinks: Those of them that are symlinks
+        Returns:
+            Names of the files to check one by one, or None for all of them
+        """
+        if not self.enabled:
+            return None
+        recent = self.recent.get(base, set())
+        stored = self.digests.get(relative_dir)
+        # Git cannot vouch for the target of a symlink
+        if self.git is not None and not self.git._untracked_directory(relative_dir):
+            self.vouched.add(relative_dir)
+            single = recent | symlinks | self.reported.get(relative_dir, set())
+            if stored is not None:
+                # Entries of the other files are what they were when the digests were taken
+                self.fresh[relative_dir] = [
+                    "" if single.intersection(names[index * DIGEST_CHUNK:(index + 1) * DIGEST_CHUNK]) else digest
+                    for index, digest in enumerate(stored)]
+            return single
+        digests = stat_digests(base, names) if stored is not None else None
+        if digests is None:
+            return None
+        self.vouched.add(relative_dir)
+        self.fresh[relative_dir] = digests
+        if digests == stored:
+            return recent
+        single = set(recent)
+        for index, digest in enumerate(digests):
+            if index >= len(stored) or digest != stored[index]:
+                single.update(names[index * DIGEST_CHUNK:(index + 1) * DIGEST_CHUNK])
+        return single
+        
+    def seen(self, relative_path: str, stat: Optional[os.stat_result]):
+        """
+        Note a file checked one by one, for the digests of its directory
+        Args:
+            relative_path: "/"-separated path relative to the root
+            stat: What it was checked against; None if it was not stat'ed
+        """
+        relative_dir = relative_path.rpartition("/")[0]
+        if relative_dir in self.vouched:
+            return
+        if relative_dir != self._directory:
+            self._close()
+            self._directory, self._fingerprints = relative_dir, []
+        if self._fingerprints is not None:
+            if stat is None:
+                self._fingerprints = None
+            else:
+                self._fingerprints.append(fingerprint(stat))
+                
+    def _close(self):
+        if self._directory is not None and self._fingerprints is not None:
+            self.fresh[self._directory] = chunk_digests(self._fingerprints)
+        self._directory = None
+        
+    def finish(self):
+        """Record the digests of this scan's directories in the state, once every file was walked"""
+        self._close()
+        self.state.digests = self.fresh
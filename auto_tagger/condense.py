@@ -0,0 +1,284 @@
+"""
+Structure-aware condensation of source files.
+
+The head of a source file is often little more than a license header and
+imports, so CodeAgent sends a skeleton of the whole file instead. Python
+files are parsed with ast and contribute their module docstring, imports,
+decorators and class and function signatures with the first line of each
+docstring. Other languages contribute the import, type and function
+declaration lines found by per-language regular expressions. Outline entries
+are ranked by how much they say about the file and packed into a token
+budget, measured with tiktoken when it is installed and estimated otherwise.
+Files that fit the budget whole are sent unchanged, and files without
+declarations (scripts, configuration) fall back to their head.
+"""
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Pattern, Tuple
+import ast
+import copy
+import re
+import sys
+
+# Encoding of the gpt-4o family of models, used when tiktoken is available
+TOKENIZER_ENCODING = "o200k_base"
+# No tokenizer packs more characters than this into a token; longer texts cannot fit a budget
+MAX_CHARS_PER_TOKEN = 8
+# Longest module-level constant kept in a Python outline, in characters
+MAX_CONSTANT_CHARS = 120
+
+_STDLIB = frozenset(getattr(sys, "stdlib_module_names", ()))
+
+# Entry ranks: lower ranks are packed first
+DECLARATION, DETAIL, EXTRA = 0, 1, 2
+
+@dataclass
+class OutlineEntry:
+    """One line (or decorated header) of a skeleton"""
+    rank: int
+    order: Tuple[int, int]
+    text: str
+    # Index of the entry this one is nested in; it is only kept together with its parent
+    parent: Optional[int] = None
+    # Position among its siblings, so the first methods of every class are packed before later ones
+    position: int = 0
+
+_tokenizer = None
+
+def _encoding():
+    """tiktoken encoding, loaded on first use; None when tiktoken or its data is unavailable"""
+    global _tokenizer
+    if _tokenizer is None:
+        try:
+            import tiktoken
+            _tokenizer = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception:
+            _tokenizer = False
+    return _tokenizer or None
+
+# Identifier pieces of up to four characters, numbers in groups of three and single symbols,
+# which tracks BPE token counts of source code closely enough for budgeting
+_TOKEN_PIECE = re.compile(r"[A-Za-z]{1,4}|\d{1,3}|[^\sA-Za-z\d]|\n")
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in text, exact with tiktoken and estimated without it"""
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(_TOKEN_PIECE.findall(text))
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Longest head of text within budget tokens, cut on a line boundary when estimating"""
+    encoding = _encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= budget else encoding.decode(tokens[:budget])
+    lines, used = [], 0
+    for line in text.split("\n"):
+        cost = count_tokens(line) + 1
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    if not lines:
+        # A single line longer than the budget, e.g. minified code
+        return text[:budget * 2]
+    return "\n".join(lines)
+
+def _first_line(docstring: Optional[str]) -> Optional[str]:
+    if not docstring:
+        return None
+    line = docstring.strip().split("\n", 1)[0].strip()
+    return line.replace('"""', "'''") or None
+
+def _header(node: ast.AST) -> str:
+    """Decorators and signature of a class or function, without its body or default values"""
+    stub = copy.copy(node)
+    stub.body = [ast.Pass()]
+    if not isinstance(node, ast.ClassDef):
+        stub.args = copy.copy(node.args)
+        stub.args.defaults = []
+        stub.args.kw_defaults = [None] * len(node.args.kwonlyargs)
+    return ast.unparse(stub).rsplit("\n", 1)[0]
+
+def outline_python(source: str) -> Optional[List[OutlineEntry]]:
+    """
+    Outline a Python module with ast
+    Returns:
+        Outline entries, or None if the source does not parse (e.g. it was truncated)
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+    entries: List[OutlineEntry] = []
+    
+    def add(rank: int, node: ast.AST, text: str, parent: Optional[int] = None, part: int = 0,
+            position: int = 0) -> int:
+        entries.append(OutlineEntry(rank, (getattr(node, "lineno", 0), part), text, parent, position))
+        return len(entries) - 1
+        
+    def visit(nodes: List[ast.stmt], depth: int, parent: Optional[int]):
+        indent = "    " * depth
+        position = 0
+        for node in nodes:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                rank = DECLARATION if depth == 0 else DETAIL if depth == 1 else EXTRA
+                header = _header(node).replace("\n", "\n" + indent)
+                is_class = isinstance(node, ast.ClassDef)
+                docstring = _first_line(ast.get_docstring(node))
+                if not is_class:
+                    header += " ..."
+                index = add(rank, node, indent + header, parent, position=position if depth else 0)
+                position += 1
+                if docstring:
+                    add(min(rank + 1, EXTRA), node, f'{indent}    """{docstring}"""', index, 1)
+                if is_class:
+                    visit(node.body, depth + 1, index)
+            elif depth == 0 and isinstance(node, (ast.Import, ast.ImportFrom)):
+                # Third-party and local dependencies say more about a module than the standard library
+                modules = [alias.name for alias in node.names] if isinstance(node, ast.Import) else [node.module or ""]
+                standard = node.__class__ is ast.Import or not node.level
+                standard = standard and all(module.split(".")[0] in _STDLIB for module in modules)
+                add(EXTRA if standard else DETAIL, node, ast.unparse(node))
+            elif depth == 0 and isinstance(node, (ast.Assign, ast.AnnAssign)):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                names = [target.id for target in targets if isinstance(target, ast.Name)]
+                if names and all(name.isupper() or name == "__all__" for name in names):
+                    text = ast.unparse(node)
+                    if len(text) <= MAX_CONSTANT_CHARS:
+                        add(EXTRA, node, text)
+            elif depth == 0 and isinstance(node, (ast.If, ast.Try)):
+                # Conditional imports and definitions, e.g. optional dependencies
+                handlers = [handler.body for handler in getattr(node, "handlers", [])]
+                for block in [node.body, node.orelse, getattr(node, "finalbody", [])] + handlers:
+                    visit(block, depth, parent)
+                    
+    docstring = ast.get_docstring(tree)
+    if docstring:
+        summary = docstring.strip().split("\n\n", 1)[0].replace('"""', "'''")
+        entries.append(OutlineEntry(DECLARATION, (0, 0), f'"""{summary}"""'))
+    visit(tree.body, 0, None)
+    return entries
+
+_JS_TS = [
+    (re.compile(r"^(export\s+)?(default\s+)?(abstract\s+)?(class|interface|enum)\s+\w+"), DECLARATION),
+    (re.compile(r"^(export\s+)?(default\s+)?(async\s+)?function\b"), DECLARATION),
+    (re.compile(r"^(export\s+)?type\s+\w+.*="), DECLARATION),
+    (re.compile(r"^(export\s+)?(const|let|var)\s+\w+\s*(:[^=]+)?=\s*(async\s+)?(function\b|\([^)]*\)\s*(:[^=]+)?=>|\w+\s*=>)"),
+     DECLARATION),
+    (re.compile(r"^(import\s|export\s+\*|export\s+\{|(const|let|var)\s+.*=\s*require\()"), DETAIL),
+    (re.compile(r"^module\.exports\b"), DETAIL),
+    (re.compile(r"^\s+(static\s+|async\s+|get\s+|set\s+|public\s+|private\s+|protected\s+|readonly\s+)*"
+                r"(?!(if|for|while|switch|catch|return|function)\b)[A-Za-z_$][\w$]*\s*\([^;]*\)\s*(:\s*[^{;]+)?\{?\s*$"),
+     DETAIL),
+]
+
+_JAVA = [
+    (re.compile(r"^package\s"), DETAIL),
+    (re.compile(r"^import\s"), DETAIL),
+    (re.compile(r"^\s*((public|protected|private|static|final|abstract|sealed)\s+)*"
+                r"(class|interface|enum|record|@interface)\s+\w+"), DECLARATION),
+    (re.compile(r"^\s*((public|protected|private|static|final|abstract|synchronized|native|default)\s+)+"
+                r"(<[^>]+>\s+)?([\w<>\[\]?,. ]+\s+)?\w+\s*\("), DETAIL),
+]
+
+_CPP = [
+    (re.compile(r"^#include\s"), DETAIL),
+    (re.compile(r"^(namespace\s+\w+|using\s+namespace\s)"), DETAIL),
+    (re.compile(r"^\s*(template\s*<.*>\s*)?(class|struct|enum(\s+class)?|union)\s+\w+[^;]*$"), DECLARATION),
+    (re.compile(r"^(?!(if|for|while|switch|return|else|do|case)\b)[A-Za-z_][\w:<>,*&\s]*[\s*&]~?[\w:~]+\s*\([^;]*$"),
+     DECLARATION),
+    (re.compile(r"^\s+(virtual\s+|static\s+|explicit\s+|inline\s+)*(?!(if|for|while|switch|return|else|do|case|delete)\b)"
+                r"[A-Za-z_][\w:<>,*&\s]*[\s*&]~?\w+\s*\([^)]*\)\s*(const\s*)?(override\s*)?(=\s*0\s*)?;\s*$"), EXTRA),
+]
+
+_GO = [
+    (re.compile(r"^package\s"), DETAIL),
+    (re.compile(r'^(import\s|\s+(\w+\s+)?"[\w./-]+"\s*$)'), DETAIL),
+    (re.compile(r"^type\s+\w+"), DECLARATION),
+    (re.compile(r"^func\s"), DECLARATION),
+]
+
+_RUST = [
+    (re.compile(r"^\s*(pub(\([^)]*\))?\s+)?(use|mod|extern\s+crate)\s"), DETAIL),
+    (re.compile(r"^\s*(pub(\([^)]*\))?\s+)?(struct|enum|trait|union|type)\s+\w+"), DECLARATION),
+    (re.compile(r"^\s*(unsafe\s+)?impl\b"), DECLARATION),
+    (re.compile(r"^(pub(\([^)]*\))?\s+)?(const\s+|async\s+|unsafe\s+|extern\s+\"\w+\"\s+)*fn\s"), DECLARATION),
+    (re.compile(r"^\s+(pub(\([^)]*\))?\s+)?(const\s+|async\s+|unsafe\s+)*fn\s"), DETAIL),
+    (re.compile(r"^\s*#\[derive\("), EXTRA),
+]
+
+_PYTHON_FALLBACK = [
+    (re.compile(r"^(import|from)\s"), DETAIL),
+    (re.compile(r"^(@|class\s|(async\s+)?def\s)"), DECLARATION),
+    (re.compile(r"^\s+(@|(async\s+)?def\s)"), DETAIL),
+]
+
+OUTLINE_PATTERNS = {
+    ".js": _JS_TS, ".ts": _JS_TS, ".java": _JAVA, ".cpp": _CPP, ".go": _GO, ".rs": _RUST
+}
+
+def outline_lines(source: str, patterns: List[Tuple[Pattern, int]]) -> List[OutlineEntry]:
+    """Outline a source file by the declaration lines matched by patterns"""
+    entries = []
+    for number, line in enumerate(source.split("\n")):
+        for pattern, rank in patterns:
+            if pattern.match(line):
+                text = line.rstrip().rstrip("{").rstrip()
+                if text:
+                    # Indented declarations (methods, impl items) rank below top-level ones
+                    indented = line[:1].isspace() and rank < EXTRA
+                    entries.append(OutlineEntry(rank + indented, (number, 0), text))
+                break
+    return entries
+
+def outline(source: str, suffix: str) -> Optional[List[OutlineEntry]]:
+    """Outline entries for a source file, or None if its language has no outliner"""
+    suffix = suffix.lower()
+    if suffix == ".py":
+        entries = outline_python(source)
+        # A truncated or Python 2 file does not parse; its declaration lines still do
+        return entries if entries is not None else outline_lines(source, _PYTHON_FALLBACK)
+    patterns = OUTLINE_PATTERNS.get(suffix)
+    return outline_lines(source, patterns) if patterns is not None else None
+
+def pack(entries: List[OutlineEntry], budget: int, cost: Callable[[str], int] = count_tokens) -> str:
+    """
+    Pack the highest ranked outline entries into a token budget
+    Entries are taken by rank, then by position among their siblings and in
+    source order, skipping any that no
+    longer fit or whose parent was left out; the chosen ones are returned in
+    source order.
+    """
+    chosen = set()
+    used = 0
+    for index in sorted(range(len(entries)), key=lambda i: (entries[i].rank, entries[i].position, entries[i].order)):
+        entry = entries[index]
+        if entry.parent is not None and entry.parent not in chosen:
+            continue
+        tokens = cost(entry.text) + 1
+        if used + tokens > budget:
+            continue
+        chosen.add(index)
+        used += tokens
+    return "\n".join(entries[index].text for index in sorted(chosen, key=lambda i: entries[i].order))
+
+def condense(source: str, suffix: str, budget: int) -> str:
+    """
+    Fit a source file into a token budget, keeping its most informative parts
+    Args:
+        source: Source text
+        suffix: File suffix selecting the outliner, e.g. ".py"
+        budget: Token budget of the result
+    Returns:
+        The whole source if it fits, otherwise its skeleton, or its head for
+        files without declarations and languages without an outliner
+    """
+    if len(source) <= budget * MAX_CHARS_PER_TOKEN and count_tokens(source) <= budget:
+        return source
+    entries = outline(source, suffix)
+    if entries and any(entry.rank == DECLARATION for entry in entries):
+        skeleton = pack(entries, budget)
+        if skeleton:
+            return skeleton
+    return truncate_to_tokens(source, budget)
@@ -0,0 +1,300 @@
+"""
+Text extraction from PDF and Word documents.
+
+PDFs, .docx and legacy .doc files are binary containers, so DocAgent cannot
+sample them as text. The extractors here pull plain text out of the first
+pages or paragraphs only and never load a whole document:
+
+- .docx: word/document.xml is streamed out of the zip archive with iterparse
+  and parsing stops after max_paragraphs paragraphs.
+- .pdf: with pypdf installed, only the first max_pages pages are parsed.
+  Without it, content streams are scanned in file order through mmap, the
+  Flate-compressed ones are inflated with a size cap and the strings shown by
+  their text operators are collected until max_pages streams yielded text.
+  This covers PDFs using standard fonts; text in embedded CID fonts is not
+  decodable without pypdf and the fallback returns nothing for it.
+- .doc: runs of readable 8-bit and UTF-16 text in the first bytes of the
+  compound file.
+
+Text that does not look like text (mostly unprintable characters) is
+discarded rather than sent to the model. Parsing is CPU-bound, so agents run
+extract_text in a shared process pool (extraction_pool) rather than in the
+threads or event loop that wait on the API. A worker that dies (killed by the
+OOM killer, or crashing in a parser) breaks the whole pool, so pool_extract
+replaces a broken pool and retries the document once in the new one.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import List, Optional
+import hashlib
+import mmap
+import os
+import re
+import threading
+import zlib
+from .sampling import _local_name, read_range
+
+DOCUMENT_SUFFIXES = (".pdf", ".docx", ".doc")
+# Bump when extraction changes so cached texts from older extractors are not reused
+EXTRACTOR_VERSION = "1"
+
+# Bytes of a PDF scanned for content streams by the fallback extractor
+MAX_PDF_SCAN_BYTES = 16 * 1024 * 1024
+# Largest inflated content stream, in bytes
+MAX_STREAM_BYTES = 4 * 1024 * 1024
+# Bytes of a .doc file searched for text
+MAX_DOC_SCAN_BYTES = 2 * 1024 * 1024
+# Share of printable characters below which extracted text is treated as garbage
+MIN_PRINTABLE_RATIO = 0.85
+
+def content_digest(file_path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """Hash of a file's bytes, read in chunks"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def looks_like_text(text: str) -> bool:
+    """Whether text is mostly printable, i.e. worth sending to the model"""
+    if not text.strip():
+        return False
+    printable = sum(1 for char in text if char.isprintable() or char in "\n\t")
+    return printable / len(text) >= MIN_PRINTABLE_RATIO
+
+def extract_text(file_path: Path, max_pages: int = 5, max_paragraphs: int = 80,
+                 max_chars: int = 4000) -> Optional[str]:
+    """
+    Extract the leading text of a PDF or Word document
+    Args:
+        file_path: .pdf, .docx or .doc file
+        max_pages: PDF pages read
+        max_paragraphs: Word paragraphs read
+        max_chars: Characters returned at most
+    Returns:
+        The text, "" if the document has no usable text, or None for unsupported suffixes
+    """
+    suffix = Path(file_path).suffix.lower()
+    if suffix == ".pdf":
+        text = extract_pdf(file_path, max_pages, max_chars)
+    elif suffix == ".docx":
+        text = extract_docx(file_path, max_paragraphs, max_chars)
+    elif suffix == ".doc":
+        text = extract_doc(file_path, max_chars)
+    else:
+        return None
+    text = (text or "").strip()[:max_chars]
+    return text if looks_like_text(text) else ""
+
+def extract_docx(file_path: Path, max_paragraphs: int = 80, max_chars: int = 4000) -> Optional[str]:
+    """Text of the first paragraphs of a .docx document, or None if it is not one"""
+    import zipfile
+    from xml.etree.ElementTree import iterparse, ParseError
+    try:
+        archive = zipfile.ZipFile(file_path)
+    except (zipfile.BadZipFile, OSError):
+        return None
+    paragraphs: List[str] = []
+    parts: List[str] = []
+    length = 0
+    with archive:
+        try:
+            with archive.open("word/document.xml") as f:
+                for _, element in iterparse(f, events=("end",)):
+                    name = _local_name(element.tag)
+                    if name == "t":
+                        parts.append(element.text or "")
+                    elif name == "tab":
+                        parts.append("\t")
+                    elif name in ("br", "cr"):
+                        parts.append("\n")
+                    elif name == "p":
+                        text = "".join(parts).strip()
+                        parts = []
+                        element.clear()
+                        if text:
+                            paragraphs.append(text)
+                            length += len(text) + 1
+                            if len(paragraphs) >= max_paragraphs or length >= max_chars:
+                                break
+        except (KeyError, ParseError):
+            return None
+    return "\n".join(paragraphs)
+
+def extract_pdf(file_path: Path, max_pages: int = 5, max_chars: int = 4000) -> Optional[str]:
+    """Text of the first pages of a PDF, with pypdf when it is installed"""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return _scan_pdf(file_path, max_pages, max_chars)
+    texts: List[str] = []
+    length = 0
+    with open(file_path, 'rb') as f:
+        reader = PdfReader(f)
+        for index in range(min(max_pages, len(reader.pages))):
+            text = reader.pages[index].extract_text() or ""
+            texts.append(text)
+            length += len(text)
+            if length >= max_chars:
+                break
+    return "\n".join(texts)
+
+_STREAM_START = re.compile(rb"stream\r?\n")
+# Stream dictionaries of things that are not page content
+_SKIPPED_STREAMS = re.compile(rb"/Subtype\s*/Image|/Length[123]\b|/Type\s*/(ObjStm|XRef|Metadata|EmbeddedFile)")
+_UNSUPPORTED_FILTER = re.compile(rb"/Filter\s*\[?\s*/(?!FlateDecode)")
+_TEXT_TOKEN = re.compile(
+    rb"\((?:\\.|[^\\()])*\)"     # literal string
+    rb"|\[(?:\\.|[^\\\]])*\]"    # array of strings and kerning offsets (TJ)
+    rb"|-?\d*\.?\d+"             # number
+    rb"|[A-Za-z'\"*]+"           # operator
+)
+_NUMBER = re.compile(rb"-?\d*\.?\d+")
+_ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f"}
+_ESCAPE = re.compile(rb"\\([0-7]{1,3}|\r\n|.)", re.S)
+
+def _unescape(literal: bytes) -> str:
+    def replace(match):
+        escaped = match.group(1)
+        if escaped[:1].isdigit():
+            return bytes([int(escaped, 8) & 0xFF])
+        if escaped in (b"\n", b"\r", b"\r\n"):
+            return b""
+        return _ESCAPES.get(escaped, escaped)
+    return _ESCAPE.sub(replace, literal).decode("latin-1")
+
+def _content_text(content: bytes) -> str:
+    """Strings shown by the text operators of a page content stream, one line per positioning operator"""
+    lines: List[str] = []
+    line: List[str] = []
+    operands: List[bytes] = []
+    for token in _TEXT_TOKEN.findall(content):
+        if token[:1] in (b"(", b"[") or _NUMBER.fullmatch(token):
+            operands.append(token)
+            continue
+        if token in (b"Tj", b"'", b'"') and operands and operands[-1][:1] == b"(":
+            line.append(_unescape(operands[-1][1:-1]))
+        elif token == b"TJ" and operands and operands[-1][:1] == b"[":
+            for part in _TEXT_TOKEN.findall(operands[-1][1:-1]):
+                if part[:1] == b"(":
+                    line.append(_unescape(part[1:-1]))
+                elif _NUMBER.fullmatch(part) and float(part) < -200:
+                    # A large negative kerning offset is how many PDFs draw a word space
+                    line.append(" ")
+        if token in (b"Td", b"TD", b"Tm", b"T*", b"'", b'"', b"ET") and line:
+            lines.append("".join(line))
+            line = []
+        operands = []
+    if line:
+        lines.append("".join(line))
+    return "\n".join(text for text in (line.strip() for line in lines) if text)
+
+def _scan_pdf(file_path: Path, max_pages: int, max_chars: int) -> Optional[str]:
+    """Dependency-free extraction from the first content streams of a PDF"""
+    with open(file_path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None
+        with mapped:
+            if mapped[:5] != b"%PDF-":
+                return None
+            texts: List[str] = []
+            length = 0
+            end = min(len(mapped), MAX_PDF_SCAN_BYTES)
+            position = 0
+            while len(texts) < max_pages and length < max_chars:
+                match = _STREAM_START.search(mapped, position, end)
+                if match is None:
+                    break
+                start = match.end()
+                stop = mapped.find(b"endstream", start, min(len(mapped), start + MAX_STREAM_BYTES))
+                if stop < 0:
+                    break
+                position = stop + len(b"endstream")
+                header = mapped[max(0, match.start() - 512):match.start()]
+                header = header[header.rfind(b"obj") + 1:]
+                if _SKIPPED_STREAMS.search(header) or _UNSUPPORTED_FILTER.search(header):
+                    continue
+                data = mapped[start:stop]
+                if b"/FlateDecode" in header:
+                    try:
+                        data = zlib.decompressobj().decompress(data, MAX_STREAM_BYTES)
+                    except zlib.error:
+                        continue
+                if b"BT" not in data:
+                    continue
+                text = _content_text(data)
+                if text:
+                    texts.append(text)
+                    length += len(text)
+    return "\n".join(texts)
+
+# Word 97-2003 stores text as cp1252 or UTF-16LE; paragraphs end with \r
+_DOC_TEXT_8BIT = re.compile(rb"[\x20-\x7e\x91-\x97\xa0-\xff\r\t]{40,}")
+_DOC_TEXT_UTF16 = re.compile(rb"(?:[\x20-\x7e\xa0-\xff\r\t]\x00){20,}")
+
+def extract_doc(file_path: Path, max_chars: int = 4000) -> Optional[str]:
+    """Readable text runs from the start of a Word 97-2003 .doc file, or None if it is not one"""
+    data = read_range(file_path, 0, MAX_DOC_SCAN_BYTES)
+    if not data.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"):
+        return None
+    narrow = [run.decode("cp1252", errors="ignore") for run in _DOC_TEXT_8BIT.findall(data)]
+    wide = [run.decode("utf-16-le", errors="ignore") for run in _DOC_TEXT_UTF16.findall(data)]
+    wide = [run for run in wide if looks_like_text(run)]
+    runs = wide if sum(map(len, wide)) > sum(map(len, narrow)) else narrow
+    text = "\n".join(run.replace("\r", "\n").strip() for run in runs)
+    return text[:max_chars]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def extraction_pool(processes: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Process pool shared by all agents for document parsing, started on first use
+    Args:
+        processes: Worker processes when the pool is created (defaults to the CPU count, at most 4)
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from multiprocessing import get_context
+            # spawn: workers must not inherit the parent's threads, locks or API clients
+            _pool = ProcessPoolExecutor(max_workers=processes or min(4, os.cpu_count() or 1),
+                                        mp_context=get_context("spawn"))
+        return _pool
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """Drop a broken pool so the next extraction starts a new one, unless another thread already has"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+
+def pool_extract(file_path: Path, max_pages: int = 5, max_paragraphs: int = 80, max_chars: int = 4000,
+                 processes: Optional[int] = None) -> Optional[str]:
+    """
+    extract_text in the shared process pool, replacing the pool when a worker died
+    Args:
+        processes: Worker processes when the pool is created, see extraction_pool
+    Raises:
+        BrokenProcessPool if the worker also dies on the retry, as when the document itself crashes the parser
+    """
+    for attempt in range(2):
+        pool = extraction_pool(processes)
+        try:
+            return pool.submit(extract_text, file_path, max_pages, max_paragraphs, max_chars).result()
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            if attempt:
+                raise
+
+def shutdown_extraction_pool():
+    """Stop the pool's worker processes; the next extraction starts a new pool"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
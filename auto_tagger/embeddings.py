@@ -0,0 +1,355 @@
+"""
+Embedding index for "find similar files" search.
+
+Tags are a handful of words per file, so a tag search only finds files that
+happen to share one exactly. The embedding index keeps one vector per file
+instead, and search_similar ranks every file by cosine similarity to another
+file or to a free-text description.
+
+Vectors come from the local sentence-embedding model of the transformers
+backend when it is installed, and otherwise from HashingEmbedder, a
+model-free bag of hashed words and word pairs. The index is a single file
+next to the metadata store (metadata.json.vec), memory-mapped for search:
+
+    vectors    count x dim float32, or int8 with one float32 scale per row
+               when quantized (a quarter of the size, for large corpora)
+    mtimes     float64 last_modified each vector was computed for
+    paths      NUL-separated UTF-8 paths in ID order
+    footer     JSON header, its length and a magic number
+
+Search runs over blocks of rows: each block is scored against a batch of
+queries with one matrix product, and only the block's top k per query is
+kept, so memory stays bounded by the block size whatever the corpus size.
+"""
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import json
+import math
+import mmap
+import os
+import struct
+import zlib
+import numpy as np
+from .fileio import atomic_write
+from .backends.heuristic import STOPWORDS, WORD_PATTERN
+
+EMBEDDING_SUFFIX = ".vec"
+MAGIC = b"ATVEC001"
+_FOOTER = struct.Struct("<Q8s")
+
+EMBEDDERS = ("auto", "transformers", "hashing")
+
+def _singular(word: str) -> str:
+    # Plurals are the most common inflection in identifiers and descriptions ("migrations", "users")
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+class HashingEmbedder:
+    """
+    Model-free embedder: signed feature hashing of words and adjacent word pairs
+    Texts sharing vocabulary get similar vectors. No weights are needed, so
+    this is the fallback when the transformers model is unavailable.
+    """
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+        
+    def features(self, text: str) -> Counter:
+        """Words and word pairs of a text, with their counts"""
+        words = [_singular(word) for word in (word.lower() for word in WORD_PATTERN.findall(text))
+                 if len(word) > 1 and word not in STOPWORDS]
+        counts = Counter(words)
+        counts.update(f"{first} {second}" for first, second in zip(words, words[1:]))
+        return counts
+        
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """L2-normalized vectors, one row per text"""
+        vectors = np.zeros((len(texts), self.dim), np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in self.features(text).items():
+                digest = zlib.crc32(feature.encode("utf-8", "surrogateescape"))
+                weight = 1.0 + math.log(count)
+                vectors[row, digest % self.dim] += -weight if digest & 0x80000000 else weight
+        return normalize(vectors)
+
+class ModelEmbedder:
+    """Sentence embeddings from the local model of the transformers backend"""
+    def __init__(self, backend):
+        self.backend = backend
+        self.name = backend.model_name
+        
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return self.backend.encode(list(texts)).cpu().numpy().astype(np.float32)
+
+def get_embedder(name: Optional[str] = None):
+    """
+    Resolve an embedder
+    Args:
+        name: "transformers", "hashing", or "auto" (the default, also read from $AUTO_TAGGER_EMBEDDER)
+            for the transformers model with the hashing embedder as fallback
+    Returns:
+        Object with a name and embed(texts) returning L2-normalized float32 rows
+    """
+    name = (name or os.getenv("AUTO_TAGGER_EMBEDDER") or "auto").lower()
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unknown embedder '{name}' (choose from {', '.join(EMBEDDERS)})")
+    if name == "hashing":
+        return HashingEmbedder()
+    from .backends import get_backend
+    backend = get_backend("transformers")
+    if backend.available():
+        return ModelEmbedder(backend)
+    return HashingEmbedder()
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length; all-zero rows are left as they are"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric int8 quantization with one scale per row"""
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    return np.rint(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+def _pad(f, position: int) -> int:
+    padding = -position % 8
+    f.write(b"\0" * padding)
+    return position + padding
+
+def write_index(path: str, model: str, chunks: Iterable[Tuple[List[str], List[Optional[float]], np.ndarray]],
+                quantized: bool = False) -> int:
+    """
+    Atomically write an index file from chunks of rows
+    Args:
+        path: Index file
+        model: Name of the embedder the vectors come from
+        chunks: (paths, last_modified values, vectors) per chunk, in ID order
+        quantized: Store int8 vectors with per-row scales instead of float32
+    Returns:
+        Number of vectors written
+    """
+    encoded: List[bytes] = []
+    mtimes: List[float] = []
+    scales: List[np.ndarray] = []
+    
+    def write(f):
+        position = dim = 0
+        for paths, chunk_mtimes, vectors in chunks:
+            if not paths:
+                continue
+            vectors = np.ascontiguousarray(vectors, np.float32)
+            dim = vectors.shape[1]
+            if quantized:
+                vectors, chunk_scales = quantize(vectors)
+                scales.append(chunk_scales)
+            f.write(vectors.tobytes())
+            position += vectors.nbytes
+            encoded.extend(path.encode("utf-8", "surrogateescape") for path in paths)
+            mtimes.extend(math.nan if mtime is None else mtime for mtime in chunk_mtimes)
+        header: Dict[str, Any] = {"model": model, "dim": dim, "count": len(encoded),
+                                  "dtype": "int8" if quantized else "float32"}
+        if quantized:
+            position = _pad(f, position)
+            header["scales"] = position
+            data = np.concatenate(scales).tobytes() if scales else b""
+            f.write(data)
+            position += len(data)
+        position = _pad(f, position)
+        header["mtimes"] = position
+        data = np.array(mtimes, np.float64).tobytes()
+        f.write(data)
+        position += len(data)
+        header["paths"] = position
+        data = b"".join(path + b"\0" for path in encoded)
+        f.write(data)
+        header["paths_length"] = len(data)
+        header_bytes = json.dumps(header).encode("utf-8")
+        f.write(header_bytes)
+        f.write(_FOOTER.pack(len(header_bytes), MAGIC))
+        
+    atomic_write(path, write)
+    return len(encoded)
+
+class EmbeddingIndex:
+    """Memory-mapped, read-only view of an index file"""
+    def __init__(self, path: str):
+        """
+        Raises:
+            ValueError if the file is not an embedding index
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self._buffer) < _FOOTER.size:
+                raise ValueError(f"{path} is not an embedding index")
+            length, magic = _FOOTER.unpack_from(self._buffer, len(self._buffer) - _FOOTER.size)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not an embedding index")
+            start = len(self._buffer) - _FOOTER.size - length
+            header = json.loads(bytes(self._buffer[start:start + length]))
+        except BaseException:
+            self._buffer.close()
+            raise
+        self.model: str = header["model"]
+        self.dim: int = header["dim"]
+        count = header["count"]
+        self.vectors = np.frombuffer(self._buffer, np.dtype(header["dtype"]), count * self.dim, 0).reshape(count, self.dim)
+        self.scales = np.frombuffer(self._buffer, np.float32, count, header["scales"]) if "scales" in header else None
+        self.mtimes = np.frombuffer(self._buffer, np.float64, count, header["mtimes"])
+        self._paths_offset = header["paths"]
+        self._paths_length = header["paths_length"]
+        self._starts: Optional[np.ndarray] = None
+        self._ids: Optional[Dict[str, int]] = None
+        
+    def __len__(self) -> int:
+        return len(self.vectors)
+        
+    @property
+    def quantized(self) -> bool:
+        return self.scales is not None
+        
+    def _path_starts(self) -> np.ndarray:
+        if self._starts is None:
+            blob = np.frombuffer(self._buffer, np.uint8, self._paths_length, self._paths_offset)
+            ends = np.flatnonzero(blob == 0)
+            self._starts = np.concatenate(([0], ends[:-1] + 1)) + self._paths_offset
+        return self._starts
+        
+    def path_of(self, file_id: int) -> str:
+        """Path of a vector ID"""
+        start = int(self._path_starts()[file_id])
+        end = self._buffer.find(b"\0", start)
+        return self._buffer[start:end].decode("utf-8", "surrogateescape")
+        
+    def ids(self) -> Dict[str, int]:
+        """Mapping of path to vector ID, built on first use"""
+        if self._ids is None:
+            blob = self._buffer[self._paths_offset:self._paths_offset + self._paths_length]
+            paths = blob.decode("utf-8", "surrogateescape").split("\0")[:-1]
+            self._ids = {path: file_id for file_id, path in enumerate(paths)}
+        return self._ids
+        
+    def vector(self, file_id: int) -> np.ndarray:
+        """A stored vector as float32"""
+        vector = self.vectors[file_id].astype(np.float32)
+        return vector * self.scales[file_id] if self.scales is not None else vector
+        
+    def search(self, queries: np.ndarray, k: int = 10, exclude: Iterable[int] = (),
+               block_rows: int = 32768) -> List[List[Tuple[int, float]]]:
+        """
+        Top-k cosine search for a batch of queries
+        Args:
+            queries: One query vector, or a (queries, dim) matrix
+            k: Results per query
+            exclude: Vector IDs never returned (such as the query file itself)
+            block_rows: Rows scored per matrix product
+        Returns:
+            Per query, (vector ID, similarity) pairs, most similar first
+        """
+        queries = normalize(np.atleast_2d(np.asarray(queries, np.float32)))
+        k = min(k, len(self))
+        if k <= 0:
+            return [[] for _ in queries]
+        excluded = np.fromiter(exclude, np.int64)
+        best_scores = np.full((len(queries), k), -np.inf, np.float32)
+        best_ids = np.full((len(queries), k), -1, np.int64)
+        for start in range(0, len(self), block_rows):
+            block = self.vectors[start:start + block_rows]
+            scores = queries @ block.T.astype(np.float32, copy=False)
+            if self.scales is not None:
+                scores *= self.scales[start:start + len(block)]
+            local = excluded[(excluded >= start) & (excluded < start + len(block))] - start
+            scores[:, local] = -np.inf
+            if scores.shape[1] > k:
+                top = np.argpartition(scores, -k, axis=1)[:, -k:]
+                scores = np.take_along_axis(scores, top, axis=1)
+            else:
+                top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+            merged_scores = np.concatenate((best_scores, scores), axis=1)
+            merged_ids = np.concatenate((best_ids, top + start), axis=1)
+            keep = np.argpartition(merged_scores, -k, axis=1)[:, -k:]
+            best_scores = np.take_along_axis(merged_scores, keep, axis=1)
+            best_ids = np.take_along_axis(merged_ids, keep, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_ids = np.take_along_axis(best_ids, order, axis=1)
+        return [[(int(file_id), float(score)) for file_id, score in zip(ids, scores) if score > -np.inf]
+                for ids, scores in zip(best_ids, best_scores)]
+                
+    def close(self):
+        """Unmap the file once no search results still refer to it"""
+        self.vectors = self.scales = self.mtimes = None
+        self._starts = None
+        try:
+            self._buffer.close()
+        except BufferError:
+            # An array handed out by vector() is still alive; the map is released with it
+            pass
+
+def open_index(path: str) -> Optional[EmbeddingIndex]:
+    """Open an index file, or None if it is missing or unreadable"""
+    try:
+        return EmbeddingIndex(path)
+    except (OSError, ValueError, KeyError) as e:
+        if os.path.exists(path):
+            print(f"Ignoring unreadable embedding index {path}: {str(e)}")
+        return None
+
+def update_index(path: str, files: List[Tuple[str, Optional[float]]], embedder,
+                 text_for: Callable[[str], str], quantized: bool = False, batch_size: int = 64) -> int:
+    """
+    Bring an index file in line with the metadata
+    Files whose path and last_modified match the existing index keep their
+    vectors; others are embedded from text_for(path) in batches. Files no
+    longer listed are dropped. The file is rewritten only if something changed.
+    Args:
+        path: Index file
+        files: (path, last_modified) of every file to index, in ID order
+        embedder: Embedder the vectors come from
+        text_for: Text a file is embedded from
+        quantized: Store int8 vectors
+        batch_size: Texts embedded per call
+    Returns:
+        Number of files embedded
+    """
+    old = open_index(path)
+    if old is not None and (old.model != embedder.name or old.quantized != quantized):
+        old.close()
+        old = None
+    ids = old.ids() if old is not None else {}
+    reused: List[int] = []
+    for file_key, mtime in files:
+        file_id = ids.get(file_key)
+        reused.append(-1 if file_id is None or mtime is None or old.mtimes[file_id] != mtime else file_id)
+    if old is not None and len(files) == len(old) and reused == list(range(len(old))):
+        old.close()
+        return 0
+        
+    embedded = 0
+    
+    def chunks() -> Iterator[Tuple[List[str], List[Optional[float]], np.ndarray]]:
+        nonlocal embedded
+        for start in range(0, len(files), batch_size):
+            batch = files[start:start + batch_size]
+            rows = reused[start:start + batch_size]
+            stale = [position for position, file_id in enumerate(rows) if file_id < 0]
+            vectors = None
+            if stale:
+                fresh = embedder.embed([text_for(batch[position][0]) for position in stale])
+                vectors = np.zeros((len(batch), fresh.shape[1]), np.float32)
+                vectors[stale] = fresh
+                embedded += len(stale)
+            for position, file_id in enumerate(rows):
+                if file_id >= 0:
+                    if vectors is None:
+                        vectors = np.zeros((len(batch), old.dim), np.float32)
+                    vectors[position] = old.vector(file_id)
+            yield [file_key for file_key, _ in batch], [mtime for _, mtime in batch], vectors
+            
+    try:
+        write_index(path, embedder.name, chunks(), quantized)
+    finally:
+        if old is not None:
+            old.close()
+    return embedded
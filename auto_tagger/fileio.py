@@ -0,0 +1,56 @@
+"""
+Atomic replacement of the files auto-tagger keeps next to its metadata store.
+
+Every state file (metadata.json, its .records sidecar, tag_cache.json, the
+.idx query index, the .vec embedding index and the .scan state) is written
+to a temporary file in the same directory and renamed over the old one, so
+readers see either the old or the new contents and never a partial write.
+
+tempfile.mkstemp creates its file readable by the owner only, so the
+temporary file is given the permissions the file would have had otherwise:
+those of the file it replaces, or what open() gives under the umask.
+"""
+from typing import IO, Any, Callable, Optional, TypeVar
+import os
+import tempfile
+
+T = TypeVar("T")
+
+def _umask() -> int:
+    mask = os.umask(0o022)
+    os.umask(mask)
+    return mask
+
+# Read once, since changing the umask to read it is not safe while other threads create files
+_UMASK = _umask()
+
+def file_mode(path: str) -> int:
+    """Permission bits for a rewrite of path: its current ones, or those open() would give a new file"""
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except OSError:
+        return 0o666 & ~_UMASK
+
+def atomic_write(path: str, writer: Callable[[IO[Any]], T], mode: str = 'wb',
+                 encoding: Optional[str] = None) -> T:
+    """
+    Write a file through a temporary file renamed over it
+    Args:
+        path: File to replace
+        writer: Called with the open temporary file to write the contents
+        mode: Mode to open the temporary file with, 'wb' or 'w'
+        encoding: Text encoding when mode is 'w'
+    Returns:
+        What writer returned
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            result = writer(f)
+        os.chmod(tmp_path, file_mode(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return result
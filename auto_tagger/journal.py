@@ -0,0 +1,89 @@
+"""
+Append-only journal of analyses that have not reached the metadata store yet.
+
+The metadata store is only rewritten when a run finishes. Every completed
+analysis is appended to the journal as soon as it returns, so a run that is
+killed keeps everything it already paid for: the next run replays the journal
+into its metadata and skips those files as unchanged. The journal is removed
+once its entries are saved to the store.
+"""
+from typing import Any, Dict, Iterator, Tuple
+import json
+import os
+import threading
+import time
+
+JOURNAL_SUFFIX = ".journal"
+
+class Journal:
+    def __init__(self, path: str, sync_interval: float = 5.0):
+        """
+        Args:
+            path: Journal file
+            sync_interval: Seconds between fsyncs; every record is flushed to the OS immediately,
+                so only a machine crash can lose the last interval
+        """
+        self.path = path
+        self.sync_interval = sync_interval
+        self._file = None
+        self._lock = threading.Lock()
+        self._last_sync = time.monotonic()
+        
+    def _open(self):
+        self._file = open(self.path, 'a+', encoding='utf-8')
+        # A crash mid-write leaves a torn last line; start on a fresh one
+        if self._file.tell() > 0:
+            self._file.seek(self._file.tell() - 1)
+            if self._file.read(1) != "\n":
+                self._file.write("\n")
+                
+    def append(self, analyses: Dict[str, Any]):
+        """Record analyses keyed by file path"""
+        if not analyses:
+            return
+        lines = "".join(json.dumps({"path": file_key, "entry": entry}) + "\n" for file_key, entry in analyses.items())
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._file.write(lines)
+            self._file.flush()
+            if time.monotonic() - self._last_sync >= self.sync_interval:
+                os.fsync(self._file.fileno())
+                self._last_sync = time.monotonic()
+                
+    def replay(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield recorded (file_key, entry) pairs in order, skipping torn or corrupt lines"""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+        try:
+            f = open(self.path, 'r', encoding='utf-8', errors='replace')
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    yield record["path"], record["entry"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+                    
+    def close(self):
+        """Flush and close the journal file, keeping its records"""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+                
+    def clear(self):
+        """Discard the journal once its records are saved to the store"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,294 @@
+"""
+Run metrics: per-stage latency, token usage, cost, cache hit rates and errors.
+
+The controller and its agents share one Metrics registry. Pipeline stages
+(walk, stat, sample, prompt, api, inference, parse, analyze, save) are timed
+into fixed-bucket latency histograms labelled by agent, and the agents count
+requests, retries, schema corrections, errors, cache hits, requests coalesced
+with an identical one in flight and the tokens the API reports in
+response.usage, which are priced per model. The registry can
+be printed as a --stats summary, written as a JSON report or served in the
+Prometheus text format for long-running (--watch) deployments.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+import json
+import threading
+import time
+
+# Upper bounds of the latency histogram buckets in seconds; the last bucket is +Inf
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# USD per million (prompt, completion) tokens; dated snapshots match by prefix
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+# Pipeline stages in report order
+STAGES = ("walk", "stat", "sample", "prompt", "api", "inference", "parse", "analyze", "save", "embed")
+
+# Per-agent counters, in report order
+COUNTERS = ("files", "requests", "retries", "corrections", "errors", "cache_hits", "cache_misses",
+            "coalesced", "prompt_tokens", "completion_tokens")
+
+def model_price(model: str) -> Optional[Tuple[float, float]]:
+    """(prompt, completion) USD per million tokens for a model, or None if unknown"""
+    matches = [name for name in MODEL_PRICES if model == name or model.startswith(name + "-")]
+    if not matches:
+        return None
+    return MODEL_PRICES[max(matches, key=len)]
+
+class Histogram:
+    """Fixed-bucket histogram of durations in seconds"""
+    
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+            
+    def merge(self, other: "Histogram"):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+        
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by linear interpolation within its bucket"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / count)
+            seen += count
+        return self.max
+        
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "total_seconds": self.sum,
+            "mean_seconds": self.sum / self.count if self.count else 0.0,
+            "p50_seconds": self.quantile(0.5),
+            "p95_seconds": self.quantile(0.95),
+            "p99_seconds": self.quantile(0.99),
+            "max_seconds": self.max
+        }
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._stages: Dict[Tuple[str, str], Histogram] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._models: Dict[str, str] = {}
+        
+    def observe(self, stage: str, seconds: float, agent: str = ""):
+        """Record the duration of one pass through a stage"""
+        with self._lock:
+            histogram = self._stages.get((stage, agent))
+            if histogram is None:
+                histogram = self._stages[(stage, agent)] = Histogram()
+            histogram.observe(seconds)
+            
+    @contextmanager
+    def timer(self, stage: str, agent: str = "") -> Iterator[None]:
+        """Time the enclosed block as one pass through stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started, agent)
+            
+    def count(self, agent: str, counter: str, amount: int = 1):
+        """Add to one of an agent's COUNTERS"""
+        with self._lock:
+            counters = self._counters.get(agent)
+            if counters is None:
+                counters = self._counters[agent] = dict.fromkeys(COUNTERS, 0)
+            counters[counter] += amount
+            
+    def record_usage(self, agent: str, model: str, response: Any):
+        """Count a completed request and the tokens its response.usage reports"""
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        with self._lock:
+            self._models[agent] = model
+        self.count(agent, "requests")
+        if isinstance(prompt_tokens, int):
+            self.count(agent, "prompt_tokens", prompt_tokens)
+        if isinstance(completion_tokens, int):
+            self.count(agent, "completion_tokens", completion_tokens)
+            
+    def _agent_report(self, agent: str, counters: Dict[str, int]) -> Dict[str, Any]:
+        report: Dict[str, Any] = dict(counters)
+        lookups = counters["cache_hits"] + counters["cache_misses"]
+        report["cache_hit_rate"] = counters["cache_hits"] / lookups if lookups else 0.0
+        model = self._models.get(agent)
+        price = model_price(model) if model else None
+        report["model"] = model
+        report["cost_usd"] = (
+            (counters["prompt_tokens"] * price[0] + counters["completion_tokens"] * price[1]) / 1e6
+            if price else None
+        )
+        return report
+        
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        JSON-serializable report of everything recorded so far
+        Returns:
+            Dictionary with the run's elapsed time, stage latency summaries
+            (overall and per agent), per-agent counters and their totals
+        """
+        with self._lock:
+            stages: Dict[str, Histogram] = {}
+            by_agent: Dict[str, Dict[str, Any]] = {}
+            for (stage, agent), histogram in sorted(self._stages.items()):
+                stages.setdefault(stage, Histogram()).merge(histogram)
+                if agent:
+                    by_agent.setdefault(stage, {})[agent] = histogram.summary()
+            agents = {agent: self._agent_report(agent, counters) for agent, counters in sorted(self._counters.items())}
+        totals: Dict[str, Any] = {counter: sum(report[counter] for report in agents.values()) for counter in COUNTERS}
+        lookups = totals["cache_hits"] + totals["cache_misses"]
+        totals["cache_hit_rate"] = totals["cache_hits"] / lookups if lookups else 0.0
+        costs = [report["cost_usd"] for report in agents.values() if report["cost_usd"] is not None]
+        totals["cost_usd"] = sum(costs) if costs else None
+        return {
+            "elapsed_seconds": time.time() - self.started,
+            "stages": {
+                stage: dict(histogram.summary(), agents=by_agent.get(stage, {}))
+                for stage, histogram in sorted(stages.items(), key=_stage_order)
+            },
+            "agents": agents,
+            "totals": totals
+        }
+        
+    def write_report(self, path: str):
+        """Write the snapshot as a JSON report file"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+            
+    def format_summary(self) -> str:
+        """Human-readable summary printed by --stats"""
+        report = self.snapshot()
+        lines = [f"Run statistics ({report['elapsed_seconds']:.1f}s elapsed)",
+                 f"  {'stage':<10} {'count':>8} {'total s':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}"]
+        for stage, summary in report["stages"].items():
+            lines.append(
+                f"  {stage:<10} {summary['count']:>8} {summary['total_seconds']:>9.2f} "
+                f"{summary['mean_seconds'] * 1000:>9.1f} {summary['p50_seconds'] * 1000:>9.1f} "
+                f"{summary['p95_seconds'] * 1000:>9.1f} {summary['max_seconds'] * 1000:>9.1f}"
+            )
+        for agent, counters in list(report["agents"].items()) + [("total", report["totals"])]:
+            cost = "n/a" if counters["cost_usd"] is None else f"${counters['cost_usd']:.4f}"
+            lines.append(
+                f"  {agent}: {counters['files']} files, {counters['requests']} requests "
+                f"({counters['retries']} retries, {counters['corrections']} corrections), "
+                f"{counters['errors']} errors, cache hit rate {counters['cache_hit_rate']:.0%} "
+                f"({counters['coalesced']} coalesced), "
+                f"tokens {counters['prompt_tokens']} in / {counters['completion_tokens']} out, cost {cost}"
+            )
+        return "\n".join(lines)
+        
+    def render_prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            stages = [(stage, agent, histogram.counts[:], histogram.buckets, histogram.sum, histogram.count)
+                      for (stage, agent), histogram in sorted(self._stages.items())]
+            agents = {agent: self._agent_report(agent, counters) for agent, counters in sorted(self._counters.items())}
+        lines = ["# HELP auto_tagger_stage_seconds Time spent per pass through a pipeline stage",
+                 "# TYPE auto_tagger_stage_seconds histogram"]
+        for stage, agent, counts, buckets, total, count in stages:
+            labels = _labels(stage=stage, agent=agent)
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += bucket_count
+                le = bound if isinstance(bound, str) else repr(float(bound))
+                lines.append(f"auto_tagger_stage_seconds_bucket{_labels(stage=stage, agent=agent, le=le)} {cumulative}")
+            lines.append(f"auto_tagger_stage_seconds_sum{labels} {total!r}")
+            lines.append(f"auto_tagger_stage_seconds_count{labels} {count}")
+        for counter in COUNTERS:
+            name = f"auto_tagger_{counter}_total"
+            lines.append(f"# TYPE {name} counter")
+            for agent, report in agents.items():
+                lines.append(f"{name}{_labels(agent=agent)} {report[counter]}")
+        lines.append("# TYPE auto_tagger_cost_usd_total counter")
+        for agent, report in agents.items():
+            if report["cost_usd"] is not None:
+                lines.append(f"auto_tagger_cost_usd_total{_labels(agent=agent, model=report['model'])} {report['cost_usd']!r}")
+        return "\n".join(lines) + "\n"
+
+def _stage_order(item: Tuple[str, Any]) -> Tuple[int, str]:
+    stage = item[0]
+    return (STAGES.index(stage) if stage in STAGES else len(STAGES), stage)
+
+def _labels(**labels: str) -> str:
+    """Prometheus label set, leaving out empty labels"""
+    pairs = [
+        name + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in labels.items() if value
+    ]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def serve_metrics(metrics: Metrics, port: int, host: str = ""):
+    """
+    Serve /metrics in the Prometheus text format from a daemon thread
+    Args:
+        metrics: Registry to expose
+        port: TCP port to listen on (0 picks a free one)
+        host: Interface to bind; all interfaces by default
+    Returns:
+        The running HTTP server; call shutdown() to stop it
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            
+        def log_message(self, format, *args):
+            # Scrapes are frequent; keep them out of the tagging output
+            pass
+            
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="auto-tagger-metrics", daemon=True).start()
+    return server
+
+_default_metrics: Optional[Metrics] = None
+_default_metrics_lock = threading.Lock()
+
+def default_metrics() -> Metrics:
+    """Process-wide registry used by agents not attached to a swarm"""
+    global _default_metrics
+    with _default_metrics_lock:
+        if _default_metrics is None:
+            _default_metrics = Metrics()
+        return _default_metrics
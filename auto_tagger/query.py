@@ -0,0 +1,368 @@
+"""
+Read-only query engine for tag lookups from tooling.
+
+Searching through SwarmController imports the tagging pipeline and parses
+the whole metadata store for every lookup. QueryEngine instead answers
+queries from a compact index file next to the store (metadata.json.idx),
+memory-mapped so a lookup only touches the pages it needs. The index is
+rebuilt from the JSON or SQLite store whenever it is missing or the store
+has changed since it was written, and holds, for files sorted by path:
+
+    terms      sorted normalized tags, plus "\\0agent:<name>" and
+               "\\0type:<suffix>" pseudo-terms for the agent and file type filters
+    postings   sorted file IDs per term
+    paths      in ID order, so a path prefix is a contiguous range of IDs
+
+Only the standard library is imported, and sqlite3 only to rebuild the
+index of a SQLite store; no agents, API clients or .env files are loaded.
+"""
+from array import array
+from itertools import accumulate
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from .fileio import atomic_write
+from .tag_index import QuerySyntaxError, TagIndex, evaluate_query
+
+INDEX_SUFFIX = ".idx"
+MAGIC = b"ATQIDX01"
+_PREAMBLE = struct.Struct("<8sI")
+_AGENT = "\0agent:"
+_TYPE = "\0type:"
+
+# (path, agent, tags) rows the index is built from
+IndexRow = Tuple[str, Optional[str], Iterable[str]]
+
+def _encode(text: str) -> bytes:
+    # UTF-8 byte order matches code point order, so byte-sorted paths bisect like strings
+    return text.encode("utf-8", "surrogateescape")
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+def source_stamp(path: str) -> List[int]:
+    """Identity of a store's contents: mtime, size and inode of the file and of its SQLite write-ahead log"""
+    stamp = []
+    for candidate in (path, path + "-wal"):
+        try:
+            st = os.stat(candidate)
+        except OSError:
+            stamp.extend((0, 0, 0))
+            continue
+        stamp.extend((st.st_mtime_ns, st.st_size, st.st_ino))
+    return stamp
+
+def read_store(path: str, kind: Optional[str] = None) -> Iterator[IndexRow]:
+    """
+    Stream (path, agent, tags) rows from a metadata store without opening it for writing
+    Args:
+        path: JSON or SQLite metadata file
+        kind: "json" or "sqlite"; inferred from the file suffix when omitted
+    """
+    from .storage import SQLITE_SUFFIXES
+    if kind is None:
+        kind = 'sqlite' if path.lower().endswith(SQLITE_SUFFIXES) else 'json'
+    if kind == 'json':
+        from .records import iter_entries
+        # Saves append changed entries after the ones they replace, so the last one of a key wins
+        with open(path, 'rb') as f:
+            rows = {file_key: (entry.get("agent"), entry.get("tags", [])) for file_key, entry, _, _ in iter_entries(f)}
+        for file_key, (agent, tags) in rows.items():
+            yield file_key, agent, tags
+        return
+    import sqlite3
+    from pathlib import Path
+    conn = sqlite3.connect(Path(path).absolute().as_uri() + "?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT f.id, f.path, f.agent, t.name FROM files f "
+            "LEFT JOIN file_tags ft ON ft.file_id = f.id LEFT JOIN tags t ON t.id = ft.tag_id "
+            "ORDER BY f.id, ft.position"
+        )
+        current, file_key, agent, tags = None, None, None, []
+        for file_id, row_path, row_agent, name in rows:
+            if file_id != current:
+                if current is not None:
+                    yield file_key, agent, tags
+                current, file_key, agent, tags = file_id, row_path, row_agent, []
+            if name is not None:
+                tags.append(name)
+        if current is not None:
+            yield file_key, agent, tags
+    finally:
+        conn.close()
+
+def build_index(rows: Iterable[IndexRow], stamp: List[int]) -> bytes:
+    """
+    Serialize rows into the compact index format
+    Args:
+        rows: (path, agent, tags) for every file
+        stamp: source_stamp of the store the rows were read from
+    Returns:
+        The index file contents
+    """
+    files = sorted(((_encode(path), agent, tags) for path, agent, tags in rows), key=lambda row: row[0])
+    postings = {}
+    for file_id, (path, agent, tags) in enumerate(files):
+        terms = {TagIndex.normalize(tag) for tag in tags}
+        terms.discard("")
+        if agent:
+            terms.add(_AGENT + agent)
+        suffix = os.path.splitext(path)[1].lower()
+        if suffix:
+            terms.add(_TYPE + suffix.decode("utf-8", "surrogateescape"))
+        for term in terms:
+            postings.setdefault(_encode(term), []).append(file_id)
+    terms = sorted(postings)
+    paths = [path for path, _, _ in files]
+    sections = [
+        ("path_offsets", array("Q", accumulate((len(path) for path in paths), initial=0)).tobytes()),
+        ("paths", b"".join(paths)),
+        ("term_offsets", array("Q", accumulate((len(term) for term in terms), initial=0)).tobytes()),
+        ("terms", b"".join(terms)),
+        ("posting_offsets", array("Q", accumulate((len(postings[term]) for term in terms), initial=0)).tobytes()),
+        ("postings", b"".join(array("I", postings[term]).tobytes() for term in terms))
+    ]
+    layout, offset = {}, 0
+    for name, data in sections:
+        layout[name] = [offset, len(data)]
+        offset = _align(offset + len(data))
+    header = json.dumps({"stamp": stamp, "byteorder": sys.byteorder, "files": len(files),
+                         "sections": layout}).encode("utf-8")
+    out = bytearray(_PREAMBLE.pack(MAGIC, len(header)) + header)
+    out.extend(bytes(_align(len(out)) - len(out)))
+    for _, data in sections:
+        out.extend(data)
+        out.extend(bytes(_align(len(out)) - len(out)))
+    return bytes(out)
+
+class CompactIndex:
+    """Read side of the compact index, over an mmap or a bytes object"""
+    def __init__(self, buffer):
+        self._buffer = buffer
+        view = memoryview(buffer)
+        self._views = [view]
+        try:
+            magic, length = _PREAMBLE.unpack_from(view)
+            if magic != MAGIC:
+                raise ValueError("not a query index")
+            header = json.loads(bytes(view[_PREAMBLE.size:_PREAMBLE.size + length]))
+            if header["byteorder"] != sys.byteorder:
+                raise ValueError("query index written on a machine with another byte order")
+            base = _align(_PREAMBLE.size + length)
+            
+            def section(name: str, fmt: str = "B") -> memoryview:
+                offset, size = header["sections"][name]
+                part = view[base + offset:base + offset + size].cast(fmt)
+                self._views.append(part)
+                return part
+                
+            self.stamp: List[int] = header["stamp"]
+            self.files: int = header["files"]
+            self._path_offsets = section("path_offsets", "Q")
+            self._paths = section("paths")
+            self._term_offsets = section("term_offsets", "Q")
+            self._terms = section("terms")
+            self._posting_offsets = section("posting_offsets", "Q")
+            self._postings = section("postings", "I")
+        except (struct.error, KeyError, TypeError, ValueError) as e:
+            self.close()
+            raise ValueError(f"corrupt query index: {e}")
+        self._term_count = len(self._term_offsets) - 1
+        self._tags_start = self._first_term(b"\x01")
+        
+    def close(self):
+        """Release the buffer; an mmap is unmapped"""
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+            
+    def _term(self, position: int) -> bytes:
+        return self._terms[self._term_offsets[position]:self._term_offsets[position + 1]].tobytes()
+        
+    def _path_bytes(self, file_id: int) -> bytes:
+        return self._paths[self._path_offsets[file_id]:self._path_offsets[file_id + 1]].tobytes()
+        
+    @staticmethod
+    def _bisect(item, count: int, key: bytes) -> int:
+        """Position of the first of count sorted items >= key (bisect's key= needs Python 3.10)"""
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if item(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+        
+    def _first_term(self, key: bytes) -> int:
+        """Position of the first term >= key"""
+        return self._bisect(self._term, self._term_count, key)
+        
+    def _posting(self, position: int) -> Set[int]:
+        return set(self._postings[self._posting_offsets[position]:self._posting_offsets[position + 1]])
+        
+    def term(self, term: str) -> Set[int]:
+        """File IDs carrying an exact index term"""
+        key = _encode(term)
+        position = self._first_term(key)
+        if position < self._term_count and self._term(position) == key:
+            return self._posting(position)
+        return set()
+        
+    def lookup(self, tag: str) -> Set[int]:
+        """File IDs carrying an exact (normalized) tag"""
+        return self.term(TagIndex.normalize(tag))
+        
+    def prefix(self, prefix: str) -> Set[int]:
+        """File IDs carrying any tag that starts with prefix"""
+        key = _encode(TagIndex.normalize(prefix))
+        ids: Set[int] = set()
+        # The agent and file type pseudo-terms sort before every tag and are not tags
+        position = max(self._first_term(key), self._tags_start)
+        while position < self._term_count:
+            term = self._term(position)
+            if not term.startswith(key):
+                break
+            ids |= self._posting(position)
+            position += 1
+        return ids
+        
+    def all_ids(self) -> Set[int]:
+        """IDs of every indexed file"""
+        return set(range(self.files))
+        
+    def path_range(self, prefix: str) -> range:
+        """IDs of the files whose path starts with prefix"""
+        key = _encode(prefix)
+        start = self._bisect(self._path_bytes, self.files, key)
+        end = start
+        while end < self.files and self._path_bytes(end).startswith(key):
+            end += 1
+        return range(start, end)
+        
+    def path(self, file_id: int) -> str:
+        return self._path_bytes(file_id).decode("utf-8", "surrogateescape")
+
+class QueryEngine:
+    def __init__(self, metadata: str = "metadata.json", kind: Optional[str] = None,
+                 index_path: Optional[str] = None):
+        """
+        Args:
+            metadata: JSON or SQLite metadata file to query
+            kind: "json" or "sqlite"; inferred from the file suffix when omitted
+            index_path: Compact index file; defaults to the metadata file plus .idx
+        """
+        self.metadata = str(metadata)
+        self.kind = kind
+        self.index_path = index_path or self.metadata + INDEX_SUFFIX
+        self._index: Optional[CompactIndex] = None
+        
+    @property
+    def index(self) -> CompactIndex:
+        """The compact index, opened or rebuilt if the store changed since it was last read"""
+        stamp = source_stamp(self.metadata)
+        if self._index is None or self._index.stamp != stamp:
+            if self._index is not None:
+                self._index.close()
+            self._index = self._open(stamp)
+        return self._index
+        
+    def _open(self, stamp: List[int]) -> CompactIndex:
+        if not os.path.exists(self.metadata):
+            return CompactIndex(build_index([], stamp))
+        try:
+            with open(self.index_path, 'rb') as f:
+                index = CompactIndex(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            if index.stamp == stamp:
+                return index
+            index.close()
+        except (OSError, ValueError):
+            pass
+        data = build_index(read_store(self.metadata, self.kind), stamp)
+        try:
+            atomic_write(self.index_path, lambda f: f.write(data))
+        except OSError:
+            # A read-only location still gets answers, from an index kept in memory
+            pass
+        return CompactIndex(data)
+        
+    def search(self, expression: str = "", prefix: Optional[str] = None, agent: Optional[str] = None,
+               file_type: Optional[str] = None) -> List[str]:
+        """
+        Find files matching a tag query and filters
+        Args:
+            expression: Tags combined with AND, OR, NOT and parentheses, a trailing * matches a
+                prefix (see tag_index); empty matches every file
+            prefix: Only files whose path starts with this string
+            agent: Only files analyzed by this agent, e.g. "CodeAgent"
+            file_type: Only files with this suffix, e.g. ".py" (case-insensitive)
+        Returns:
+            Matching file paths, sorted
+        Raises:
+            QuerySyntaxError for malformed expressions
+        """
+        index = self.index
+        ids = evaluate_query(index, expression) if expression.strip() else None
+        if prefix:
+            span = index.path_range(prefix)
+            ids = set(span) if ids is None else {file_id for file_id in ids if file_id in span}
+        for term in ([_AGENT + agent] if agent else []) + ([_TYPE + _suffix(file_type)] if file_type else []):
+            ids = index.term(term) if ids is None else ids & index.term(term)
+        if ids is None:
+            ids = index.all_ids()
+        return [index.path(file_id) for file_id in sorted(ids)]
+        
+    def close(self):
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+
+def _suffix(file_type: str) -> str:
+    file_type = file_type.strip().lower()
+    return file_type if file_type.startswith(".") else "." + file_type
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='auto_tagger query',
+                                     description='Read-only tag queries against the metadata store; '
+                                                 'no agents or API clients are loaded')
+    parser.add_argument('expression', nargs='?', default='',
+                        help='Tag query such as "python AND NOT test" or "pyth*"; omit to match every file')
+    parser.add_argument('--metadata', type=str, default='metadata.json',
+                        help='Metadata file to query (.json, or .db/.sqlite for SQLite)')
+    parser.add_argument('--store', choices=['json', 'sqlite'],
+                        help='Storage backend of the metadata file (default: inferred from its suffix)')
+    parser.add_argument('--prefix', type=str, help='Only files whose path starts with PREFIX')
+    parser.add_argument('--agent', type=str, help='Only files analyzed by AGENT, e.g. CodeAgent')
+    parser.add_argument('--type', dest='file_type', type=str, help='Only files with this suffix, e.g. .py')
+    parser.add_argument('--count', action='store_true', help='Print the number of matches instead of the paths')
+    parser.add_argument('--json', action='store_true', help='Print the matches as a JSON list')
+    args = parser.parse_args(argv)
+    
+    engine = QueryEngine(args.metadata, args.store)
+    try:
+        results = engine.search(args.expression, args.prefix, args.agent, args.file_type)
+    except QuerySyntaxError as e:
+        print(f"Error: invalid search query: {e}")
+        return 2
+    except (OSError, ValueError) as e:
+        print(f"Error: cannot read metadata '{args.metadata}': {e}")
+        return 1
+    finally:
+        engine.close()
+    if args.count:
+        print(len(results))
+    elif args.json:
+        print(json.dumps(results))
+    else:
+        sys.stdout.write("".join(f"{path}\n" for path in results))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
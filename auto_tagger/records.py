@@ -0,0 +1,640 @@
+"""
+Compact in-memory model of a JSON metadata store.
+
+Loaded with json.load, every metadata.json entry becomes nested dictionaries:
+the entry, its metadata dict, a list holding its own copy of every tag string
+and the free-text analysis, well over a kilobyte per file. JSONMetadata keeps
+one record per file instead: a single bytes object packing only what scans
+and tag searches need,
+
+    last_modified   the file's mtime when it was analyzed
+    fingerprint     its (size, mtime_ns, inode), compared against a stat on every scan
+    offset, length  where the full entry is in the store file
+    agent           ID of the interned agent name
+    tags            uint32 IDs into a TagVocabulary shared by all records
+
+about 100 bytes next to the path, where a __slots__ object holding the same
+fields as Python floats, ints and bytes costs over twice as much.
+
+Everything else (purpose, components, analysis text, errors) stays in the
+store file and is decoded only when the entry itself is read. The file is
+parsed as a stream, so loading never holds more than one entry in its full
+form. Entries assigned since the last save are kept as serialized JSON until
+the store is written, after which they are read back from the file too.
+
+The file stays what json.dump(metadata, f, indent=2) writes, extended in
+place: a save appends only the entries assigned since the last one to the
+end of the object, after the entries they replace. JSON parsers keep the
+last value of a repeated key (json.load, JSON.parse and jq all do), so the
+file still reads as the metadata, and saving costs as much as what changed.
+Deleting entries, or replaced entries adding up to half the file, rewrites
+it from scratch, copying runs of unchanged entries from the old file.
+
+Parsing a large store still costs a pass over every entry, so the records
+are also kept in binary form next to it (<store>.records), tagged with the
+size, times and inode of the store file they point into. Each append adds a
+segment holding the records it wrote. A load whose store file matches the
+last segment reads them back instead of parsing; any other writer changes
+the store file, and the sidecar is ignored and rewritten. The segments also
+say which entries were written since a given time (modified_since), so a
+rescan can trust the entries of every other file.
+"""
+from array import array
+from collections.abc import MutableMapping
+from itertools import accumulate
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+import json
+import os
+import math
+import re
+import struct
+import sys
+import threading
+from .fileio import atomic_write
+
+# Header of a file's record: last_modified (NaN when unknown), offset and length of the
+# entry in the store file (offset -1 until it is written), agent ID + 1 (0 for none) and
+# fingerprint (size -1 when unknown), followed by one uint32 tag ID per tag
+_RECORD = struct.Struct("<dqIHqqQ")
+# The offset and length fields on their own, rewritten when the store file is
+_SPAN = struct.Struct("<qI")
+_SPAN_AT = struct.calcsize("<d")
+_NO_FINGERPRINT = (-1, 0, 0)
+RECORDS_SUFFIX = ".records"
+# Sidecar segment header: magic, (size, mtime_ns, ctime_ns, inode) of the store file after the write
+# the segment is for, number of records, of tags and agents new to the vocabularies, the byte lengths
+# of the "\0"-joined keys, records, tags and agents that follow, and the bytes of replaced entries in
+# the store file; the keys are followed by a uint32 length per record
+_SIDECAR = struct.Struct("<8sqqqQQIIQQQQQ")
+_SIDECAR_MAGIC = b"ATRECS02"
+# How a non-empty store file ends, and where appended entries go
+_STORE_END = b"\n}"
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+# What json.dumps gives for a string, without its per-call overhead
+_encode_key = json.encoder.encode_basestring_ascii
+
+class TagVocabulary:
+    """Tag strings stored once and referred to by integer ID"""
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        
+    def __len__(self) -> int:
+        return len(self._names)
+        
+    def id(self, name: str) -> int:
+        """ID of a string, adding it to the vocabulary if it is new"""
+        name_id = self._ids.get(name)
+        if name_id is None:
+            name = sys.intern(name)
+            name_id = self._ids[name] = len(self._names)
+            self._names.append(name)
+        return name_id
+        
+    def name(self, name_id: int) -> str:
+        return self._names[name_id]
+        
+    def encode(self, tags: Iterable[str]) -> bytes:
+        """Pack tags as uint32 IDs"""
+        return array("I", [self.id(tag) for tag in tags]).tobytes()
+        
+    def decode(self, tag_ids: bytes) -> List[str]:
+        """Tag strings of packed IDs"""
+        ids = array("I")
+        ids.frombytes(tag_ids)
+        return [self._names[tag_id] for tag_id in ids]
+
+def entry_text(entry: Any) -> bytes:
+    """An entry serialized exactly as json.dump(metadata, f, indent=2) writes it inside the store"""
+    # ensure_ascii (the default) escapes newlines inside strings, so only structural newlines are indented
+    return json.dumps(entry, indent=2).replace("\n", "\n  ").encode("ascii")
+
+def iter_entries(f: BinaryIO, chunk_size: int = 1024 * 1024) -> Iterator[Tuple[str, Any, int, int]]:
+    """
+    Stream the members of a top-level JSON object from a binary file
+    Args:
+        f: File opened in binary mode
+        chunk_size: Bytes read at a time
+    Yields:
+        (key, value, offset, length) with the byte span of each value in the file
+    Raises:
+        ValueError if the file is not a JSON object
+    """
+    # Latin-1 maps bytes 1:1 to characters, so positions are byte offsets; multi-byte UTF-8
+    # never contains ASCII bytes, so the structure parses the same and non-ASCII values are re-decoded
+    buffer = ""
+    base = 0
+    position = 0
+    eof = False
+    
+    def fill() -> bool:
+        nonlocal buffer, base, position, eof
+        if eof:
+            return False
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[position:] + chunk.decode("latin-1")
+        base += position
+        position = 0
+        return True
+        
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            position = _WHITESPACE.match(buffer, position).end()
+            if position < len(buffer) or not fill():
+                return
+                
+    def take(expected: str) -> str:
+        nonlocal position
+        skip_whitespace()
+        char = buffer[position:position + 1]
+        if char not in expected:
+            raise json.JSONDecodeError(f"Expecting one of {expected!r}", buffer, position)
+        position += 1
+        return char
+        
+    def value() -> Tuple[Any, int, int]:
+        nonlocal position
+        skip_whitespace()
+        while True:
+            try:
+                decoded, end = _DECODER.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The value may continue in the next chunk
+                if fill():
+                    continue
+                raise
+            # A number or literal cut at the chunk boundary decodes without error; make sure it ended
+            if end == len(buffer) and fill():
+                continue
+            start, position = position, end
+            if not buffer[start:end].isascii():
+                decoded = json.loads(buffer[start:end].encode("latin-1").decode("utf-8"))
+            return decoded, base + start, end - start
+            
+    fill()
+    take("{")
+    skip_whitespace()
+    if buffer[position:position + 1] == "}":
+        return
+    while True:
+        key, _, _ = value()
+        if not isinstance(key, str):
+            raise json.JSONDecodeError("Expecting property name", buffer, position)
+        take(":")
+        decoded, offset, length = value()
+        yield key, decoded, offset, length
+        if take(",}") == "}":
+            return
+
+def _copy(source: BinaryIO, f: BinaryIO, start: int, end: int, chunk_size: int = 1024 * 1024):
+    source.seek(start)
+    while start < end:
+        chunk = source.read(min(chunk_size, end - start))
+        if not chunk:
+            raise ValueError("Metadata store file is shorter than its records")
+        f.write(chunk)
+        start += len(chunk)
+
+def write_entries(path: str, items: Iterable[Tuple[str, Union[bytes, Tuple[int, int]]]],
+                  source: Optional[BinaryIO] = None) -> array:
+    """
+    Atomically write serialized entries as a store file
+    Args:
+        path: Store file
+        items: (key, entry_text) pairs in order; instead of its text, an entry of source may be
+            given as its (offset, length) there
+        source: Store file to copy such entries from; runs of entries that follow each other
+            in it are copied in one piece, with the keys and separators between them
+    Returns:
+        Byte offset of each entry in the written file
+    """
+    offsets = array("Q")
+    
+    def write(f: BinaryIO):
+        position = 0
+        separator = b"{\n  "
+        # Span of source still to be copied
+        run_start = run_end = -1
+        for key, text in items:
+            encoded = _encode_key(key)
+            if isinstance(text, tuple):
+                offset, length = text
+                # Only this entry's separator, key and colon fit between it and the previous one
+                head_size = len(encoded) + 6
+                if run_start < 0 or offset - run_end != head_size:
+                    if run_start >= 0:
+                        _copy(source, f, run_start, run_end)
+                    f.write(separator + encoded.encode("ascii") + b": ")
+                    run_start = offset
+                separator = b",\n  "
+                position += head_size
+                offsets.append(position)
+                position += length
+                run_end = offset + length
+                continue
+            if run_start >= 0:
+                _copy(source, f, run_start, run_end)
+                run_start = run_end = -1
+            head = separator + encoded.encode("ascii") + b": "
+            separator = b",\n  "
+            f.write(head)
+            f.write(text)
+            position += len(head)
+            offsets.append(position)
+            position += len(text)
+        if run_start >= 0:
+            _copy(source, f, run_start, run_end)
+        f.write(b"\n}" if offsets else b"{}")
+        
+    atomic_write(path, write)
+    return offsets
+
+def _file_stamp(f: BinaryIO) -> Tuple[int, int, int, int]:
+    """(size, mtime_ns, ctime_ns, inode) of an open file, which change whenever it is rewritten"""
+    stat = os.fstat(f.fileno())
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns, stat.st_ino)
+
+def _written_ns(stamp: Tuple[int, int, int, int]) -> int:
+    # ctime cannot be set back, but on Windows it is the creation time, which appends leave alone
+    return max(stamp[1], stamp[2])
+
+def _segment(data: bytes, position: int):
+    """Parse the sidecar segment at position: (header, keys, records, tags, agents, end), or None if it is not one"""
+    if len(data) - position < _SIDECAR.size:
+        return None
+    magic, *header = _SIDECAR.unpack_from(data, position)
+    count, tag_count, agent_count, keys_size, records_size, tags_size, agents_size = header[4:11]
+    position += _SIDECAR.size
+    end = position + keys_size + 4 * count + records_size + tags_size + agents_size
+    if magic != _SIDECAR_MAGIC or end > len(data):
+        return None
+        
+    def names(size: int, items: int) -> List[str]:
+        nonlocal position
+        text = data[position:position + size].decode("utf-8", "surrogatepass")
+        position += size
+        return text.split("\0") if items else []
+        
+    keys = names(keys_size, count)
+    lengths = array("I")
+    lengths.frombytes(data[position:position + 4 * count])
+    bounds = list(accumulate(lengths, initial=position + 4 * count))
+    position = bounds[-1]
+    tags, agents = names(tags_size, tag_count), names(agents_size, agent_count)
+    if position != end or len(keys) != count:
+        return None
+    return header, keys, map(data.__getitem__, map(slice, bounds, bounds[1:])), tags, agents, end
+
+class JSONMetadata(MutableMapping):
+    """
+    Dictionary view over a JSON metadata store, one packed record per file
+    Like SQLiteMetadata, entries are returned as fresh dictionaries, so
+    mutate them by assigning them back. Call close (or the store's close)
+    to release the store file.
+    """
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: Store file to load; a missing file gives an empty mapping
+        """
+        self.vocabulary = TagVocabulary()
+        self._agents = TagVocabulary()
+        self._records: Dict[str, bytes] = {}
+        # Serialized entries not written to the store file yet
+        self._pending: Dict[str, bytes] = {}
+        self._source: Optional[BinaryIO] = None
+        # Whether entries were assigned or deleted since the mapping was loaded or saved, and whether any
+        # were deleted
+        self._dirty = False
+        self._deleted = False
+        # Stamp of the store file as of the last load or save, and bytes of its entries that later
+        # appends replaced, plus those that appending the pending entries will
+        self._stamp: Optional[Tuple[int, int, int, int]] = None
+        self._stale = 0
+        self._replaced = 0
+        # When the store file was last written whole, and when each append since was, with its keys
+        self._written_ns: Optional[int] = None
+        self._appends: List[Tuple[int, List[str]]] = []
+        # Size of the sidecar while it is in step with the store file, and the tags and agents it holds
+        self._sidecar_size: Optional[int] = None
+        self._sidecar_names = (0, 0)
+        self._lock = threading.RLock()
+        if path is not None:
+            self._load(path)
+            
+    def _load(self, path: str):
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return
+        try:
+            stamp = _file_stamp(f)
+            if not self._load_sidecar(path + RECORDS_SUFFIX, stamp):
+                records = self._records
+                for key, entry, offset, length in iter_entries(f):
+                    replaced = records.get(key)
+                    if replaced is not None:
+                        self._stale += _SPAN.unpack_from(replaced, _SPAN_AT)[1]
+                    records[key] = self._record(entry, offset, length)
+                self._stamp, self._written_ns = stamp, _written_ns(stamp)
+                self._source = f
+                self._write_sidecar(path + RECORDS_SUFFIX)
+        except BaseException:
+            f.close()
+            raise
+        self._source = f
+        
+    def _load_sidecar(self, path: str, stamp: Tuple[int, int, int, int]) -> bool:
+        """Read the records of the store file with the given stamp; False if the sidecar is not for it"""
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return False
+        records: Dict[str, bytes] = {}
+        vocabulary, agent_names = TagVocabulary(), TagVocabulary()
+        appends = []
+        header = None
+        position = 0
+        # The records of the last full write, then those of each append
+        while position < len(data):
+            segment = _segment(data, position)
+            if segment is None:
+                return False
+            header, keys, values, tags, agents, position = segment
+            records.update(zip(keys, values))
+            expected = (len(vocabulary) + len(tags), len(agent_names) + len(agents))
+            for name in tags:
+                vocabulary.id(name)
+            for name in agents:
+                agent_names.id(name)
+            if (len(vocabulary), len(agent_names)) != expected:
+                return False
+            appends.append((_written_ns(header[:4]), keys))
+        if header is None or tuple(header[:4]) != stamp:
+            return False
+        self._records, self.vocabulary, self._agents = records, vocabulary, agent_names
+        self._stamp, self._stale = stamp, header[11]
+        self._written_ns, self._appends = appends[0][0], appends[1:]
+        self._sidecar_size, self._sidecar_names = len(data), (len(vocabulary), len(agent_names))
+        return True
+        
+    def _sidecar_segment(self, keys: List[str], tags_from: int, agents_from: int) -> Optional[List[bytes]]:
+        """Sidecar segment with the records of keys and the names added to the vocabularies since"""
+        sections = []
+        for names in (keys, self.vocabulary._names[tags_from:], self._agents._names[agents_from:]):
+            text = "\0".join(names)
+            # Names containing the separator cannot be stored this way
+            if text.count("\0") != max(len(names) - 1, 0):
+                return None
+            sections.append(text.encode("utf-8", "surrogatepass"))
+        records = [self._records[key] for key in keys]
+        lengths = array("I", map(len, records)).tobytes()
+        records = b"".join(records)
+        header = _SIDECAR.pack(_SIDECAR_MAGIC, *self._stamp, len(keys), len(self.vocabulary) - tags_from,
+                               len(self._agents) - agents_from, len(sections[0]), len(records), len(sections[1]),
+                               len(sections[2]), self._stale)
+        return [header, sections[0], lengths, records, sections[1], sections[2]]
+        
+    def _write_sidecar(self, path: str):
+        """Keep the records next to the store file they point into; it is only a cache, so failures are ignored"""
+        self._sidecar_size = None
+        parts = self._sidecar_segment(list(self._records), 0, 0)
+        if parts is None:
+            return
+        try:
+            atomic_write(path, lambda f: f.writelines(parts))
+        except OSError:
+            return
+        self._sidecar_size = sum(map(len, parts))
+        self._sidecar_names = (len(self.vocabulary), len(self._agents))
+        
+    def _append_sidecar(self, path: str, keys: List[str]):
+        """Add a segment with the records of appended entries, or write the sidecar again if it is out of step"""
+        if self._sidecar_size is not None:
+            parts = self._sidecar_segment(keys, *self._sidecar_names)
+            try:
+                # Nobody else wrote it since
+                if parts is not None and os.path.getsize(path) == self._sidecar_size:
+                    with open(path, 'ab') as f:
+                        f.writelines(parts)
+                    self._sidecar_size += sum(map(len, parts))
+                    self._sidecar_names = (len(self.vocabulary), len(self._agents))
+                    return
+            except OSError:
+                pass
+        self._write_sidecar(path)
+        
+    def _record(self, entry: Any, offset: int = -1, length: int = 0) -> bytes:
+        if not isinstance(entry, dict):
+            return _RECORD.pack(math.nan, offset, length, 0, *_NO_FINGERPRINT)
+        last_modified = entry.get("last_modified")
+        agent = entry.get("agent")
+        fingerprint = entry.get("fingerprint")
+        if not (isinstance(fingerprint, list) and len(fingerprint) == 3
+                and all(isinstance(value, int) and value >= 0 for value in fingerprint)):
+            fingerprint = _NO_FINGERPRINT
+        header = _RECORD.pack(last_modified if isinstance(last_modified, (int, float)) else math.nan,
+                              offset, length, self._agents.id(agent) + 1 if isinstance(agent, str) else 0,
+                              *fingerprint)
+        return header + self.vocabulary.encode(entry.get("tags", []))
+        
+    def _text(self, path: str, record: bytes) -> bytes:
+        text = self._pending.get(path)
+        if text is not None:
+            return text
+        _, offset, length = _RECORD.unpack_from(record)[:3]
+        with self._lock:
+            if self._source is None:
+                raise ValueError("Metadata store file is closed")
+            self._source.seek(offset)
+            return self._source.read(length)
+            
+    def __getitem__(self, path: str) -> Dict[str, Any]:
+        return json.loads(self._text(path, self._records[path]))
+        
+    def __setitem__(self, path: str, entry: Dict[str, Any]):
+        text = entry_text(entry)
+        record = self._record(entry)
+        with self._lock:
+            replaced = self._records.get(path)
+            if replaced is not None and path not in self._pending:
+                self._replaced += _SPAN.unpack_from(replaced, _SPAN_AT)[1]
+            self._pending[path] = text
+            self._records[path] = record
+            self._dirty = True
+            
+    def __delitem__(self, path: str):
+        with self._lock:
+            del self._records[path]
+            self._pending.pop(path, None)
+            self._dirty = True
+            self._deleted = True
+            
+    def __contains__(self, path) -> bool:
+        return path in self._records
+        
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._records)
+        
+    def __len__(self) -> int:
+        return len(self._records)
+        
+    def last_modified(self, path: str) -> Optional[float]:
+        """Stored modification time of a file without decoding its entry, or None if it is unknown"""
+        record = self._records.get(path)
+        if record is None:
+            return None
+        last_modified = _RECORD.unpack_from(record)[0]
+        return None if math.isnan(last_modified) else last_modified
+        
+    def fingerprint(self, path: str) -> Optional[Tuple[int, int, int]]:
+        """Stored (size, mtime_ns, inode) of a file without decoding its entry, or None if it is unknown"""
+        record = self._records.get(path)
+        if record is None:
+            return None
+        fingerprint = _RECORD.unpack_from(record)[4:]
+        return None if fingerprint[0] < 0 else fingerprint
+        
+    def agent(self, path: str) -> Optional[str]:
+        """Name of the agent that analyzed a file, without decoding its entry"""
+        record = self._records.get(path)
+        agent_id = _RECORD.unpack_from(record)[3] if record is not None else 0
+        return self._agents.name(agent_id - 1) if agent_id else None
+        
+    def tags(self, path: str) -> List[str]:
+        """Tags of a file without decoding its entry"""
+        record = self._records.get(path)
+        return self.vocabulary.decode(record[_RECORD.size:]) if record is not None else []
+        
+    def iter_tags(self) -> Iterator[Tuple[str, List[str]]]:
+        """Yield (path, tags) for every file, for building in-memory indexes"""
+        decode = self.vocabulary.decode
+        for path, record in list(self._records.items()):
+            yield path, decode(record[_RECORD.size:])
+            
+    def modified_since(self, ns: int) -> Optional[Set[str]]:
+        """
+        Files whose entries may have been written at or after a time
+        Args:
+            ns: Wall-clock time in nanoseconds
+        Returns:
+            Keys assigned since the last save or appended to the store file since ns, or None if
+            the file was written whole since then or entries were deleted, which loses track
+        """
+        with self._lock:
+            if self._deleted or self._written_ns is None or self._written_ns >= ns:
+                return None
+            keys = set(self._pending)
+            for written_ns, written in reversed(self._appends):
+                if written_ns < ns:
+                    break
+                keys.update(written)
+            return keys
+            
+    def save(self, path: str):
+        """
+        Write the entries to a store file; afterwards all entries are read from that file
+        Entries assigned since the last save are appended to the file they were loaded from;
+        deletions, or a save to another file, write every entry.
+        """
+        with self._lock:
+            # Nothing to write back to the file the entries were read from
+            if not self._dirty and self._source is not None and self._source.name == path:
+                return
+            if not self._append(path):
+                self._rewrite(path)
+            self._dirty = False
+            
+    def _append(self, path: str) -> bool:
+        """Append the pending entries to the store file in place; False if it has to be written whole"""
+        if self._deleted or not self._pending or self._source is None or self._source.name != path:
+            return False
+        stamp = _file_stamp(self._source)
+        size = stamp[0]
+        stale = self._stale + self._replaced
+        # Compact the file once replaced entries would make up half of it
+        if stamp != self._stamp or stale * 2 > size + sum(map(len, self._pending.values())):
+            return False
+        try:
+            # The file may have been replaced by another one
+            if os.stat(path).st_ino != stamp[3]:
+                return False
+        except OSError:
+            return False
+        end = size - len(_STORE_END)
+        chunks = []
+        spans = []
+        position = end
+        for key, text in self._pending.items():
+            head = b",\n  " + _encode_key(key).encode("ascii") + b": "
+            chunks += (head, text)
+            spans.append((key, position + len(head), len(text)))
+            position += len(head) + len(text)
+        chunks.append(_STORE_END)
+        with open(path, 'r+b', buffering=0) as f:
+            f.seek(end)
+            # An empty store file is "{}"
+            if end <= 0 or f.read(len(_STORE_END)) != _STORE_END:
+                return False
+            f.seek(end)
+            try:
+                data = memoryview(b"".join(chunks))
+                while data:
+                    data = data[f.write(data):]
+            except BaseException:
+                # Put the end of the object back, so the file holds what the last save wrote
+                f.truncate(size)
+                f.seek(end)
+                f.write(_STORE_END)
+                raise
+        self._stamp = _file_stamp(self._source)
+        pack, span_end = _SPAN.pack, _SPAN_AT + _SPAN.size
+        for key, offset, length in spans:
+            record = self._records[key]
+            self._records[key] = record[:_SPAN_AT] + pack(offset, length) + record[span_end:]
+        keys = list(self._pending)
+        self._pending = {}
+        self._stale, self._replaced = stale, 0
+        self._appends.append((_written_ns(self._stamp), keys))
+        self._append_sidecar(path + RECORDS_SUFFIX, keys)
+        return True
+        
+    def _rewrite(self, path: str):
+        """Write every entry to a new store file"""
+        records = list(self._records.items())
+        if self._source is None and len(self._pending) < len(records):
+            raise ValueError("Metadata store file is closed")
+        # Entries already in the store file are copied from it rather than read one by one
+        offsets = write_entries(path, ((key, self._pending.get(key) or _SPAN.unpack_from(record, _SPAN_AT))
+                                       for key, record in records), self._source)
+        if self._source is not None:
+            self._source.close()
+        self._source = open(path, 'rb')
+        pack, pending, end = _SPAN.pack, self._pending, _SPAN_AT + _SPAN.size
+        for (key, record), offset in zip(records, offsets):
+            text = pending.pop(key, None)
+            length = len(text) if text is not None else _SPAN.unpack_from(record, _SPAN_AT)[1]
+            self._records[key] = record[:_SPAN_AT] + pack(offset, length) + record[end:]
+        self._stamp = _file_stamp(self._source)
+        self._written_ns, self._appends = _written_ns(self._stamp), []
+        self._stale = self._replaced = 0
+        self._deleted = False
+        self._write_sidecar(path + RECORDS_SUFFIX)
+        
+    def close(self):
+        """Release the store file; entries not yet saved stay readable"""
+        with self._lock:
+            if self._source is not None:
+                self._source.close()
+                self._source = None
+                
+    def __del__(self):
+        # Like a sqlite3 connection, the store file is released when the mapping is dropped
+        if getattr(self, "_source", None) is not None:
+            self._source.close()
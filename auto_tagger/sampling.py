@@ -0,0 +1,445 @@
+"""
+Bounded-memory sampling of large files.
+
+Agents only send a small sample of each file to the model, so there is no
+reason to load whole files to build it. Every reader here stops as soon as it
+has enough for the sample: CSV heads are read with nrows, JSON documents and
+NDJSON streams are decoded element by element, XML is walked with iterparse
+and XLSX worksheets are streamed straight out of the zip archive. Plain byte
+ranges are read through mmap, so only the pages touched are loaded. Peak
+memory therefore depends on the sample size, not on the file size.
+
+Text samples (read_sample) take a character budget and a strategy: the
+head of the file, its head and tail, or evenly spaced windows. Binary files
+and the encoding are detected from the first few kilobytes, and only the
+bytes that end up in the sample are read and decoded.
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+import codecs
+import json
+import mmap
+import os
+import re
+
+# Characters decoded per read while streaming JSON
+JSON_CHUNK_CHARS = 64 * 1024
+# Largest single JSON value decoded for a sample; bigger values end the sample
+MAX_JSON_VALUE_CHARS = 1024 * 1024
+# XML/XLSX parse events after which sampling stops, whatever it has found
+MAX_XML_EVENTS = 20000
+
+# Bytes inspected to detect binary files and the text encoding
+SNIFF_BYTES = 4096
+# Marker placed between the pieces of head_tail and windows samples
+WINDOW_SEPARATOR = "\n...\n"
+SAMPLE_STRATEGIES = ("head", "head_tail", "windows")
+
+_WHITESPACE = re.compile(r"\s*")
+
+# Byte order marks, longest first so UTF-32 is not mistaken for UTF-16
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"), (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"), (codecs.BOM_UTF16_LE, "utf-16-le"), (codecs.BOM_UTF16_BE, "utf-16-be")
+)
+# Bytes per code unit of the encodings detected; windows must start on a unit boundary
+_UNIT_BYTES = {"utf-16-le": 2, "utf-16-be": 2, "utf-32-le": 4, "utf-32-be": 4}
+
+def read_range(file_path: Path, start: int = 0, length: int = 4096) -> bytes:
+    """
+    Read a byte range of a file through mmap
+    Only the pages covering the range are loaded, however large the file is.
+    Args:
+        file_path: File to read
+        start: Offset of the first byte
+        length: Number of bytes to read (fewer at the end of the file)
+    Returns:
+        The bytes in the range
+    """
+    with open(file_path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return b""
+        except OSError:
+            # Pipes and special files cannot be mapped either
+            f.seek(start)
+            return f.read(length)
+        with mapped:
+            return mapped[start:start + length]
+
+def read_text(file_path: Path, start: int = 0, chars: int = 1500, encoding: str = 'utf-8') -> str:
+    """
+    Decode up to chars characters starting at a byte offset
+    Characters cut by the range boundaries are dropped.
+    """
+    data = read_range(file_path, start, chars * 4)
+    return data.decode(encoding, errors='ignore')[:chars]
+
+def detect_encoding(head: bytes, complete: bool = False) -> Tuple[Optional[str], int]:
+    """
+    Guess the text encoding of a file from its first bytes
+    Args:
+        head: The first bytes of the file (SNIFF_BYTES is plenty)
+        complete: Whether head is the whole file, so a character cut at its end is an error
+    Returns:
+        (encoding, bom_length); encoding is None for binary files
+    """
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding, len(bom)
+    # NUL bytes do not occur in text outside UTF-16/32, which would have a BOM
+    if b"\0" in head:
+        return None, 0
+    try:
+        # Incremental decoding tolerates a character cut at the end of the sniffed bytes
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=complete)
+        return "utf-8", 0
+    except UnicodeDecodeError:
+        # Not UTF-8: treat as a single-byte legacy encoding, which cannot fail to decode
+        return "cp1252", 0
+
+def _decode_span(f, head: bytes, start: int, end: int, chars: int, encoding: str) -> str:
+    """
+    Decode up to chars characters from the bytes in [start, end)
+    Reads grow only as far as needed: one code unit per character is tried
+    first (exact for ASCII), and more is read only if multi-byte characters
+    left the sample short. Bytes already sniffed into head are not re-read.
+    """
+    unit = _UNIT_BYTES.get(encoding, 1)
+    start += (-start) % unit
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pieces: List[str] = []
+    decoded = 0
+    position = start
+    while decoded < chars and position < end:
+        length = min((chars - decoded) * unit, end - position)
+        if position + length <= len(head):
+            data = head[position:position + length]
+        else:
+            f.seek(position)
+            data = f.read(length)
+        if not data:
+            break
+        if position == start and start > 0 and encoding == "utf-8":
+            # Drop the continuation bytes of a character that began before the window
+            skip = 0
+            while skip < min(3, len(data)) and 0x80 <= data[skip] < 0xC0:
+                skip += 1
+            position += skip
+            data = data[skip:]
+        position += len(data)
+        piece = decoder.decode(data)
+        pieces.append(piece)
+        decoded += len(piece)
+    return "".join(pieces)[:chars]
+
+def read_sample(file_path: Path, chars: int, strategy: str = "head", windows: int = 4) -> Optional[str]:
+    """
+    Read a bounded text sample of a file
+    Args:
+        file_path: File to sample
+        chars: Character budget of the whole sample
+        strategy: "head", "head_tail" (half from each end) or "windows" (evenly spaced pieces)
+        windows: Number of pieces for the windows strategy
+    Returns:
+        The sample ("" for an empty file), or None if the file looks binary
+    """
+    if strategy not in SAMPLE_STRATEGIES:
+        raise ValueError(f"Unknown sampling strategy '{strategy}'")
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        head = f.read(min(size, SNIFF_BYTES))
+        encoding, bom = detect_encoding(head, complete=len(head) >= size)
+        if encoding is None:
+            return None
+        unit = _UNIT_BYTES.get(encoding, 1)
+        # Files that fit in the budget are read whole, whatever the strategy
+        if strategy == "head" or size - bom <= chars * unit:
+            return _decode_span(f, head, bom, size, chars, encoding)
+        pieces = 2 if strategy == "head_tail" else max(1, windows)
+        piece_chars = max(1, (chars - len(WINDOW_SEPARATOR) * (pieces - 1)) // pieces)
+        last_start = max(bom, size - piece_chars * unit)
+        starts = [bom + (last_start - bom) * i // max(1, pieces - 1) for i in range(pieces)]
+        return WINDOW_SEPARATOR.join(_decode_span(f, head, start, size, piece_chars, encoding) for start in starts)
+
+class _JSONStream:
+    """Sliding window over incrementally decoded file text for raw_decode"""
+    
+    def __init__(self, f, max_value_chars: int):
+        self.f = f
+        self.max_value_chars = max_value_chars
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+        
+    def fill(self) -> bool:
+        """Append the next chunk, dropping text already consumed"""
+        if self.eof:
+            return False
+        chunk = self.f.read(JSON_CHUNK_CHARS)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+        
+    def peek(self) -> str:
+        """Skip whitespace and return the next character ('' at the end of the file)"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+                
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos}")
+        self.pos += 1
+        
+    def value(self) -> Any:
+        """Decode the next JSON value, reading more text until it is complete"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                value, end = None, -1
+            # A number running into the end of the buffer may continue in the next chunk
+            truncated = end == len(self.buffer) and isinstance(value, (int, float)) and not isinstance(value, bool)
+            if end >= 0 and not (truncated and not self.eof):
+                self.pos = end
+                return value
+            if len(self.buffer) - self.pos > self.max_value_chars:
+                raise ValueError("JSON value too large to sample")
+            if not self.fill() and end < 0:
+                raise ValueError("Truncated or invalid JSON")
+
+def sample_json(file_path: Path, items: int = 5, lines: bool = False,
+                max_value_chars: int = MAX_JSON_VALUE_CHARS) -> Optional[str]:
+    """
+    Sample the first items of a JSON document or NDJSON stream without loading it
+    Args:
+        file_path: JSON or JSON Lines file
+        items: Number of array elements, object members or NDJSON records to keep
+        lines: Treat the file as a stream of documents (JSON Lines) even if it starts with an object
+        max_value_chars: Largest single value decoded
+    Returns:
+        The first object members as a dict, or the first elements/records as a
+        list, rendered with str(); None if nothing could be decoded
+    """
+    members: Dict[str, Any] = {}
+    values: List[Any] = []
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        stream = _JSONStream(f, max_value_chars)
+        first = stream.peek()
+        try:
+            if first == '{' and not lines:
+                stream.expect('{')
+                while len(members) < items and stream.peek() not in ('}', ''):
+                    key = stream.value()
+                    stream.expect(':')
+                    members[key] = stream.value()
+                    if stream.peek() == ',':
+                        stream.pos += 1
+            elif first == '[' and not lines:
+                stream.expect('[')
+                while len(values) < items and stream.peek() not in (']', ''):
+                    values.append(stream.value())
+                    if stream.peek() == ',':
+                        stream.pos += 1
+            else:
+                # One value per line (NDJSON) or several concatenated documents
+                while len(values) < items and stream.peek():
+                    values.append(stream.value())
+        except ValueError:
+            # Keep whatever was decoded before an oversized or malformed value
+            if not members and not values:
+                return None
+    if lines or first not in ('{', '['):
+        return str(values) if values else None
+    return str(members) if first == '{' else str(values)
+
+def _local_name(tag: str) -> str:
+    """Element tag without its namespace"""
+    return tag.rsplit('}', 1)[-1]
+
+def _render_attributes(element) -> str:
+    return "".join(f' {_local_name(key)}="{value}"' for key, value in list(element.attrib.items())[:5])
+
+def sample_xml(file_path: Path, records: int = 5, max_fields: int = 10) -> Optional[str]:
+    """
+    Sample the root and its first child elements with iterparse
+    Finished records are cleared as the parse goes, and parsing stops after
+    the requested number of records.
+    Args:
+        file_path: XML file
+        records: Number of children of the root element to describe
+        max_fields: Number of sub-elements shown per record
+    Returns:
+        One line for the root and one per record, or None if the file is not XML
+    """
+    from xml.etree.ElementTree import iterparse, ParseError
+    lines: List[str] = []
+    fields: List[str] = []
+    root = None
+    depth = 0
+    with open(file_path, 'rb') as f:
+        try:
+            for events, (event, element) in enumerate(iterparse(f, events=("start", "end"))):
+                if event == "start":
+                    depth += 1
+                    if depth == 1:
+                        root = element
+                        lines.append(f"Root: <{_local_name(element.tag)}{_render_attributes(element)}>")
+                    elif depth == 2:
+                        fields = []
+                else:
+                    if depth == 3 and len(fields) < max_fields:
+                        fields.append(f"{_local_name(element.tag)}={(element.text or '').strip()[:80]}")
+                    elif depth == 2:
+                        description = ", ".join(fields) or (element.text or "").strip()[:200]
+                        lines.append(f"<{_local_name(element.tag)}{_render_attributes(element)}> {description}")
+                        # Drop the finished record so memory does not grow with the file
+                        root.clear()
+                        if len(lines) > records:
+                            break
+                    depth -= 1
+                if events >= MAX_XML_EVENTS:
+                    break
+        except ParseError:
+            if not lines:
+                return None
+    return "\n".join(lines) if lines else None
+
+_RELATIONSHIP_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+_CELL_REFERENCE = re.compile(r"([A-Z]+)")
+
+def _column_index(reference: Optional[str]) -> Optional[int]:
+    """Zero-based column of a cell reference such as 'C7'"""
+    match = _CELL_REFERENCE.match(reference or "")
+    if not match:
+        return None
+    index = 0
+    for letter in match.group(1):
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+def _first_sheet(archive) -> Tuple[str, str]:
+    """Name and archive path of the workbook's first worksheet"""
+    from xml.etree.ElementTree import fromstring
+    try:
+        workbook = fromstring(archive.read("xl/workbook.xml"))
+        sheet = next(element for element in workbook.iter() if _local_name(element.tag) == "sheet")
+        relationships = fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+        target = next(element.get("Target") for element in relationships
+                      if element.get("Id") == sheet.get(_RELATIONSHIP_ID))
+        path = target.lstrip('/') if target.startswith('/') else f"xl/{target}"
+        return sheet.get("name", "Sheet1"), path
+    except (KeyError, StopIteration):
+        return "Sheet1", "xl/worksheets/sheet1.xml"
+
+def _shared_strings(archive, needed: Set[int]) -> Dict[int, str]:
+    """Stream the shared string table just far enough to resolve the needed indices"""
+    from xml.etree.ElementTree import iterparse
+    strings: Dict[int, str] = {}
+    if not needed:
+        return strings
+    last = max(needed)
+    try:
+        f = archive.open("xl/sharedStrings.xml")
+    except KeyError:
+        return strings
+    with f:
+        index = 0
+        for _, element in iterparse(f, events=("end",)):
+            if _local_name(element.tag) != "si":
+                continue
+            if index in needed:
+                strings[index] = "".join(part.text or "" for part in element.iter()
+                                         if _local_name(part.tag) == "t")
+            element.clear()
+            index += 1
+            if index > last:
+                break
+    return strings
+
+def sample_xlsx(file_path: Path, rows: int = 5, max_columns: int = 10) -> Optional[str]:
+    """
+    Sample the first rows of the first worksheet of an XLSX workbook
+    The worksheet XML is streamed out of the archive and only the shared
+    strings those rows refer to are resolved, so neither the sheet nor the
+    string table is loaded in full. Needs no third-party packages.
+    Args:
+        file_path: XLSX workbook
+        rows: Number of rows to read, the first being treated as the header
+        max_columns: Number of columns shown
+    Returns:
+        Sheet name, columns and sample rows, or None if the file is not a workbook
+    """
+    import zipfile
+    from xml.etree.ElementTree import iterparse, ParseError
+    try:
+        archive = zipfile.ZipFile(file_path)
+    except (zipfile.BadZipFile, OSError):
+        return None
+    with archive:
+        sheet_name, sheet_path = _first_sheet(archive)
+        # Cell values are strings, or ints indexing the shared string table
+        table: List[Dict[int, Any]] = []
+        needed: Set[int] = set()
+        try:
+            with archive.open(sheet_path) as f:
+                for events, (_, element) in enumerate(iterparse(f, events=("end",))):
+                    if _local_name(element.tag) == "row":
+                        cells: Dict[int, Any] = {}
+                        for cell in element:
+                            if _local_name(cell.tag) != "c":
+                                continue
+                            column = _column_index(cell.get("r"))
+                            column = len(cells) if column is None else column
+                            if column >= max_columns:
+                                continue
+                            kind = cell.get("t")
+                            if kind == "inlineStr":
+                                cells[column] = "".join(part.text or "" for part in cell.iter()
+                                                        if _local_name(part.tag) == "t")
+                                continue
+                            value = next((part.text or "" for part in cell if _local_name(part.tag) == "v"), "")
+                            if kind == "s" and value.isdigit():
+                                # Index into the shared string table, resolved once the rows are read
+                                needed.add(int(value))
+                                cells[column] = int(value)
+                            elif kind == "b":
+                                cells[column] = "TRUE" if value == "1" else "FALSE"
+                            else:
+                                cells[column] = value
+                        table.append(cells)
+                        element.clear()
+                        if len(table) >= rows:
+                            break
+                    if events >= MAX_XML_EVENTS:
+                        break
+        except (KeyError, ParseError):
+            return None
+        strings = _shared_strings(archive, needed)
+    if not table:
+        return None
+    width = max((max(cells) + 1 for cells in table if cells), default=0)
+    
+    def render(cells: Dict[int, Any]) -> List[str]:
+        values = []
+        for column in range(width):
+            value = cells.get(column, "")
+            if isinstance(value, int):
+                value = strings.get(value, "")
+            values.append(str(value))
+        return values
+        
+    header = render(table[0])
+    body = "\n".join(", ".join(render(cells)) for cells in table[1:])
+    return f"Sheet: {sheet_name}\nColumns: {', '.join(header)}\nSample data:\n{body}"
@@ -0,0 +1,347 @@
+"""
+Rate-limit and token-budget aware request scheduling.
+
+Every model request made by the agents goes through one RequestScheduler, so
+concurrent workers share a single view of the account's limits instead of
+each discovering them through 429 responses. Requests are admitted by two
+token buckets, one for requests per minute and one for tokens per minute,
+where a request's token cost is estimated from its prompt and max_tokens and
+corrected with the usage the API reports. Throttled and transiently failed
+requests are retried with jittered exponential backoff, honouring the
+server's Retry-After, and a 429 pauses admission for every lane.
+
+Waiting requests are admitted by priority lane first and arrival order
+second, so interactive single-file requests overtake a bulk backfill.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import heapq
+import itertools
+import random
+import threading
+import time
+from .batching import estimate_tokens
+
+# Priority lanes; lower values are admitted first
+INTERACTIVE = 0
+BULK = 1
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+# Extra prompt tokens per chat message for role and separators
+TOKENS_PER_MESSAGE = 4
+
+# How often async waiters behind another request re-check their turn
+_ASYNC_POLL_INTERVAL = 0.01
+
+_current_priority: ContextVar[int] = ContextVar("auto_tagger_priority", default=INTERACTIVE)
+
+@contextmanager
+def priority_lane(priority: int):
+    """Submit requests made in this context (thread or task) with the given priority"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+def estimate_request_tokens(params: Dict[str, Any]) -> int:
+    """Estimated token cost of a chat completion: its prompt plus the completion it may produce"""
+    prompt = sum(estimate_tokens(message.get("content") or "") + TOKENS_PER_MESSAGE
+                 for message in params.get("messages", []))
+    return prompt + (params.get("max_tokens") or 0)
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait before retrying, if it said"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def is_rate_limit(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed request may succeed if sent again"""
+    # An exhausted quota is reported as a 429 but will not clear up by waiting
+    if getattr(error, "code", None) == "insufficient_quota":
+        return False
+    if getattr(error, "status_code", None) in RETRYABLE_STATUSES:
+        return True
+    # Connection failures and timeouts (matched by name so openai is not imported here)
+    return any(cls.__name__ == "APIConnectionError" for cls in type(error).__mro__)
+
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        """
+        Args:
+            per_minute: Refill rate in units per minute
+            capacity: Largest burst; defaults to one minute's worth
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken (0 when it can be taken now)"""
+        self._refill(now)
+        # A request larger than the bucket is admitted once the bucket is full
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+        
+    def consume(self, amount: float):
+        """Take amount; the level may go negative, which delays later requests"""
+        self.level -= amount
+        
+    def refund(self, amount: float):
+        """Give back an over-estimate (or take more for a negative amount)"""
+        self.level = min(self.capacity, self.level + amount)
+
+class RequestScheduler:
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0):
+        """
+        Args:
+            requests_per_minute: Request budget (None for unlimited)
+            tokens_per_minute: Token budget (None for unlimited)
+            max_retries: Retries of a throttled or transiently failed request before giving up
+            base_delay: Backoff before the first retry when the server gives no Retry-After
+            max_delay: Upper bound of the exponential backoff
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._buckets: List[Tuple[TokenBucket, bool]] = []
+        if requests_per_minute:
+            self._buckets.append((TokenBucket(requests_per_minute), False))
+        self._token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        if self._token_bucket is not None:
+            self._buckets.append((self._token_bucket, True))
+        self._cond = threading.Condition()
+        self._waiting: List[Tuple[int, int]] = []
+        self._order = itertools.count()
+        self._paused_until = 0.0
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.queued_seconds = 0.0
+        self.estimated_tokens = 0
+        self.used_tokens = 0
+        
+    def _poll(self, ticket: Tuple[int, int], tokens: int) -> Optional[float]:
+        """
+        Try to admit a waiting request; the caller holds the lock
+        Returns:
+            0 when admitted, seconds to wait when it is next in line, or None
+            when another request is ahead of it
+        """
+        if self._waiting[0] is not ticket:
+            return None
+        now = time.monotonic()
+        delay = self._paused_until - now
+        for bucket, counts_tokens in self._buckets:
+            delay = max(delay, bucket.delay(tokens if counts_tokens else 1, now))
+        if delay > 0:
+            return delay
+        for bucket, counts_tokens in self._buckets:
+            bucket.consume(tokens if counts_tokens else 1)
+        heapq.heappop(self._waiting)
+        self._cond.notify_all()
+        return 0
+        
+    def _enqueue(self, priority: int, order: int) -> Tuple[int, int]:
+        ticket = (priority, order)
+        heapq.heappush(self._waiting, ticket)
+        # The new request may now be first in line
+        self._cond.notify_all()
+        return ticket
+        
+    def _withdraw(self, ticket: Tuple[int, int]):
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            self._cond.notify_all()
+            
+    def acquire(self, tokens: int, priority: Optional[int] = None, order: Optional[int] = None):
+        """
+        Block until a request costing tokens may be sent
+        Args:
+            tokens: Estimated token cost of the request
+            priority: Lane to wait in; defaults to the current priority_lane
+            order: Position within the lane; defaults to arrival order
+        """
+        priority = _current_priority.get() if priority is None else priority
+        order = next(self._order) if order is None else order
+        started = time.monotonic()
+        with self._cond:
+            ticket = self._enqueue(priority, order)
+            try:
+                while True:
+                    delay = self._poll(ticket, tokens)
+                    if delay == 0:
+                        break
+                    self._cond.wait(delay)
+            except BaseException:
+                self._withdraw(ticket)
+                raise
+            self.queued_seconds += time.monotonic() - started
+            
+    async def acquire_async(self, tokens: int, priority: Optional[int] = None, order: Optional[int] = None):
+        """Asynchronous counterpart of acquire that waits without blocking the event loop"""
+        import asyncio
+        priority = _current_priority.get() if priority is None else priority
+        order = next(self._order) if order is None else order
+        started = time.monotonic()
+        with self._cond:
+            ticket = self._enqueue(priority, order)
+        try:
+            while True:
+                with self._cond:
+                    delay = self._poll(ticket, tokens)
+                if delay == 0:
+                    break
+                await asyncio.sleep(_ASYNC_POLL_INTERVAL if delay is None else delay)
+        except BaseException:
+            with self._cond:
+                self._withdraw(ticket)
+            raise
+        with self._cond:
+            self.queued_seconds += time.monotonic() - started
+            
+    def backoff(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """Seconds to wait before retry number attempt (counting from 0)"""
+        if error is not None:
+            delay = retry_after(error)
+            if delay is not None:
+                return delay
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        # Equal jitter: keep half the delay and randomize the rest so retries spread out
+        return delay / 2 + random.uniform(0, delay / 2)
+        
+    def _settle(self, estimated: int, response: Any):
+        """Record a completed request and correct the token bucket with its reported usage"""
+        usage = getattr(response, "usage", None)
+        used = getattr(usage, "total_tokens", None)
+        with self._cond:
+            self.requests += 1
+            self.estimated_tokens += estimated
+            if isinstance(used, int):
+                self.used_tokens += used
+                if self._token_bucket is not None:
+                    self._token_bucket.refund(estimated - used)
+                    
+    def _on_failure(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying a failed request, or None to give up"""
+        with self._cond:
+            if not is_retryable(error) or attempt >= self.max_retries:
+                self.failures += 1
+                return None
+            self.retries += 1
+            delay = self.backoff(attempt, error)
+            if is_rate_limit(error):
+                # The limit is shared, so hold back every lane rather than just this request
+                self.rate_limited += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            return delay
+            
+    def submit(self, call: Callable[[], Any], tokens: int, priority: Optional[int] = None) -> Any:
+        """
+        Send a request once the budgets allow it, retrying transient failures
+        Args:
+            call: Sends the request and returns the response
+            tokens: Estimated token cost of the request
+            priority: Lane to wait in; defaults to the current priority_lane
+        Returns:
+            The response of the first successful attempt
+        Raises:
+            The last error once it is not retryable or retries are exhausted
+        """
+        order = next(self._order)
+        attempt = 0
+        while True:
+            self.acquire(tokens, priority, order)
+            try:
+                response = call()
+            except Exception as e:
+                delay = self._on_failure(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self._settle(tokens, response)
+            return response
+            
+    async def submit_async(self, call: Callable[[], Awaitable[Any]], tokens: int,
+                           priority: Optional[int] = None) -> Any:
+        """Asynchronous counterpart of submit; call returns an awaitable for each attempt"""
+        import asyncio
+        order = next(self._order)
+        attempt = 0
+        while True:
+            await self.acquire_async(tokens, priority, order)
+            try:
+                response = await call()
+            except Exception as e:
+                delay = self._on_failure(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self._settle(tokens, response)
+            return response
+            
+    def summary(self) -> Dict[str, Any]:
+        """Counters describing the requests sent so far"""
+        with self._cond:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "failures": self.failures,
+                "queued_seconds": self.queued_seconds,
+                "estimated_tokens": self.estimated_tokens,
+                "used_tokens": self.used_tokens
+            }
+
+_default_scheduler: Optional[RequestScheduler] = None
+_default_scheduler_lock = threading.Lock()
+
+def default_scheduler() -> RequestScheduler:
+    """Process-wide scheduler (no rate budgets, retries only) used by agents not attached to a swarm"""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = RequestScheduler()
+        return _default_scheduler
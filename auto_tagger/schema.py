@@ -0,0 +1,153 @@
+"""
+Structured analysis output.
+
+Model-backed agents ask for a JSON object with typed fields instead of free
+text, using OpenAI structured outputs (response_format json_schema, strict), so
+tags are the model's chosen tags rather than the first long words of a prose
+answer. parse_analysis() validates and normalizes an answer; when it fails, the
+agent sends only the invalid answer and the validation error back for a
+correction (see correction_messages) instead of re-sending the file.
+"""
+from typing import Any, Dict, List, Optional
+import json
+import re
+
+MAX_TAGS = 5
+MAX_COMPONENTS = 5
+MAX_TAG_LENGTH = 32
+MAX_PURPOSE_LENGTH = 200
+
+ANALYSIS_FIELDS = ("language", "purpose", "components", "tags")
+
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "language": {"type": "string", "description": "Language or format of the file"},
+        "purpose": {"type": "string", "description": "What the file is for, in one short sentence"},
+        "components": {"type": "array", "items": {"type": "string"},
+                       "description": f"Up to {MAX_COMPONENTS} key parts: classes, functions, sections or fields"},
+        "tags": {"type": "array", "items": {"type": "string"},
+                 "description": f"1 to {MAX_TAGS} short lowercase topic tags"}
+    },
+    "required": list(ANALYSIS_FIELDS),
+    "additionalProperties": False
+}
+
+BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "files": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": dict({"id": {"type": "integer"}}, **ANALYSIS_SCHEMA["properties"]),
+                "required": ["id"] + list(ANALYSIS_FIELDS),
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["files"],
+    "additionalProperties": False
+}
+
+FORMAT_INSTRUCTIONS = (
+    "Respond with only a JSON object with the fields language (string), purpose (string, one sentence), "
+    f"components (list of at most {MAX_COMPONENTS} strings) and tags (list of 1 to {MAX_TAGS} short lowercase tags)."
+)
+
+class SchemaError(ValueError):
+    """A model answer that does not match the analysis schema"""
+    pass
+
+def response_format(batch: bool = False) -> Dict[str, Any]:
+    """response_format argument for chat.completions.create"""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "file_batch_analysis" if batch else "file_analysis",
+            "strict": True,
+            "schema": BATCH_SCHEMA if batch else ANALYSIS_SCHEMA
+        }
+    }
+
+def normalize_tag(tag: str) -> str:
+    """Lowercase, hyphenate inner whitespace and trim punctuation: "Web Server:" -> "web-server" """
+    tag = re.sub(r"\s+", "-", tag.strip().lower())
+    return tag.strip("-_.,:;!?\"'`#*()[]{}")[:MAX_TAG_LENGTH]
+
+def _strings(value: Any, field: str, errors: List[str]) -> List[str]:
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        errors.append(f"{field} must be a list of strings")
+        return []
+    return value
+
+def validate(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Check and normalize analysis fields, from a model answer or a local backend
+    Args:
+        payload: Mapping with the analysis fields
+    Returns:
+        The normalized fields: tags deduplicated, normalized and capped, lists capped
+    Raises:
+        SchemaError naming every problem
+    """
+    errors = [f"missing field {field}" for field in ANALYSIS_FIELDS if field not in payload]
+    for field in ("language", "purpose"):
+        if field in payload and not isinstance(payload[field], str):
+            errors.append(f"{field} must be a string")
+    components = _strings(payload.get("components", []), "components", errors)
+    tags = []
+    for tag in _strings(payload.get("tags", []), "tags", errors):
+        tag = normalize_tag(tag)
+        if tag and tag not in tags:
+            tags.append(tag)
+    if errors:
+        raise SchemaError("; ".join(errors))
+    return {
+        "language": payload["language"].strip(),
+        "purpose": payload["purpose"].strip()[:MAX_PURPOSE_LENGTH],
+        "components": [component.strip() for component in components if component.strip()][:MAX_COMPONENTS],
+        "tags": tags[:MAX_TAGS]
+    }
+
+def parse_analysis(text: Optional[str]) -> Dict[str, Any]:
+    """
+    Validate a model answer against the analysis schema
+    Args:
+        text: Raw model output
+    Returns:
+        The normalized fields, see validate
+    Raises:
+        SchemaError naming every problem, to be sent back for a correction
+    """
+    # Tolerate a Markdown code fence around the JSON
+    text = re.sub(r"^\s*```(?:json)?\s*|\s*```\s*$", "", text or "")
+    try:
+        payload = json.loads(text)
+    except ValueError as e:
+        raise SchemaError(f"not valid JSON ({e.msg})")
+    if not isinstance(payload, dict):
+        raise SchemaError("expected a JSON object")
+    fields = validate(payload)
+    # A model must choose some tag; a local backend may find none in an empty sample
+    if not fields["tags"]:
+        raise SchemaError("tags must contain at least one non-empty tag")
+    return fields
+
+def dump_analysis(fields: Dict[str, Any]) -> str:
+    """Compact JSON form of validated fields, as stored in the result cache"""
+    return json.dumps({field: fields[field] for field in ANALYSIS_FIELDS}, separators=(",", ":"))
+
+def correction_messages(system_prompt: str, answer: str, error: Exception) -> List[Dict[str, str]]:
+    """
+    Messages asking the model to fix an invalid answer
+    Only the answer and what is wrong with it are sent, not the file sample,
+    so a correction costs a fraction of the original request.
+    """
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": (
+            f"This file analysis does not match the required format: {error}.\n"
+            f"{FORMAT_INSTRUCTIONS}\nKeep its content and fix only the format.\n\n{answer}"
+        )}
+    ]
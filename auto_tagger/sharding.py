@@ -0,0 +1,143 @@
+"""
+Sharded directory runs across processes and machines.
+
+A run is split into N shards by a stable hash of each file's path relative to
+the processed directory, so every node (or process) that walks the same tree
+agrees on which files are its own without coordinating. Each shard writes its
+own partial metadata store next to the main one, and merge_stores() combines
+shard outputs into the main store, keeping the entry with the newest
+last_modified when several shards analyzed the same path.
+
+run_local_shards() launches one process per shard on this machine and merges
+the results, going through exactly the code path a multi-node run uses.
+"""
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+import hashlib
+import re
+from .storage import MetadataStore, open_store
+
+# Partial stores written by shard_path(), never tagged themselves
+SHARD_STORE_NAME = re.compile(r"\.shard-\d+-of-\d+\.[^.]+$")
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """
+    Parse an "i/N" shard spec
+    Returns:
+        (index, count) with 0 <= index < count
+    Raises:
+        ValueError for malformed specs
+    """
+    index, separator, count = value.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, got '{value}'")
+    if not separator or count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index must be in 0..N-1, got '{value}'")
+    return index, count
+
+def shard_of(relative_path: str, count: int) -> int:
+    """Shard a path belongs to; stable across processes, machines and Python versions"""
+    digest = hashlib.blake2b(relative_path.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % count
+
+def shard_path(path: str, index: int, count: int) -> str:
+    """Per-shard variant of a store path, e.g. metadata.json -> metadata.shard-1-of-4.json"""
+    path = Path(path)
+    return str(path.with_name(f"{path.stem}.shard-{index}-of-{count}{path.suffix}"))
+
+def merge_stores(sources: Iterable[MetadataStore], target: MetadataStore) -> Dict[str, int]:
+    """
+    Merge shard outputs into a target store, last writer wins on last_modified
+    An incoming entry replaces the stored one unless the stored entry has a
+    newer last_modified; sources are applied in order.
+    Args:
+        sources: Shard stores to read
+        target: Store to update
+    Returns:
+        Counts of merged and skipped (older) entries
+    """
+    metadata = target.load()
+    merged = skipped = 0
+    for source in sources:
+        for file_key, entry in source.load().items():
+            current = metadata.get(file_key)
+            if current is not None and (current.get("last_modified") or 0) > (entry.get("last_modified") or 0):
+                skipped += 1
+                continue
+            metadata[file_key] = entry
+            merged += 1
+    target.save(metadata)
+    return {"merged": merged, "skipped": skipped}
+
+def _run_shard(directory: str, index: int, count: int, options: Dict[str, Any]) -> Tuple[str, int]:
+    """Process one shard in a worker process; returns its store path and file count"""
+    from .swarm_controller import SwarmController
+    from .scheduler import RequestScheduler
+    from .cache import DEFAULT_MAX_BYTES, DEFAULT_SHARED_CACHE_FILE
+    rpm, tpm = options.get("rpm"), options.get("tpm")
+    store = open_store(shard_path(options["metadata"], index, count), options.get("store"))
+    swarm = SwarmController(
+        cache_max_bytes=options.get("cache_max_bytes", DEFAULT_MAX_BYTES),
+        # One SQLite cache shared by every shard, so answers and in-flight requests are reused across processes
+        cache_file=options.get("cache_file") or DEFAULT_SHARED_CACHE_FILE,
+        store=store,
+        ignore_patterns=options.get("ignore_patterns"),
+        use_gitignore=options.get("use_gitignore", True),
+        # The account's limits are shared by every shard
+        scheduler=RequestScheduler(rpm / count if rpm else None, tpm / count if tpm else None),
+        backend=options.get("backend"),
+        use_git=options.get("use_git", False)
+    )
+    try:
+        if options.get("use_async"):
+            import asyncio
+            files = len(asyncio.run(swarm.process_directory_async(
+                Path(directory), options.get("recursive", True),
+                max_concurrency=options.get("max_workers", 100), shard=(index, count),
+                full_scan=options.get("full_scan", False)
+            )))
+        else:
+            files = len(swarm.process_directory(
+                Path(directory), options.get("recursive", True), max_workers=options.get("max_workers", 1),
+                batch_tokens=options.get("batch_tokens", 0), shard=(index, count),
+                full_scan=options.get("full_scan", False)
+            ))
+    finally:
+        store.close()
+        if swarm.cache is not None:
+            swarm.cache.close()
+    return store.path, files
+
+def run_local_shards(directory: Path, processes: int, metadata: str = "metadata.json",
+                     store: Optional[str] = None, **options) -> Dict[str, int]:
+    """
+    Run a directory as one shard per local process, then merge the shards
+    Args:
+        directory: Directory to process
+        processes: Number of shards, and of worker processes
+        metadata: Main store path; shards write next to it
+        store: "json" or "sqlite" (inferred from the path when omitted)
+        options: SwarmController / process_directory settings (recursive, max_workers, batch_tokens,
+            use_async, cache_max_bytes, cache_file, ignore_patterns, use_gitignore, backend, rpm, tpm, use_git, full_scan)
+    Returns:
+        Files processed per shard summed under "files", plus the merge counts
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+    options = dict(options, metadata=metadata, store=store)
+    # spawn: workers must not inherit the parent's threads or open database handles
+    with ProcessPoolExecutor(max_workers=processes, mp_context=get_context("spawn")) as executor:
+        futures = [executor.submit(_run_shard, str(directory), index, processes, options)
+                   for index in range(processes)]
+        outcomes = [future.result() for future in futures]
+    sources = [open_store(path, store) for path, _ in outcomes]
+    target = open_store(metadata, store)
+    try:
+        summary = merge_stores(sources, target)
+    finally:
+        for source in sources + [target]:
+            source.close()
+    summary["files"] = sum(files for _, files in outcomes)
+    return summary
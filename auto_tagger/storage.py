@@ -0,0 +1,321 @@
+"""
+Pluggable metadata storage for the SwarmController.
+
+JSONMetadataStore keeps the original single metadata.json, loaded into the
+compact records of records.py, to which saves append the entries that
+changed. SQLiteMetadataStore keeps files, tags and a file<->tag join table
+in SQLite, so entries are read on demand and each processed file is
+upserted on its own instead of rewriting the whole store.
+"""
+from abc import ABC, abstractmethod
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import json
+import sqlite3
+import threading
+import weakref
+from .records import JSONMetadata, entry_text, write_entries
+
+class MetadataStore(ABC):
+    def __init__(self, path: str):
+        self.path = path
+        # Weak references, so views nobody holds any more are not read on close (mappings are unhashable)
+        self._views: List[weakref.ref] = []
+        
+    @abstractmethod
+    def load(self) -> MutableMapping:
+        """
+        Load the stored metadata
+        Returns:
+            Mapping of file path to its metadata entry
+        """
+        pass
+        
+    @abstractmethod
+    def save(self, metadata: MutableMapping):
+        """
+        Persist metadata
+        Args:
+            metadata: Mapping returned by load (possibly updated) or a replacement dictionary
+        """
+        pass
+        
+    def keep_readable(self, view):
+        """
+        Have a lazy view of the loaded metadata outlive it
+        Args:
+            view: Object whose detach() reads what it needs from the metadata; called before it is released
+        """
+        self._views = [ref for ref in self._views if ref() is not None] + [weakref.ref(view)]
+        
+    def _detach_views(self):
+        views, self._views = self._views, []
+        for ref in views:
+            view = ref()
+            if view is not None:
+                view.detach()
+                
+    def close(self):
+        """Release any resources held by the store"""
+        self._detach_views()
+
+class JSONMetadataStore(MetadataStore):
+    """Single JSON document, loaded into compact records and extended with the entries each save changes"""
+    def __init__(self, path: str = "metadata.json"):
+        super().__init__(path)
+        self._mapping: Optional[JSONMetadata] = None
+        
+    def load(self) -> MutableMapping:
+        """Load existing metadata if available; analyses are read from the file on demand"""
+        self.close()
+        self._mapping = JSONMetadata(self.path)
+        return self._mapping
+        
+    def save(self, metadata: MutableMapping):
+        """
+        Save metadata without ever leaving the file unreadable
+        The loaded mapping appends what changed and undoes a failed append (see
+        JSONMetadata.save); a replacement dictionary is written atomically.
+        """
+        if isinstance(metadata, JSONMetadata):
+            metadata.save(self.path)
+        else:
+            write_entries(self.path, ((path, entry_text(entry)) for path, entry in metadata.items()))
+            
+    def close(self):
+        """Release the store file held by the loaded mapping"""
+        self._detach_views()
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    agent TEXT,
+    last_modified REAL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    norm TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS file_tags (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    tag_id INTEGER NOT NULL REFERENCES tags(id),
+    position INTEGER NOT NULL,
+    PRIMARY KEY (file_id, position)
+);
+-- Path lookups use the index behind files.path's UNIQUE constraint; stores created before
+-- that was relied on also had a copy of it, which only slowed down writes
+DROP INDEX IF EXISTS idx_files_path;
+CREATE INDEX IF NOT EXISTS idx_tags_norm ON tags(norm);
+CREATE INDEX IF NOT EXISTS idx_file_tags_tag ON file_tags(tag_id);
+"""
+
+class SQLiteMetadata(MutableMapping):
+    """
+    Dictionary view over a SQLiteMetadataStore
+    Reads go to the database on demand and assignments are upserted
+    immediately; they become durable when the store is saved. Entries are
+    returned as fresh dictionaries, so mutate them by assigning them back.
+    """
+    def __init__(self, store: "SQLiteMetadataStore"):
+        self._store = store
+        
+    def __getitem__(self, path: str) -> Dict[str, Any]:
+        entry = self._store.get(path)
+        if entry is None:
+            raise KeyError(path)
+        return entry
+        
+    def __setitem__(self, path: str, entry: Dict[str, Any]):
+        self._store.upsert(path, entry)
+        
+    def __delitem__(self, path: str):
+        if not self._store.delete(path):
+            raise KeyError(path)
+            
+    def __contains__(self, path) -> bool:
+        return self._store.contains(path)
+        
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._store.paths())
+        
+    def __len__(self) -> int:
+        return self._store.count()
+        
+    def last_modified(self, path: str) -> Optional[float]:
+        """Stored modification time of a file without loading its entry, or None if it is unknown"""
+        return self._store.last_modified(path)
+        
+    def fingerprint(self, path: str) -> Optional[Tuple[int, int, int]]:
+        """Stored (size, mtime_ns, inode) of a file, or None if it is unknown"""
+        return self._store.fingerprint(path)
+        
+    def iter_tags(self) -> Iterator[Tuple[str, List[str]]]:
+        """Yield (path, tags) for every file with a single query, for building in-memory indexes"""
+        return iter(self._store.all_tags())
+
+class SQLiteMetadataStore(MetadataStore):
+    """Indexed SQLite store with per-file upserts"""
+    def __init__(self, path: str = "metadata.db"):
+        super().__init__(path)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._mapping = SQLiteMetadata(self)
+        
+    def load(self) -> MutableMapping:
+        """Return a lazy mapping over the database"""
+        return self._mapping
+        
+    def save(self, metadata: MutableMapping):
+        """Commit pending upserts, or replace the contents with a plain dictionary"""
+        with self._lock:
+            if metadata is not self._mapping:
+                stale = set(self.paths()) - set(metadata.keys())
+                for path in stale:
+                    self.delete(path)
+                for path, entry in metadata.items():
+                    self.upsert(path, entry)
+            self._conn.commit()
+            
+    def close(self):
+        self._detach_views()
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+            
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        """Fetch a single entry, or None if the path is unknown"""
+        with self._lock:
+            row = self._conn.execute("SELECT id, data FROM files WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                return None
+            tags = [name for (name,) in self._conn.execute(
+                "SELECT t.name FROM file_tags ft JOIN tags t ON t.id = ft.tag_id "
+                "WHERE ft.file_id = ? ORDER BY ft.position", (row[0],)
+            )]
+        entry = {"tags": tags}
+        entry.update(json.loads(row[1]))
+        return entry
+        
+    def contains(self, path: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM files WHERE path = ?", (path,)).fetchone() is not None
+            
+    def last_modified(self, path: str) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute("SELECT last_modified FROM files WHERE path = ?", (path,)).fetchone()
+        return row[0] if row is not None else None
+        
+    def fingerprint(self, path: str) -> Optional[Tuple[int, int, int]]:
+        with self._lock:
+            row = self._conn.execute("SELECT json_extract(data, '$.fingerprint') FROM files WHERE path = ?",
+                                     (path,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return tuple(json.loads(row[0]))
+        
+    def paths(self) -> List[str]:
+        with self._lock:
+            return [path for (path,) in self._conn.execute("SELECT path FROM files ORDER BY id")]
+            
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            
+    def all_tags(self) -> List[Tuple[str, List[str]]]:
+        """(path, tags) for every file, in insertion order"""
+        grouped: Dict[str, List[str]] = {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT f.path, t.name FROM files f "
+                "LEFT JOIN file_tags ft ON ft.file_id = f.id LEFT JOIN tags t ON t.id = ft.tag_id "
+                "ORDER BY f.id, ft.position"
+            ).fetchall()
+        for path, name in rows:
+            tags = grouped.setdefault(path, [])
+            if name is not None:
+                tags.append(name)
+        return list(grouped.items())
+        
+    def _tag_id(self, name: str) -> int:
+        self._conn.execute("INSERT OR IGNORE INTO tags (name, norm) VALUES (?, ?)", (name, name.lower()))
+        return self._conn.execute("SELECT id FROM tags WHERE name = ?", (name,)).fetchone()[0]
+        
+    def upsert(self, path: str, entry: Dict[str, Any]):
+        """Insert or replace the entry for one file"""
+        data = {key: value for key, value in entry.items() if key != "tags"}
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO files (path, agent, last_modified, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET agent = excluded.agent, "
+                "last_modified = excluded.last_modified, data = excluded.data",
+                (path, entry.get("agent"), entry.get("last_modified"), json.dumps(data))
+            )
+            file_id = self._conn.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()[0]
+            self._conn.execute("DELETE FROM file_tags WHERE file_id = ?", (file_id,))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO file_tags (file_id, tag_id, position) VALUES (?, ?, ?)",
+                [(file_id, self._tag_id(tag), position) for position, tag in enumerate(entry.get("tags", []))]
+            )
+            
+    def delete(self, path: str) -> bool:
+        """Remove one file's entry; returns whether it existed"""
+        with self._lock:
+            return self._conn.execute("DELETE FROM files WHERE path = ?", (path,)).rowcount > 0
+            
+    def paths_with_tag(self, tag: str) -> List[str]:
+        """Paths of files carrying a tag, matched case-insensitively through the tag index"""
+        with self._lock:
+            return [path for (path,) in self._conn.execute(
+                "SELECT DISTINCT f.path FROM tags t "
+                "JOIN file_tags ft ON ft.tag_id = t.id JOIN files f ON f.id = ft.file_id "
+                "WHERE t.norm = ? ORDER BY f.id", (tag.lower(),)
+            )]
+
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+def open_store(path: str, kind: Optional[str] = None) -> MetadataStore:
+    """
+    Open a metadata store
+    Args:
+        path: Store file
+        kind: "json" or "sqlite"; inferred from the file suffix when omitted
+    Returns:
+        The store
+    """
+    if kind is None:
+        kind = 'sqlite' if str(path).lower().endswith(SQLITE_SUFFIXES) else 'json'
+    if kind == 'sqlite':
+        return SQLiteMetadataStore(path)
+    return JSONMetadataStore(path)
+
+def migrate_json_to_sqlite(json_path: str = "metadata.json", sqlite_path: str = "metadata.db") -> int:
+    """
+    One-shot import of an existing metadata.json into a SQLite store
+    Args:
+        json_path: Existing JSON metadata file
+        sqlite_path: SQLite database to create or update
+    Returns:
+        Number of entries migrated
+    """
+    source = JSONMetadataStore(json_path)
+    store = SQLiteMetadataStore(sqlite_path)
+    try:
+        metadata = source.load()
+        mapping = store.load()
+        for path, entry in metadata.items():
+            mapping[path] = entry
+        store.save(mapping)
+        return len(metadata)
+    finally:
+        store.close()
+        source.close()
@@ -1,92 +1,851 @@
+from collections.abc import Mapping, MutableMapping
 from pathlib import Path
-from typing import List, Dict, Any
-import json
-from tqdm import tqdm
-from .agents.code_agent import CodeAgent
-from .agents.doc_agent import DocAgent
-from .agents.data_agent import DataAgent
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple, Iterator, Union
+import os
+import threading
+import time
+from .agents.registry import AgentSpec, registered_agents, build_dispatch_table
+from .cache import DEFAULT_CACHE_FILE, DEFAULT_MAX_BYTES, open_cache
+from .storage import MetadataStore, JSONMetadataStore
+from .tag_index import TagIndex
+from .batching import BatchItem, BatchPacker, BatchStats, analyze_batch, estimate_tokens
+from .walker import walk_entries, walk_settings, CachedRun, DirectoryCache, DEFAULT_IGNORE_PATTERNS, RACY_WINDOW_NS
+from .changes import SCAN_SUFFIX, ScanState, UnchangedDirectories, fingerprint
+from .backends import TaggingBackend, get_backend
+from .scheduler import RequestScheduler, default_scheduler, priority_lane, BULK, INTERACTIVE
+from .sharding import SHARD_STORE_NAME, shard_of
+from .journal import Journal, JOURNAL_SUFFIX
+from .metrics import Metrics
+
+# Sample characters added to a file's analysis when embedding it
+EMBED_SAMPLE_CHARS = 2000
+EMBEDDING_SUFFIX = ".vec"
+
+class ScanResults(Mapping):
+    """
+    Analyses of the files found by a scan, in walk order
+    Files the scan analyzed map to their new analysis; the entries of
+    unchanged files are read from the metadata store when they are looked
+    up, so a rescan of a large tree does not decode every stored entry.
+    Closing the store reads them all first (see MetadataStore.keep_readable).
+    The files analyzed by this scan are listed in analyzed.
+    """
+    def __init__(self, order: List[Union[str, CachedRun]], analyses: Dict[str, Any], metadata: MutableMapping):
+        """
+        Args:
+            order: File keys in walk order, with CachedRuns standing for runs of unchanged files
+            analyses: New analyses by file key
+            metadata: Store holding the entries of the other files
+        """
+        self._order = order
+        self._analyses = analyses
+        self.analyzed: List[str] = list(analyses)
+        self._metadata: Optional[MutableMapping] = metadata
+        self._keys: Optional[Set[str]] = None
+        self._length = sum(len(file_key) if isinstance(file_key, CachedRun) else 1 for file_key in order)
+        
+    def __getitem__(self, file_key: str) -> Dict[str, Any]:
+        analysis = self._analyses.get(file_key)
+        if analysis is not None:
+            return analysis
+        if self._metadata is None or file_key not in self:
+            raise KeyError(file_key)
+        return self._metadata[file_key]
+        
+    def detach(self):
+        """Read the stored entries now, before the metadata they come from is released"""
+        if self._metadata is not None:
+            self._analyses = {file_key: self[file_key] for file_key in self}
+            self._metadata = None
+            
+    def __contains__(self, file_key) -> bool:
+        if self._keys is None:
+            self._keys = set(self)
+        return file_key in self._keys
+        
+    def __iter__(self) -> Iterator[str]:
+        for file_key in self._order:
+            if isinstance(file_key, CachedRun):
+                yield from file_key
+            else:
+                yield file_key
+                
+    def __len__(self) -> int:
+        return self._length
 
 class SwarmController:
-    def __init__(self):
-        """Initialize the swarm controller with all available agents"""
-        self.agents = [
-            CodeAgent(),
-            DocAgent(),
-            DataAgent()
-        ]
-        self.metadata_file = "metadata.json"
+    def __init__(self, cache_max_bytes: Optional[int] = DEFAULT_MAX_BYTES,
+                 store: Optional[MetadataStore] = None,
+                 ignore_patterns: Optional[List[str]] = None, use_gitignore: bool = True,
+                 scheduler: Optional[RequestScheduler] = None,
+                 backend: Union[str, TaggingBackend, None] = None, journal: bool = True,
+                 metrics: Optional[Metrics] = None, cache_file: str = DEFAULT_CACHE_FILE,
+                 embeddings: bool = False, embedder: Optional[str] = None, quantize_embeddings: bool = False,
+                 use_git: bool = False):
+        """
+        Initialize the swarm controller with all registered agent types
+        Agents are only imported and constructed the first time a file they
+        handle is encountered (or when the agents property is read).
+        Args:
+            cache_max_bytes: Size bound of the content-addressed result cache; 0 or None disables it
+            store: Metadata storage backend; defaults to a JSONMetadataStore on metadata.json
+            ignore_patterns: .gitignore-style patterns pruned while walking (defaults to VCS and dependency dirs)
+            use_gitignore: Whether .gitignore files found while walking are honoured
+            scheduler: Rate-limit aware scheduler shared by all agents; defaults to the process-wide one
+            backend: Tagging backend name or instance for all agents ("openai", "heuristic", "transformers");
+                defaults to $AUTO_TAGGER_BACKEND or openai
+            journal: Record each analysis in <metadata file>.journal as it completes, so an
+                interrupted or killed run resumes without redoing finished files
+            metrics: Registry for stage timings, token usage and error counts shared with the agents;
+                a fresh one is created by default
+            cache_file: File the result cache is kept in; a .db/.sqlite file is a SQLiteResultCache that
+                concurrent processes share
+            embeddings: Keep the similarity index (<metadata file>.vec) up to date whenever metadata is saved
+            embedder: "transformers", "hashing" or "auto" (see embeddings.get_embedder)
+            quantize_embeddings: Store the similarity index as int8, a quarter of the size
+            use_git: Inside a git work tree, skip stat'ing files git reports unchanged since the
+                last scan (see changes.py)
+        """
+        self.agent_specs: List[AgentSpec] = registered_agents()
+        self._dispatch = build_dispatch_table(self.agent_specs)
+        self._agent_instances: Dict[str, Any] = {}
+        self._agent_instances_lock = threading.Lock()
+        self.store = store if store is not None else JSONMetadataStore("metadata.json")
+        self.metadata_file = self.store.path
+        self.cache_file = cache_file
+        self.cache = open_cache(self.cache_file, cache_max_bytes) if cache_max_bytes else None
+        self.journal = Journal(str(self.metadata_file) + JOURNAL_SUFFIX) if journal else None
+        self._agent_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._agent_slots_lock = threading.Lock()
+        self._tag_index: Optional[TagIndex] = None
+        self.batch_stats = BatchStats()
+        self.ignore_patterns = list(DEFAULT_IGNORE_PATTERNS if ignore_patterns is None else ignore_patterns)
+        self.use_gitignore = use_gitignore
+        self.scheduler = scheduler if scheduler is not None else default_scheduler()
+        self.backend = get_backend(backend)
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.embeddings = embeddings
+        self.embedder_name = embedder
+        self.quantize_embeddings = quantize_embeddings
+        self.embedding_file = str(self.metadata_file) + EMBEDDING_SUFFIX
+        self._embedder = None
+        self._embedding_index = None
+        self.use_git = use_git
+        self.scan_file = str(self.metadata_file) + SCAN_SUFFIX
         self.load_metadata()
         
+    @property
+    def metadata(self):
+        """Mapping of file path to its tags and analysis"""
+        return self._metadata
+        
+    @metadata.setter
+    def metadata(self, value):
+        # Replacing the metadata wholesale invalidates the inverted index; it is rebuilt on next search
+        self._metadata = value
+        self._tag_index = None
+        
+    @property
+    def tag_index(self) -> TagIndex:
+        """Inverted tag index over the metadata, built on first use and then kept in sync"""
+        if self._tag_index is None:
+            iter_tags = getattr(self._metadata, "iter_tags", None)
+            if iter_tags is not None:
+                items = iter_tags()
+            else:
+                items = ((file_key, data.get("tags", [])) for file_key, data in self._metadata.items())
+            self._tag_index = TagIndex.build(items)
+        return self._tag_index
+        
+    def _stored_mtime(self, file_key: str) -> Optional[float]:
+        """Modification time recorded for a file, read without decoding its analysis where the store allows"""
+        last_modified = getattr(self._metadata, "last_modified", None)
+        if last_modified is not None:
+            return last_modified(file_key)
+        entry = self._metadata.get(file_key)
+        return entry.get("last_modified") if entry is not None else None
+        
+    def _stored_fingerprint(self, file_key: str) -> Optional[Tuple[int, int, int]]:
+        """(size, mtime_ns, inode) recorded for a file, or None for entries written without one"""
+        stored = getattr(self._metadata, "fingerprint", None)
+        if stored is not None:
+            return stored(file_key)
+        entry = self._metadata.get(file_key)
+        stored = entry.get("fingerprint") if entry is not None else None
+        return tuple(stored) if stored else None
+        
+    def _unchanged(self, file_key: str, stat: os.stat_result) -> bool:
+        """Whether a file's stored analysis is for its current contents"""
+        stored = self._stored_fingerprint(file_key)
+        if stored is not None:
+            return stored == fingerprint(stat)
+        return self._stored_mtime(file_key) == stat.st_mtime
+        
+    @staticmethod
+    def _stamp(analysis: Dict[str, Any], stat: os.stat_result):
+        """Record which version of the file an analysis is for"""
+        analysis["last_modified"] = stat.st_mtime
+        analysis["fingerprint"] = list(fingerprint(stat))
+        
+    @property
+    def state_file_names(self) -> Tuple[str, ...]:
+        """Names of the controller's own metadata and cache files, which are never tagged"""
+        return (Path(self.metadata_file).name, Path(self.cache_file).name, Path(self.embedding_file).name,
+                Path(self.scan_file).name)
+                
     def load_metadata(self):
-        """Load existing metadata if available"""
-        try:
-            with open(self.metadata_file, 'r') as f:
-                self.metadata = json.load(f)
-        except FileNotFoundError:
-            self.metadata = {}
+        """Load existing metadata if available, plus analyses journaled by an unfinished run"""
+        self.metadata = self.store.load()
+        if self.journal is None:
+            return
+        recovered = 0
+        for file_key, entry in self.journal.replay():
+            self.metadata[file_key] = entry
+            recovered += 1
+        if recovered:
+            print(f"Resuming: recovered {recovered} analyses from {self.journal.path}")
             
     def save_metadata(self):
-        """Save metadata to file"""
-        with open(self.metadata_file, 'w') as f:
-            json.dump(self.metadata, f, indent=2)
+        """Save metadata to the configured store"""
+        with self.metrics.timer("save"):
+            self.store.save(self.metadata)
+        if self.embeddings:
+            self.update_embeddings()
             
+    @property
+    def agents(self) -> List[Any]:
+        """All agents, constructing any that have not been needed yet"""
+        return [self._get_agent(spec) for spec in self.agent_specs]
+        
+    def _get_agent(self, spec: AgentSpec):
+        """Return the agent for a spec, importing and constructing it on first use"""
+        agent = self._agent_instances.get(spec.name)
+        if agent is None:
+            with self._agent_instances_lock:
+                agent = self._agent_instances.get(spec.name)
+                if agent is None:
+                    agent = spec.create()
+                    agent.result_cache = self.cache
+                    agent.scheduler = self.scheduler
+                    agent.backend = self.backend
+                    agent.metrics = self.metrics
+                    self._agent_instances[spec.name] = agent
+        return agent
+        
     def get_agent_for_file(self, file_path: Path):
-        """Find the appropriate agent for a given file"""
-        for agent in self.agents:
-            if agent.can_handle_file(file_path):
-                return agent
-        return None
+        """Find the appropriate agent for a given file via the suffix dispatch table"""
+        spec = self._dispatch.get(file_path.suffix.lower())
+        if spec is None:
+            return None
+        return self._get_agent(spec)
+        
+    def _agent_slot(self, agent) -> Optional[threading.BoundedSemaphore]:
+        """Return the semaphore bounding concurrent calls into an agent, if it has a limit"""
+        limit = getattr(agent, "max_concurrency", None)
+        if not limit:
+            return None
+        with self._agent_slots_lock:
+            slot = self._agent_slots.get(agent.name)
+            if slot is None:
+                slot = threading.BoundedSemaphore(limit)
+                self._agent_slots[agent.name] = slot
+            return slot
+            
+    def _analyze(self, agent, file_path: Path, stat: os.stat_result) -> Dict[str, Any]:
+        """Run a single agent analysis, honouring the agent's concurrency limit"""
+        slot = self._agent_slot(agent)
+        with priority_lane(BULK):
+            if slot is None:
+                with self.metrics.timer("analyze", agent.name):
+                    analysis = agent.analyze_file(file_path)
+            else:
+                with slot:
+                    with self.metrics.timer("analyze", agent.name):
+                        analysis = agent.analyze_file(file_path)
+        self._stamp(analysis, stat)
+        analysis["agent"] = agent.name
+        return analysis
         
-    def process_directory(self, directory: Path, recursive: bool = True) -> Dict[str, Any]:
-        """Process all files in a directory"""
-        results = {}
+    def _analyze_batch(self, agent, items: List[BatchItem]) -> Dict[str, Any]:
+        """Analyze a batch of small files with one request, honouring the agent's concurrency limit"""
+        slot = self._agent_slot(agent)
+        with priority_lane(BULK):
+            if slot is None:
+                analyses = analyze_batch(agent, items, self.batch_stats)
+            else:
+                with slot:
+                    analyses = analyze_batch(agent, items, self.batch_stats)
+        for item in items:
+            analyses[item.file_key]["last_modified"] = item.last_modified
+            if item.fingerprint is not None:
+                analyses[item.file_key]["fingerprint"] = list(item.fingerprint)
+            analyses[item.file_key]["agent"] = agent.name
+        self._record(analyses)
+        return analyses
         
-        # Get all files in directory
-        pattern = "**/*" if recursive else "*"
-        files = [f for f in Path(directory).glob(pattern) if f.is_file()]
+    def _analyze_single(self, file_key: str, agent, file_path: Path, stat: os.stat_result) -> Dict[str, Any]:
+        analyses = {file_key: self._analyze(agent, file_path, stat)}
+        self._record(analyses)
+        return analyses
         
-        print(f"Processing {len(files)} files...")
+    def _record(self, analyses: Dict[str, Any]):
+        """Count finished analyses and journal them so they survive a crash before the store is saved"""
+        for analysis in analyses.values():
+            self.metrics.count(analysis.get("agent", ""), "files")
+        if self.journal is not None:
+            self.journal.append(analyses)
+            
+    def _scan_state(self, directory: Path, recursive: bool, full_scan: bool = False) -> ScanState:
+        """What the last scan of a directory recorded (nothing with full_scan), plus git's changes since"""
+        root = os.path.abspath(directory)
+        walk = walk_settings(recursive, set(self._dispatch), self.ignore_patterns, self.use_gitignore,
+                             self.state_file_names)
+        if full_scan:
+            state = ScanState(root, DirectoryCache(walk))
+        else:
+            state = ScanState.load(self.scan_file, root, walk)
+        if self.use_git:
+            with self.metrics.timer("stat"):
+                state.check_git()
+        return state
         
-        for file_path in tqdm(files):
-            # Skip the metadata file itself
-            if file_path.name == self.metadata_file:
+    def _discover(self, directory: Path, recursive: bool, shard: Optional[Tuple[int, int]] = None,
+                  state: Optional[ScanState] = None) -> Iterator[Tuple[str, Any, Optional[os.stat_result]]]:
+        """
+        Stream handled files from the walker
+        Files are dispatched on their extension before they are stat'ed, so
+        files no agent handles never cost a stat call. With a shard (index,
+        count) only the files hashed to that shard are yielded, and the
+        partial stores of other shards are skipped. With the state of the
+        last scan, unchanged directories are not listed again, files git
+        vouches for are not stat'ed, and runs of files vouched for in bulk
+        (see changes.UnchangedDirectories) come as CachedRuns.
+        Paths stay strings, since most files of a rescan are unchanged and
+        never need a Path.
+        Yields:
+            (file_key, agent, stat) tuples in walk order; stat is None for files known to be
+            unchanged without one, and for runs of them file_key is a CachedRun and agent is None
+        """
+        unchanged = None
+        if state is not None and shard is None:
+            modified_since = getattr(self._metadata, "modified_since", None)
+            recent = None
+            if modified_since is not None and state.scanned_ns is not None:
+                recent = modified_since(state.scanned_ns - RACY_WINDOW_NS)
+            unchanged = UnchangedDirectories(state, str(Path(directory)), recent)
+        elif state is not None:
+            # A sharded scan leaves files of other shards unanalyzed
+            state.digests = None
+        entries = walk_entries(
+            directory, recursive,
+            extensions=set(self._dispatch),
+            ignore_patterns=self.ignore_patterns,
+            use_gitignore=self.use_gitignore,
+            skip_names=self.state_file_names,
+            cache=state.directories if state is not None else None,
+            on_reuse=unchanged.reuse if unchanged is not None else None
+        )
+        dispatch = self._dispatch
+        git = state.git if state is not None else None
+        # Length of the prefix the walker puts before paths relative to the root ("" for ".")
+        root_length = len(str(Path(directory) / "_")) - 1
+        # Files directly under "." come as "./name" where str(Path) gives "name", which is the key
+        dot_prefix = os.curdir + os.sep if str(Path(directory)) == os.curdir else None
+        observe = self.metrics.observe
+        while True:
+            # Time spent inside the walker between handled files
+            started = time.perf_counter()
+            entry = next(entries, None)
+            observe("walk", time.perf_counter() - started)
+            if entry is None:
+                break
+            if isinstance(entry, CachedRun):
+                if dot_prefix is not None and entry.base.startswith(dot_prefix):
+                    entry = CachedRun(entry.base[len(dot_prefix):], entry.names)
+                yield entry, None, None
+                continue
+            spec = dispatch.get(os.path.splitext(entry.name)[1].lower())
+            if spec is None:
+                continue
+            agent = self._get_agent(spec)
+            file_key = entry.path
+            if dot_prefix is not None and file_key.startswith(dot_prefix):
+                file_key = file_key[len(dot_prefix):]
+            relative_path = file_key[root_length:]
+            if os.sep != "/":
+                relative_path = relative_path.replace(os.sep, "/")
+            if shard is not None:
+                if SHARD_STORE_NAME.search(entry.name):
+                    continue
+                if shard_of(relative_path, shard[1]) != shard[0]:
+                    continue
+            # Git cannot vouch for the target of a symlink
+            if git is not None and not entry.is_symlink():
+                if git.unchanged(relative_path, self._stored_mtime(file_key)):
+                    if unchanged is not None:
+                        unchanged.seen(relative_path, None)
+                    yield file_key, agent, None
+                    continue
+            started = time.perf_counter()
+            try:
+                stat = entry.stat()
+            except OSError:
+                stat = None
+            finally:
+                observe("stat", time.perf_counter() - started)
+            if unchanged is not None:
+                unchanged.seen(relative_path, stat)
+            if stat is not None:
+                yield file_key, agent, stat
+        if unchanged is not None:
+            unchanged.finish()
+            
+    def _iter_jobs(self, directory: Path, recursive: bool, batch_tokens: int,
+                   order: List[Union[str, CachedRun]], results: Dict[str, Any], analyzed: Set[str], progress,
+                   batch_local: bool = True, shard: Optional[Tuple[int, int]] = None,
+                   state: Optional[ScanState] = None) -> Iterator[Tuple[Any, tuple]]:
+        """
+        Stream units of work as files are discovered
+        Files whose metadata is up to date, and runs of them, only count
+        towards progress. Without a batch budget every changed file is its
+        own job. With one, files of model-backed agents whose sample fits in
+        a quarter of the budget are packed per agent and emitted as soon as a
+        batch fills.
+        Agents on a local backend (when batch_local is set) are packed into
+        batches of the backend's batch_size instead, whatever the budget.
+        Yields:
+            (callable, args) tuples whose callables return {file_key: analysis}
+        """
+        open_batches: Dict[str, Tuple[Any, BatchPacker]] = {}
+        for file_key, agent, stat in self._discover(directory, recursive, shard, state):
+            order.append(file_key)
+            if agent is None:
+                progress.update(len(file_key))
                 continue
                 
             # Check if file has already been processed and hasn't changed
-            file_stat = file_path.stat()
-            file_key = str(file_path)
+            if stat is None or self._unchanged(file_key, stat):
+                progress.update(1)
+                continue
+            file_path = Path(file_key)
+            analyzed.add(file_key)
             
-            if (file_key in self.metadata and 
-                self.metadata[file_key].get("last_modified") == file_stat.st_mtime):
-                results[file_key] = self.metadata[file_key]
+            model_backed = getattr(agent, "is_model_backed", lambda: False)()
+            local = batch_local and model_backed and not agent.backend.remote
+            sample = None
+            if model_backed and (batch_tokens > 0 or local):
+                try:
+                    with self.metrics.timer("sample", agent.name):
+                        sample = agent.build_sample(file_path)
+                except Exception:
+                    sample = None
+            if not sample or (not local and estimate_tokens(sample) > batch_tokens // 4):
+                yield self._analyze_single, (file_key, agent, file_path, stat)
                 continue
                 
-            # Find appropriate agent
-            agent = self.get_agent_for_file(file_path)
-            if agent:
-                # Process file
-                analysis = agent.analyze_file(file_path)
-                analysis["last_modified"] = file_stat.st_mtime
+            if agent.name not in open_batches:
+                # Local batches are bounded by the backend's batch size rather than by tokens
+                packer = BatchPacker(agent.backend.batch_size, lambda item: 1) if local else BatchPacker(batch_tokens)
+                open_batches[agent.name] = (agent, packer)
+            _, packer = open_batches[agent.name]
+            if local:
+                item = BatchItem(file_key, file_path, stat.st_mtime, sample, None, fingerprint(stat))
+            else:
+                item = BatchItem(file_key, file_path, stat.st_mtime, sample,
+                                 agent.cache_key(agent.messages_for_sample(sample)), fingerprint(stat))
+            for batch in packer.add(item):
+                yield self._analyze_batch, (agent, batch)
+                
+        for agent, packer in open_batches.values():
+            if packer.items:
+                yield self._analyze_batch, (agent, packer.flush())
+                
+    def _merge_results(self, order: List[Union[str, CachedRun]], results: Dict[str, Any],
+                       analyzed: Set[str]) -> ScanResults:
+        """Merge freshly analyzed results into metadata in directory order and persist them"""
+        # Files whose analysis did not finish (on an interrupt) are left out
+        order = [file_key for file_key in order if file_key not in analyzed or file_key in results]
+        
+        # Update metadata in scan order, which keeps concurrent runs byte-for-byte identical to
+        # serial ones; unchanged entries are already stored and are not rewritten
+        for file_key in order:
+            if file_key not in analyzed:
+                continue
+            self.metadata[file_key] = results[file_key]
+            if self._tag_index is not None:
+                self._tag_index.add(file_key, results[file_key].get("tags", []))
+        self.save_metadata()
+        if self.cache is not None:
+            self.cache.save()
+        if self.journal is not None:
+            self.journal.clear()
+            
+        results = ScanResults(order, {file_key: results[file_key] for file_key in analyzed if file_key in results},
+                              self.metadata)
+        self.store.keep_readable(results)
+        return results
+        
+    def _save_interrupted(self, order: List[Union[str, CachedRun]], results: Dict[str, Any],
+                          analyzed: Set[str]):
+        """Save everything finished before an interrupt, including analyses not collected yet"""
+        print("\nInterrupted; saving completed analyses...")
+        if self.journal is not None:
+            for file_key, entry in self.journal.replay():
+                if file_key in analyzed:
+                    results.setdefault(file_key, entry)
+        results = self._merge_results(order, results, analyzed)
+        print(f"Saved {len(analyzed.intersection(results))} analyses; rerun to resume")
+        
+    def process_directory(self, directory: Path, recursive: bool = True,
+                          max_workers: int = 1, batch_tokens: int = 0,
+                          shard: Optional[Tuple[int, int]] = None, full_scan: bool = False) -> ScanResults:
+        """
+        Process all files in a directory
+        Files are analyzed as the walker discovers them rather than after the
+        whole tree has been listed. Directory listings (and with use_git, the
+        commit) of a finished scan are kept in <metadata file>.scan so the
+        next scan of the same directory only looks at what changed.
+        Args:
+            directory: Directory to scan
+            recursive: Whether to descend into subdirectories
+            max_workers: Number of jobs analyzed concurrently; 1 keeps the serial behaviour
+            batch_tokens: Token budget for packing small files into shared requests; 0 disables batching
+            shard: (index, count) to process only this shard of the directory (see sharding.py)
+            full_scan: List every directory and stat every file, ignoring what the last scan recorded
+        Returns:
+            Mapping of file paths to their analysis, in directory order
+        """
+        # Imported here so that search-only use of the controller starts quickly
+        from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+        from tqdm import tqdm
+        
+        order: List[Union[str, CachedRun]] = []
+        results: Dict[str, Any] = {}
+        analyzed: Set[str] = set()
+        
+        print(f"Processing files in {directory}...")
+        state = self._scan_state(directory, recursive, full_scan)
+        
+        with tqdm(unit="file") as progress:
+            jobs = self._iter_jobs(directory, recursive, batch_tokens, order, results, analyzed, progress,
+                                   shard=shard, state=state)
+            try:
+                if max_workers <= 1:
+                    for job, args in jobs:
+                        analyses = job(*args)
+                        results.update(analyses)
+                        progress.update(len(analyses))
+                else:
+                    executor = ThreadPoolExecutor(max_workers=max_workers)
+                    try:
+                        in_flight = set()
+                        for job, args in jobs:
+                            # Keep discovery only a little ahead of the workers
+                            if len(in_flight) >= max_workers * 2:
+                                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                                for future in done:
+                                    analyses = future.result()
+                                    results.update(analyses)
+                                    progress.update(len(analyses))
+                            in_flight.add(executor.submit(job, *args))
+                        for future in as_completed(in_flight):
+                            analyses = future.result()
+                            results.update(analyses)
+                            progress.update(len(analyses))
+                    finally:
+                        # On an interrupt, queued jobs are dropped and running ones journal their results
+                        executor.shutdown(wait=True, cancel_futures=True)
+            except KeyboardInterrupt:
+                self._save_interrupted(order, results, analyzed)
+                raise
+                
+        results = self._merge_results(order, results, analyzed)
+        state.save(self.scan_file)
+        return results
+        
+    async def process_directory_async(self, directory: Path, recursive: bool = True,
+                                      max_concurrency: int = 100,
+                                      shard: Optional[Tuple[int, int]] = None,
+                                      full_scan: bool = False) -> ScanResults:
+        """
+        Process all files in a directory on a single event loop
+        Args:
+            directory: Directory to scan
+            recursive: Whether to descend into subdirectories
+            max_concurrency: Maximum number of analyses in flight at once
+            shard: (index, count) to process only this shard of the directory
+            full_scan: List every directory and stat every file, ignoring what the last scan recorded
+        Returns:
+            Mapping of file paths to their analysis, in directory order
+        """
+        import asyncio
+        from tqdm import tqdm
+        
+        order: List[Union[str, CachedRun]] = []
+        results: Dict[str, Any] = {}
+        analyzed: Set[str] = set()
+        in_flight = asyncio.Semaphore(max(1, max_concurrency))
+        agent_slots: Dict[str, Any] = {}
+        tasks = set()
+        
+        print(f"Processing files in {directory}...")
+        state = self._scan_state(directory, recursive, full_scan)
+        
+        with tqdm(unit="file") as progress:
+            async def analyze(file_key, agent, file_path, stat):
+                try:
+                    slot = agent_slots.get(agent.name)
+                    if slot is None and getattr(agent, "max_concurrency", None):
+                        slot = agent_slots[agent.name] = asyncio.Semaphore(agent.max_concurrency)
+                    # Each task runs in its own context, so the lane only applies to this analysis
+                    with priority_lane(BULK):
+                        if slot is None:
+                            with self.metrics.timer("analyze", agent.name):
+                                analysis = await agent.analyze_file_async(file_path)
+                        else:
+                            async with slot:
+                                with self.metrics.timer("analyze", agent.name):
+                                    analysis = await agent.analyze_file_async(file_path)
+                finally:
+                    in_flight.release()
+                self._stamp(analysis, stat)
                 analysis["agent"] = agent.name
                 results[file_key] = analysis
-            
-        # Update metadata
-        self.metadata.update(results)
+                self._record({file_key: analysis})
+                progress.update(1)
+                
+            try:
+                for _, args in self._iter_jobs(directory, recursive, 0, order, results, analyzed, progress,
+                                              batch_local=False, shard=shard, state=state):
+                    # Waiting for a free slot lets running analyses progress while the walk continues
+                    await in_flight.acquire()
+                    tasks.add(asyncio.create_task(analyze(*args)))
+                    
+                    # Drop finished tasks so memory stays bounded by max_concurrency
+                    for task in [task for task in tasks if task.done()]:
+                        tasks.discard(task)
+                        task.result()
+                        
+                await asyncio.gather(*tasks)
+            except (KeyboardInterrupt, asyncio.CancelledError):
+                # asyncio.run() turns Ctrl-C into a cancellation of the main task
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                self._save_interrupted(order, results, analyzed)
+                raise
+                
+        results = self._merge_results(order, results, analyzed)
+        state.save(self.scan_file)
+        return results
+        
+    def tag_file(self, file_path: Path) -> Dict[str, Any]:
+        """
+        Analyze a single file right away and store the result
+        The request is submitted in the interactive lane, so it is sent ahead
+        of any bulk directory run sharing the same scheduler.
+        Args:
+            file_path: File to analyze
+        Returns:
+            The file's analysis, or an empty dict if no agent handles it
+        """
+        file_path = Path(file_path)
+        agent = self.get_agent_for_file(file_path)
+        if agent is None:
+            return {}
+        stat = file_path.stat()
+        with priority_lane(INTERACTIVE):
+            with self.metrics.timer("analyze", agent.name):
+                analysis = agent.analyze_file(file_path)
+        self._stamp(analysis, stat)
+        analysis["agent"] = agent.name
+        self.metrics.count(agent.name, "files")
+        file_key = str(file_path)
+        self.metadata[file_key] = analysis
+        if self._tag_index is not None:
+            self._tag_index.add(file_key, analysis.get("tags", []))
         self.save_metadata()
+        if self.cache is not None:
+            self.cache.save()
+        return analysis
+        
+    def forget(self, path: Path, directory: bool = False) -> int:
+        """
+        Drop the metadata of a deleted file, or of every file under a deleted directory
+        Returns:
+            Number of entries removed
+        """
+        file_key = str(path)
+        if directory:
+            prefix = file_key.rstrip(os.sep) + os.sep
+            keys = [key for key in self.metadata if key.startswith(prefix)]
+        else:
+            keys = [file_key] if file_key in self.metadata else []
+        for key in keys:
+            del self.metadata[key]
+            if self._tag_index is not None:
+                self._tag_index.remove(key)
+        return len(keys)
         
+    def apply_changes(self, changed: Iterable[Path], deleted: Iterable[Path] = (),
+                      deleted_dirs: Iterable[Path] = (), max_workers: int = 1) -> Dict[str, Any]:
+        """
+        Bring the metadata up to date with paths a watcher reported
+        Deleted files and everything under deleted directories are dropped
+        from the store, and changed files are analyzed if an agent handles them and their
+        fingerprint (size, mtime, inode) differs from the stored one. The store is saved once
+        for the whole batch.
+        Args:
+            changed: Created, modified or renamed-to files
+            deleted: Deleted or renamed-from files
+            deleted_dirs: Deleted or renamed-from directories
+            max_workers: Number of files analyzed concurrently
+        Returns:
+            Dictionary mapping the re-analyzed file paths to their analysis
+        """
+        removed = sum(self.forget(path) for path in deleted)
+        removed += sum(self.forget(path, directory=True) for path in deleted_dirs)
+        jobs = []
+        for file_path in changed:
+            file_path = Path(file_path)
+            if file_path.name in self.state_file_names:
+                continue
+            agent = self.get_agent_for_file(file_path)
+            if agent is None:
+                continue
+            try:
+                stat = file_path.stat()
+            except OSError:
+                # Gone again before we got to it
+                removed += self.forget(file_path)
+                continue
+            if self._unchanged(str(file_path), stat):
+                continue
+            jobs.append((str(file_path), agent, file_path, stat))
+            
+        results: Dict[str, Any] = {}
+        if max_workers <= 1 or len(jobs) <= 1:
+            for job in jobs:
+                results.update(self._analyze_single(*job))
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for analyses in executor.map(lambda job: self._analyze_single(*job), jobs):
+                    results.update(analyses)
+                    
+        for file_key, analysis in results.items():
+            self.metadata[file_key] = analysis
+            if self._tag_index is not None:
+                self._tag_index.add(file_key, analysis.get("tags", []))
+        if results or removed:
+            self.save_metadata()
+            if self.cache is not None:
+                self.cache.save()
+            if self.journal is not None:
+                self.journal.clear()
         return results
         
     def get_tags_for_file(self, file_path: Path) -> List[str]:
         """Get tags for a specific file"""
         file_key = str(file_path)
+        tags = getattr(self._metadata, "tags", None)
+        if tags is not None:
+            return tags(file_key)
         if file_key in self.metadata:
             return self.metadata[file_key].get("tags", [])
         return []
         
     def search_by_tag(self, tag: str) -> List[str]:
         """Find all files with a specific tag"""
-        return [
-            file_path
-            for file_path, data in self.metadata.items()
-            if tag.lower() in [t.lower() for t in data.get("tags", [])]
-        ] 
\ No newline at end of file
+        return self.tag_index.search(tag)
+        
+    def search(self, query: str) -> List[str]:
+        """
+        Find files matching a boolean tag query
+        Args:
+            query: Tags combined with AND, OR, NOT and parentheses; a trailing * matches a prefix
+        Returns:
+            Matching file paths
+        """
+        return self.tag_index.query(query)
+        
+        
+    @property
+    def embedder(self):
+        """Embedder of the similarity index, resolved on first use"""
+        if self._embedder is None:
+            from .embeddings import get_embedder
+            self._embedder = get_embedder(self.embedder_name)
+        return self._embedder
+        
+    def _embedding_text(self, file_key: str) -> str:
+        """What a file is embedded from: its name, tags and analysis, then the start of its sample"""
+        entry = self.metadata.get(file_key) or {}
+        details = entry.get("metadata") or {}
+        parts = [Path(file_key).name, " ".join(entry.get("tags", [])),
+                 str(details.get("purpose") or details.get("analysis") or ""),
+                 " ".join(map(str, details.get("components") or []))]
+        file_path = Path(file_key)
+        agent = self.get_agent_for_file(file_path)
+        if agent is not None and file_path.is_file():
+            try:
+                sample = agent.build_sample(file_path)
+            except Exception:
+                sample = None
+            if sample:
+                parts.append(sample[:EMBED_SAMPLE_CHARS])
+        return "\n".join(part for part in parts if part)
+        
+    def update_embeddings(self) -> int:
+        """
+        Bring the similarity index in line with the metadata
+        Files analyzed since their vector was computed are embedded again,
+        files no longer in the metadata are dropped, and the index file is
+        left untouched when nothing changed.
+        Returns:
+            Number of files embedded
+        """
+        from .embeddings import update_index
+        files = [(file_key, self._stored_mtime(file_key)) for file_key in self.metadata]
+        if self._embedding_index is not None:
+            self._embedding_index.close()
+            self._embedding_index = None
+        with self.metrics.timer("embed"):
+            return update_index(self.embedding_file, files, self.embedder, self._embedding_text,
+                                self.quantize_embeddings)
+                                
+    def search_similar(self, query: Union[str, Path], k: int = 10,
+                       refresh: Optional[bool] = None) -> List[Tuple[str, float]]:
+        """
+        Find the files most similar to a file or to a free-text description
+        Args:
+            query: Path of a file (tagged or not) to find files like it, or free text
+            k: Number of results
+            refresh: Update the index before searching; by default only when the controller
+                does not keep it current (embeddings=False) or it does not exist yet
+        Returns:
+            (file path, cosine similarity) pairs, most similar first
+        """
+        from .embeddings import open_index
+        if refresh is None:
+            refresh = not self.embeddings or not os.path.exists(self.embedding_file)
+        if refresh:
+            self.update_embeddings()
+        index = self._embedding_index
+        if index is None:
+            index = self._embedding_index = open_index(self.embedding_file)
+            if index is None or index.model != self.embedder.name:
+                self.update_embeddings()
+                index = self._embedding_index = open_index(self.embedding_file)
+        exclude = []
+        is_path = isinstance(query, Path) or os.path.exists(query)
+        file_id = index.ids().get(str(query)) if is_path else None
+        if file_id is not None:
+            # Files like a tagged file: its stored vector, without the file itself
+            vector = index.vector(file_id)
+            exclude.append(file_id)
+        elif is_path and os.path.isfile(query):
+            vector = self.embedder.embed([self._embedding_text(str(query))])[0]
+        else:
+            vector = self.embedder.embed([str(query)])[0]
+        return [(index.path_of(file_id), score) for file_id, score in index.search(vector, k, exclude)[0]]
@@ -0,0 +1,224 @@
+"""
+Inverted index from normalized tag to the files carrying it.
+
+Each file gets a small integer ID and every tag maps to a posting set of IDs,
+so single-tag lookups are a dictionary hit instead of a scan over all
+metadata. On top of the postings, query() evaluates boolean expressions:
+
+    python                      files tagged "python"
+    python AND NOT test         files tagged "python" but not "test"
+    (web OR api) flask          adjacent terms are ANDed
+    pyth*                       any tag starting with "pyth"
+    "machine learning"          quoted tags may contain spaces
+
+Operators must be upper case so that lower-case tags such as "not" remain
+searchable.
+"""
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import re
+
+OPERATORS = ("AND", "OR", "NOT")
+TOKEN_RE = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|([^\s()"]+))')
+
+class QuerySyntaxError(ValueError):
+    """Raised for malformed tag query expressions"""
+    pass
+
+class TagIndex:
+    def __init__(self):
+        self._postings: Dict[str, Set[int]] = {}
+        self._ids: Dict[str, int] = {}
+        self._paths: List[Optional[str]] = []
+        self._file_tags: Dict[int, Set[str]] = {}
+        self._sorted_tags: Optional[List[str]] = None
+        
+    @staticmethod
+    def normalize(tag: str) -> str:
+        """Normalize a tag for indexing and lookup"""
+        return tag.strip().lower()
+        
+    @classmethod
+    def build(cls, items: Iterable[Tuple[str, Iterable[str]]]) -> "TagIndex":
+        """Build an index from (path, tags) pairs"""
+        index = cls()
+        for path, tags in items:
+            index.add(path, tags)
+        return index
+        
+    def __len__(self) -> int:
+        return len(self._ids)
+        
+    def __contains__(self, path: str) -> bool:
+        return path in self._ids
+        
+    def add(self, path: str, tags: Iterable[str]):
+        """Index a file's tags, replacing any previously indexed tags for that path"""
+        file_id = self._ids.get(path)
+        if file_id is None:
+            file_id = len(self._paths)
+            self._ids[path] = file_id
+            self._paths.append(path)
+        else:
+            self._unlink(file_id)
+        normalized = {self.normalize(tag) for tag in tags}
+        normalized.discard("")
+        for tag in normalized:
+            posting = self._postings.get(tag)
+            if posting is None:
+                self._postings[tag] = posting = set()
+                self._sorted_tags = None
+            posting.add(file_id)
+        self._file_tags[file_id] = normalized
+        
+    def remove(self, path: str):
+        """Drop a file from the index"""
+        file_id = self._ids.pop(path, None)
+        if file_id is None:
+            return
+        self._unlink(file_id)
+        del self._file_tags[file_id]
+        self._paths[file_id] = None
+        
+    def _unlink(self, file_id: int):
+        for tag in self._file_tags.get(file_id, ()):
+            posting = self._postings[tag]
+            posting.discard(file_id)
+            if not posting:
+                del self._postings[tag]
+                self._sorted_tags = None
+                
+    def lookup(self, tag: str) -> Set[int]:
+        """File IDs carrying an exact (normalized) tag"""
+        return self._postings.get(self.normalize(tag), set())
+        
+    def prefix(self, prefix: str) -> Set[int]:
+        """File IDs carrying any tag that starts with prefix"""
+        prefix = self.normalize(prefix)
+        if self._sorted_tags is None:
+            self._sorted_tags = sorted(self._postings)
+        ids: Set[int] = set()
+        position = bisect_left(self._sorted_tags, prefix)
+        while position < len(self._sorted_tags) and self._sorted_tags[position].startswith(prefix):
+            ids |= self._postings[self._sorted_tags[position]]
+            position += 1
+        return ids
+        
+    def all_ids(self) -> Set[int]:
+        """IDs of every indexed file"""
+        return set(self._ids.values())
+        
+    def paths(self, ids: Iterable[int]) -> List[str]:
+        """Resolve file IDs to paths in indexing order"""
+        return [self._paths[file_id] for file_id in sorted(ids)]
+        
+    def search(self, tag: str) -> List[str]:
+        """Paths of files carrying a single tag"""
+        return self.paths(self.lookup(tag))
+        
+    def query(self, expression: str) -> List[str]:
+        """
+        Evaluate a boolean tag expression
+        Args:
+            expression: Terms combined with AND, OR, NOT, parentheses and trailing-* prefixes
+        Returns:
+            Matching paths in indexing order
+        """
+        return self.paths(evaluate_query(self, expression))
+
+def evaluate_query(index, expression: str) -> Set[int]:
+    """
+    Evaluate a boolean tag expression against any index of file IDs
+    Args:
+        index: Object with lookup(tag), prefix(prefix) and all_ids() returning sets of file IDs
+        expression: Terms combined with AND, OR, NOT, parentheses and trailing-* prefixes
+    Returns:
+        IDs of the matching files
+    Raises:
+        QuerySyntaxError for malformed expressions
+    """
+    return _QueryParser(index, expression).parse()
+
+class _QueryParser:
+    """Recursive-descent parser: OR < AND (explicit or implicit) < NOT < term"""
+    def __init__(self, index, expression: str):
+        self.index = index
+        self.tokens = self._tokenize(expression)
+        self.position = 0
+        
+    @staticmethod
+    def _tokenize(expression: str) -> List[Tuple[str, str]]:
+        tokens = []
+        position = 0
+        expression = expression.strip()
+        while position < len(expression):
+            match = TOKEN_RE.match(expression, position)
+            if match is None or match.end() == position:
+                raise QuerySyntaxError(f"Unexpected input at position {position}: {expression[position:]!r}")
+            lparen, rparen, quoted, word = match.groups()
+            if lparen:
+                tokens.append(("(", lparen))
+            elif rparen:
+                tokens.append((")", rparen))
+            elif quoted is not None:
+                tokens.append(("TERM", quoted))
+            elif word in OPERATORS:
+                tokens.append((word, word))
+            else:
+                tokens.append(("TERM", word))
+            position = match.end()
+        return tokens
+        
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+        
+    def _take(self) -> Tuple[str, str]:
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+        
+    def parse(self) -> Set[int]:
+        if not self.tokens:
+            return set()
+        result = self._or()
+        if self._peek() is not None:
+            raise QuerySyntaxError(f"Unexpected {self.tokens[self.position][1]!r}")
+        return result
+        
+    def _or(self) -> Set[int]:
+        result = self._and()
+        while self._peek() == "OR":
+            self._take()
+            result = result | self._and()
+        return result
+        
+    def _and(self) -> Set[int]:
+        result = self._not()
+        while self._peek() in ("AND", "NOT", "TERM", "("):
+            if self._peek() == "AND":
+                self._take()
+            result = result & self._not()
+        return result
+        
+    def _not(self) -> Set[int]:
+        if self._peek() == "NOT":
+            self._take()
+            return self.index.all_ids() - self._not()
+        return self._term()
+        
+    def _term(self) -> Set[int]:
+        kind = self._peek()
+        if kind is None:
+            raise QuerySyntaxError("Unexpected end of query")
+        kind, value = self._take()
+        if kind == "(":
+            result = self._or()
+            if self._peek() != ")":
+                raise QuerySyntaxError("Missing closing parenthesis")
+            self._take()
+            return result
+        if kind != "TERM":
+            raise QuerySyntaxError(f"Unexpected {value!r}")
+        if value.endswith("*") and len(value) > 1:
+            return self.index.prefix(value[:-1])
+        return set(self.index.lookup(value))
@@ -0,0 +1,367 @@
+"""
+Streaming directory walker.
+
+walk_files() is a generator built on os.scandir. It prunes ignored
+directories before descending into them, honours .gitignore files found along
+the way, and filters files by extension before anything is stat'ed, so the
+analysis stage can start on the first file instead of waiting for the whole
+tree to be listed. Given a DirectoryCache, directories whose mtime has not
+changed since the last walk are not listed again, and a caller that can vouch
+for the files of such a directory gets them as one CachedRun.
+"""
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+import json
+import os
+import re
+import time
+
+# Directories that never contain files worth tagging
+DEFAULT_IGNORE_PATTERNS = [
+    ".git/", ".hg/", ".svn/", "node_modules/", "__pycache__/",
+    ".venv/", "venv/", ".tox/", ".nox/", ".mypy_cache/", ".pytest_cache/"
+]
+
+# on_directory(path, relative path, ignore rules in effect), see walk_files
+DirectoryCallback = Callable[[Path, str, List["IgnoreRules"]], None]
+# on_reuse(relative path, prefix of its files' paths, file names, names of symlinks), see walk_entries
+ReuseCallback = Callable[[str, str, List[str], Set[str]], Optional[Iterable[str]]]
+
+# Directories modified this recently may still gain entries within the same mtime tick,
+# so their listings are not cached (git calls such entries "racily clean")
+RACY_WINDOW_NS = 2 * 10**9
+
+class IgnorePattern:
+    """A single .gitignore-style pattern"""
+    def __init__(self, pattern: str):
+        self.negated = pattern.startswith("!")
+        if self.negated:
+            pattern = pattern[1:]
+        if pattern.startswith("\\"):
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        # Patterns with an inner slash are relative to the .gitignore's directory
+        self.anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+        self.regex = re.compile(self._translate(pattern))
+        
+    @staticmethod
+    def _translate(pattern: str) -> str:
+        parts = []
+        i = 0
+        while i < len(pattern):
+            if pattern.startswith("**/", i):
+                parts.append("(?:.*/)?")
+                i += 3
+            elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+                parts.append("/.*")
+                i += 3
+            elif pattern.startswith("**", i):
+                parts.append(".*")
+                i += 2
+            elif pattern[i] == "*":
+                parts.append("[^/]*")
+                i += 1
+            elif pattern[i] == "?":
+                parts.append("[^/]")
+                i += 1
+            elif pattern[i] == "[":
+                end = pattern.find("]", i + 1)
+                if end == -1:
+                    parts.append(re.escape(pattern[i]))
+                    i += 1
+                else:
+                    body = pattern[i + 1:end]
+                    if body.startswith("!"):
+                        body = "^" + body[1:]
+                    parts.append(f"[{body}]")
+                    i = end + 1
+            else:
+                parts.append(re.escape(pattern[i]))
+                i += 1
+        return "^" + "".join(parts) + "$"
+        
+    def matches(self, relative_path: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if self.anchored:
+            return self.regex.match(relative_path) is not None
+        return self.regex.match(relative_path.rsplit("/", 1)[-1]) is not None
+
+class IgnoreRules:
+    """Ordered patterns from one source, relative to a base directory"""
+    def __init__(self, patterns: Iterable[str], base: str = ""):
+        self.base = base
+        self.patterns: List[IgnorePattern] = []
+        for line in patterns:
+            line = line.rstrip("\n").rstrip()
+            if line and not line.startswith("#"):
+                self.patterns.append(IgnorePattern(line))
+                
+    @classmethod
+    def from_file(cls, path: Path, base: str = "") -> "IgnoreRules":
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                return cls(f.readlines(), base)
+        except OSError:
+            return cls([], base)
+            
+    def match(self, relative_path: str, is_dir: bool) -> Optional[bool]:
+        """True if ignored, False if re-included, None if no pattern applies"""
+        if self.base:
+            if not relative_path.startswith(self.base + "/"):
+                return None
+            relative_path = relative_path[len(self.base) + 1:]
+        result = None
+        for pattern in self.patterns:
+            if pattern.matches(relative_path, is_dir):
+                result = not pattern.negated
+        return result
+
+def is_ignored(rules: List[IgnoreRules], relative_path: str, is_dir: bool) -> bool:
+    """Evaluate rule sets from outermost to innermost; the last matching pattern wins"""
+    ignored = False
+    for rule_set in rules:
+        result = rule_set.match(relative_path, is_dir)
+        if result is not None:
+            ignored = result
+    return ignored
+
+def _stamp(path) -> Optional[List[int]]:
+    """(mtime_ns, size, inode) of a path, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+
+class CachedEntry:
+    """Stand-in for the os.DirEntry of a file in a directory that was not listed again"""
+    __slots__ = ("name", "path", "_symlink")
+    
+    def __init__(self, name: str, path: str, symlink: bool = False):
+        self.name = name
+        self.path = path
+        self._symlink = symlink
+        
+    def is_symlink(self) -> bool:
+        return self._symlink
+        
+    def stat(self) -> os.stat_result:
+        return os.stat(self.path)
+
+class CachedRun:
+    """Consecutive files of a directory that was not listed again, yielded as one entry"""
+    __slots__ = ("base", "names")
+    
+    def __init__(self, base: str, names: str):
+        """
+        Args:
+            base: Prefix of the files' paths: their directory and a separator
+            names: "/"-joined file names
+        """
+        self.base = base
+        self.names = names
+        
+    def __len__(self) -> int:
+        return self.names.count("/") + 1
+        
+    def __iter__(self) -> Iterator[str]:
+        """Paths of the files"""
+        return map(self.base.__add__, self.names.split("/"))
+
+class DirectoryCache:
+    """
+    Listings of the directories of an earlier walk, reused while they are unchanged
+    Creating, deleting or renaming an entry updates the mtime of its
+    directory, so a directory whose mtime and .gitignore are the same as
+    when it was listed still holds the same files and subdirectories, and
+    walk_files yields them (with CachedEntry stand-ins) without listing it
+    again. File contents are not covered: callers stat the files yielded to
+    see whether they changed.
+    """
+    def __init__(self, key: str = "", listings: Optional[Dict[str, list]] = None):
+        """
+        Args:
+            key: Walk settings the listings were made with; a walk with other settings starts afresh
+            listings: Relative directory -> [stamp, .gitignore stamp, "/"-joined files,
+                "/"-joined subdirectories, "/"-joined files that are symlinks]
+        """
+        self.key = key
+        self.listings = listings if listings is not None else {}
+        # Listings seen by the current walk, and whether it got to the end
+        self.visited: Dict[str, list] = {}
+        self.complete = False
+        self.reused = 0
+        
+    def start(self, key: str):
+        """Begin a walk with the given settings, reusing what an earlier walk with them listed"""
+        if key != self.key:
+            self.key = key
+            self.listings = {}
+        elif self.visited:
+            self.listings = self.snapshot()
+        self.visited = {}
+        self.complete = False
+        self.reused = 0
+        
+    def snapshot(self) -> Dict[str, list]:
+        """Listings to keep: those of the last walk, plus older ones it did not get to if it stopped early"""
+        if self.complete:
+            return self.visited
+        return dict(self.listings, **self.visited)
+
+def walk_settings(recursive: bool, extensions: Optional[Set[str]], ignore_patterns: Iterable[str],
+                  use_gitignore: bool, skip_names: Iterable[str]) -> str:
+    """Key identifying the walk settings that directory listings depend on"""
+    return json.dumps([recursive, sorted(extensions) if extensions is not None else None,
+                       list(ignore_patterns), use_gitignore, sorted(skip_names)])
+
+def walk_files(directory: Path, recursive: bool = True, extensions: Optional[Set[str]] = None,
+               ignore_patterns: Optional[Iterable[str]] = None, use_gitignore: bool = True,
+               skip_names: Iterable[str] = (),
+               on_directory: Optional[DirectoryCallback] = None,
+               cache: Optional[DirectoryCache] = None) -> Iterator[Tuple[Path, os.DirEntry]]:
+    """
+    Lazily yield files under a directory
+    Args:
+        directory: Root to walk
+        recursive: Whether to descend into subdirectories
+        extensions: Lower-case suffixes to keep (None keeps every file); checked before any stat
+        ignore_patterns: .gitignore-style patterns relative to the root (defaults to DEFAULT_IGNORE_PATTERNS)
+        use_gitignore: Whether to honour .gitignore files found while walking
+        skip_names: File names never yielded (e.g. the metadata file)
+        on_directory: Called with (path, relative path, rules in effect) for every directory visited
+        cache: Listings of the last walk of this root, reused for unchanged directories and updated
+    Returns:
+        Iterator of (path, DirEntry) pairs in a stable, sorted order; files of directories
+        that were not listed again come with a CachedEntry
+    """
+    return ((Path(entry.path), entry) for entry in walk_entries(
+        directory, recursive, extensions, ignore_patterns, use_gitignore, skip_names, on_directory, cache))
+
+def walk_entries(directory: Path, recursive: bool = True, extensions: Optional[Set[str]] = None,
+                 ignore_patterns: Optional[Iterable[str]] = None, use_gitignore: bool = True,
+                 skip_names: Iterable[str] = (),
+                 on_directory: Optional[DirectoryCallback] = None,
+                 cache: Optional[DirectoryCache] = None,
+                 on_reuse: Optional[ReuseCallback] = None) -> Iterator[Union[os.DirEntry, CachedRun]]:
+    """
+    Like walk_files, but yield only the entries, for callers that need no Path for most files
+    Args:
+        on_reuse: Called for every directory whose listing is reused from the cache; it returns the
+            names of the files to yield one by one, and the others come as CachedRuns in their
+            place, or None to have every file yielded one by one
+    """
+    ignore_patterns = DEFAULT_IGNORE_PATTERNS if ignore_patterns is None else list(ignore_patterns)
+    if cache is not None:
+        cache.start(walk_settings(recursive, extensions, ignore_patterns, use_gitignore, skip_names))
+    return _walk_entries(Path(directory), "", [IgnoreRules(ignore_patterns)], recursive, extensions,
+                         use_gitignore, skip_names, on_directory, cache, on_reuse)
+
+def walk_subtree(directory: Path, relative_dir: str, rules: List["IgnoreRules"], recursive: bool = True,
+                 extensions: Optional[Set[str]] = None, use_gitignore: bool = True,
+                 skip_names: Iterable[str] = (),
+                 on_directory: Optional[DirectoryCallback] = None,
+                 cache: Optional[DirectoryCache] = None) -> Iterator[Tuple[Path, os.DirEntry]]:
+    """
+    Walk part of a tree given the rules its parents put in effect
+    Used by walk_files and by the watcher when a directory appears under a watched root.
+    Args:
+        directory: Subtree to walk
+        relative_dir: Its path relative to the walk root ("" for the root itself)
+        rules: Ignore rule sets in effect for its parent, outermost first
+    """
+    for entry in _walk_entries(directory, relative_dir, rules, recursive, extensions, use_gitignore, skip_names,
+                               on_directory, cache):
+        yield Path(entry.path), entry
+
+def _walk_entries(directory: Path, relative_dir: str, rules: List["IgnoreRules"], recursive: bool,
+                  extensions: Optional[Set[str]], use_gitignore: bool, skip_names: Iterable[str],
+                  on_directory: Optional[DirectoryCallback],
+                  cache: Optional[DirectoryCache],
+                  on_reuse: Optional[ReuseCallback] = None) -> Iterator[Union[os.DirEntry, CachedRun]]:
+    skip_names = set(skip_names)
+    # The last element says whether the rules in effect are those the cached listings were made with
+    stack = [(Path(directory), relative_dir, rules, cache is not None)]
+    while stack:
+        current, relative_dir, rules, reusable = stack.pop()
+        gitignore_stamp = None
+        if use_gitignore:
+            gitignore = current / ".gitignore"
+            gitignore_stamp = _stamp(gitignore)
+            if gitignore_stamp is not None:
+                rules = rules + [IgnoreRules.from_file(gitignore, relative_dir)]
+        if on_directory is not None:
+            on_directory(current, relative_dir, rules)
+            
+        if cache is not None:
+            stamp = _stamp(current)
+            listing = cache.listings.get(relative_dir)
+            # Subdirectories inherit these rules; they only match the cache if this .gitignore is unchanged
+            reusable = reusable and listing is not None and listing[1] == gitignore_stamp
+            if reusable and stamp is not None and listing[0] == stamp:
+                cache.visited[relative_dir] = listing
+                cache.reused += 1
+                base = os.path.join(str(current), "")
+                symlinks = set(listing[4].split("/")) if listing[4] else set()
+                names = listing[2].split("/") if listing[2] else []
+                single = on_reuse(relative_dir, base, names, symlinks) if on_reuse is not None and names else None
+                if single is None:
+                    for name in names:
+                        yield CachedEntry(name, base + name, name in symlinks)
+                else:
+                    start = 0
+                    for position in sorted(names.index(name) for name in set(single) if name in names):
+                        if position > start:
+                            yield CachedRun(base, "/".join(names[start:position]))
+                        yield CachedEntry(names[position], base + names[position], names[position] in symlinks)
+                        start = position + 1
+                    if start < len(names):
+                        yield CachedRun(base, listing[2] if start == 0 else "/".join(names[start:]))
+                stack.extend((current / name, f"{relative_dir}/{name}" if relative_dir else name, rules, True)
+                             for name in reversed(listing[3].split("/") if listing[3] else ()))
+                continue
+            listed_at = time.time_ns()
+        try:
+            with os.scandir(current) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        files = []
+        symlinks = []
+        subdirectories = []
+        for entry in entries:
+            relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if recursive and not is_ignored(rules, relative_path, True):
+                    subdirectories.append((Path(entry.path), relative_path, rules, reusable))
+                continue
+            if entry.name in skip_names:
+                continue
+            if extensions is not None and os.path.splitext(entry.name)[1].lower() not in extensions:
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            if is_ignored(rules, relative_path, False):
+                continue
+            files.append(entry.name)
+            if entry.is_symlink():
+                symlinks.append(entry.name)
+            yield entry
+        if cache is not None and stamp is not None and stamp[0] < listed_at - RACY_WINDOW_NS:
+            cache.visited[relative_dir] = [stamp, gitignore_stamp, "/".join(files),
+                                           "/".join(path.name for path, _, _, _ in subdirectories),
+                                           "/".join(symlinks)]
+        # Depth-first, visiting subdirectories in name order
+        stack.extend(reversed(subdirectories))
+    if cache is not None:
+        cache.complete = True
@@ -0,0 +1,332 @@
+"""
+Watch mode: keep tags fresh as files change.
+
+A watcher reports ("changed" | "deleted" | "deleted_dir" | "rescan", path)
+events for one directory tree. InotifyWatcher asks the Linux kernel for them through ctypes,
+so an idle tree costs no CPU at all; PollingWatcher re-walks the tree every few
+seconds and diffs (mtime, size) snapshots where inotify is unavailable. Both
+apply the same ignore rules as a normal run.
+
+watch() catches the tree up with one process_directory() run, then feeds
+events through a Debouncer, which coalesces bursts (an editor's
+write-rename-chmod, a build touching hundreds of files) into one batch per
+quiet period and keeps only the last event per path. Each batch is handed to
+SwarmController.apply_changes(), which re-tags changed files and drops deleted
+ones from the store.
+"""
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from .walker import DEFAULT_IGNORE_PATTERNS, IgnoreRules, is_ignored, walk_files, walk_subtree
+
+CHANGED = "changed"
+DELETED = "deleted"
+DELETED_DIR = "deleted_dir"
+RESCAN = "rescan"
+
+Event = Tuple[str, Path]
+
+# inotify(7) event bits
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct("iIII")
+
+_libc = None
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    return _libc
+
+def inotify_available() -> bool:
+    """Whether this platform provides inotify"""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        return hasattr(_load_libc(), "inotify_init1")
+    except OSError:
+        return False
+
+class Debouncer:
+    def __init__(self, quiet: float = 0.5, max_delay: float = 5.0):
+        """
+        Args:
+            quiet: Seconds without new events before a batch is released
+            max_delay: Longest a batch is held back while events keep arriving
+        """
+        self.quiet = quiet
+        self.max_delay = max_delay
+        self._pending: Dict[Path, str] = {}
+        self._first = self._last = 0.0
+        
+    def add(self, kind: str, path: Path, now: Optional[float] = None):
+        """Record an event; a later event for the same path replaces an earlier one"""
+        now = time.monotonic() if now is None else now
+        if not self._pending:
+            self._first = now
+        self._last = now
+        self._pending.pop(path, None)
+        self._pending[path] = kind
+        
+    def timeout(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds until the pending batch is due, or None when nothing is pending"""
+        if not self._pending:
+            return None
+        now = time.monotonic() if now is None else now
+        return max(0.0, min(self._last + self.quiet, self._first + self.max_delay) - now)
+        
+    def due(self, now: Optional[float] = None) -> bool:
+        return self.timeout(now) == 0.0
+        
+    def drain(self) -> Dict[str, List[Path]]:
+        """Take the pending batch as lists of paths keyed by event kind"""
+        pending, self._pending = self._pending, {}
+        batch: Dict[str, List[Path]] = {CHANGED: [], DELETED: [], DELETED_DIR: [], RESCAN: []}
+        for path, kind in pending.items():
+            batch[kind].append(path)
+        return batch
+
+class Watcher(ABC):
+    """Source of filesystem events for one tree"""
+    def __init__(self, directory: Path, recursive: bool = True,
+                 ignore_patterns: Optional[List[str]] = None, use_gitignore: bool = True):
+        self.directory = Path(directory)
+        self.recursive = recursive
+        self.ignore_patterns = list(DEFAULT_IGNORE_PATTERNS if ignore_patterns is None else ignore_patterns)
+        self.use_gitignore = use_gitignore
+        
+    @abstractmethod
+    def read(self, timeout: Optional[float]) -> List[Event]:
+        """Wait up to timeout seconds (None: indefinitely) and return the events seen"""
+        pass
+        
+    def close(self):
+        pass
+
+class InotifyWatcher(Watcher):
+    """Kernel-driven events; one watch per non-ignored directory"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._libc = _load_libc()
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        # wd -> (directory, path relative to the root, ignore rules in effect there)
+        self._watches: Dict[int, Tuple[Path, str, List[IgnoreRules]]] = {}
+        rules = [IgnoreRules(self.ignore_patterns)]
+        for _ in walk_subtree(self.directory, "", rules, self.recursive, extensions=set(),
+                              use_gitignore=self.use_gitignore, on_directory=self._add_watch):
+            pass
+            
+    def _add_watch(self, directory: Path, relative_dir: str, rules: List[IgnoreRules]):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                print(f"Error watching {directory}: inotify watch limit reached "
+                      "(raise fs.inotify.max_user_watches or use --poll)")
+            return
+        self._watches[wd] = (directory, relative_dir, rules)
+        
+    def _scan_new_directory(self, directory: Path, relative_dir: str, parent_rules: List[IgnoreRules]) -> List[Event]:
+        """Watch a directory created or moved into the tree and report the files already in it"""
+        return [(CHANGED, file_path) for file_path, _ in walk_subtree(
+            directory, relative_dir, parent_rules, self.recursive,
+            use_gitignore=self.use_gitignore, on_directory=self._add_watch
+        )]
+        
+    def _drop_watches(self, directory: Path):
+        """Stop watching a directory that left the tree, and everything below it"""
+        for wd, (path, _, _) in list(self._watches.items()):
+            if path == directory or directory in path.parents:
+                self._libc.inotify_rm_watch(self.fd, wd)
+                self._watches.pop(wd, None)
+                
+    def read(self, timeout: Optional[float]) -> List[Event]:
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0"))
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                events.append((RESCAN, self.directory))
+                continue
+            watch = self._watches.get(wd)
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            if watch is None or not name:
+                continue
+            directory, relative_dir, rules = watch
+            path = directory / name
+            relative_path = f"{relative_dir}/{name}" if relative_dir else name
+            is_dir = bool(mask & IN_ISDIR)
+            if is_ignored(rules, relative_path, is_dir):
+                continue
+            if is_dir:
+                if mask & (IN_MOVED_FROM | IN_DELETE):
+                    self._drop_watches(path)
+                    events.append((DELETED_DIR, path))
+                elif mask & (IN_CREATE | IN_MOVED_TO) and self.recursive:
+                    events.extend(self._scan_new_directory(path, relative_path, rules))
+            elif mask & (IN_MOVED_FROM | IN_DELETE):
+                events.append((DELETED, path))
+            else:
+                events.append((CHANGED, path))
+        return events
+        
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+class PollingWatcher(Watcher):
+    """Periodic re-walk of the tree, diffing (mtime, size) of every file"""
+    def __init__(self, *args, interval: float = 2.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.interval = interval
+        self._snapshot = self._scan()
+        self._next_scan = time.monotonic() + interval
+        
+    def _scan(self) -> Dict[Path, Tuple[int, int]]:
+        snapshot = {}
+        for file_path, entry in walk_files(self.directory, self.recursive, ignore_patterns=self.ignore_patterns,
+                                           use_gitignore=self.use_gitignore):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            snapshot[file_path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+        
+    def read(self, timeout: Optional[float]) -> List[Event]:
+        wait = self._next_scan - time.monotonic()
+        if timeout is not None and wait > timeout:
+            time.sleep(timeout)
+            return []
+        if wait > 0:
+            time.sleep(wait)
+        self._next_scan = time.monotonic() + self.interval
+        snapshot = self._scan()
+        events = [(CHANGED, path) for path, signature in snapshot.items() if self._snapshot.get(path) != signature]
+        events.extend((DELETED, path) for path in self._snapshot if path not in snapshot)
+        self._snapshot = snapshot
+        return events
+
+def open_watcher(directory: Path, recursive: bool = True, ignore_patterns: Optional[List[str]] = None,
+                 use_gitignore: bool = True, poll_interval: Optional[float] = None) -> Watcher:
+    """
+    Create the best watcher for this platform
+    Args:
+        poll_interval: Force the polling watcher with this interval in seconds
+    """
+    if poll_interval is None and inotify_available():
+        try:
+            return InotifyWatcher(directory, recursive, ignore_patterns, use_gitignore)
+        except OSError as e:
+            print(f"Error starting inotify, falling back to polling: {e}")
+    return PollingWatcher(directory, recursive, ignore_patterns, use_gitignore,
+                          interval=poll_interval or 2.0)
+
+def _vanished(swarm, directory: Path, recursive: bool, found) -> List[Path]:
+    """Stored files under a directory that a walk of it did not find and that no longer exist"""
+    root = str(directory)
+    # Files directly under "." are stored without the "./" prefix
+    prefix = "" if root == os.curdir else root.rstrip(os.sep) + os.sep
+    vanished = []
+    for file_key in swarm.metadata:
+        if file_key in found or not file_key.startswith(prefix) or os.path.isabs(file_key) != os.path.isabs(root):
+            continue
+        if not recursive and os.sep in file_key[len(prefix):]:
+            continue
+        if not os.path.lexists(file_key):
+            vanished.append(Path(file_key))
+    return vanished
+
+def watch(swarm, directory: Path, recursive: bool = True, debounce: float = 0.5,
+          poll_interval: Optional[float] = None, max_workers: int = 1,
+          stop: Optional[threading.Event] = None,
+          on_batch: Optional[Callable[[Dict[str, int]], None]] = None):
+    """
+    Tag a tree, then keep its tags up to date until stopped
+    Args:
+        swarm: SwarmController whose store is updated
+        directory: Tree to watch
+        recursive: Whether subdirectories are watched
+        debounce: Quiet period in seconds before a burst of events is processed
+        poll_interval: Poll every this many seconds instead of using inotify
+        max_workers: Number of changed files analyzed concurrently
+        stop: Event that ends the watch when set; otherwise runs until interrupted
+        on_batch: Called with the batch's {"changed", "deleted", "tagged"} path counts; after a
+            rescan, "changed" counts the files the rescan found changed
+    """
+    directory = Path(directory)
+    stop = stop or threading.Event()
+    # Subscribe before catching up, so changes made during the first run are not missed
+    watcher = open_watcher(directory, recursive, swarm.ignore_patterns, swarm.use_gitignore, poll_interval)
+    debouncer = Debouncer(quiet=debounce)
+    try:
+        swarm.process_directory(directory, recursive, max_workers=max_workers)
+        print(f"Watching {directory} for changes ({type(watcher).__name__}); press Ctrl-C to stop")
+        while not stop.is_set():
+            timeout = debouncer.timeout()
+            # Wake up now and then to notice the stop event; idle waits cost no CPU
+            for kind, path in watcher.read(1.0 if timeout is None else min(timeout, 1.0)):
+                debouncer.add(kind, path)
+            if not debouncer.due():
+                continue
+            batch = debouncer.drain()
+            if batch[RESCAN]:
+                # The kernel queue overflowed and events were lost: the walk finds changed files,
+                # and deleted ones are those missing from it
+                results = swarm.process_directory(directory, recursive, max_workers=max_workers)
+                vanished = _vanished(swarm, directory, recursive, results)
+                swarm.apply_changes([], vanished)
+                tagged = changed = len(results.analyzed)
+                deleted = len(vanished)
+            else:
+                tagged = len(swarm.apply_changes(batch[CHANGED], batch[DELETED], batch[DELETED_DIR],
+                                                 max_workers=max_workers))
+                changed = len(batch[CHANGED])
+                deleted = len(batch[DELETED]) + len(batch[DELETED_DIR])
+            counts = {"changed": changed, "deleted": deleted, "tagged": tagged}
+            if tagged:
+                print(f"Re-tagged {tagged} of {changed} changed files")
+            if on_batch is not None:
+                on_batch(counts)
+    finally:
+        watcher.close()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Compare one-file-per-request analysis with batched multi-file prompts.
+
+Every agent's OpenAI client is replaced by a stub that sleeps for a fixed
+latency per request, answers batch prompts with per-file JSON and counts
+prompt/completion tokens with the same estimate the batcher uses. The corpus
+is dominated by small configs and short modules, like most real trees.
+
+Usage:
+    python benchmarks/bench_batching.py --files 300 --batch-tokens 1500 --workers 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+os.environ.setdefault('OPENAI_API_KEY', 'sk-benchmark')
+
+from auto_tagger.swarm_controller import SwarmController
+from corpus import make_corpus
+from fake_openai import StubClient
+
+
+def run(corpus: Path, workdir: Path, latency: float, workers: int, batch_tokens: int):
+    metadata = workdir / "metadata.json"
+    if metadata.exists():
+        metadata.unlink()
+    swarm = SwarmController(cache_max_bytes=0)
+    clients = []
+    for agent in swarm.agents:
+        agent.client = StubClient(latency)
+        clients.append(agent.client)
+    start = time.perf_counter()
+    results = swarm.process_directory(corpus, recursive=True, max_workers=workers, batch_tokens=batch_tokens)
+    elapsed = time.perf_counter() - start
+    return {
+        "files": len(results),
+        "seconds": elapsed,
+        "requests": sum(c.requests for c in clients),
+        "prompt_tokens": sum(c.prompt_tokens for c in clients),
+        "completion_tokens": sum(c.completion_tokens for c in clients),
+        "retried": swarm.batch_stats.retried_files
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=300)
+    parser.add_argument('--latency', type=float, default=0.02, help='Injected seconds per API call')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--batch-tokens', type=int, default=1500)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        corpus = tmp / "corpus"
+        corpus.mkdir()
+        # Mostly small configs and short modules with a tail of larger files
+        make_corpus(corpus, args.files, median_size=256)
+        previous_cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            single = run(corpus, tmp, args.latency, args.workers, 0)
+            batched = run(corpus, tmp, args.latency, args.workers, args.batch_tokens)
+        finally:
+            os.chdir(previous_cwd)
+            
+    print(f"\n{args.files} files, {args.workers} workers, {args.latency * 1000:.0f} ms simulated latency")
+    print(f"{'mode':<12} {'requests':>9} {'prompt tok':>11} {'output tok':>11} {'seconds':>8} {'files/s':>8}")
+    for name, row in (("single", single), (f"batch {args.batch_tokens}", batched)):
+        print(f"{name:<12} {row['requests']:>9} {row['prompt_tokens']:>11} {row['completion_tokens']:>11} "
+              f"{row['seconds']:>8.2f} {row['files'] / row['seconds']:>8.1f}")
+    print(f"\nprompt tokens saved: {1 - batched['prompt_tokens'] / single['prompt_tokens']:.0%}, "
+          f"requests saved: {1 - batched['requests'] / single['requests']:.0%}, "
+          f"speedup: {single['seconds'] / batched['seconds']:.1f}x, "
+          f"retried individually: {batched['retried']}")
+
+
+if __name__ == '__main__':
+    main()
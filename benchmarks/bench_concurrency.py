@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark serial vs. concurrent SwarmController.process_directory.
+
+Every agent's OpenAI client is replaced by a stub that sleeps for a fixed
+latency before answering, so the speedup from --workers can be measured
+offline and without an API key.
+
+Usage:
+    python benchmarks/bench_concurrency.py --files 200 --latency 0.05 --workers 1 8 32
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+os.environ.setdefault('OPENAI_API_KEY', 'sk-benchmark')
+
+from auto_tagger.swarm_controller import SwarmController
+from corpus import make_corpus
+from fake_openai import StubClient
+
+
+def run(corpus: Path, workdir: Path, latency: float, workers: int) -> float:
+    metadata = workdir / "metadata.json"
+    if metadata.exists():
+        metadata.unlink()
+    # No result cache, so every run pays the simulated latency
+    swarm = SwarmController(cache_max_bytes=0)
+    for agent in swarm.agents:
+        agent.client = StubClient(latency)
+    start = time.perf_counter()
+    swarm.process_directory(corpus, recursive=True, max_workers=workers)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=120)
+    parser.add_argument('--latency', type=float, default=0.05, help='Injected seconds per API call')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16])
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        corpus = tmp / "corpus"
+        corpus.mkdir()
+        # Small files of every kind, so the run is dominated by request latency
+        make_corpus(corpus, args.files, mix="code=1,doc=1,data=1", distribution="fixed", median_size=64)
+        previous_cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            baseline = None
+            rows = []
+            for workers in args.workers:
+                elapsed = run(corpus, tmp, args.latency, workers)
+                baseline = baseline or elapsed
+                rows.append((workers, elapsed, args.files / elapsed, baseline / elapsed))
+        finally:
+            os.chdir(previous_cwd)
+            
+    print(f"\n{args.files} files, {args.latency * 1000:.0f} ms simulated latency")
+    print(f"{'workers':>8} {'seconds':>9} {'files/s':>9} {'speedup':>8}")
+    for workers, elapsed, rate, speedup in rows:
+        print(f"{workers:>8} {elapsed:>9.2f} {rate:>9.1f} {speedup:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Compare CodeAgent's condensed samples with the old 1500-character head.
+
+Samples every source file CodeAgent handles under the given paths (this
+repository by default) both ways and reports the prompt tokens of the
+sample per file, measured with the same tokenizer the condenser uses
+(tiktoken if installed, otherwise its estimate). As a proxy for tag quality
+it also reports, for Python files, the share of top-level classes and
+functions whose names appear in the sample, i.e. how much of the module's
+API the model actually gets to see.
+
+Usage:
+    python benchmarks/bench_condense.py /path/to/repo --budget 400
+"""
+import argparse
+import ast
+import statistics
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from auto_tagger.agents.code_agent import CodeAgent
+from auto_tagger.condense import count_tokens, _encoding
+
+HEAD_CHARS = 1500
+
+
+def top_level_names(source: str):
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return []
+    return [node.name for node in tree.body
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', type=Path, default=[ROOT])
+    parser.add_argument('--budget', type=int, default=CodeAgent.sample_tokens, help='Token budget of the condensed sample')
+    args = parser.parse_args()
+    
+    agent = CodeAgent()
+    agent.sample_tokens = args.budget
+    files = sorted({path for root in args.paths for path in ([root] if root.is_file() else root.rglob("*"))
+                    if path.is_file() and agent.can_handle_file(path)})
+    head_tokens, condensed_tokens, head_coverage, condensed_coverage = [], [], [], []
+    for path in files:
+        head = agent.read_sample(path, HEAD_CHARS, "head")
+        condensed = agent.build_sample(path) or ""
+        if not head:
+            continue
+        head_tokens.append(count_tokens(head))
+        condensed_tokens.append(count_tokens(condensed))
+        if path.suffix == ".py":
+            names = top_level_names(agent.read_sample(path))
+            if names:
+                head_coverage.append(sum(name in head for name in names) / len(names))
+                condensed_coverage.append(sum(name in condensed for name in names) / len(names))
+    if not head_tokens:
+        print("No source files found")
+        return
+        
+    print(f"{len(head_tokens)} files, tokens counted with {'tiktoken' if _encoding() else 'the built-in estimate'}")
+    print(f"{'sample':<22} {'tokens/file':>11} {'median':>7} {'max':>6} {'total':>9} {'API coverage':>13}")
+    for name, tokens, coverage in ((f"head {HEAD_CHARS} chars", head_tokens, head_coverage),
+                                   (f"condensed {args.budget} tokens", condensed_tokens, condensed_coverage)):
+        share = f"{statistics.mean(coverage):.0%}" if coverage else "-"
+        print(f"{name:<22} {statistics.mean(tokens):>11.1f} {statistics.median(tokens):>7.0f} "
+              f"{max(tokens):>6} {sum(tokens):>9} {share:>13}")
+    saved = 1 - sum(condensed_tokens) / sum(head_tokens)
+    print(f"Prompt tokens saved: {saved:.1%}")
+
+
+if __name__ == '__main__':
+    main()
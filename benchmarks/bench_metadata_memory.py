@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Measure the memory held by a loaded metadata store.
+
+Writes a synthetic metadata.json with the shape the agents produce (a
+purpose sentence, components, ~6 tags drawn from a 2000-tag vocabulary)
+and loads it in fresh interpreters two ways: json.load into nested
+dictionaries, as JSONMetadataStore used to, and JSONMetadataStore.load into
+compact records. For each it reports the resident set size added by the
+load (current RSS from /proc where available, otherwise peak RSS), the
+bytes per file, and the load time. RSS is taken after every file's
+modification time has been checked, as a rescan does, so it includes
+anything that check decodes.
+
+Usage:
+    python benchmarks/bench_metadata_memory.py --sizes 100000 1000000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from auto_tagger.records import entry_text, write_entries
+
+WORDS = ("weather forecast client server request response cache index search query parser token stream "
+         "buffer config logging metrics scheduler worker queue database migration schema record user").split()
+
+LOAD = r"""
+import json, resource, sys, time
+sys.path.insert(0, sys.argv[3])
+
+def rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+from auto_tagger.storage import JSONMetadataStore
+before = rss()
+start = time.perf_counter()
+if sys.argv[1] == "dict":
+    with open(sys.argv[2]) as f:
+        metadata = json.load(f)
+    unknown = sum(1 for entry in metadata.values() if entry.get("last_modified") is None)
+else:
+    metadata = JSONMetadataStore(sys.argv[2]).load()
+    unknown = sum(1 for path in metadata if metadata.last_modified(path) is None)
+elapsed = time.perf_counter() - start
+loaded = rss()
+print(json.dumps({"bytes": loaded - before, "seconds": elapsed, "files": len(metadata)}))
+"""
+
+
+def entries(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    vocabulary = [f"{rng.choice(WORDS)}-{i}" for i in range(2000)]
+    for i in range(count):
+        words = rng.choices(WORDS, k=30)
+        yield f"/home/user/projects/repo{i % 97}/src/module_{i}.py", {
+            "tags": rng.sample(vocabulary, 6),
+            "metadata": {
+                "file_type": ".py",
+                "language": "Python",
+                "purpose": " ".join(words).capitalize() + ".",
+                "components": [f"{word.capitalize()}Handler" for word in words[:5]],
+                "size": rng.randint(200, 50000)
+            },
+            "last_modified": 1700000000.0 + rng.random() * 1e7,
+            "agent": "CodeAgent"
+        }
+
+
+def measure(mode: str, path: Path):
+    result = subprocess.run([sys.executable, "-c", LOAD, mode, str(path), str(ROOT)],
+                            check=True, stdout=subprocess.PIPE, text=True)
+    return json.loads(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000])
+    args = parser.parse_args()
+    
+    print(f"{'files':>9} {'store':>9} {'model':<8} {'RSS':>10} {'bytes/file':>11} {'load':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp, "metadata.json")
+        for size in args.sizes:
+            write_entries(str(path), ((key, entry_text(entry)) for key, entry in entries(size)))
+            megabytes = os.path.getsize(path) / 2**20
+            results = {mode: measure(mode, path) for mode in ("dict", "compact")}
+            for mode, result in results.items():
+                print(f"{size:>9} {megabytes:>7.0f}MB {mode:<8} {result['bytes'] / 2**20:>8.1f}MB "
+                      f"{result['bytes'] / size:>11.0f} {result['seconds']:>7.2f}s")
+            print(f"{'':>9} {'':>9} {'ratio':<8} {results['dict']['bytes'] / results['compact']['bytes']:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Compare whole-file reads with bounded text samples on a large-file corpus.
+
+Builds a corpus of large .txt logs and small .py modules, then samples every
+file in a fresh interpreter twice: once the old way (decode the whole file
+with get_file_content, then slice) and once with BaseAgent.read_sample. Each
+run reports its wall time over the corpus (page cache warm) and the peak RSS
+of the process.
+
+Usage:
+    python benchmarks/bench_read_sample.py --large 40 --size-mb 8 --small 2000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+RUN_SNIPPET = """
+import resource, sys, time
+from pathlib import Path
+from auto_tagger.agents.doc_agent import DocAgent
+agent = DocAgent()
+files = sorted(Path(sys.argv[1]).iterdir())
+mode = sys.argv[2]
+start = time.perf_counter()
+total = 0
+for path in files:
+    if mode == "whole":
+        total += len(agent.get_file_content(path)[:agent.sample_chars])
+    else:
+        total += len(agent.read_sample(path))
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, total)
+"""
+
+
+def build_corpus(directory: Path, large: int, size: int, small: int):
+    line = "2024-01-01 12:00:00 INFO request handled path=/api/items status=200 duration=12ms\n"
+    block = line * (1024 * 1024 // len(line))
+    for i in range(large):
+        with open(directory / f"service_{i}.txt", 'w') as f:
+            for _ in range(max(1, size // len(block))):
+                f.write(block)
+    module = "import os\n\n\ndef handler(event):\n    return os.path.join('a', event)\n" * 20
+    for i in range(small):
+        (directory / f"module_{i}.py").write_text(module)
+
+
+def run(directory: Path, mode: str, env):
+    result = subprocess.run([sys.executable, "-c", RUN_SNIPPET, str(directory), mode], env=env,
+                            capture_output=True, text=True, check=True)
+    elapsed, rss, total = result.stdout.split()
+    return float(elapsed), int(rss), int(total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--large', type=int, default=40, help='Number of large log files')
+    parser.add_argument('--size-mb', type=int, default=8, help='Size of each large file in MB')
+    parser.add_argument('--small', type=int, default=2000, help='Number of small source files')
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=str(ROOT) + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        build_corpus(directory, args.large, args.size_mb * 1024 * 1024, args.small)
+        # Warm the page cache so both runs measure decoding rather than disk
+        run(directory, "sample", env)
+        rows = [(mode, *run(directory, mode, env)) for mode in ("whole", "sample")]
+
+    print(f"\n{args.large} x {args.size_mb} MB logs + {args.small} small modules")
+    print(f"{'mode':<8} {'seconds':>9} {'files/s':>9} {'peak RSS MB':>12} {'chars kept':>11}")
+    files = args.large + args.small
+    for mode, elapsed, rss, total in rows:
+        print(f"{mode:<8} {elapsed:>9.3f} {files / elapsed:>9.0f} {rss / 1024:>12.1f} {total:>11}")
+
+
+if __name__ == '__main__':
+    main()
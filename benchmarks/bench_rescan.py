@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Measure warm rescans of a large tree where only a few files changed.
+
+Builds a tree of small Python files (1000 per directory), stores an analysis
+for every file, and optionally commits the tree to a git repository. Each
+mode then gets its own batch of modified files and is timed on the rescan
+that picks them up:
+
+    dirs    unchanged directories reused from the last scan, their files stat'ed
+            in bulk and checked one by one only near a change
+    git     --git: only files git reports as changed are stat'ed
+    full    --full-scan: every directory listed, every file stat'ed and checked
+
+Loading the metadata store is timed separately from the scan itself.
+
+Usage:
+    python benchmarks/bench_rescan.py --count 1000000 --changes 100 --store sqlite
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from auto_tagger.changes import fingerprint
+from auto_tagger.records import entry_text, write_entries
+from auto_tagger.storage import open_store
+from auto_tagger.swarm_controller import SwarmController
+
+PER_DIRECTORY = 1000
+
+
+def build_tree(tree: Path, count: int, metadata: str, store: str):
+    """Write the files, dated a minute back, and a stored analysis for each"""
+    past = time.time() - 60
+    
+    def entries():
+        for i in range(count):
+            directory = tree / f"d{i // PER_DIRECTORY:04d}"
+            if i % PER_DIRECTORY == 0:
+                directory.mkdir(parents=True)
+            path = directory / f"f{i:07d}.py"
+            with open(path, 'w') as f:
+                f.write(f"value = {i}\n")
+            os.utime(path, (past, past))
+            stat = path.stat()
+            yield str(path), {"tags": ["python", "code"], "metadata": {"file_type": ".py"},
+                              "last_modified": stat.st_mtime, "fingerprint": list(fingerprint(stat)),
+                              "agent": "CodeAgent"}
+        
+    if store == "json":
+        write_entries(metadata, ((path, entry_text(entry)) for path, entry in entries()))
+    else:
+        target = open_store(metadata, store)
+        for path, entry in entries():
+            target.upsert(path, entry)
+        target.close()
+    for directory in tree.iterdir():
+        os.utime(directory, (past, past))
+
+
+def git(tree: Path, *args: str):
+    subprocess.run(["git", "-C", str(tree), "-c", "gc.auto=0", "-c", "user.name=bench", "-c", "user.email=bench@example.com",
+                    *args], check=True, stdout=subprocess.DEVNULL)
+
+
+def modify(tree: Path, count: int, changes: int, round_: int):
+    """Rewrite a spread of files in place, which leaves their directories' mtimes alone"""
+    for i in range(round_, count, max(1, count // changes)):
+        path = tree / f"d{i // PER_DIRECTORY:04d}" / f"f{i:07d}.py"
+        with open(path, 'a') as f:
+            f.write(f"changed = {round_}\n")
+
+
+def rescan(metadata: str, store: str, tree: Path, use_git: bool = False, full_scan: bool = False):
+    started = time.perf_counter()
+    store = open_store(metadata, store)
+    swarm = SwarmController(store=store, backend="heuristic", cache_max_bytes=0, journal=False,
+                            use_gitignore=False, use_git=use_git)
+    loaded = time.perf_counter()
+    files = len(swarm.process_directory(tree, full_scan=full_scan))
+    finished = time.perf_counter()
+    # The results are gone, so closing the store does not read the entries they would have kept
+    store.close()
+    return loaded - started, finished - loaded, files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=1000000)
+    parser.add_argument('--changes', type=int, default=100)
+    parser.add_argument('--store', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--no-git', action='store_true', help='Skip the git mode')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tree = Path(tmp) / "tree"
+        metadata = os.path.join(tmp, "metadata.json" if args.store == "json" else "metadata.db")
+        started = time.perf_counter()
+        build_tree(tree, args.count, metadata, args.store)
+        print(f"Built {args.count} files in {time.perf_counter() - started:.0f}s")
+        modes = [("dirs", False, False)]
+        if not args.no_git:
+            started = time.perf_counter()
+            git(tree, "init", "-q")
+            git(tree, "add", "-A")
+            git(tree, "commit", "-q", "-m", "tree")
+            print(f"Committed the tree in {time.perf_counter() - started:.0f}s")
+            modes.append(("git", True, False))
+        # Last, since a full scan starts the recorded state afresh, without the commit git mode compares with
+        modes.append(("full", False, True))
+        
+        # Records the directory listings (and the commit) the warm rescans start from
+        rescan(metadata, args.store, tree, use_git=not args.no_git)
+        
+        print(f"{'mode':<6} {'load':>8} {'scan':>8} {'files':>9}")
+        for round_, (mode, use_git, full_scan) in enumerate(modes, 1):
+            modify(tree, args.count, args.changes, round_)
+            load, scan, files = rescan(metadata, args.store, tree, use_git, full_scan)
+            print(f"{mode:<6} {load:>7.2f}s {scan:>7.2f}s {files:>9}")
+
+
+if __name__ == '__main__':
+    main()
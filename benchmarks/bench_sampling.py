@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Measure peak memory of DataAgent sampling as data files grow.
+
+Generates CSV, JSON array, NDJSON, XML, XLSX and YAML files of each requested
+size, then builds DataAgent's sample for every file in a fresh interpreter
+and reports the peak RSS (ru_maxrss) of that process. With --eager it also
+loads each file the way DataAgent used to (pd.read_csv, json.load, whole-file
+reads) for comparison. Streaming samples should stay flat across sizes.
+
+Usage:
+    python benchmarks/bench_sampling.py --sizes 16,128 --eager
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SAMPLE_SNIPPET = """
+import resource, sys
+from pathlib import Path
+from auto_tagger.agents.data_agent import DataAgent
+sample = DataAgent().build_sample(Path(sys.argv[1]))
+assert sample
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+EAGER_SNIPPET = """
+import resource, sys, json
+path = sys.argv[1]
+if path.endswith('.csv'):
+    import pandas as pd
+    pd.read_csv(path)
+elif path.endswith('.json'):
+    with open(path) as f:
+        json.load(f)
+else:
+    with open(path, 'rb') as f:
+        f.read()
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def write_repeated(path: Path, size: int, head: str, record, tail: str = "", separator: str = ""):
+    """Write head, then records until the file reaches size bytes, then tail"""
+    with open(path, 'w') as f:
+        f.write(head)
+        written, i = len(head), 0
+        while written < size:
+            chunk = "".join((separator if i + j else "") + record(i + j) for j in range(1000))
+            f.write(chunk)
+            written += len(chunk)
+            i += 1000
+        f.write(tail)
+
+
+def write_xlsx(path: Path, size: int):
+    """Workbook whose first sheet holds inline-string rows up to about size bytes of sheet XML"""
+    main = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("xl/workbook.xml", f'<workbook xmlns="{main}"><sheets><sheet name="Data"/></sheets></workbook>')
+        with archive.open("xl/worksheets/sheet1.xml", 'w', force_zip64=True) as f:
+            f.write(f'<worksheet xmlns="{main}"><sheetData>'.encode())
+            written, row = 0, 1
+            while written < size:
+                chunk = "".join(
+                    f'<row r="{r}"><c r="A{r}" t="inlineStr"><is><t>item{r}</t></is></c><c r="B{r}"><v>{r * 3}</v></c></row>'
+                    for r in range(row, row + 1000)
+                ).encode()
+                f.write(chunk)
+                written += len(chunk)
+                row += 1000
+            f.write(b'</sheetData></worksheet>')
+
+
+def generate(directory: Path, size: int):
+    """One file of roughly size bytes per sampled format"""
+    files = {
+        "csv": directory / "data.csv",
+        "json": directory / "data.json",
+        "ndjson": directory / "data.ndjson",
+        "xml": directory / "data.xml",
+        "xlsx": directory / "data.xlsx",
+        "yaml": directory / "data.yaml",
+    }
+    write_repeated(files["csv"], size, "id,name,score,city\n", lambda i: f"{i},user{i},{i % 97},city{i % 13}\n")
+    write_repeated(files["json"], size, "[", lambda i: json.dumps({"id": i, "name": f"user{i}", "tags": ["a", "b"]}),
+                   "]", ",")
+    write_repeated(files["ndjson"], size, "", lambda i: json.dumps({"id": i, "event": "click"}) + "\n")
+    write_repeated(files["xml"], size, "<users>", lambda i: f'<user id="{i}"><name>user{i}</name></user>', "</users>")
+    write_xlsx(files["xlsx"], size)
+    write_repeated(files["yaml"], size, "users:\n", lambda i: f"  - id: {i}\n    name: user{i}\n")
+    return files
+
+
+def peak_rss_kb(snippet: str, path: Path, env) -> int:
+    result = subprocess.run([sys.executable, "-c", snippet, str(path)], env=env,
+                            capture_output=True, text=True, check=True)
+    return int(result.stdout.split()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default="16,128", help='Comma-separated file sizes in MB')
+    parser.add_argument('--eager', action='store_true', help='Also measure whole-file loading')
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=str(ROOT) + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    sizes = [int(size) for size in args.sizes.split(",")]
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            directory = Path(tmp, str(size))
+            directory.mkdir()
+            for name, path in generate(directory, size * 1024 * 1024).items():
+                streaming = peak_rss_kb(SAMPLE_SNIPPET, path, env)
+                eager = peak_rss_kb(EAGER_SNIPPET, path, env) if args.eager and name != "xlsx" else None
+                rows.append((name, size, path.stat().st_size, streaming, eager))
+                path.unlink()
+
+    print(f"\n{'format':<8} {'size MB':>8} {'on disk MB':>11} {'sample RSS MB':>14} {'eager RSS MB':>13}")
+    for name, size, on_disk, streaming, eager in rows:
+        eager_text = f"{eager / 1024:>13.1f}" if eager is not None else f"{'-':>13}"
+        print(f"{name:<8} {size:>8} {on_disk / 1024 / 1024:>11.1f} {streaming / 1024:>14.1f} {eager_text}")
+
+
+if __name__ == '__main__':
+    main()
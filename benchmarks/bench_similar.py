@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Measure top-k similarity search latency on a large embedding index.
+
+Writes an index of random unit vectors (drawn around a few thousand cluster
+centres, so neighbours are meaningful) in float32 and int8, then times
+EmbeddingIndex.search for single queries and for batches of queries, with
+the file already memory-mapped and in the page cache. Recall@k of the int8
+index is measured against the exact float32 results.
+
+Usage:
+    python benchmarks/bench_similar.py --count 1000000 --dim 384 --k 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from auto_tagger.embeddings import EmbeddingIndex, normalize, write_index
+
+CHUNK = 65536
+
+
+def chunks(count: int, dim: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centres = normalize(rng.standard_normal((4096, dim)).astype(np.float32))
+    for start in range(0, count, CHUNK):
+        size = min(CHUNK, count - start)
+        vectors = centres[rng.integers(len(centres), size=size)] + 0.6 * rng.standard_normal((size, dim)) / np.sqrt(dim)
+        yield [f"src/module_{i}.py" for i in range(start, start + size)], [0.0] * size, normalize(vectors.astype(np.float32))
+
+
+def timed(index, queries, k, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        results = index.search(queries, k)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=1000000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--batch', type=int, default=32, help='Queries per batched search')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    
+    print(f"{args.count} vectors x {args.dim} dims, top {args.k}, median of {args.runs} runs")
+    print(f"{'index':<8} {'size':>9} {'1 query':>10} {f'{args.batch} queries':>12} {'per query':>10} {'recall':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        exact = None
+        for dtype in ("float32", "int8"):
+            path = os.path.join(tmp, f"index.{dtype}.vec")
+            write_index(path, "bench", chunks(args.count, args.dim), quantized=dtype == "int8")
+            index = EmbeddingIndex(path)
+            rng = np.random.default_rng(1)
+            queries = np.stack([index.vector(int(i)) for i in rng.integers(args.count, size=args.batch)])
+            queries += 0.3 * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(args.dim)
+            index.search(queries[:1], args.k)  # fault the file into the page cache
+            single, _ = timed(index, queries[:1], args.k, args.runs)
+            batched, results = timed(index, queries, args.k, args.runs)
+            found = [{file_id for file_id, _ in row} for row in results]
+            if exact is None:
+                exact = found
+            recall = statistics.mean(len(a & b) / len(b) for a, b in zip(found, exact))
+            print(f"{dtype:<8} {os.path.getsize(path) / 2**20:>7.0f}MB {single * 1000:>8.1f}ms "
+                  f"{batched * 1000:>10.1f}ms {batched / args.batch * 1000:>8.2f}ms {recall:>7.1%}")
+            index.close()
+
+
+if __name__ == '__main__':
+    main()
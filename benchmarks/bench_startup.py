@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Measure CLI startup for a search-only call.
+
+Runs `python -m auto_tagger <dir> -s <tag>` in fresh interpreters against a
+small metadata.json and reports the median wall time, alongside an eager
+reference that imports every built-in agent and its dependencies the way the
+package used to at import time. It also checks which heavy modules the
+search path pulled in, using -X importtime.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ("openai", "pandas", "dotenv", "asyncio", "tqdm")
+
+
+def timed_run(command, cwd, env):
+    start = time.perf_counter()
+    subprocess.run(command, cwd=cwd, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def imported_modules(command, cwd, env):
+    result = subprocess.run(command[:1] + ["-X", "importtime"] + command[1:], cwd=cwd, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    return {line.rsplit("|", 1)[-1].strip() for line in result.stderr.splitlines() if line.startswith("import time:")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+    
+    env = dict(os.environ, PYTHONPATH=str(ROOT) + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    with tempfile.TemporaryDirectory() as tmp:
+        metadata = {f"src/file_{i}.py": {"tags": ["python", f"tag{i % 50}"]} for i in range(1000)}
+        Path(tmp, "metadata.json").write_text(json.dumps(metadata))
+        search = [sys.executable, "-m", "auto_tagger", tmp, "-s", "python"]
+        eager = [sys.executable, "-c",
+                 "import openai, pandas, dotenv, auto_tagger.agents.code_agent, "
+                 "auto_tagger.agents.doc_agent, auto_tagger.agents.data_agent"]
+        baseline = [sys.executable, "-c", "pass"]
+        
+        rows = []
+        for name, command in (("python -c pass", baseline), ("search (-s python)", search),
+                              ("eager agent imports", eager)):
+            times = [timed_run(command, tmp, env) for _ in range(args.runs)]
+            rows.append((name, statistics.median(times)))
+        loaded = imported_modules(search, tmp, env)
+        
+    print(f"\nmedian of {args.runs} runs")
+    for name, seconds in rows:
+        print(f"{name:<22} {seconds * 1000:>8.1f} ms")
+    heavy = [module for module in HEAVY_MODULES if module in loaded]
+    print(f"\nheavy modules imported by the search path: {', '.join(heavy) if heavy else 'none'}")
+
+
+if __name__ == '__main__':
+    main()
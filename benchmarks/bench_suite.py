@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Reproducible end-to-end benchmark suite.
+
+Generates a synthetic corpus (see corpus.py), starts the fake chat
+completions server (see fake_openai.py) and runs the real CLI against them
+in fresh processes:
+
+    cold     first run over the whole tree with empty metadata and cache
+    warm     incremental rerun after --changed of the files were modified
+    search   tag query against the resulting metadata (median of --runs)
+    startup  `python -m auto_tagger --help` (median of --runs)
+
+Each scenario reports wall time, files per second and the peak RSS of the
+process, plus the requests, tokens, retries and errors from the run's
+--stats-json report. Results are printed as a table and as one JSON object,
+which --output appends to a JSON Lines file (with the commit, Python version
+and machine) so throughput and memory can be tracked over time.
+
+Usage:
+    python benchmarks/bench_suite.py --files 2000 --latency 0.05 --workers 16 --output bench_results.jsonl
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from corpus import make_corpus
+from fake_openai import FakeOpenAIServer
+
+SCENARIOS = ("cold", "warm", "search", "startup")
+
+
+def peak_rss_mb(maxrss: int) -> float:
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def run_cli(arguments, cwd: Path, env, log: Path):
+    """Run the CLI in a fresh interpreter; returns (seconds, peak RSS in MB or None)"""
+    with open(log, "ab") as out:
+        started = time.perf_counter()
+        process = subprocess.Popen([sys.executable, "-m", "auto_tagger"] + arguments, cwd=cwd, env=env,
+                                   stdout=out, stderr=subprocess.STDOUT)
+        if hasattr(os, "wait4"):
+            # Reaping the child ourselves gives its own rusage rather than that of every child so far
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            rss = peak_rss_mb(usage.ru_maxrss)
+        else:
+            process.wait()
+            rss = None
+        elapsed = time.perf_counter() - started
+    if process.returncode != 0:
+        raise RuntimeError(f"auto_tagger {' '.join(arguments)} exited with {process.returncode}; see {log}")
+    return elapsed, rss
+
+
+def run_stats(stats_file: Path):
+    totals = json.loads(stats_file.read_text())["totals"]
+    return {key: totals[key] for key in ("files", "requests", "retries", "corrections", "errors",
+                                         "cache_hits", "prompt_tokens", "completion_tokens")}
+
+
+def touch_files(corpus: Path, fraction: float, seed: int) -> int:
+    """Append a line to a reproducible sample of the corpus so their content and mtime change"""
+    files = sorted(path for path in corpus.rglob("*") if path.is_file())
+    chosen = random.Random(seed).sample(files, int(len(files) * fraction))
+    for path in chosen:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n" if path.suffix in (".json", ".csv") else "\nupdated\n")
+    return len(chosen)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--files', type=int, default=1000)
+    parser.add_argument('--mix', default="code=50,doc=30,data=20")
+    parser.add_argument('--distribution', choices=["lognormal", "uniform", "fixed"], default="lognormal")
+    parser.add_argument('--median-size', type=int, default=2048)
+    parser.add_argument('--max-size', type=int, default=256 * 1024)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds per simulated API call')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Fraction of requests answered with 429')
+    parser.add_argument('--rpm', type=float, default=0.0, help='Server-side requests per minute limit')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--async', dest='use_async', action='store_true')
+    parser.add_argument('--batch-tokens', type=int, default=0)
+    parser.add_argument('--changed', type=float, default=0.05, help='Fraction of files modified before the warm run')
+    parser.add_argument('--query', default="client OR serv*", help='Query for the search scenario')
+    parser.add_argument('--runs', type=int, default=5, help='Runs of the search and startup scenarios')
+    parser.add_argument('--output', type=Path, help='Append the results as one JSON line to this file')
+    args = parser.parse_args()
+    
+    server = FakeOpenAIServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                              rate_limit_rate=args.rate_limit_rate, rpm=args.rpm, seed=args.seed).start()
+    env = dict(os.environ, PYTHONPATH=str(ROOT) + os.pathsep + os.environ.get("PYTHONPATH", ""),
+               OPENAI_BASE_URL=server.base_url, OPENAI_API_KEY="sk-benchmark")
+    env.pop("AUTO_TAGGER_BACKEND", None)
+    scenarios = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            corpus = tmp / "corpus"
+            corpus.mkdir()
+            started = time.perf_counter()
+            summary = make_corpus(corpus, args.files, args.mix, args.distribution, args.median_size,
+                                  args.max_size, seed=args.seed)
+            print(f"Generated {summary['files']} files ({summary['bytes'] / 1e6:.1f} MB) "
+                  f"in {time.perf_counter() - started:.1f}s")
+            log = tmp / "auto_tagger.log"
+            stats_file = tmp / "stats.json"
+            process = [str(corpus), "-r", "--backend", "openai", "--workers", str(args.workers),
+                       "--stats-json", str(stats_file)]
+            if args.use_async:
+                process.append("--async")
+            if args.batch_tokens:
+                process += ["--batch-tokens", str(args.batch_tokens)]
+                
+            if {"cold", "warm", "search"} & set(args.scenarios):
+                seconds, rss = run_cli(process, tmp, env, log)
+                if "cold" in args.scenarios:
+                    scenarios["cold"] = dict(seconds=seconds, files_per_second=args.files / seconds,
+                                             peak_rss_mb=rss, **run_stats(stats_file))
+            if "warm" in args.scenarios:
+                changed = touch_files(corpus, args.changed, args.seed)
+                seconds, rss = run_cli(process, tmp, env, log)
+                scenarios["warm"] = dict(seconds=seconds, files_per_second=args.files / seconds,
+                                         peak_rss_mb=rss, changed=changed, **run_stats(stats_file))
+            for name, arguments in (("search", [str(corpus), "-s", args.query]), ("startup", ["--help"])):
+                if name not in args.scenarios:
+                    continue
+                runs = [run_cli(arguments, tmp, env, log) for _ in range(args.runs)]
+                scenarios[name] = {
+                    "median_seconds": statistics.median(seconds for seconds, _ in runs),
+                    "peak_rss_mb": max((rss for _, rss in runs), default=None) if runs[0][1] is not None else None,
+                    "runs": args.runs
+                }
+    finally:
+        server.close()
+        
+    result = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "corpus": summary,
+        "server": dict(server.counts),
+        "scenarios": scenarios
+    }
+    
+    print(f"\n{'scenario':<9} {'seconds':>9} {'files/s':>9} {'peak MB':>8} {'requests':>9} {'retries':>8} {'errors':>7}")
+    for name, row in scenarios.items():
+        seconds = row.get("seconds", row.get("median_seconds"))
+        rate = f"{row['files_per_second']:.1f}" if "files_per_second" in row else "-"
+        rss = f"{row['peak_rss_mb']:.1f}" if row.get("peak_rss_mb") is not None else "-"
+        print(f"{name:<9} {seconds:>9.3f} {rate:>9} {rss:>8} {row.get('requests', '-'):>9} "
+              f"{row.get('retries', '-'):>8} {row.get('errors', '-'):>7}")
+    print(json.dumps(result))
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result) + "\n")
+        print(f"Appended results to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
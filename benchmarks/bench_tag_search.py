@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark the inverted tag index against the original linear scan.
+
+Builds synthetic metadata with --tags total tags (five per file) drawn from a
+Zipf-like vocabulary and times single-tag lookups with the scan that
+search_by_tag used to do, then single-tag, boolean and prefix queries on
+TagIndex.
+
+Usage:
+    python benchmarks/bench_tag_search.py --tags 1000000
+"""
+import argparse
+import itertools
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from auto_tagger.tag_index import TagIndex
+
+
+def make_metadata(total_tags: int, vocabulary: int, seed: int = 0):
+    rng = random.Random(seed)
+    words = [f"tag{i}" for i in range(vocabulary)] + ["python", "test", "web"]
+    cumulative = list(itertools.accumulate(1.0 / (i + 1) for i in range(len(words))))
+    metadata = {}
+    for i in range(total_tags // 5):
+        metadata[f"src/pkg{i % 100}/file_{i}.py"] = {"tags": rng.choices(words, cum_weights=cumulative, k=5)}
+    return metadata
+
+
+def scan(metadata, tag):
+    """The pre-index search_by_tag implementation"""
+    return [
+        file_path
+        for file_path, data in metadata.items()
+        if tag.lower() in [t.lower() for t in data.get("tags", [])]
+    ]
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tags', type=int, default=1_000_000)
+    parser.add_argument('--vocabulary', type=int, default=20_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    
+    metadata = make_metadata(args.tags, args.vocabulary)
+    print(f"{len(metadata)} files, {args.tags} tags")
+    
+    build_time, index = timed(lambda: TagIndex.build((k, v["tags"]) for k, v in metadata.items()), 1)
+    print(f"index build: {build_time * 1000:.0f} ms")
+    
+    scan_time, expected = timed(lambda: scan(metadata, "tag500"), max(1, args.repeat // 10))
+    index_time, found = timed(lambda: index.search("tag500"), args.repeat)
+    assert found == expected
+    print(f"{'query':<32} {'ms':>10}")
+    print(f"{'scan: tag500':<32} {scan_time * 1000:>10.3f}")
+    print(f"{'index: tag500':<32} {index_time * 1000:>10.3f}  ({scan_time / index_time:.0f}x faster)")
+    for query in ("python AND NOT test", "(web OR python) AND tag1", "tag12*"):
+        query_time, _ = timed(lambda: index.query(query), args.repeat)
+        print(f"{'index: ' + query:<32} {query_time * 1000:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic tree of code, documentation and data files.
+
+The mix of file kinds, the number of files per directory and the file-size
+distribution are configurable, and the same seed always produces the same
+tree, so benchmark runs on different commits see identical input. Sizes are
+drawn from a log-normal distribution by default, which matches real trees:
+mostly small files with a long tail of large ones.
+
+Usage:
+    python benchmarks/corpus.py /tmp/corpus --files 5000 --mix code=50,doc=30,data=20 --median-size 2048
+"""
+import argparse
+import json
+import math
+import random
+from pathlib import Path
+from typing import Dict
+
+KINDS = {
+    "code": (".py", ".js", ".go"),
+    "doc": (".md", ".txt", ".rst"),
+    "data": (".json", ".csv")
+}
+
+WORDS = (
+    "weather forecast client server request response cache index search query parser token stream "
+    "buffer config logging metrics scheduler worker queue database migration schema record user account "
+    "payment invoice report chart image upload download storage bucket network socket retry timeout "
+    "auth session cookie template render widget layout theme plugin module package release version "
+    "sensor device firmware driver kernel thread process memory profile benchmark test fixture mock"
+).split()
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """Parse "code=50,doc=30,data=20" into normalized weights"""
+    weights = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in KINDS:
+            raise ValueError(f"unknown file kind {kind!r}; expected one of {', '.join(KINDS)}")
+        weights[kind] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("the mix needs at least one positive weight")
+    return {kind: weight / total for kind, weight in weights.items()}
+
+
+def draw_size(rng: random.Random, distribution: str, median: int, max_size: int) -> int:
+    if distribution == "fixed":
+        size = median
+    elif distribution == "uniform":
+        size = rng.randint(1, 2 * median)
+    else:
+        size = int(rng.lognormvariate(math.log(median), 1.0))
+    return max(16, min(max_size, size))
+
+
+def words(rng: random.Random, count: int) -> list:
+    # Zipf-like: a few topics dominate, as in real trees
+    return [WORDS[min(len(WORDS) - 1, int(rng.paretovariate(1.2)) - 1)] for _ in range(count)]
+
+
+def code_text(rng: random.Random, suffix: str, size: int) -> str:
+    topic = words(rng, 2)
+    parts = []
+    if suffix == ".py":
+        parts.append(f"import os\nimport json\n\nclass {topic[0].title()}{topic[1].title()}:\n")
+        template = "    def {0}_{1}(self, {2}):\n        return self.{3}.get({2}, {4})\n\n"
+    elif suffix == ".js":
+        parts.append(f"const {topic[0]} = require('{topic[1]}');\n\n")
+        template = "function {0}_{1}({2}) {{\n  return {3}.get({2}) || {4};\n}}\n\n"
+    else:
+        parts.append(f"package {topic[0]}\n\nimport \"fmt\"\n\n")
+        template = "func {0}_{1}({2} string) int {{\n\treturn len({3}) + {4}\n}}\n\n"
+    length = sum(len(part) for part in parts)
+    while length < size:
+        part = template.format(*words(rng, 4), rng.randint(0, 999))
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)[:size]
+
+
+def doc_text(rng: random.Random, suffix: str, size: int) -> str:
+    heading = " ".join(words(rng, 3)).title()
+    parts = [f"# {heading}\n\n" if suffix == ".md" else f"{heading}\n{'=' * len(heading)}\n\n"]
+    length = len(parts[0])
+    while length < size:
+        sentence = " ".join(words(rng, rng.randint(6, 14))).capitalize() + ".\n\n"
+        parts.append(sentence)
+        length += len(sentence)
+    return "".join(parts)[:size]
+
+
+def data_text(rng: random.Random, suffix: str, size: int) -> str:
+    fields = list(dict.fromkeys(words(rng, 4))) or ["value"]
+    if suffix == ".csv":
+        rows = [",".join(["id"] + fields)]
+        length = len(rows[0])
+        while length < size:
+            row = ",".join([str(len(rows))] + [str(rng.randint(0, 10 ** 6)) for _ in fields])
+            rows.append(row)
+            length += len(row) + 1
+        return "\n".join(rows) + "\n"
+    records = []
+    length = 2
+    while length < size or not records:
+        record = {"id": len(records), **{field: rng.choice(WORDS) for field in fields}}
+        records.append(record)
+        length += len(json.dumps(record)) + 2
+    return json.dumps(records, indent=1)
+
+
+GENERATORS = {"code": code_text, "doc": doc_text, "data": data_text}
+
+
+def make_corpus(root: Path, files: int, mix: str = "code=50,doc=30,data=20", distribution: str = "lognormal",
+                median_size: int = 2048, max_size: int = 256 * 1024, files_per_dir: int = 50,
+                seed: int = 0) -> Dict[str, int]:
+    """
+    Write a reproducible synthetic tree
+    Args:
+        root: Directory to create the tree in
+        files: Number of files
+        mix: Weights of the file kinds, e.g. "code=50,doc=30,data=20"
+        distribution: "lognormal", "uniform" or "fixed" file sizes around median_size
+        median_size: Typical file size in bytes
+        max_size: Largest file size in bytes
+        files_per_dir: Files per leaf directory; directories nest two levels deep
+        seed: Random seed; the same arguments always produce the same tree
+    Returns:
+        Number of files and total bytes written
+    """
+    rng = random.Random(seed)
+    weights = parse_mix(mix)
+    kinds, cumulative = list(weights), []
+    for kind in kinds:
+        cumulative.append((cumulative[-1] if cumulative else 0) + weights[kind])
+    total_bytes = 0
+    for index in range(files):
+        leaf = index // files_per_dir
+        directory = root / f"pkg{leaf // 10}" / f"mod{leaf % 10}"
+        directory.mkdir(parents=True, exist_ok=True)
+        kind = rng.choices(kinds, cum_weights=cumulative)[0]
+        suffix = rng.choice(KINDS[kind])
+        text = GENERATORS[kind](rng, suffix, draw_size(rng, distribution, median_size, max_size))
+        (directory / f"{kind}_{index}{suffix}").write_text(text, encoding="utf-8")
+        total_bytes += len(text)
+    return {"files": files, "bytes": total_bytes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('root', type=Path)
+    parser.add_argument('--files', type=int, default=1000)
+    parser.add_argument('--mix', default="code=50,doc=30,data=20")
+    parser.add_argument('--distribution', choices=["lognormal", "uniform", "fixed"], default="lognormal")
+    parser.add_argument('--median-size', type=int, default=2048)
+    parser.add_argument('--max-size', type=int, default=256 * 1024)
+    parser.add_argument('--files-per-dir', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    
+    summary = make_corpus(args.root, args.files, args.mix, args.distribution, args.median_size,
+                          args.max_size, args.files_per_dir, args.seed)
+    print(f"Wrote {summary['files']} files ({summary['bytes'] / 1e6:.1f} MB) to {args.root}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI chat completions endpoint.
+
+Answers POST /v1/chat/completions with schema-valid analyses (one per file
+for batched requests) after a configurable latency, and can fail a fraction
+of requests with 500s, throttle a fraction with 429s, or enforce a requests
+per minute limit with 429s carrying Retry-After, so retries and rate
+limiting are exercised the way the real API does. Point the package at it
+with OPENAI_BASE_URL. StubClient gives the same answers in-process, for
+benchmarks that swap it in as an agent's client.
+
+Usage:
+    python benchmarks/fake_openai.py --port 8080 --latency 0.2 --error-rate 0.01 --rpm 3000
+    OPENAI_BASE_URL=http://127.0.0.1:8080/v1 OPENAI_API_KEY=sk-fake python -m auto_tagger corpus -r
+"""
+import argparse
+import collections
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Tuple
+
+FILE_MARKER = re.compile(r"^=== FILE (\d+): ", re.MULTILINE)
+WORD = re.compile(r"[A-Za-z]{4,}")
+
+
+class FakeOpenAIServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, rpm: float = 0.0, seed: int = 0):
+        """
+        Args:
+            host: Interface to listen on
+            port: TCP port (0 picks a free one)
+            latency: Seconds every answer takes
+            jitter: Extra random latency of up to this many seconds
+            error_rate: Fraction of requests answered with a 500
+            rate_limit_rate: Fraction of requests answered with a 429
+            rpm: Requests per minute admitted before answering 429 with Retry-After (0 = unlimited)
+            seed: Seed for the random failures and jitter
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rpm = rpm
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.admitted = collections.deque()
+        self.counts = collections.Counter()
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                status, payload, headers = server.respond(body)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+                
+            def log_message(self, *args):
+                pass
+                
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}/v1"
+        self.thread = None
+        
+    def start(self) -> "FakeOpenAIServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+        return self
+        
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        
+    def _throttle(self):
+        """Decide how to answer a request: ((status, retry_after) to fail it or None, seconds to wait first)"""
+        with self.lock:
+            self.counts["requests"] += 1
+            roll = self.rng.random()
+            delay = self.latency + self.rng.uniform(0, self.jitter)
+            if self.rpm:
+                now = time.monotonic()
+                while self.admitted and now - self.admitted[0] >= 60:
+                    self.admitted.popleft()
+                if len(self.admitted) >= self.rpm:
+                    self.counts["rate_limited"] += 1
+                    return (429, 60 - (now - self.admitted[0])), 0.0
+                self.admitted.append(now)
+            if roll < self.rate_limit_rate:
+                self.counts["rate_limited"] += 1
+                return (429, 0.1), delay
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.counts["errors"] += 1
+                return (500, None), delay
+            self.counts["answered"] += 1
+            return None, delay
+            
+    def respond(self, body):
+        failure, delay = self._throttle()
+        time.sleep(delay)
+        if failure is not None:
+            status, retry_after = failure
+            headers = {"retry-after-ms": str(int(retry_after * 1000))} if retry_after is not None else {}
+            kind = "rate_limit_exceeded" if status == 429 else "server_error"
+            return status, {"error": {"message": "Simulated failure", "type": kind, "code": kind}}, headers
+        content, prompt_tokens, completion_tokens = answer(body.get("messages", []))
+        return 200, {
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens}
+        }, {}
+
+
+def analysis(text: str):
+    """Deterministic analysis whose tags are the sample's most frequent words"""
+    counts = collections.Counter(word.lower() for word in WORD.findall(text))
+    tags = [word for word, _ in counts.most_common(5)] or ["empty"]
+    return {"language": "Text", "purpose": f"Mentions {', '.join(tags[:2])}", "components": tags[:3], "tags": tags}
+
+
+def answer(messages) -> Tuple[str, int, int]:
+    """Answer content for chat messages (one entry per file for batched prompts) and its token counts"""
+    prompt = "\n".join(message.get("content") or "" for message in messages)
+    # Leave the system prompt and instructions out of the tags
+    sample = (messages or [{}])[-1].get("content") or ""
+    ids = [int(match) for match in FILE_MARKER.findall(sample)]
+    if ids:
+        sections = FILE_MARKER.split(sample)[1:]
+        texts = dict(zip((int(i) for i in sections[::2]), sections[1::2]))
+        content = json.dumps({"files": [dict(analysis(texts.get(i, "")), id=i) for i in ids]})
+    else:
+        content = json.dumps(analysis(sample.split("\n\n", 1)[-1]))
+    return content, max(1, len(prompt) // 4), max(1, len(content) // 4)
+
+
+class StubClient:
+    """
+    In-process stand-in for an OpenAI client with a fixed latency per request
+    Answers like the server, without HTTP, and counts requests and tokens;
+    assign one to agent.client.
+    """
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        
+    def create(self, **kwargs):
+        time.sleep(self.latency)
+        content, prompt_tokens, completion_tokens = answer(kwargs["messages"])
+        with self.lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--rpm', type=float, default=0.0)
+    args = parser.parse_args()
+    
+    server = FakeOpenAIServer(args.host, args.port, args.latency, args.jitter, args.error_rate,
+                              args.rate_limit_rate, args.rpm)
+    print(f"Serving fake chat completions on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(dict(server.counts))
+
+
+if __name__ == '__main__':
+    main()
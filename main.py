@@ -30,8 +30,8 @@ def main():
             print(f"\nFile: {file_path}")
             print(f"Tags: {', '.join(data.get('tags', []))}")
             print(f"Agent: {data.get('agent', 'Unknown')}")
-            if 'metadata' in data and 'analysis' in data['metadata']:
-                print(f"Analysis: {data['metadata']['analysis']}")
+            if 'metadata' in data and 'purpose' in data['metadata']:
+                print(f"Purpose: {data['metadata']['purpose']}")
     
     # Example: Search for files with specific tags
     example_tags = ['python', 'documentation', 'data']
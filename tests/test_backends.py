@@ -0,0 +1,144 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from pathlib import Path
+import asyncio
+import importlib.util
+import json
+import os
+import tempfile
+import shutil
+from auto_tagger.backends import get_backend
+from auto_tagger.backends.heuristic import HeuristicBackend
+from auto_tagger.backends.transformers_backend import TransformersBackend
+from auto_tagger.agents.code_agent import CodeAgent
+from auto_tagger.swarm_controller import SwarmController
+
+class CountingBackend(HeuristicBackend):
+    """Heuristic backend that records the size of every batch it is given"""
+    batch_size = 2
+    
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+        
+    def analyze(self, agent, items):
+        self.batches.append(len(items))
+        return super().analyze(agent, items)
+
+class TestBackendSelection(unittest.TestCase):
+    def test_get_backend(self):
+        """Test backends are resolved by name and shared per name"""
+        self.assertIsInstance(get_backend("heuristic"), HeuristicBackend)
+        self.assertIs(get_backend("heuristic"), get_backend("Heuristic"))
+        self.assertTrue(get_backend().remote)
+        backend = CountingBackend()
+        self.assertIs(get_backend(backend), backend)
+        with self.assertRaises(ValueError):
+            get_backend("gpt-9")
+            
+    def test_environment_variable(self):
+        """Test AUTO_TAGGER_BACKEND selects the backend agents start with"""
+        with patch.dict(os.environ, {"AUTO_TAGGER_BACKEND": "heuristic"}):
+            self.assertEqual(CodeAgent().backend.name, "heuristic")
+        self.assertEqual(CodeAgent().backend.name, "openai")
+
+class TestLocalBackends(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        for state_file in ("metadata.json", "metadata.json.records", "metadata.json.scan", "tag_cache.json"):
+            if Path(state_file).exists():
+                Path(state_file).unlink()
+                
+    def test_heuristic_tags(self):
+        """Test format tag plus frequent identifier words, without stopwords"""
+        file_path = self.test_dir / "client.py"
+        file_path.write_text(
+            "def fetchWeather(city):\n"
+            "    return weather_client.get_forecast(city)\n\n"
+            "def weather_report(city):\n"
+            "    return fetchWeather(city)\n"
+        )
+        agent = CodeAgent()
+        agent.backend = HeuristicBackend()
+        agent.client = MagicMock(side_effect=AssertionError("no API calls"))
+        
+        result = agent.analyze_file(file_path)
+        
+        self.assertEqual(result["tags"][:3], ["python", "weather", "city"])
+        self.assertNotIn("return", result["tags"])
+        self.assertEqual(result["metadata"]["language"], "python")
+        self.assertEqual(result["metadata"]["components"], result["tags"][1:])
+        self.assertTrue(result["metadata"]["purpose"].startswith("Keywords: weather, city"))
+        self.assertNotIn("analysis", result["metadata"])
+        self.assertEqual(result["metadata"]["size"], file_path.stat().st_size)
+        
+    def test_swarm_batches_local_backend(self):
+        """Test a directory run feeds a local backend batches of files and never calls the API"""
+        for i in range(5):
+            (self.test_dir / f"module{i}.py").write_text(f"def parse_config{i}(): return load_config()\n")
+        (self.test_dir / "notes.md").write_text("# Release notes\nRelease schedule for the release train\n")
+        backend = CountingBackend()
+        swarm = SwarmController(cache_max_bytes=0, backend=backend)
+        
+        with patch('openai.OpenAI', side_effect=AssertionError("no API calls")):
+            results = swarm.process_directory(self.test_dir)
+            
+        self.assertEqual(len(results), 6)
+        self.assertEqual(sorted(backend.batches), [1, 1, 2, 2])
+        self.assertIn("release", results[str(self.test_dir / "notes.md")]["tags"])
+        self.assertEqual(results[str(self.test_dir / "module0.py")]["agent"], "CodeAgent")
+        self.assertEqual(swarm.search("python AND config"), sorted(
+            str(self.test_dir / f"module{i}.py") for i in range(5)
+        ))
+        
+    def test_async_local_backend(self):
+        """Test the async pipeline runs local backends in worker threads"""
+        (self.test_dir / "data.json").write_text(json.dumps({"customer": "acme", "invoice": 12}))
+        swarm = SwarmController(cache_max_bytes=0, backend="heuristic")
+        
+        results = asyncio.run(swarm.process_directory_async(self.test_dir))
+        
+        self.assertIn("json", results[str(self.test_dir / "data.json")]["tags"])
+        
+    @unittest.skipIf(importlib.util.find_spec("transformers") is not None, "transformers is installed")
+    def test_transformers_falls_back_to_heuristic(self):
+        """Test the transformers backend degrades to heuristic tags when no model can be loaded"""
+        file_path = self.test_dir / "guide.md"
+        file_path.write_text("# Deployment guide\nDeployment steps for the deployment pipeline\n")
+        agent = CodeAgent()
+        agent.backend = TransformersBackend()
+        
+        result = agent.analyze_file(file_path)
+        
+        self.assertEqual(result["tags"][:2], ["markdown", "deployment"])
+        self.assertTrue(result["metadata"]["purpose"].startswith("Keywords: "))
+        
+    @unittest.skipIf(importlib.util.find_spec("numpy") is None, "numpy is not installed")
+    def test_transformers_tags_follow_schema(self):
+        """Test multi-word labels are stored as normalized tags next to the schema fields"""
+        import numpy
+        file_path = self.test_dir / "train.py"
+        file_path.write_text("model.fit(features)\n")
+        backend = TransformersBackend(labels=["Machine Learning", "web development", "finance"], top_k=2)
+        backend._label_vectors = numpy.eye(3)
+        
+        with patch.object(TransformersBackend, "_load", return_value=True), \
+             patch.object(TransformersBackend, "encode", return_value=numpy.array([[0.9, 0.6, 0.1]])):
+            result = backend.analyze(None, [(file_path, file_path.read_text())])[0]
+            
+        self.assertEqual(result["tags"], ["python", "machine-learning", "web-development"])
+        self.assertEqual(result["metadata"]["language"], "python")
+        self.assertEqual(result["metadata"]["components"], ["Machine Learning", "web development"])
+        self.assertEqual(result["metadata"]["purpose"], "Topics: Machine Learning (0.90), web development (0.60)")
+        
+    def test_transformers_ranking(self):
+        """Test labels are ranked by similarity and cut by top_k and threshold"""
+        backend = TransformersBackend(labels=["web", "database", "testing", "finance"], top_k=2, threshold=0.3)
+        self.assertEqual(backend.rank([0.2, 0.9, 0.5, 0.1]), [("database", 0.9), ("testing", 0.5)])
+        self.assertEqual(backend.rank([0.1, 0.35, 0.2, 0.0]), [("database", 0.35)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+import asyncio
 from pathlib import Path
 from auto_tagger.agents.base_agent import BaseAgent
 
@@ -28,6 +29,11 @@ class TestBaseAgent(unittest.TestCase):
         self.assertTrue(self.agent.can_handle_file(test_file))
         self.assertFalse(self.agent.can_handle_file(unsupported_file))
         
+    def test_analyze_file_async_fallback(self):
+        """Test agents without build_messages run analyze_file in a thread"""
+        result = asyncio.run(self.agent.analyze_file_async(Path("test.test")))
+        self.assertEqual(result, {"tags": ["test"], "metadata": {"test": True}})
+        
     def test_get_file_content(self):
         """Test file content reading"""
         # Create a temporary test file
@@ -50,5 +56,25 @@ class TestBaseAgent(unittest.TestCase):
             if test_file.exists():
                 test_file.unlink()
 
+    def test_read_sample(self):
+        """Test bounded reads follow the agent's budget and skip binary files"""
+        test_file = Path("test_sample.txt")
+        binary_file = Path("test_sample.bin")
+        try:
+            test_file.write_text("".join(f"line {i}\n" for i in range(10000)))
+            binary_file.write_bytes(b"\x7fELF\0\0\0binary")
+            self.agent.sample_chars = 20
+            
+            self.assertEqual(self.agent.read_sample(test_file), "line 0\nline 1\nline 2")
+            self.assertEqual(self.agent.get_file_content(test_file, max_chars=7), "line 0\n")
+            tail = self.agent.read_sample(test_file, strategy="head_tail").split("\n...\n")
+            self.assertEqual(tail, ["line 0\n", "e 9999\n"])
+            self.assertEqual(self.agent.read_sample(binary_file), "")
+            self.assertEqual(self.agent.read_sample(Path("nonexistent.txt")), "")
+        finally:
+            for path in (test_file, binary_file):
+                if path.exists():
+                    path.unlink()
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,163 @@
+import unittest
+from unittest.mock import MagicMock
+from pathlib import Path
+from types import SimpleNamespace
+import json
+import re
+import tempfile
+import shutil
+from auto_tagger.agents.code_agent import CodeAgent
+from auto_tagger.cache import ResultCache
+from auto_tagger.metrics import Metrics
+from auto_tagger.batching import (
+    BatchItem, BatchPacker, BatchStats, analyze_batch, build_batch_messages, pack_batches, split_batch_response
+)
+
+def answer(purpose, tags=("python",)):
+    """Schema-shaped analysis as a model would return it"""
+    return {"language": "Python", "purpose": purpose, "components": [], "tags": list(tags)}
+
+def completion(content, prompt_tokens=None, completion_tokens=None):
+    usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+class TestBatchHelpers(unittest.TestCase):
+    def test_pack_batches(self):
+        """Test items are packed in order without exceeding the budget"""
+        items = [BatchItem(str(i), Path(f"{i}.py"), 0.0, "x" * 40) for i in range(5)]
+        batches = pack_batches(items, token_budget=25)
+        self.assertEqual([[item.file_key for item in batch] for batch in batches], [["0", "1"], ["2", "3"], ["4"]])
+        
+        # An item larger than the budget still gets its own batch
+        self.assertEqual(len(pack_batches([BatchItem("big", Path("big.py"), 0.0, "x" * 400)], 25)), 1)
+        
+        # Incrementally, a batch is released as soon as it is full or the next item does not fit
+        packer = BatchPacker(2, lambda item: 1)
+        self.assertEqual([packer.add(item) for item in items[:3]], [[], [items[:2]], []])
+        self.assertEqual(packer.flush(), [items[2]])
+        
+    def test_split_batch_response(self):
+        """Test per-file answers are attributed by id"""
+        text = json.dumps({"files": [
+            dict(answer("first"), id=0),
+            dict(answer("second"), id="1"),
+            dict(answer("out of range"), id=7),
+            dict(answer("duplicate"), id=0)
+        ]})
+        expected = {0: json.dumps(answer("first")), 1: json.dumps(answer("second"))}
+        self.assertEqual(split_batch_response(text, 3), expected)
+        self.assertEqual(split_batch_response("```json\n" + text + "\n```", 2), expected)
+        self.assertEqual(split_batch_response("not json", 2), {})
+        self.assertEqual(split_batch_response(json.dumps([dict(answer("bare list"), id=1)]), 2),
+                         {1: json.dumps(answer("bare list"))})
+
+class TestAnalyzeBatch(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.agent = CodeAgent()
+        self.agent.client = MagicMock()
+        self.items = []
+        for i in range(3):
+            path = self.test_dir / f"mod_{i}.py"
+            path.write_text(f"def f{i}(): pass")
+            self.items.append(BatchItem(str(path), path, 0.0, self.agent.build_sample(path)))
+            
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        
+    def test_batch_prompt_lists_every_file(self):
+        """Test the batch prompt carries every sample and the agent's instructions"""
+        messages = build_batch_messages(self.agent, self.items)
+        self.assertEqual(messages[0]["content"], self.agent.system_prompt)
+        self.assertIn(self.agent.analysis_request, messages[1]["content"])
+        for i, item in enumerate(self.items):
+            self.assertIn(f"=== FILE {i}: mod_{i}.py ===", messages[1]["content"])
+            self.assertIn(item.sample, messages[1]["content"])
+            
+    def test_unattributed_files_are_retried_individually(self):
+        """Test only files missing from the batched answer get their own request"""
+        batched = json.dumps({"files": [
+            dict(answer("Python module zero"), id=0),
+            dict(answer("Python module two"), id=2)
+        ]})
+        self.agent.client.chat.completions.create.side_effect = [
+            completion(batched, prompt_tokens=90, completion_tokens=30),
+            completion(json.dumps(answer("Python module one")))
+        ]
+        stats = BatchStats()
+        
+        results = analyze_batch(self.agent, self.items, stats)
+        
+        calls = self.agent.client.chat.completions.create.call_args_list
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(calls[0].kwargs["max_tokens"], self.agent.max_tokens * 3)
+        self.assertEqual(calls[0].kwargs["response_format"]["json_schema"]["name"], "file_batch_analysis")
+        self.assertIn("def f1(): pass", calls[1].kwargs["messages"][1]["content"])
+        self.assertNotIn("def f0(): pass", calls[1].kwargs["messages"][1]["content"])
+        self.assertEqual(results[self.items[0].file_key]["metadata"]["purpose"], "Python module zero")
+        self.assertEqual(results[self.items[1].file_key]["metadata"]["purpose"], "Python module one")
+        self.assertEqual(stats.requests, 1)
+        self.assertEqual(stats.batched_files, 3)
+        self.assertEqual(stats.retried_files, 1)
+        self.assertEqual(stats.prompt_tokens, 90)
+        self.assertGreater(stats.summary()["single_request_prompt_tokens"], 0)
+        
+    def test_failed_batch_falls_back_to_single_requests(self):
+        """Test a failed batch request retries every file individually"""
+        self.agent.client.chat.completions.create.side_effect = [
+            RuntimeError("rate limited"),
+            *(completion(json.dumps(answer(purpose))) for purpose in "abc")
+        ]
+        results = analyze_batch(self.agent, self.items, BatchStats())
+        self.assertEqual(self.agent.client.chat.completions.create.call_count, 4)
+        self.assertEqual([r["metadata"]["purpose"] for r in results.values()], ["a", "b", "c"])
+        
+    def test_invalid_entries_are_retried_individually(self):
+        """Test a batch entry that fails validation gets its own request"""
+        batched = json.dumps({"files": [
+            dict(answer("zero"), id=0),
+            {"id": 1, "language": "Python", "tags": ["python"]},
+            dict(answer("two"), id=2)
+        ]})
+        self.agent.client.chat.completions.create.side_effect = [
+            completion(batched), completion(json.dumps(answer("one")))
+        ]
+        results = analyze_batch(self.agent, self.items, BatchStats())
+        self.assertEqual(self.agent.client.chat.completions.create.call_count, 2)
+        self.assertEqual([r["metadata"]["purpose"] for r in results.values()], ["zero", "two", "one"])
+        
+    def test_identical_prompts_share_one_slot(self):
+        """Test files whose samples are identical are sent once and share the answer"""
+        self.agent.result_cache = ResultCache(None)
+        self.agent.metrics = Metrics()
+        copy = self.test_dir / "copy_of_mod_0.py"
+        copy.write_text("def f0(): pass")
+        items = self.items + [BatchItem(str(copy), copy, 0.0, self.agent.build_sample(copy))]
+        for item in items:
+            item.cache_key = self.agent.cache_key(self.agent.messages_for_sample(item.sample))
+        batched = json.dumps({"files": [dict(answer(f"module {i}"), id=i) for i in range(3)]})
+        self.agent.client.chat.completions.create.side_effect = [completion(batched)]
+        
+        results = analyze_batch(self.agent, items, BatchStats())
+        
+        prompt = self.agent.client.chat.completions.create.call_args.kwargs["messages"][1]["content"]
+        self.assertNotIn("=== FILE 3:", prompt)
+        self.assertEqual(results[str(copy)]["metadata"]["purpose"], "module 0")
+        self.assertEqual(self.agent.metrics.snapshot()["totals"]["coalesced"], 1)
+
+class FakeBatchingClient:
+    """Answers batch prompts with JSON and single prompts with text"""
+    def __init__(self):
+        self.requests = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        
+    def create(self, **kwargs):
+        self.requests += 1
+        prompt = kwargs["messages"][-1]["content"]
+        ids = re.findall(r"^=== FILE (\d+):", prompt, re.MULTILINE)
+        if ids:
+            return completion(json.dumps({"files": [dict(answer(f"batched file {i}"), id=int(i)) for i in ids]}))
+        return completion(json.dumps(answer("single file analysis")))
+
+if __name__ == '__main__':
+    unittest.main()
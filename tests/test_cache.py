@@ -0,0 +1,204 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from pathlib import Path
+import asyncio
+import os
+import tempfile
+import shutil
+import threading
+import time
+from auto_tagger.cache import ResultCache, SQLiteResultCache, open_cache
+
+MESSAGES = [
+    {"role": "system", "content": "You are a code analysis expert."},
+    {"role": "user", "content": "def test(): pass"}
+]
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.cache_file = str(self.test_dir / "cache.json")
+        
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        
+    def test_make_key(self):
+        """Test keys depend on messages, agent, prompt version and model"""
+        key = ResultCache.make_key("CodeAgent", "1", "gpt-3.5-turbo", MESSAGES)
+        self.assertEqual(key, ResultCache.make_key("CodeAgent", "1", "gpt-3.5-turbo", list(MESSAGES)))
+        self.assertNotEqual(key, ResultCache.make_key("DocAgent", "1", "gpt-3.5-turbo", MESSAGES))
+        self.assertNotEqual(key, ResultCache.make_key("CodeAgent", "2", "gpt-3.5-turbo", MESSAGES))
+        self.assertNotEqual(key, ResultCache.make_key("CodeAgent", "1", "gpt-4", MESSAGES))
+        changed = [MESSAGES[0], {"role": "user", "content": "def other(): pass"}]
+        self.assertNotEqual(key, ResultCache.make_key("CodeAgent", "1", "gpt-3.5-turbo", changed))
+        sampled = ResultCache.make_key("CodeAgent", "1", "gpt-3.5-turbo", MESSAGES, 0.3, 150)
+        self.assertNotEqual(sampled, ResultCache.make_key("CodeAgent", "1", "gpt-3.5-turbo", MESSAGES, 0.7, 150))
+        self.assertNotEqual(sampled, ResultCache.make_key("CodeAgent", "1", "gpt-3.5-turbo", MESSAGES, 0.3, 300))
+        
+    def test_get_put(self):
+        """Test hits and misses are counted"""
+        cache = ResultCache(None)
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", "analysis")
+        self.assertEqual(cache.get("a"), "analysis")
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+        
+    def test_lru_eviction(self):
+        """Test least recently used entries are evicted once max_bytes is exceeded"""
+        cache = ResultCache(None, max_bytes=25)
+        cache.put("a", "x" * 9)
+        cache.put("b", "x" * 9)
+        cache.get("a")
+        cache.put("c", "x" * 9)
+        
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertLessEqual(cache.size, 25)
+        
+        # Entries larger than the whole cache are not stored
+        cache.put("d", "x" * 100)
+        self.assertIsNone(cache.get("d"))
+        
+    def test_persistence(self):
+        """Test the cache survives a reload and keeps LRU order"""
+        cache = ResultCache(self.cache_file, max_bytes=25)
+        cache.put("a", "x" * 9)
+        cache.put("b", "x" * 9)
+        cache.get("a")
+        with patch("auto_tagger.fileio._UMASK", 0o022):
+            cache.save()
+        if os.name != "nt":
+            self.assertEqual(os.stat(self.cache_file).st_mode & 0o777, 0o644)
+        
+        reloaded = ResultCache(self.cache_file, max_bytes=25)
+        self.assertEqual(len(reloaded), 2)
+        reloaded.put("c", "x" * 9)
+        self.assertIsNone(reloaded.get("b"))
+        self.assertEqual(reloaded.get("a"), "x" * 9)
+    def test_coalesce(self):
+        """Test identical concurrent misses make one call and share its answer or error"""
+        cache = ResultCache(None)
+        calls = []
+        release = threading.Event()
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return "answer"
+        with ThreadPoolExecutor(4) as pool:
+            futures = [pool.submit(cache.coalesce, "k", compute) for _ in range(4)]
+            time.sleep(0.1)
+            release.set()
+            outcomes = [future.result() for future in futures]
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(outcomes), [("answer", False)] + [("answer", True)] * 3)
+        self.assertEqual(cache.get("k"), "answer")
+        
+        def fail():
+            raise RuntimeError("boom")
+        with self.assertRaises(RuntimeError):
+            cache.coalesce("other", fail)
+        self.assertEqual(cache.coalesce("other", lambda: "retried"), ("retried", False))
+        
+    def test_coalesce_async(self):
+        """Test identical requests awaiting on one event loop make one call"""
+        cache = ResultCache(None)
+        calls = []
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "answer"
+        async def run():
+            return await asyncio.gather(*(cache.coalesce_async("k", compute) for _ in range(3)))
+        outcomes = asyncio.run(run())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([value for value, _ in outcomes], ["answer"] * 3)
+
+class TestSQLiteResultCache(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.cache_file = str(self.test_dir / "cache.db")
+        
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        
+    def test_shared_between_instances(self):
+        """Test answers stored by one process are hits in another straight away"""
+        first = open_cache(self.cache_file)
+        second = open_cache(self.cache_file)
+        try:
+            self.assertIsInstance(first, SQLiteResultCache)
+            self.assertIsNone(second.get("a"))
+            first.put("a", "analysis")
+            self.assertEqual(second.get("a"), "analysis")
+            self.assertEqual(second.stats(), {"hits": 1, "misses": 1, "entries": 1, "bytes": 9})
+        finally:
+            first.close()
+            second.close()
+            
+    def test_coalesce_across_instances(self):
+        """Test a request claimed by another process is waited for, and taken over if its holder fails"""
+        holder = SQLiteResultCache(self.cache_file, poll_interval=0.01)
+        waiter = SQLiteResultCache(self.cache_file, poll_interval=0.01)
+        try:
+            started = threading.Event()
+            release = threading.Event()
+            def slow():
+                started.set()
+                release.wait(5)
+                return "from holder"
+            with ThreadPoolExecutor(1) as pool:
+                future = pool.submit(holder.coalesce, "k", slow)
+                started.wait(5)
+                results = []
+                waiting = threading.Thread(target=lambda: results.append(waiter.coalesce("k", lambda: "from waiter")))
+                waiting.start()
+                time.sleep(0.05)
+                release.set()
+                waiting.join(5)
+            self.assertEqual(future.result(), ("from holder", False))
+            self.assertEqual(results, [("from holder", True)])
+            
+            def fail():
+                started.set()
+                raise RuntimeError("boom")
+            started.clear()
+            with self.assertRaises(RuntimeError):
+                holder.coalesce("j", fail)
+            self.assertEqual(waiter.coalesce("j", lambda: "from waiter"), ("from waiter", False))
+        finally:
+            holder.close()
+            waiter.close()
+            
+    def test_expired_lease_is_taken_over(self):
+        """Test a claim left behind by a dead process stops blocking once its lease expires"""
+        dead = SQLiteResultCache(self.cache_file, lease_seconds=0.1)
+        self.assertEqual(dead._acquire("k"), (None, True))
+        cache = SQLiteResultCache(self.cache_file, poll_interval=0.01)
+        try:
+            self.assertEqual(cache.coalesce("k", lambda: "answer"), ("answer", False))
+        finally:
+            dead.close()
+            cache.close()
+            
+    def test_eviction_on_save(self):
+        """Test least recently used entries beyond max_bytes are evicted when saved"""
+        cache = SQLiteResultCache(self.cache_file, max_bytes=25)
+        try:
+            cache.put("a", "x" * 9)
+            time.sleep(0.01)
+            cache.put("b", "x" * 9)
+            time.sleep(0.01)
+            cache.get("a")
+            cache.put("c", "x" * 9)
+            cache.save()
+            self.assertIsNone(cache.get("b"))
+            self.assertIsNotNone(cache.get("a"))
+            self.assertLessEqual(cache.size, 25)
+        finally:
+            cache.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,214 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+import os
+import tempfile
+import shutil
+import subprocess
+import time
+from typing import List, Tuple
+from auto_tagger.changes import DIGEST_CHUNK, ScanState, fingerprint, git_changes
+from auto_tagger.records import JSONMetadata
+from auto_tagger.storage import JSONMetadataStore
+from auto_tagger.swarm_controller import SwarmController
+
+def write(path: Path, text: str, mtime: float):
+    path.write_text(text)
+    os.utime(path, (mtime, mtime))
+
+def scan(swarm: SwarmController, directory: Path, **options) -> Tuple[List[str], int]:
+    """Process a directory, returning the names of the files analyzed and the number of files stat'ed"""
+    analyzed = []
+    store = JSONMetadata.__setitem__
+    def record(metadata, file_key, entry):
+        analyzed.append(Path(file_key).name)
+        store(metadata, file_key, entry)
+    with patch.object(JSONMetadata, "__setitem__", record), \
+            patch.object(swarm, "_unchanged", wraps=swarm._unchanged) as checked:
+        swarm.process_directory(directory, **options)
+    return sorted(analyzed), checked.call_count
+
+class TestFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        (self.test_dir / "tree").mkdir()
+        self.file = self.test_dir / "tree" / "main.py"
+        self.file.write_text("print('hello')\n")
+        self.store = JSONMetadataStore(str(self.test_dir / "metadata.json"))
+        self.swarm = SwarmController(store=self.store, backend="heuristic", journal=False)
+        
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.test_dir)
+        
+    def test_same_mtime_size_change_is_noticed(self):
+        """Test a rewrite within the same mtime is re-analyzed because the size changed"""
+        self.assertEqual(scan(self.swarm, self.test_dir / "tree"), (["main.py"], 1))
+        stat = self.file.stat()
+        self.assertEqual(self.store.load().fingerprint(str(self.file)), fingerprint(stat))
+        self.swarm.load_metadata()
+        
+        self.file.write_text("print('hello, world')\n")
+        os.utime(self.file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(self.file.stat().st_mtime, stat.st_mtime)
+        self.assertEqual(scan(self.swarm, self.test_dir / "tree"), (["main.py"], 1))
+        self.assertEqual(scan(self.swarm, self.test_dir / "tree"), ([], 1))
+        
+    def test_results_are_read_lazily(self):
+        """Test a rescan does not decode unchanged entries, which stay readable after the store is closed"""
+        with patch("auto_tagger.fileio._UMASK", 0o022):
+            self.swarm.process_directory(self.test_dir / "tree")
+        self.assertTrue(os.path.exists(self.swarm.scan_file))
+        if os.name != "nt":
+            self.assertEqual(os.stat(self.swarm.scan_file).st_mode & 0o777, 0o644)
+        swarm = SwarmController(store=self.store, backend="heuristic", journal=False)
+        with patch.object(JSONMetadata, "__getitem__", wraps=swarm.metadata.__getitem__) as decode:
+            results = swarm.process_directory(self.test_dir / "tree")
+            decode.assert_not_called()
+        self.assertEqual(list(results), [str(self.file)])
+        self.store.close()
+        self.assertEqual(results[str(self.file)]["agent"], "CodeAgent")
+
+class TestUnchangedDirectories(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.tree = self.test_dir / "tree"
+        (self.tree / "pkg").mkdir(parents=True)
+        self.past = time.time() - 60
+        self.count = DIGEST_CHUNK + 10
+        for i in range(self.count):
+            write(self.tree / "pkg" / f"f{i:03d}.py", f"x = {i}\n", self.past)
+        for directory in (self.tree / "pkg", self.tree):
+            os.utime(directory, (self.past, self.past))
+        self.store = JSONMetadataStore(str(self.test_dir / "metadata.json"))
+        self.swarm = SwarmController(store=self.store, backend="heuristic", journal=False)
+        # Entries written up to this long before a scan started count as written since it; scans are
+        # spaced further apart than that (see scan)
+        racy = patch("auto_tagger.swarm_controller.RACY_WINDOW_NS", 3 * 10**7)
+        racy.start()
+        self.addCleanup(racy.stop)
+        
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.test_dir)
+        
+    def scan(self) -> Tuple[List[str], int]:
+        time.sleep(0.05)
+        return scan(self.swarm, self.tree)
+        
+    def test_only_files_near_changes_are_checked(self):
+        """Test a rescan checks one by one only the chunk of a changed file and files written since the last scan"""
+        self.assertEqual(self.scan(), ([f"f{i:03d}.py" for i in range(self.count)], self.count))
+        # The first save wrote the whole store, so nothing in it can be vouched for yet
+        self.assertEqual(self.scan(), ([], self.count))
+        self.assertEqual(self.scan(), ([], 0))
+        
+        write(self.tree / "pkg" / "f005.py", "x = 'changed'\n", self.past)
+        self.assertEqual(self.scan(), (["f005.py"], DIGEST_CHUNK))
+        self.assertEqual(self.scan(), ([], 1))
+        self.assertEqual(self.scan(), ([], 0))
+        
+        # Analyzed between scans, then put back as it was: the digest matches, the analysis does not
+        last = self.tree / "pkg" / f"f{self.count - 1:03d}.py"
+        stat = last.stat()
+        last.write_text("x = 'tagged'\n")
+        self.swarm.tag_file(last)
+        last.write_text(f"x = {self.count - 1}\n")
+        os.utime(last, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(fingerprint(last.stat()), fingerprint(stat))
+        self.assertEqual(self.scan(), ([last.name], 1))
+        
+        results = self.swarm.process_directory(self.tree)
+        keys = [str(self.tree / "pkg" / f"f{i:03d}.py") for i in range(self.count)]
+        self.assertEqual(len(results), self.count)
+        self.assertEqual(list(results), keys)
+        self.assertIn(keys[-1], results)
+        self.assertEqual(results[keys[0]]["agent"], "CodeAgent")
+        
+        # A sharded scan leaves no digests behind
+        self.swarm.process_directory(self.tree, shard=(0, 1))
+        self.assertIsNone(self.swarm._scan_state(self.tree, True).digests)
+
+@unittest.skipIf(shutil.which("git") is None, "git is not installed")
+class TestGitChanges(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.repo = self.test_dir / "repo"
+        (self.repo / "pkg").mkdir(parents=True)
+        (self.repo / "build").mkdir()
+        # Analyses of files written within a scan's racy window are never trusted without a stat
+        self.past = time.time() - 60
+        write(self.repo / "a.py", "a = 1\n", self.past)
+        write(self.repo / "pkg" / "b.py", "b = 2\n", self.past)
+        write(self.repo / "build" / "out.py", "out = 3\n", self.past)
+        write(self.repo / ".gitignore", "build/\n", self.past)
+        self.git("init", "-q")
+        self.git("add", "-A")
+        self.commit()
+        self.store = JSONMetadataStore(str(self.test_dir / "metadata.json"))
+        self.swarm = SwarmController(store=self.store, backend="heuristic", journal=False, use_git=True,
+                                     use_gitignore=False)
+    
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.test_dir)
+        
+    def git(self, *args):
+        subprocess.run(["git", "-C", str(self.repo), *args], check=True, stdout=subprocess.DEVNULL)
+        
+    def commit(self):
+        self.git("-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-q", "-m", "change")
+        
+    def scan(self, **options):
+        return scan(self.swarm, self.repo, **options)
+        
+    def test_git_changes(self):
+        """Test status, commits since the last scan and untracked directories are reported"""
+        changes = git_changes(str(self.repo / "pkg"))
+        self.assertIsNone(changes.since_ns)
+        self.assertEqual(changes.paths, set())
+        self.assertIsNone(git_changes(str(self.test_dir)))
+        write(self.repo / "pkg" / "b.py", "b = 20\n", self.past)
+        changes = git_changes(str(self.repo), changes.commit, time.time_ns())
+        self.assertEqual(changes.paths, {"pkg/b.py"})
+        self.assertEqual(changes.directories, {"build"})
+        self.assertEqual(changes.dirty, ["pkg/b.py"])
+        self.assertFalse(changes.unchanged("build/out.py", self.past))
+        self.assertTrue(changes.unchanged("a.py", self.past))
+        
+    def test_unchanged_files_are_not_stated(self):
+        """Test files git vouches for are skipped, and modified, reverted and committed files are not"""
+        self.assertEqual(self.scan(), (["a.py", "b.py", "out.py"], 3))
+        # Only the file in the ignored directory needs a stat
+        self.assertEqual(self.scan(), ([], 1))
+        
+        write(self.repo / "pkg" / "b.py", "b = 'changed'\n", self.past)
+        self.assertEqual(self.scan(), (["b.py"], 2))
+        self.git("checkout", "--", "pkg/b.py")
+        os.utime(self.repo / "pkg" / "b.py", (self.past, self.past))
+        self.assertEqual(self.scan(), (["b.py"], 2))
+        
+        write(self.repo / "a.py", "a = 'committed'\n", self.past)
+        self.git("add", "a.py")
+        self.commit()
+        self.assertEqual(self.scan(), (["a.py"], 2))
+        self.assertEqual(self.scan(), ([], 1))
+        
+        # Without git, or with --full-scan, every file is stat'ed again
+        self.swarm.use_git = False
+        self.assertEqual(self.scan(), ([], 3))
+        self.swarm.use_git = True
+        self.assertEqual(self.scan(full_scan=True), ([], 3))
+        
+    def test_state_is_per_root(self):
+        """Test the recorded state is only used for the root and walk settings it was recorded with"""
+        self.swarm.process_directory(self.repo)
+        state = self.swarm._scan_state(self.repo, True)
+        self.assertIsNotNone(state.commit)
+        self.assertEqual(state.git.paths, set())
+        self.assertIsNone(self.swarm._scan_state(self.repo, False).commit)
+        self.assertIsNone(self.swarm._scan_state(self.repo / "pkg", True).commit)
+        self.assertEqual(ScanState.load(self.swarm.scan_file, str(self.repo), "").directories.listings, {})
+
+if __name__ == '__main__':
+    unittest.main()
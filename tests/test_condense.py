@@ -0,0 +1,129 @@
+import unittest
+from pathlib import Path
+import tempfile
+import shutil
+from auto_tagger.agents.code_agent import CodeAgent
+from auto_tagger.condense import condense, count_tokens, outline, pack, truncate_to_tokens
+
+LICENSE = "".join(f"# Licensed under the Example License, clause {i}; see LICENSE for details.\n" for i in range(30))
+
+MODULE = LICENSE + '''"""Weather forecast client.
+
+Talks to the forecast HTTP API.
+"""
+import json
+import requests
+from .cache import ForecastCache
+
+API_URL = "https://example.com/api"
+
+@dataclass
+class Forecast:
+    """One day of forecast"""
+    day: str
+    
+    def summary(self) -> str:
+        return self.day
+
+class ForecastClient(BaseClient):
+    def __init__(self, api_key: str, timeout: float = 10.0):
+        self.api_key = api_key
+''' + "".join(f'''
+    def fetch_{i}(self, city: str) -> Forecast:
+        """Fetch forecast number {i}"""
+        response = requests.get(API_URL, params={{"city": city, "key": self.api_key}})
+        return Forecast(**json.loads(response.text))
+''' for i in range(40)) + '''
+async def main(argv=None) -> int:
+    return 0
+'''
+
+class TestCondense(unittest.TestCase):
+    def test_small_files_are_kept_whole(self):
+        """Test a file within the budget is returned unchanged"""
+        source = "def hello():\n    print('Hello, World!')\n"
+        self.assertEqual(condense(source, ".py", 400), source)
+        
+    def test_python_skeleton(self):
+        """Test a long Python module is reduced to its docstring, imports and signatures within the budget"""
+        skeleton = condense(MODULE, ".py", 250)
+        self.assertLessEqual(count_tokens(skeleton), 250)
+        self.assertTrue(skeleton.startswith('"""Weather forecast client."""'))
+        self.assertNotIn("Licensed under", skeleton)
+        self.assertNotIn("requests.get", skeleton)
+        for line in ("import requests", "from .cache import ForecastCache", "@dataclass\nclass Forecast:",
+                     "class ForecastClient(BaseClient):", "    def __init__(self, api_key: str, timeout: float): ...",
+                     "    def fetch_0(self, city: str) -> Forecast: ...", "async def main(argv) -> int: ..."):
+            self.assertIn(line, skeleton)
+        # Later methods are left out once the budget is spent; the skeleton keeps source order
+        self.assertNotIn("def fetch_39", skeleton)
+        self.assertLess(skeleton.index("class Forecast:"), skeleton.index("async def main"))
+        
+    def test_truncated_python_falls_back_to_declaration_lines(self):
+        """Test Python that no longer parses is outlined line by line"""
+        skeleton = condense(MODULE[:len(MODULE) // 2] + "    def broken(self", ".py", 250)
+        self.assertIn("class ForecastClient(BaseClient):", skeleton)
+        self.assertIn("import requests", skeleton)
+        self.assertNotIn("Licensed under", skeleton)
+        
+    def test_regex_outlines(self):
+        """Test the other supported languages are outlined by their declaration lines"""
+        sources = {
+            ".js": ("import express from 'express';\nexport class Router extends Base {\n"
+                    "  async handle(req, res) {\n    if (req) {\n      return res.send(1);\n    }\n  }\n}\n",
+                    ["import express from 'express';", "export class Router extends Base", "  async handle(req, res)"],
+                    "if (req)"),
+            ".go": ("package server\n\nimport \"net/http\"\n\ntype Server struct {\n\taddr string\n}\n\n"
+                    "func (s *Server) Start() error {\n\treturn http.ListenAndServe(s.addr, nil)\n}\n",
+                    ["package server", "type Server struct", "func (s *Server) Start() error"], "ListenAndServe"),
+            ".rs": ("use std::collections::HashMap;\npub struct Cache {\n    map: HashMap<String, String>,\n}\n"
+                    "impl Cache {\n    pub fn new() -> Self {\n        Self { map: HashMap::new() }\n    }\n}\n",
+                    ["use std::collections::HashMap;", "pub struct Cache", "impl Cache", "    pub fn new() -> Self"],
+                    "map: HashMap"),
+            ".java": ("package com.example;\npublic class Service {\n    public Service(List<String> items) {\n"
+                      "        this.items = items;\n    }\n    public static int count(List<String> xs) {\n"
+                      "        return xs.size();\n    }\n}\n",
+                      ["package com.example;", "public class Service", "    public static int count(List<String> xs)"],
+                      "xs.size()"),
+            ".cpp": ("#include <vector>\nclass Point {\npublic:\n    double norm() const;\n};\n"
+                     "double Point::norm() const {\n    if (x) return 1;\n    return 0;\n}\n",
+                     ["#include <vector>", "class Point", "double Point::norm() const"], "return 0")
+        }
+        for suffix, (source, expected, body) in sources.items():
+            skeleton = pack(outline(source, suffix), 1000)
+            for line in expected:
+                self.assertIn(line, skeleton.split("\n"), suffix)
+            self.assertNotIn(body, skeleton, suffix)
+            
+    def test_files_without_declarations_keep_their_head(self):
+        """Test scripts without definitions, and unknown languages, are cut to the budget from the top"""
+        script = "".join(f"print('step {i}')\n" for i in range(500))
+        head = condense(script, ".py", 100)
+        self.assertTrue(head.startswith("print('step 0')"))
+        self.assertLessEqual(count_tokens(head), 100)
+        self.assertEqual(truncate_to_tokens(script, 100), head)
+        self.assertEqual(condense(script, ".unknown", 100), head)
+
+class TestCodeAgentSample(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        
+    def test_build_sample_is_condensed(self):
+        """Test CodeAgent sends the skeleton of long files instead of their license header"""
+        path = self.test_dir / "forecast.py"
+        path.write_text(MODULE)
+        agent = CodeAgent()
+        sample = agent.build_sample(path)
+        self.assertLessEqual(count_tokens(sample), agent.sample_tokens)
+        self.assertIn("class ForecastClient(BaseClient):", sample)
+        self.assertLess(count_tokens(sample), count_tokens(agent.read_sample(path, 1500, "head")))
+        
+        empty = self.test_dir / "empty.py"
+        empty.write_text("")
+        self.assertIsNone(agent.build_sample(empty))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import os
+import tempfile
+import shutil
+import zipfile
+import zlib
+from auto_tagger.agents.doc_agent import DocAgent
+from auto_tagger.cache import ResultCache
+from auto_tagger.documents import extract_text, extraction_pool, shutdown_extraction_pool
+
+DOCX_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+def write_docx(path: Path, paragraphs):
+    body = "".join(f'<w:p><w:r><w:t>{text}</w:t></w:r></w:p>' for text in paragraphs)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("word/document.xml", f'<w:document xmlns:w="{DOCX_NS}"><w:body>{body}</w:body></w:document>')
+
+def write_pdf(path: Path, pages, compress: bool = True):
+    """Minimal PDF with one content stream per page, plus an image stream that must be skipped"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b"<< /Type /Pages /Count %d >>" % len(pages),
+               b"<< /Type /XObject /Subtype /Image /Length 4 >>\nstream\nBT (x) Tj ET\nendstream"]
+    for content in pages:
+        data = zlib.compress(content) if compress else content
+        dictionary = b"<< /Length %d%s >>" % (len(data), b" /Filter /FlateDecode" if compress else b"")
+        objects.append(dictionary + b"\nstream\n" + data + b"\nendstream")
+    body = b"%PDF-1.4\n" + b"".join(b"%d 0 obj\n%s\nendobj\n" % (number, obj) for number, obj in enumerate(objects, 1))
+    path.write_bytes(body + b"trailer\n<< /Root 1 0 R >>\n%%EOF\n")
+
+class TestExtractors(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        
+    def test_docx_reads_leading_paragraphs(self):
+        """Test .docx text is streamed paragraph by paragraph and stops at max_paragraphs"""
+        path = self.test_dir / "report.docx"
+        write_docx(path, ["Quarterly Report"] + [f"Paragraph {i} about revenue." for i in range(500)])
+        text = extract_text(path, max_paragraphs=3)
+        self.assertEqual(text.split("\n"), ["Quarterly Report", "Paragraph 0 about revenue.", "Paragraph 1 about revenue."])
+        
+    def test_pdf_without_pypdf(self):
+        """Test the fallback reads text operators from the first content streams only"""
+        path = self.test_dir / "paper.pdf"
+        pages = [b"BT /F1 12 Tf 72 720 Td (Attention Is) Tj 0 -14 Td [(All)-300(You Need)] TJ ET",
+                 b"BT (Section \\(2\\): Method) Tj ET",
+                 b"BT (Appendix) Tj ET"]
+        write_pdf(path, pages)
+        with patch.dict("sys.modules", {"pypdf": None}):
+            self.assertEqual(extract_text(path, max_pages=2), "Attention Is\nAll You Need\nSection (2): Method")
+            write_pdf(path, pages[:1], compress=False)
+            self.assertEqual(extract_text(path), "Attention Is\nAll You Need")
+            
+    def test_doc_text_runs(self):
+        """Test readable UTF-16 text is pulled out of a legacy .doc file"""
+        path = self.test_dir / "memo.doc"
+        text = "Meeting notes for the infrastructure migration project.\r"
+        path.write_bytes(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" + b"\x00\x03\xfe\xff" * 100 + text.encode("utf-16-le"))
+        self.assertEqual(extract_text(path), text.strip())
+        
+    def test_garbage_is_dropped(self):
+        """Test files that are not what their suffix claims yield no text instead of binary noise"""
+        for name in ("fake.pdf", "fake.docx", "fake.doc"):
+            path = self.test_dir / name
+            path.write_bytes(bytes(range(256)) * 40)
+            self.assertEqual(extract_text(path), "", name)
+        self.assertIsNone(extract_text(self.test_dir / "notes.txt"))
+
+class TestDocAgentExtraction(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.path = self.test_dir / "guide.docx"
+        write_docx(self.path, ["Installation Guide", "Run the installer and follow the prompts."])
+        self.agent = DocAgent()
+        self.agent.result_cache = ResultCache(None)
+        
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        
+    def test_extracted_text_is_cached_by_content(self):
+        """Test documents are extracted once per content, including copies under other names"""
+        self.agent.extract_processes = 0
+        with patch("auto_tagger.agents.doc_agent.extract_text", wraps=extract_text) as extract:
+            sample = self.agent.build_sample(self.path)
+            copy = self.test_dir / "copy.docx"
+            shutil.copy(self.path, copy)
+            self.assertEqual(self.agent.build_sample(copy), sample)
+        self.assertEqual(sample, "Installation Guide\nRun the installer and follow the prompts.")
+        self.assertEqual(extract.call_count, 1)
+        
+    def test_extraction_in_process_pool(self):
+        """Test extraction runs in worker processes, from both pipelines"""
+        try:
+            self.assertTrue(self.agent.build_sample(self.path).startswith("Installation Guide"))
+            self.agent.result_cache = None
+            messages = asyncio.run(self.agent.build_messages_async(self.path))
+            self.assertIn("Run the installer", messages[1]["content"])
+        finally:
+            shutdown_extraction_pool()
+            
+    def test_pool_replaced_after_worker_dies(self):
+        """Test a pool broken by a killed worker is replaced instead of failing every later document"""
+        try:
+            broken = extraction_pool(1)
+            with self.assertRaises(BrokenProcessPool):
+                broken.submit(os._exit, 1).result()
+            self.assertTrue(self.agent.build_sample(self.path).startswith("Installation Guide"))
+            self.assertIsNot(extraction_pool(), broken)
+        finally:
+            shutdown_extraction_pool()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+import os
+import tempfile
+import shutil
+import numpy as np
+from auto_tagger.embeddings import EmbeddingIndex, HashingEmbedder, normalize, update_index, write_index
+from auto_tagger.storage import JSONMetadataStore
+from auto_tagger.swarm_controller import SwarmController
+
+class TestHashingEmbedder(unittest.TestCase):
+    def test_related_texts_are_closer(self):
+        """Test texts sharing vocabulary get more similar vectors than unrelated ones"""
+        embedder = HashingEmbedder()
+        vectors = embedder.embed(["weather forecast client for cities", "cache of weather forecasts by city",
+                                  "database migrations for user accounts", ""])
+        self.assertEqual(vectors.shape, (4, embedder.dim))
+        np.testing.assert_allclose(np.linalg.norm(vectors[:3], axis=1), 1, rtol=1e-5)
+        self.assertFalse(vectors[3].any())
+        self.assertGreater(vectors[0] @ vectors[1], vectors[0] @ vectors[2])
+        np.testing.assert_array_equal(embedder.embed(["weather forecast client for cities"])[0], vectors[0])
+
+class TestEmbeddingIndex(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.path = str(self.test_dir / "metadata.json.vec")
+        rng = np.random.default_rng(0)
+        self.vectors = normalize(rng.standard_normal((1000, 32)).astype(np.float32))
+        self.paths = [f"src/module_{i}.py" for i in range(1000)]
+        
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        
+    def write(self, quantized=False):
+        chunks = ((self.paths[start:start + 300], [float(i) for i in range(start, min(start + 300, 1000))],
+                   self.vectors[start:start + 300]) for start in range(0, 1000, 300))
+        write_index(self.path, "test", chunks, quantized)
+        return EmbeddingIndex(self.path)
+        
+    def test_search_matches_brute_force(self):
+        """Test blocked, batched top-k search returns the exact nearest neighbours"""
+        index = self.write()
+        self.assertEqual((len(index), index.dim, index.model), (1000, 32, "test"))
+        self.assertEqual(index.path_of(999), "src/module_999.py")
+        self.assertEqual(index.ids()["src/module_7.py"], 7)
+        self.assertEqual(index.mtimes[7], 7.0)
+        queries = self.vectors[[3, 500, 998]]
+        results = index.search(queries, k=5, exclude=[500], block_rows=128)
+        scores = queries @ self.vectors.T
+        scores[1, 500] = -np.inf
+        for row, result in zip(scores, results):
+            expected = np.argsort(-row)[:5]
+            self.assertEqual([file_id for file_id, _ in result], expected.tolist())
+            np.testing.assert_allclose([score for _, score in result], row[expected], rtol=1e-5)
+        self.assertNotIn(500, [file_id for file_id, _ in results[1]])
+        self.assertEqual(len(index.search(queries[0], k=5000)[0]), 1000)
+        index.close()
+        
+    def test_quantized_index(self):
+        """Test the int8 index is a quarter of the size and finds the same nearest neighbour"""
+        index = self.write()
+        float_size = index.vectors.nbytes
+        index.close()
+        index = self.write(quantized=True)
+        self.assertTrue(index.quantized)
+        self.assertEqual(index.vectors.nbytes * 4, float_size)
+        np.testing.assert_allclose(index.vector(42), self.vectors[42], atol=0.02)
+        for file_id in (0, 123, 999):
+            self.assertEqual(index.search(self.vectors[file_id], k=1)[0][0][0], file_id)
+        index.close()
+        
+    def test_update_reuses_unchanged_vectors(self):
+        """Test only new or re-analyzed files are embedded and unchanged indexes are not rewritten"""
+        embedder = HashingEmbedder(dim=16)
+        files = [("a.py", 1.0), ("b.py", 2.0), ("c.py", 3.0)]
+        texts = {"a.py": "weather forecast", "b.py": "forecast cache", "c.py": "database schema", "d.py": "notes"}
+        with patch.object(embedder, "embed", wraps=embedder.embed) as embed:
+            with patch("auto_tagger.fileio._UMASK", 0o022):
+                self.assertEqual(update_index(self.path, files, embedder, texts.get, batch_size=2), 3)
+            if os.name != "nt":
+                self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o644)
+            stamp = os.stat(self.path).st_mtime_ns
+            self.assertEqual(update_index(self.path, files, embedder, texts.get), 0)
+            self.assertEqual(os.stat(self.path).st_mtime_ns, stamp)
+            embed.reset_mock()
+            self.assertEqual(update_index(self.path, [("c.py", 3.0), ("a.py", 1.5), ("d.py", None)],
+                                          embedder, texts.get), 2)
+            embed.assert_called_once_with(["weather forecast", "notes"])
+        index = EmbeddingIndex(self.path)
+        self.assertEqual([index.path_of(i) for i in range(len(index))], ["c.py", "a.py", "d.py"])
+        np.testing.assert_allclose(index.vector(0), embedder.embed(["database schema"])[0])
+        index.close()
+
+class TestSearchSimilar(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.tree = self.test_dir / "tree"
+        self.tree.mkdir()
+        (self.tree / "weather.py").write_text(
+            '"""Weather forecast client"""\ndef fetch_forecast(city):\n    return get_weather_forecast(city)\n')
+        (self.tree / "forecast_cache.py").write_text(
+            '"""Cache of weather forecasts"""\nclass ForecastCache:\n    def forecast(self, city):\n        pass\n')
+        (self.tree / "migrations.py").write_text(
+            '"""Database migrations"""\ndef migrate(connection):\n    connection.execute("ALTER TABLE accounts")\n')
+        
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        
+    def test_similar_files_and_free_text(self):
+        """Test files like a tagged file, and files matching a description, are ranked first"""
+        store = JSONMetadataStore(str(self.test_dir / "metadata.json"))
+        swarm = SwarmController(store=store, backend="heuristic", embeddings=True, embedder="hashing", journal=False)
+        swarm.process_directory(self.tree)
+        self.assertTrue(os.path.exists(swarm.embedding_file))
+        
+        results = swarm.search_similar(self.tree / "weather.py", k=2)
+        self.assertEqual([path for path, _ in results],
+                         [str(self.tree / "forecast_cache.py"), str(self.tree / "migrations.py")])
+        self.assertEqual(swarm.search_similar("database migration for accounts", k=1)[0][0],
+                         str(self.tree / "migrations.py"))
+        
+        # Files are re-embedded when they are analyzed again
+        (self.tree / "migrations.py").write_text('"""Weather forecast migrations"""\n')
+        os.utime(self.tree / "migrations.py", (1, 1))
+        swarm.process_directory(self.tree)
+        self.assertIn(swarm.search_similar(self.tree / "migrations.py", k=1)[0][0],
+                      [str(self.tree / "weather.py"), str(self.tree / "forecast_cache.py")])
+        store.close()
+
+if __name__ == '__main__':
+    unittest.main()
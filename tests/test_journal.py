@@ -0,0 +1,118 @@
+import unittest
+from pathlib import Path
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import shutil
+from auto_tagger.journal import Journal
+
+ROOT = Path(__file__).resolve().parent.parent
+
+RUN_SNIPPET = """
+import os, signal, sys
+from pathlib import Path
+from auto_tagger.agents.registry import register_agent
+from auto_tagger.swarm_controller import SwarmController
+
+class StubAgent:
+    name = "StubAgent"
+    supported_extensions = [".stub"]
+    
+    def analyze_file(self, file_path):
+        with open("calls.log", "a") as f:
+            f.write(file_path.name + "\\n")
+        if file_path.name == sys.argv[2]:
+            os.kill(os.getpid(), getattr(signal, sys.argv[3]))
+        return {"tags": [file_path.stem], "metadata": {}}
+
+register_agent("StubAgent", [".stub"], StubAgent)
+swarm = SwarmController(cache_max_bytes=None)
+swarm.process_directory(Path(sys.argv[1]), max_workers=int(sys.argv[4]))
+"""
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        
+    def test_append_and_replay(self):
+        """Test records replay in order, torn lines are skipped and clear removes the file"""
+        journal = Journal(str(self.test_dir / "metadata.json.journal"))
+        journal.append({"a.py": {"tags": ["a"]}, "b.py": {"tags": ["b"]}})
+        journal.close()
+        with open(journal.path, 'a') as f:
+            f.write('{"path": "c.py", "ent')
+        # Appending after a torn line starts a fresh one
+        journal.append({"d.py": {"tags": ["d"]}})
+        
+        self.assertEqual(list(journal.replay()),
+                         [("a.py", {"tags": ["a"]}), ("b.py", {"tags": ["b"]}), ("d.py", {"tags": ["d"]})])
+        journal.clear()
+        self.assertFalse(Path(journal.path).exists())
+        self.assertEqual(list(journal.replay()), [])
+
+class TestResumableRuns(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.tree = self.test_dir / "tree"
+        self.tree.mkdir()
+        self.names = [f"file_{i}.stub" for i in range(10)]
+        for name in self.names:
+            (self.tree / name).write_text(name)
+        self.env = dict(os.environ, PYTHONPATH=str(ROOT) + os.pathsep + os.environ.get("PYTHONPATH", ""))
+        
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        
+    def run_swarm(self, kill_at: str = "", signal_name: str = "SIGKILL", workers: int = 1) -> int:
+        result = subprocess.run([sys.executable, "-c", RUN_SNIPPET, str(self.tree), kill_at, signal_name, str(workers)],
+                                cwd=self.test_dir, env=self.env, capture_output=True, text=True)
+        return result.returncode
+        
+    def calls(self):
+        calls = (self.test_dir / "calls.log").read_text().split()
+        (self.test_dir / "calls.log").unlink()
+        return calls
+        
+    def stored(self):
+        with open(self.test_dir / "metadata.json") as f:
+            return {Path(file_key).name for file_key in json.load(f)}
+            
+    def test_resume_after_kill(self):
+        """Test a run killed mid-way resumes without redoing any completed file"""
+        self.assertNotEqual(self.run_swarm("file_5.stub", "SIGKILL"), 0)
+        self.assertEqual(self.calls(), self.names[:6])
+        self.assertFalse((self.test_dir / "metadata.json").exists())
+        self.assertTrue((self.test_dir / "metadata.json.journal").exists())
+        
+        self.assertEqual(self.run_swarm(), 0)
+        
+        # Only the file being analyzed when the process died is analyzed again
+        self.assertEqual(self.calls(), self.names[5:])
+        self.assertEqual(self.stored(), set(self.names))
+        self.assertFalse((self.test_dir / "metadata.json.journal").exists())
+        
+    def test_interrupt_saves_completed(self):
+        """Test Ctrl-C saves finished analyses to the store before exiting"""
+        self.assertNotEqual(self.run_swarm("file_3.stub", "SIGINT"), 0)
+        self.assertEqual(self.calls(), self.names[:4])
+        self.assertEqual(self.stored(), set(self.names[:3]))
+        self.assertFalse((self.test_dir / "metadata.json.journal").exists())
+        
+    def test_interrupt_with_workers(self):
+        """Test Ctrl-C with a thread pool keeps the results of jobs that were already running"""
+        self.assertNotEqual(self.run_swarm("file_3.stub", "SIGINT", workers=4), 0)
+        first = self.calls()
+        self.assertEqual(self.stored(), set(first))
+        
+        self.assertEqual(self.run_swarm(workers=4), 0)
+        
+        self.assertEqual(sorted(self.calls()), sorted(set(self.names) - set(first)))
+        self.assertEqual(self.stored(), set(self.names))
+
+if __name__ == '__main__':
+    unittest.main()
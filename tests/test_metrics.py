@@ -0,0 +1,129 @@
+import unittest
+from pathlib import Path
+from urllib.request import urlopen
+import asyncio
+import json
+import tempfile
+import shutil
+from openai import OpenAI, AsyncOpenAI
+from auto_tagger.agents.code_agent import CodeAgent
+from auto_tagger.cache import ResultCache
+from auto_tagger.metrics import Histogram, Metrics, model_price, serve_metrics
+from auto_tagger.scheduler import RequestScheduler
+from auto_tagger.storage import JSONMetadataStore
+from auto_tagger.swarm_controller import SwarmController
+from tests.test_scheduler import FakeOpenAIServer
+
+class TestHistogram(unittest.TestCase):
+    def test_quantiles(self):
+        """Test quantiles are interpolated within buckets and never exceed the maximum"""
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.05, 0.05, 0.5, 0.5, 2.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 2, 1])
+        self.assertAlmostEqual(histogram.quantile(0.4), 0.1)
+        self.assertAlmostEqual(histogram.quantile(0.6), 0.1 + 0.9 * 0.5)
+        self.assertEqual(histogram.quantile(1.0), 2.0)
+        self.assertEqual(Histogram().quantile(0.5), 0.0)
+        
+    def test_model_price(self):
+        """Test dated snapshots use their model's price and the longest name wins"""
+        self.assertEqual(model_price("gpt-4o-mini-2024-07-18"), (0.15, 0.60))
+        self.assertEqual(model_price("gpt-4o"), (2.50, 10.00))
+        self.assertIsNone(model_price("local-model"))
+
+class TestAgentMetrics(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.file_path = self.test_dir / "util.py"
+        self.file_path.write_text("def add(a, b):\n    return a + b\n")
+        self.server = FakeOpenAIServer(rate_limited=1, retry_after="0")
+        self.metrics = Metrics()
+        self.agent = CodeAgent()
+        self.agent.metrics = self.metrics
+        self.agent.scheduler = RequestScheduler(base_delay=0.01)
+        self.agent.result_cache = ResultCache(None, 1024 * 1024)
+        self.agent.client = OpenAI(api_key="test", base_url=self.server.base_url, max_retries=0)
+        self.agent.async_client = AsyncOpenAI(api_key="test", base_url=self.server.base_url, max_retries=0)
+        
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.test_dir)
+        
+    def test_usage_retries_and_cache(self):
+        """Test reported tokens, cost, retries and cache hits are counted per agent"""
+        self.agent.analyze_file(self.file_path)
+        self.agent.analyze_file(self.file_path)
+        
+        report = self.metrics.snapshot()
+        counters = report["agents"]["CodeAgent"]
+        self.assertEqual(counters["requests"], 1)
+        self.assertEqual(counters["retries"], 1)
+        self.assertEqual(counters["prompt_tokens"], 40)
+        self.assertEqual(counters["completion_tokens"], 5)
+        self.assertAlmostEqual(counters["cost_usd"], (40 * 0.15 + 5 * 0.60) / 1e6)
+        self.assertEqual((counters["cache_hits"], counters["cache_misses"]), (1, 1))
+        self.assertEqual(counters["cache_hit_rate"], 0.5)
+        # Both attempts reached the server; the backoff between them is not api time
+        self.assertEqual(report["stages"]["api"]["count"], 2)
+        self.assertEqual(set(report["stages"]), {"sample", "prompt", "api", "parse"})
+        self.assertEqual(report["totals"]["requests"], 1)
+        
+    def test_async_and_errors(self):
+        """Test the async path records the same counters and failures are counted as errors"""
+        asyncio.run(self.agent.analyze_file_async(self.file_path))
+        self.assertEqual(self.metrics.snapshot()["agents"]["CodeAgent"]["retries"], 1)
+        
+        self.agent.scheduler = RequestScheduler(max_retries=0)
+        self.agent.result_cache = None
+        self.server.rate_limited = 10 ** 6
+        result = self.agent.analyze_file(self.file_path)
+        
+        self.assertIn("error", result["metadata"])
+        counters = self.metrics.snapshot()["agents"]["CodeAgent"]
+        self.assertEqual(counters["errors"], 1)
+        self.assertEqual(counters["requests"], 1)
+
+class TestControllerMetrics(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.tree = self.test_dir / "tree"
+        self.tree.mkdir()
+        (self.tree / "app.py").write_text("import os\nprint(os.getcwd())\n")
+        (self.tree / "notes.md").write_text("# Notes\n")
+        self.swarm = SwarmController(cache_max_bytes=None, backend="heuristic",
+                                     store=JSONMetadataStore(str(self.test_dir / "metadata.json")))
+        
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        
+    def test_run_report(self):
+        """Test a run records pipeline stages and files per agent, and reports them in every format"""
+        self.swarm.process_directory(self.tree, max_workers=2)
+        
+        report = self.swarm.metrics.snapshot()
+        self.assertEqual(list(report["stages"]), ["walk", "stat", "sample", "inference", "save"])
+        self.assertEqual(report["stages"]["stat"]["count"], 2)
+        self.assertEqual(report["totals"]["files"], 2)
+        self.assertEqual(report["agents"]["DocAgent"]["files"], 1)
+        self.assertIsNone(report["totals"]["cost_usd"])
+        
+        report_file = self.test_dir / "stats.json"
+        self.swarm.metrics.write_report(str(report_file))
+        self.assertEqual(json.loads(report_file.read_text())["totals"]["files"], 2)
+        self.assertIn("walk", self.swarm.metrics.format_summary())
+        
+        server = serve_metrics(self.swarm.metrics, 0, "127.0.0.1")
+        try:
+            with urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics", timeout=5) as response:
+                self.assertIn("text/plain", response.headers["Content-Type"])
+                body = response.read().decode("utf-8")
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertIn('auto_tagger_stage_seconds_count{stage="stat"} 2', body)
+        self.assertIn('auto_tagger_stage_seconds_bucket{stage="stat",le="+Inf"} 2', body)
+        self.assertIn('auto_tagger_files_total{agent="CodeAgent"} 1', body)
+
+if __name__ == '__main__':
+    unittest.main()
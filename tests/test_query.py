@@ -0,0 +1,143 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import shutil
+from auto_tagger.query import QueryEngine
+from auto_tagger.storage import JSONMetadataStore, SQLiteMetadataStore
+from auto_tagger.tag_index import QuerySyntaxError, TagIndex
+from tests.test_storage import ENTRIES
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MORE = {
+    "src/api/server.py": {"tags": ["python", "api", "http"], "agent": "CodeAgent"},
+    "src/api/schema.json": {"tags": ["api", "json-schema"], "agent": "DataAgent"},
+    "src/apiary/bees.md": {"tags": ["bees"], "agent": "DocAgent"},
+    "tests/test_app.PY": {"tags": ["python", "test"], "agent": "CodeAgent"}
+}
+
+class TestQueryEngine(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.metadata = str(self.test_dir / "metadata.json")
+        JSONMetadataStore(self.metadata).save(dict(ENTRIES, **MORE))
+        self.engine = QueryEngine(self.metadata)
+        
+    def tearDown(self):
+        self.engine.close()
+        shutil.rmtree(self.test_dir)
+        
+    def test_queries_and_filters(self):
+        """Test tag queries and path prefix, agent and file type filters"""
+        self.assertEqual(self.engine.search("python AND NOT test"), ["src/api/server.py", "src/app.py"])
+        self.assertEqual(self.engine.search("WEB"), ["docs/readme.md", "src/app.py"])
+        self.assertEqual(self.engine.search("json*"), ["src/api/schema.json"])
+        self.assertEqual(self.engine.search("api", prefix="src/api/"), ["src/api/schema.json", "src/api/server.py"])
+        self.assertEqual(self.engine.search(prefix="src/api"),
+                         ["src/api/schema.json", "src/api/server.py", "src/apiary/bees.md"])
+        self.assertEqual(self.engine.search("python", agent="CodeAgent", file_type="py"),
+                         ["src/api/server.py", "src/app.py", "tests/test_app.PY"])
+        self.assertEqual(self.engine.search(agent="DocAgent", file_type=".md"), ["docs/readme.md", "src/apiary/bees.md"])
+        self.assertEqual(self.engine.search("nothing"), [])
+        self.assertEqual(len(self.engine.search()), 6)
+        with self.assertRaises(QuerySyntaxError):
+            self.engine.search("python AND")
+            
+    def test_prefixes_match_tag_index(self):
+        """Test bare and path prefixes agree with TagIndex, ignoring the agent and type filter terms"""
+        entries = dict(ENTRIES, **MORE, **{"notes/untagged.txt": {"tags": [], "agent": "DocAgent"}})
+        JSONMetadataStore(self.metadata).save(entries)
+        tag_index = TagIndex.build((path, entry["tags"]) for path, entry in entries.items())
+        # '" *"' is a prefix that normalizes to "", matching every tag
+        for expression in ('" *"', "p*", "a* AND NOT api"):
+            self.assertEqual(self.engine.search(expression), sorted(tag_index.query(expression)))
+        self.assertNotIn("notes/untagged.txt", self.engine.search('" *"'))
+        self.assertEqual(self.engine.search(prefix="notes/"), ["notes/untagged.txt"])
+        self.assertEqual(self.engine.search(prefix="zzz"), [])
+        self.assertEqual(self.engine.search(prefix=""), sorted(entries))
+        
+    def test_index_follows_the_store(self):
+        """Test the index is written once, reused, and rebuilt when the store changes or is corrupt"""
+        with patch("auto_tagger.fileio._UMASK", 0o022):
+            self.engine.search("python")
+        index_file = Path(self.metadata + ".idx")
+        self.assertTrue(index_file.exists())
+        if os.name != "nt":
+            # Other users can query a store they can read
+            self.assertEqual(index_file.stat().st_mode & 0o777, 0o644)
+        
+        other = QueryEngine(self.metadata)
+        try:
+            self.assertEqual(other.search("bees"), ["src/apiary/bees.md"])
+            JSONMetadataStore(self.metadata).save({"new.py": {"tags": ["bees"], "agent": "CodeAgent"}})
+            self.assertEqual(other.search("bees"), ["new.py"])
+            self.assertEqual(self.engine.search("bees"), ["new.py"])
+        finally:
+            other.close()
+            
+        self.engine.close()
+        index_file.write_bytes(b"garbage")
+        self.assertEqual(QueryEngine(self.metadata).search("bees"), ["new.py"])
+        
+    def test_appended_entries_replace_earlier_ones(self):
+        """Test entries a save appended to the store replace the ones they follow in the index"""
+        self.assertEqual(self.engine.search("bees"), ["src/apiary/bees.md"])
+        store = JSONMetadataStore(self.metadata)
+        metadata = store.load()
+        metadata["src/apiary/bees.md"] = dict(MORE["src/apiary/bees.md"], tags=["wasps"])
+        store.save(metadata)
+        store.close()
+        self.assertEqual(self.engine.search("bees"), [])
+        self.assertEqual(self.engine.search("wasps"), ["src/apiary/bees.md"])
+        self.assertEqual(self.engine.search(prefix="src/apiary/"), ["src/apiary/bees.md"])
+        
+    def test_missing_store(self):
+        """Test a store that does not exist yet has no matches"""
+        engine = QueryEngine(str(self.test_dir / "absent.json"))
+        self.assertEqual(engine.search("python"), [])
+        self.assertFalse((self.test_dir / "absent.json.idx").exists())
+        
+    def test_sqlite_store(self):
+        """Test SQLite stores are read without being opened for writing, including uncheckpointed writes"""
+        store = SQLiteMetadataStore(str(self.test_dir / "metadata.db"))
+        try:
+            store.save(dict(ENTRIES, **MORE))
+            engine = QueryEngine(str(self.test_dir / "metadata.db"))
+            self.assertEqual(engine.search("web", agent="CodeAgent"), ["src/app.py"])
+            mapping = store.load()
+            mapping["late.py"] = {"tags": ["web"], "agent": "CodeAgent"}
+            store.save(mapping)
+            self.assertEqual(engine.search("web", agent="CodeAgent"), ["late.py", "src/app.py"])
+            engine.close()
+        finally:
+            store.close()
+
+class TestQueryCommand(unittest.TestCase):
+    def test_query_subcommand(self):
+        """Test the query subcommand answers without importing the tagging pipeline"""
+        with tempfile.TemporaryDirectory() as tmp:
+            JSONMetadataStore(os.path.join(tmp, "metadata.json")).save(dict(ENTRIES, **MORE))
+            snippet = (
+                "import sys\n"
+                "from auto_tagger.__main__ import main\n"
+                "try:\n"
+                "    main(sys.argv[1:])\n"
+                "except SystemExit as e:\n"
+                "    loaded = [m for m in ('openai', 'dotenv', 'pandas', 'auto_tagger.swarm_controller',\n"
+                "                          'auto_tagger.agents.registry') if m in sys.modules]\n"
+                "    print('loaded:', loaded, 'status:', e.code)\n"
+            )
+            env = dict(os.environ, PYTHONPATH=str(ROOT))
+            output = subprocess.run([sys.executable, "-c", snippet, "query", "python", "--type", ".py", "--json"],
+                                    cwd=tmp, env=env, capture_output=True, text=True, check=True).stdout
+        lines = output.splitlines()
+        self.assertEqual(json.loads(lines[0]), ["src/api/server.py", "src/app.py", "tests/test_app.PY"])
+        self.assertEqual(lines[1], "loaded: [] status: 0")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,220 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+import io
+import json
+import os
+import tempfile
+import shutil
+import time
+from auto_tagger.records import RECORDS_SUFFIX, JSONMetadata, iter_entries
+from auto_tagger.storage import JSONMetadataStore
+from auto_tagger.swarm_controller import SwarmController
+
+ENTRIES = {
+    "src/app.py": {
+        "tags": ["python", "web"],
+        "metadata": {"file_type": ".py", "purpose": "Flask app\nwith \"quotes\"", "components": ["App"], "size": 120},
+        "last_modified": 123456789.5,
+        "agent": "CodeAgent"
+    },
+    "docs/résumé.md": {
+        "tags": ["documentation", "web", "café"],
+        "metadata": {"file_type": ".md", "error": None},
+        "last_modified": 42.0,
+        "agent": "DocAgent"
+    },
+    "data/empty.json": {"tags": [], "metadata": {}}
+}
+
+class TestIterEntries(unittest.TestCase):
+    def test_stream_across_chunks(self):
+        """Test entries and their byte spans are parsed whatever the chunk boundaries"""
+        for ensure_ascii in (True, False):
+            raw = json.dumps(ENTRIES, indent=2, ensure_ascii=ensure_ascii).encode("utf-8")
+            for chunk_size in (1, 7, 4096):
+                entries = list(iter_entries(io.BytesIO(raw), chunk_size))
+                self.assertEqual({key: value for key, value, _, _ in entries}, ENTRIES)
+                for _, value, offset, length in entries:
+                    self.assertEqual(json.loads(raw[offset:offset + length]), value)
+                    
+    def test_not_an_object(self):
+        """Test files that are not a JSON object are rejected like json.load rejects them"""
+        for raw in (b"[1, 2]", b'{"a": 1', b'{"a" 1}', b""):
+            with self.assertRaises(ValueError):
+                list(iter_entries(io.BytesIO(raw)))
+
+class TestJSONMetadata(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.path = str(self.test_dir / "metadata.json")
+        self.store = JSONMetadataStore(self.path)
+        self.store.save(ENTRIES)
+        
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.test_dir)
+        
+    def test_file_format_is_unchanged(self):
+        """Test saving writes exactly what json.dump with indent=2 wrote"""
+        expected = json.dumps(ENTRIES, indent=2)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), expected)
+        metadata = self.store.load()
+        self.store.save(metadata)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), expected)
+            
+    def test_records_are_compact(self):
+        """Test scan and search fields are answered from the records without decoding any entry"""
+        metadata = self.store.load()
+        self.assertIsInstance(metadata, JSONMetadata)
+        with patch("auto_tagger.records.json.loads") as loads:
+            self.assertEqual(metadata.last_modified("src/app.py"), 123456789.5)
+            self.assertIsNone(metadata.last_modified("data/empty.json"))
+            self.assertIsNone(metadata.last_modified("missing.py"))
+            self.assertEqual(metadata.agent("docs/résumé.md"), "DocAgent")
+            self.assertEqual(dict(metadata.iter_tags()), {path: entry["tags"] for path, entry in ENTRIES.items()})
+            loads.assert_not_called()
+        # "web" is stored once for both files
+        self.assertEqual(len(metadata.vocabulary), 4)
+        self.assertEqual(metadata, ENTRIES)
+        
+    def test_updates_survive_save(self):
+        """Test assigned and deleted entries are written in order and read back from the new file"""
+        metadata = self.store.load()
+        updated = dict(ENTRIES["src/app.py"], tags=["python", "api"], last_modified=7.0)
+        metadata["src/app.py"] = updated
+        metadata["new.py"] = {"tags": ["python"], "last_modified": 1.0}
+        del metadata["data/empty.json"]
+        self.assertEqual(metadata.tags("src/app.py"), ["python", "api"])
+        self.store.save(metadata)
+        
+        expected = {"src/app.py": updated, "docs/résumé.md": ENTRIES["docs/résumé.md"],
+                    "new.py": {"tags": ["python"], "last_modified": 1.0}}
+        self.assertEqual(metadata, expected)
+        self.assertEqual(list(metadata), list(expected))
+        with open(self.path) as f:
+            self.assertEqual(f.read(), json.dumps(expected, indent=2))
+        self.assertEqual(JSONMetadataStore(self.path).load(), expected)
+        
+    def test_fingerprint_and_clean_save(self):
+        """Test fingerprints come from the records and saving unchanged metadata leaves the file alone"""
+        metadata = self.store.load()
+        self.assertIsNone(metadata.fingerprint("src/app.py"))
+        metadata["new.py"] = {"tags": [], "last_modified": 1.0, "fingerprint": [12, 1000000000, 77]}
+        self.store.save(metadata)
+        metadata = self.store.load()
+        with patch("auto_tagger.records.json.loads") as loads:
+            self.assertEqual(metadata.fingerprint("new.py"), (12, 1000000000, 77))
+            loads.assert_not_called()
+        with patch("auto_tagger.records.write_entries") as write:
+            self.store.save(metadata)
+            write.assert_not_called()
+            
+    def test_records_sidecar(self):
+        """Test a load reads the records kept next to an unchanged store instead of parsing it"""
+        metadata = self.store.load()
+        metadata["new.py"] = {"tags": ["python", "new"], "last_modified": 1.0, "agent": "CodeAgent"}
+        with patch("auto_tagger.fileio._UMASK", 0o022):
+            self.store.save(metadata)
+        self.assertTrue(os.path.exists(self.path + RECORDS_SUFFIX))
+        if os.name != "nt":
+            self.assertEqual(os.stat(self.path + RECORDS_SUFFIX).st_mode & 0o777, 0o644)
+        expected = dict(ENTRIES, **{"new.py": metadata["new.py"]})
+        with patch("auto_tagger.records.iter_entries") as parse:
+            metadata = self.store.load()
+            parse.assert_not_called()
+        self.assertEqual(metadata, expected)
+        self.assertEqual(metadata.tags("new.py"), ["python", "new"])
+        self.assertEqual(metadata.agent("new.py"), "CodeAgent")
+        
+        # Written by something else, the store is parsed again
+        with open(self.path, 'w') as f:
+            json.dump(ENTRIES, f, indent=2)
+        self.assertEqual(self.store.load(), ENTRIES)
+
+    def test_save_appends_changes(self):
+        """Test a save appends only the assigned entries and the file still reads as the metadata"""
+        with open(self.path, 'rb') as f:
+            before = f.read()
+        metadata = self.store.load()
+        updated = dict(ENTRIES["src/app.py"], tags=["python", "api"])
+        metadata["src/app.py"] = updated
+        metadata["new.py"] = {"tags": ["python"], "last_modified": 1.0}
+        with patch("auto_tagger.records.write_entries") as write:
+            self.store.save(metadata)
+            write.assert_not_called()
+        with open(self.path, 'rb') as f:
+            after = f.read()
+        self.assertTrue(after.startswith(before[:-len(b"\n}")]))
+        
+        expected = dict(ENTRIES, **{"src/app.py": updated, "new.py": {"tags": ["python"], "last_modified": 1.0}})
+        with open(self.path) as f:
+            self.assertEqual(json.load(f), expected)
+        self.assertEqual(metadata, expected)
+        with patch("auto_tagger.records.iter_entries") as parse:
+            metadata = self.store.load()
+            parse.assert_not_called()
+        self.assertEqual(metadata, expected)
+        self.assertEqual(list(metadata), list(expected))
+        self.assertEqual(metadata.tags("src/app.py"), ["python", "api"])
+        
+    def test_modified_since(self):
+        """Test entries written after a time are known, also after a reload, until entries are deleted"""
+        stat = os.stat(self.path)
+        since = max(stat.st_mtime_ns, stat.st_ctime_ns) + 1
+        metadata = self.store.load()
+        self.assertEqual(metadata.modified_since(since), set())
+        # The whole file was written at that point
+        self.assertIsNone(metadata.modified_since(since - 1))
+        metadata["new.py"] = {"tags": [], "last_modified": 1.0}
+        self.assertEqual(metadata.modified_since(since), {"new.py"})
+        # Past the granularity of file times
+        time.sleep(0.05)
+        self.store.save(metadata)
+        metadata = self.store.load()
+        self.assertEqual(metadata.modified_since(since), {"new.py"})
+        self.assertEqual(metadata.modified_since(time.time_ns() + 1), set())
+        del metadata["new.py"]
+        self.assertIsNone(metadata.modified_since(since))
+        
+    def test_replaced_entries_are_compacted(self):
+        """Test the file is written whole again once replaced entries make up half of it"""
+        metadata = self.store.load()
+        for round_ in range(10):
+            metadata["src/app.py"] = dict(ENTRIES["src/app.py"], last_modified=float(round_))
+            self.store.save(metadata)
+        expected = dict(ENTRIES, **{"src/app.py": dict(ENTRIES["src/app.py"], last_modified=9.0)})
+        with open(self.path) as f:
+            text = f.read()
+        self.assertEqual(json.loads(text), expected)
+        self.assertLess(text.count('"src/app.py"'), 10)
+        self.assertEqual(self.store.load(), expected)
+
+class TestControllerRecords(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        (self.test_dir / "tree").mkdir()
+        self.file = self.test_dir / "tree" / "main.py"
+        self.file.write_text("print('hello')\n")
+        
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        
+    def test_rescan_checks_records(self):
+        """Test unchanged files are recognized from their records and their tags served from the vocabulary"""
+        store = JSONMetadataStore(str(self.test_dir / "metadata.json"))
+        store.save({str(self.file): {"tags": ["python", "script"], "metadata": {"purpose": "Greets"},
+                                     "last_modified": self.file.stat().st_mtime, "agent": "CodeAgent"}})
+        swarm = SwarmController(store=store, backend="heuristic")
+        with patch.object(JSONMetadata, "__setitem__") as assign:
+            results = swarm.process_directory(self.test_dir / "tree")
+            assign.assert_not_called()
+        self.assertEqual(results[str(self.file)]["metadata"]["purpose"], "Greets")
+        self.assertEqual(swarm.get_tags_for_file(self.file), ["python", "script"])
+        self.assertEqual(swarm.search("script"), [str(self.file)])
+        store.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from pathlib import Path
+import subprocess
+import sys
+from auto_tagger.agents.base_agent import BaseAgent
+from auto_tagger.agents.registry import (
+    AgentSpec, register_agent, unregister_agent, registered_agents, build_dispatch_table
+)
+from auto_tagger.swarm_controller import SwarmController
+
+class NotebookAgent(BaseAgent):
+    """Stand-in third-party agent"""
+    created = 0
+    
+    def __init__(self):
+        super().__init__("NotebookAgent")
+        self.supported_extensions = ['.ipynb']
+        NotebookAgent.created += 1
+        
+    def analyze_file(self, file_path: Path):
+        return {"tags": ["notebook"], "metadata": {}}
+
+class TestRegistry(unittest.TestCase):
+    def tearDown(self):
+        unregister_agent("NotebookAgent")
+        for state_file in ("metadata.json", "tag_cache.json"):
+            if Path(state_file).exists():
+                Path(state_file).unlink()
+        
+    def test_builtin_specs_match_agents(self):
+        """Test built-in registrations agree with the agents' own extension lists"""
+        for spec in registered_agents()[:3]:
+            agent = spec.create()
+            self.assertEqual(agent.name, spec.name)
+            self.assertEqual(list(spec.extensions), agent.supported_extensions)
+            
+    def test_dispatch_table(self):
+        """Test the first registered agent wins each suffix"""
+        specs = [
+            AgentSpec("A", (".py", ".md"), "x:A"),
+            AgentSpec("B", (".md", ".csv"), "x:B")
+        ]
+        table = build_dispatch_table(specs)
+        self.assertEqual({suffix: spec.name for suffix, spec in table.items()},
+                         {".py": "A", ".md": "A", ".csv": "B"})
+        
+    def test_register_plugin(self):
+        """Test third-party agents are dispatched by extension and built lazily"""
+        register_agent("NotebookAgent", [".IPYNB"], NotebookAgent)
+        with self.assertRaises(ValueError):
+            register_agent("NotebookAgent", [".ipynb"], NotebookAgent)
+        NotebookAgent.created = 0
+        
+        swarm = SwarmController()
+        self.assertEqual(NotebookAgent.created, 0)
+        agent = swarm.get_agent_for_file(Path("analysis.ipynb"))
+        self.assertIsInstance(agent, NotebookAgent)
+        self.assertIs(swarm.get_agent_for_file(Path("other.ipynb")), agent)
+        self.assertEqual(NotebookAgent.created, 1)
+        self.assertIs(agent.result_cache, swarm.cache)
+        
+    def test_controller_is_lazy(self):
+        """Test constructing the controller and searching import no agent dependencies"""
+        code = (
+            "import sys\n"
+            "from auto_tagger import SwarmController\n"
+            "swarm = SwarmController()\n"
+            "swarm.search_by_tag('python')\n"
+            "heavy = [m for m in ('openai', 'pandas', 'auto_tagger.agents.code_agent') if m in sys.modules]\n"
+            "print(','.join(heavy))\n"
+        )
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), "")
+
+if __name__ == '__main__':
+    unittest.main()
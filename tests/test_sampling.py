@@ -0,0 +1,199 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+import json
+import tempfile
+import shutil
+import zipfile
+from auto_tagger import sampling
+from auto_tagger.sampling import (
+    detect_encoding, read_range, read_sample, read_text, sample_json, sample_xml, sample_xlsx
+)
+from auto_tagger.agents.data_agent import DataAgent
+
+def write_xlsx(path: Path, rows, shared):
+    """Minimal workbook whose first sheet holds rows of (cell type, value) pairs"""
+    main = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+    rel = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+    sheet_rows = []
+    for number, cells in enumerate(rows, start=1):
+        xml_cells = []
+        for column, (kind, value) in enumerate(cells):
+            reference = f"{chr(ord('A') + column)}{number}"
+            if kind == "inlineStr":
+                xml_cells.append(f'<c r="{reference}" t="inlineStr"><is><t>{value}</t></is></c>')
+            elif kind:
+                xml_cells.append(f'<c r="{reference}" t="{kind}"><v>{value}</v></c>')
+            else:
+                xml_cells.append(f'<c r="{reference}"><v>{value}</v></c>')
+        sheet_rows.append(f'<row r="{number}">{"".join(xml_cells)}</row>')
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr("xl/workbook.xml",
+                         f'<workbook xmlns="{main}" xmlns:r="{rel}"><sheets>'
+                         f'<sheet name="Sales" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        archive.writestr("xl/_rels/workbook.xml.rels",
+                         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                         '<Relationship Id="rId1" Target="worksheets/data.xml"/></Relationships>')
+        archive.writestr("xl/worksheets/data.xml",
+                         f'<worksheet xmlns="{main}"><sheetData>{"".join(sheet_rows)}</sheetData></worksheet>')
+        archive.writestr("xl/sharedStrings.xml",
+                         f'<sst xmlns="{main}">' + "".join(f"<si><t>{text}</t></si>" for text in shared) + "</sst>")
+
+class TestSampling(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        
+    def write(self, name: str, content: str) -> Path:
+        path = self.test_dir / name
+        path.write_text(content, encoding='utf-8')
+        return path
+        
+    def test_read_range(self):
+        """Test byte ranges are read through mmap and cut characters are dropped"""
+        path = self.write("text.txt", "héllo wörld")
+        self.assertEqual(read_range(path, 0, 5), "héllo".encode('utf-8')[:5])
+        self.assertEqual(read_text(path, 0, 4), "héll")
+        self.assertEqual(read_text(path, 2, 100), "llo wörld")
+        self.assertEqual(read_range(self.write("empty.txt", ""), 0, 10), b"")
+        
+    def test_detect_encoding(self):
+        """Test BOMs, binary files, UTF-8 (even when cut mid-character) and legacy encodings"""
+        self.assertEqual(detect_encoding("naïve".encode('utf-8')), ("utf-8", 0))
+        self.assertEqual(detect_encoding("naïve".encode('utf-8')[:3]), ("utf-8", 0))
+        self.assertEqual(detect_encoding("x".encode('utf-8-sig')), ("utf-8", 3))
+        self.assertEqual(detect_encoding("x".encode('utf-16')), ("utf-16-le", 2))
+        self.assertEqual(detect_encoding("café".encode('cp1252'), complete=True), ("cp1252", 0))
+        self.assertEqual(detect_encoding("cafés".encode('cp1252')), ("cp1252", 0))
+        self.assertEqual(detect_encoding(b"\x89PNG\r\n\x1a\n\0\0"), (None, 0))
+        
+    def test_read_sample_strategies(self):
+        """Test head, head_tail and windows samples stay within the budget"""
+        path = self.write("log.txt", "".join(f"{i:04d}\n" for i in range(1000)))
+        
+        self.assertEqual(read_sample(path, 10), "0000\n0001\n")
+        self.assertEqual(read_sample(path, 15, "head_tail"), "0000\n\n...\n0999\n")
+        windows = read_sample(path, 40, "windows", windows=4)
+        self.assertLessEqual(len(windows), 40)
+        self.assertEqual(windows.split("\n...\n")[0], "0000\n0")
+        self.assertTrue(windows.endswith("0999\n"))
+        # Files within the budget are returned whole whatever the strategy
+        self.assertEqual(read_sample(self.write("short.txt", "short"), 100, "windows"), "short")
+        self.assertEqual(read_sample(self.write("empty.txt", ""), 100), "")
+        with self.assertRaises(ValueError):
+            read_sample(path, 10, "middle")
+            
+    def test_read_sample_encodings(self):
+        """Test multi-byte characters are never split and legacy encodings decode"""
+        path = self.test_dir / "utf16.txt"
+        path.write_bytes("héllo wörld".encode('utf-16'))
+        self.assertEqual(read_sample(path, 5), "héllo")
+        
+        path = self.write("accents.txt", "é" * 100)
+        self.assertEqual(read_sample(path, 3), "ééé")
+        # Windows read one byte per character of budget, so multi-byte text yields fewer characters
+        self.assertEqual(read_sample(path, 9, "head_tail"), "éé\n...\né")
+        
+        path = self.test_dir / "latin.txt"
+        path.write_bytes("crème brûlée".encode('cp1252'))
+        self.assertEqual(read_sample(path, 100), "crème brûlée")
+        
+        path = self.test_dir / "image.png"
+        path.write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(100))
+        self.assertIsNone(read_sample(path, 10))
+        
+    def test_json_object_and_array(self):
+        """Test the first members or elements are decoded and the rest never read"""
+        path = self.write("object.json", json.dumps({f"key{i}": i for i in range(100)}))
+        self.assertEqual(sample_json(path), str({f"key{i}": i for i in range(5)}))
+        
+        path = self.write("array.json", json.dumps([{"id": i} for i in range(100)]))
+        self.assertEqual(sample_json(path, items=2), str([{"id": 0}, {"id": 1}]))
+        self.assertEqual(sample_json(self.write("empty.json", "[]")), "[]")
+        self.assertIsNone(sample_json(self.write("blank.json", "  ")))
+        
+    def test_json_streams_across_chunks(self):
+        """Test values (including numbers) split across read chunks are decoded whole"""
+        records = [{"name": "x" * 30, "value": 123456789} for _ in range(5)]
+        path = self.write("records.json", json.dumps(records))
+        with patch.object(sampling, "JSON_CHUNK_CHARS", 7):
+            self.assertEqual(sample_json(path), str(records))
+        path = self.write("numbers.json", "[1234567, 89]")
+        with patch.object(sampling, "JSON_CHUNK_CHARS", 5):
+            self.assertEqual(sample_json(path), "[1234567, 89]")
+            
+    def test_ndjson(self):
+        """Test JSON Lines files sample their first records"""
+        path = self.write("events.ndjson", "\n".join(json.dumps({"event": i}) for i in range(50)) + "\n")
+        self.assertEqual(sample_json(path, items=3, lines=True), str([{"event": 0}, {"event": 1}, {"event": 2}]))
+        
+    def test_json_oversized_value(self):
+        """Test a value above the size limit ends the sample instead of being loaded"""
+        path = self.write("big.json", json.dumps([1, "x" * 5000, 3]))
+        with patch.object(sampling, "JSON_CHUNK_CHARS", 50):
+            self.assertEqual(sample_json(path, max_value_chars=100), "[1]")
+        self.assertIsNone(sample_json(self.write("bad.json", "{not json")))
+        
+    def test_xml(self):
+        """Test the root and the first records are described"""
+        books = "".join(f'<book id="{i}"><title>Book {i}</title><author>A{i}</author></book>' for i in range(100))
+        path = self.write("catalog.xml", f'<catalog xmlns="urn:books" version="2">{books}</catalog>')
+        
+        sample = sample_xml(path, records=2)
+        
+        self.assertEqual(sample.splitlines(), [
+            'Root: <catalog version="2">',
+            '<book id="0"> title=Book 0, author=A0',
+            '<book id="1"> title=Book 1, author=A1'
+        ])
+        self.assertIsNone(sample_xml(self.write("broken.xml", "not xml at all")))
+        
+    def test_xlsx(self):
+        """Test the first sheet is streamed and shared strings are resolved"""
+        path = self.test_dir / "sales.xlsx"
+        write_xlsx(path, [
+            [("s", 0), ("s", 1), ("inlineStr", "Paid")],
+            [("s", 2), ("", 19.5), ("b", 1)],
+            [("s", 3), ("", 7), ("b", 0)]
+        ], ["Customer", "Amount", "Acme", "Globex"])
+        
+        self.assertEqual(sample_xlsx(path), (
+            "Sheet: Sales\n"
+            "Columns: Customer, Amount, Paid\n"
+            "Sample data:\n"
+            "Acme, 19.5, TRUE\n"
+            "Globex, 7, FALSE"
+        ))
+        self.assertIsNone(sample_xlsx(self.write("fake.xlsx", "not a zip")))
+        
+    def test_data_agent_samples(self):
+        """Test DataAgent builds bounded samples for every data format"""
+        agent = DataAgent()
+        csv_path = self.write("table.csv", "a,b\n" + "".join(f"{i},{i * 2}\n" for i in range(1000)))
+        self.assertEqual(agent.build_sample(csv_path).splitlines()[:3], ["Columns: a, b", "Sample data:", "   a  b"])
+        self.assertEqual(len(agent.build_sample(csv_path).splitlines()), 6)
+        
+        yaml_path = self.write("config.yaml", "key: value\n" * 1000)
+        sample = agent.build_sample(yaml_path)
+        self.assertLessEqual(len(sample), agent.sample_chars)
+        self.assertIn("\n...\n", sample)
+        
+        jsonl_path = self.write("rows.jsonl", '{"a": 1}\n{"a": 2}\n')
+        self.assertEqual(agent.build_sample(jsonl_path), "[{'a': 1}, {'a': 2}]")
+        
+        # Malformed JSON falls back to the text head
+        self.assertEqual(agent.build_sample(self.write("broken.json", "{oops")), "{oops")
+        self.assertIsNone(agent.build_sample(self.write("empty.json", "")))
+        
+        # So do CSVs pandas cannot parse
+        ragged = "a,b\n1,2\n3,4,5,6\n"
+        self.assertEqual(agent.build_sample(self.write("ragged.csv", ragged)), ragged)
+        latin1 = self.test_dir / "latin1.csv"
+        latin1.write_bytes("name\ncaf\xe9\n".encode("latin-1"))
+        self.assertEqual(agent.build_sample(latin1), "name\ncafé\n")
+        self.assertIsNone(agent.build_sample(self.write("empty.csv", "")))
+
+if __name__ == '__main__':
+    unittest.main()
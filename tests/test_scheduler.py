@@ -0,0 +1,192 @@
+import unittest
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import json
+import tempfile
+import shutil
+import threading
+import time
+from openai import OpenAI, AsyncOpenAI
+from auto_tagger.agents.code_agent import CodeAgent
+from auto_tagger.scheduler import (
+    RequestScheduler, TokenBucket, BULK, INTERACTIVE, estimate_request_tokens, priority_lane
+)
+
+ANSWER = json.dumps({"language": "Python", "purpose": "python utility module", "components": [], "tags": ["python"]})
+
+class FakeOpenAIServer:
+    """Local chat completions endpoint that answers the first requests with 429s"""
+    
+    def __init__(self, rate_limited=0, retry_after=None):
+        self.rate_limited = rate_limited
+        self.retry_after = retry_after
+        self.requests = 0
+        self.lock = threading.Lock()
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with server.lock:
+                    server.requests += 1
+                    throttle = server.requests <= server.rate_limited
+                if throttle:
+                    body = {"error": {"message": "Rate limit reached", "type": "requests",
+                                      "code": "rate_limit_exceeded"}}
+                    self.reply(429, body, server.retry_after)
+                else:
+                    body = {
+                        "id": "chatcmpl-test", "object": "chat.completion", "created": 0,
+                        "model": "gpt-4o-mini",
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": ANSWER}}],
+                        "usage": {"prompt_tokens": 40, "completion_tokens": 5, "total_tokens": 45}
+                    }
+                    self.reply(200, body)
+                    
+            def reply(self, status, body, retry_after=None):
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                if retry_after is not None:
+                    self.send_header("Retry-After", retry_after)
+                self.end_headers()
+                self.wfile.write(payload)
+                
+            def log_message(self, *args):
+                pass
+                
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+        
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class TestTokenBucket(unittest.TestCase):
+    def test_delay_and_refill(self):
+        """Test the bucket reports the wait for a refill and admits oversized requests when full"""
+        bucket = TokenBucket(600)
+        now = bucket.updated
+        self.assertEqual(bucket.delay(600, now), 0)
+        bucket.consume(600)
+        self.assertAlmostEqual(bucket.delay(10, now), 1.0)
+        self.assertAlmostEqual(bucket.delay(10, now + 0.5), 0.5)
+        self.assertEqual(bucket.delay(10, now + 1.0), 0)
+        self.assertAlmostEqual(bucket.delay(5000, now + 1.0), 59.0)
+        
+    def test_estimate_request_tokens(self):
+        """Test the estimate covers the prompt and the completion budget"""
+        params = {"messages": [{"role": "user", "content": "x" * 400}], "max_tokens": 200}
+        self.assertEqual(estimate_request_tokens(params), 100 + 4 + 200)
+
+class TestRequestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.file_path = self.test_dir / "util.py"
+        self.file_path.write_text("def add(a, b):\n    return a + b\n")
+        self.server = None
+        
+    def tearDown(self):
+        if self.server is not None:
+            self.server.close()
+        shutil.rmtree(self.test_dir)
+        
+    def make_agent(self, scheduler, **server_args):
+        self.server = FakeOpenAIServer(**server_args)
+        agent = CodeAgent()
+        agent.scheduler = scheduler
+        agent.client = OpenAI(api_key="test", base_url=self.server.base_url, max_retries=0)
+        agent.async_client = AsyncOpenAI(api_key="test", base_url=self.server.base_url, max_retries=0)
+        return agent
+        
+    def test_retries_rate_limited_requests(self):
+        """Test 429 responses are retried until the request succeeds"""
+        scheduler = RequestScheduler(base_delay=0.01)
+        agent = self.make_agent(scheduler, rate_limited=2)
+        
+        result = agent.analyze_file(self.file_path)
+        
+        self.assertEqual(result["metadata"]["purpose"], "python utility module")
+        self.assertEqual(self.server.requests, 3)
+        summary = scheduler.summary()
+        self.assertEqual(summary["retries"], 2)
+        self.assertEqual(summary["rate_limited"], 2)
+        self.assertEqual(summary["requests"], 1)
+        self.assertEqual(summary["used_tokens"], 45)
+        
+    def test_honours_retry_after(self):
+        """Test the server's Retry-After replaces the exponential backoff"""
+        scheduler = RequestScheduler(base_delay=0.001)
+        agent = self.make_agent(scheduler, rate_limited=1, retry_after="0.3")
+        
+        start = time.monotonic()
+        result = agent.analyze_file(self.file_path)
+        
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
+        self.assertNotIn("error", result["metadata"])
+        
+    def test_gives_up_after_max_retries(self):
+        """Test a request that keeps being throttled ends as an error result"""
+        scheduler = RequestScheduler(max_retries=2, base_delay=0.01)
+        agent = self.make_agent(scheduler, rate_limited=10)
+        
+        result = agent.analyze_file(self.file_path)
+        
+        self.assertEqual(result["tags"], [])
+        self.assertIn("Rate limit", result["metadata"]["error"])
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(scheduler.summary()["failures"], 1)
+        
+    def test_async_retries(self):
+        """Test the async path retries through the same scheduler"""
+        scheduler = RequestScheduler(base_delay=0.01)
+        agent = self.make_agent(scheduler, rate_limited=1)
+        
+        result = asyncio.run(agent.analyze_file_async(self.file_path))
+        
+        self.assertEqual(result["metadata"]["purpose"], "python utility module")
+        self.assertEqual(scheduler.summary()["retries"], 1)
+        
+    def test_interactive_lane_goes_first(self):
+        """Test interactive requests are admitted ahead of bulk requests already waiting"""
+        # 1000 tokens per second; draining the bucket makes every later request wait
+        scheduler = RequestScheduler(tokens_per_minute=60000)
+        scheduler.acquire(60000)
+        admitted = []
+        
+        def request(name, priority):
+            with priority_lane(priority):
+                scheduler.acquire(50)
+            admitted.append(name)
+            
+        threads = [threading.Thread(target=request, args=(f"bulk{i}", BULK)) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.02)
+        threads.append(threading.Thread(target=request, args=("interactive", INTERACTIVE)))
+        threads[-1].start()
+        for thread in threads:
+            thread.join()
+            
+        self.assertEqual(admitted[0], "interactive")
+        self.assertEqual(sorted(admitted[1:]), ["bulk0", "bulk1", "bulk2"])
+        
+    def test_requests_per_minute(self):
+        """Test the request bucket spaces requests out once the burst is spent"""
+        scheduler = RequestScheduler(requests_per_minute=600)
+        for _ in range(600):
+            scheduler.acquire(1)
+            
+        start = time.monotonic()
+        scheduler.acquire(1)
+        scheduler.acquire(1)
+        
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+from unittest.mock import MagicMock
+from pathlib import Path
+from types import SimpleNamespace
+import asyncio
+import json
+import tempfile
+import shutil
+from auto_tagger.agents.code_agent import CodeAgent
+from auto_tagger.cache import ResultCache
+from auto_tagger.schema import SchemaError, dump_analysis, normalize_tag, parse_analysis, response_format
+
+def completion(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+VALID = {"language": "Python", "purpose": "Fetches weather forecasts", "components": ["WeatherClient"],
+         "tags": ["Weather", "HTTP Client", "weather", "api:", "python", "cli", "extra"]}
+
+class TestParseAnalysis(unittest.TestCase):
+    def test_valid_answer(self):
+        """Test tags are normalized, deduplicated and capped"""
+        fields = parse_analysis("```json\n" + json.dumps(VALID) + "\n```")
+        self.assertEqual(fields["tags"], ["weather", "http-client", "api", "python", "cli"])
+        self.assertEqual(fields["components"], ["WeatherClient"])
+        self.assertEqual(json.loads(dump_analysis(fields)), fields)
+        self.assertEqual(normalize_tag("  Web Server: "), "web-server")
+        
+    def test_invalid_answers(self):
+        """Test every problem is named so it can be sent back for a correction"""
+        with self.assertRaisesRegex(SchemaError, "not valid JSON"):
+            parse_analysis("Python code file\nWeb server")
+        with self.assertRaisesRegex(SchemaError, "expected a JSON object"):
+            parse_analysis("[1, 2]")
+        with self.assertRaisesRegex(SchemaError, "missing field purpose; tags must be a list of strings"):
+            parse_analysis(json.dumps({"language": "Python", "components": [], "tags": "python"}))
+        with self.assertRaisesRegex(SchemaError, "at least one"):
+            parse_analysis(json.dumps(dict(VALID, tags=["", "::"])))
+        with self.assertRaises(SchemaError):
+            parse_analysis(None)
+            
+    def test_response_format(self):
+        """Test requests ask for strict structured output"""
+        self.assertTrue(response_format()["json_schema"]["strict"])
+        schema = response_format(batch=True)["json_schema"]["schema"]
+        self.assertEqual(schema["properties"]["files"]["items"]["required"],
+                         ["id", "language", "purpose", "components", "tags"])
+
+class TestCorrections(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.file_path = self.test_dir / "weather.py"
+        self.file_path.write_text("def forecast(city):\n    return fetch(city)\n")
+        self.agent = CodeAgent()
+        self.agent.client = MagicMock()
+        
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        
+    def test_structured_request(self):
+        """Test one valid answer costs one request with the schema attached"""
+        self.agent.client.chat.completions.create.return_value = completion(json.dumps(VALID))
+        self.agent.result_cache = ResultCache(None, 1024 * 1024)
+        
+        result = self.agent.analyze_file(self.file_path)
+        
+        params = self.agent.client.chat.completions.create.call_args.kwargs
+        self.assertEqual(params["response_format"]["type"], "json_schema")
+        self.assertEqual(params["max_tokens"], self.agent.max_tokens)
+        self.assertEqual(result["tags"], ["weather", "http-client", "api", "python", "cli"])
+        self.assertEqual(result["metadata"]["language"], "Python")
+        self.assertNotIn("analysis", result["metadata"])
+        # Only the validated, compact form is cached
+        key = self.agent.cache_key(self.agent.build_messages(self.file_path))
+        self.assertEqual(self.agent.result_cache.get(key), dump_analysis(parse_analysis(json.dumps(VALID))))
+        
+    def test_correction_sends_only_the_answer(self):
+        """Test an invalid answer is corrected without re-sending the file"""
+        self.agent.client.chat.completions.create.side_effect = [
+            completion('{"language": "Python", "tags": ["weather"]}'),
+            completion(json.dumps(VALID))
+        ]
+        
+        result = self.agent.analyze_file(self.file_path)
+        
+        calls = self.agent.client.chat.completions.create.call_args_list
+        self.assertEqual(len(calls), 2)
+        correction = calls[1].kwargs["messages"][-1]["content"]
+        self.assertIn("missing field purpose", correction)
+        self.assertIn('{"language": "Python", "tags": ["weather"]}', correction)
+        self.assertNotIn("def forecast", correction)
+        self.assertEqual(result["metadata"]["purpose"], "Fetches weather forecasts")
+        
+    def test_correction_gives_up(self):
+        """Test an answer that stays invalid ends as an error result after max_corrections"""
+        self.agent.client.chat.completions.create.return_value = completion("Python code file")
+        
+        result = self.agent.analyze_file(self.file_path)
+        
+        self.assertEqual(self.agent.client.chat.completions.create.call_count, 1 + self.agent.max_corrections)
+        self.assertEqual(result["tags"], [])
+        self.assertIn("Invalid model output", result["metadata"]["error"])
+        
+    def test_async_correction(self):
+        """Test the async path corrects invalid answers the same way"""
+        answers = iter(["not json", json.dumps(VALID)])
+        requests = []
+        async def create(**kwargs):
+            requests.append(kwargs)
+            return completion(next(answers))
+        self.agent.async_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        
+        result = asyncio.run(self.agent.analyze_file_async(self.file_path))
+        
+        self.assertEqual(len(requests), 2)
+        self.assertEqual(result["metadata"]["components"], ["WeatherClient"])
+
+if __name__ == '__main__':
+    unittest.main()
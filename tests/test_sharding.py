@@ -0,0 +1,108 @@
+import unittest
+from pathlib import Path
+import io
+import os
+import tempfile
+import shutil
+from contextlib import redirect_stdout
+from auto_tagger.__main__ import main
+from auto_tagger.sharding import merge_stores, parse_shard, run_local_shards, shard_of, shard_path
+from auto_tagger.storage import JSONMetadataStore, SQLiteMetadataStore, open_store
+from auto_tagger.swarm_controller import SwarmController
+
+class TestSharding(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.cwd = os.getcwd()
+        # Stores and the result cache default to the working directory
+        os.chdir(self.test_dir)
+        self.tree = self.test_dir / "tree"
+        (self.tree / "pkg").mkdir(parents=True)
+        for i in range(12):
+            (self.tree / "pkg" / f"module_{i}.py").write_text(f"def handler_{i}(event):\n    return event\n")
+        (self.tree / "README.md").write_text("# Weather service\n")
+        
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir)
+        
+    def controller(self, metadata: str) -> SwarmController:
+        return SwarmController(cache_max_bytes=None, store=open_store(metadata), backend="heuristic")
+        
+    def test_parse_shard(self):
+        """Test i/N specs are validated"""
+        self.assertEqual(parse_shard("0/4"), (0, 4))
+        self.assertEqual(parse_shard("3/4"), (3, 4))
+        for spec in ("4/4", "-1/2", "1", "a/b", "0/0"):
+            with self.assertRaises(ValueError):
+                parse_shard(spec)
+                
+    def test_shard_of_is_stable(self):
+        """Test shard assignment depends only on the path and spreads paths over every shard"""
+        self.assertEqual(shard_of("pkg/module_1.py", 4), shard_of("pkg/module_1.py", 4))
+        shards = {shard_of(f"src/file_{i}.py", 4) for i in range(200)}
+        self.assertEqual(shards, {0, 1, 2, 3})
+        # Known value, so a change of hash function is noticed
+        self.assertEqual(shard_of("README.md", 1000), 505)
+        self.assertEqual(shard_path("out/metadata.json", 1, 4), str(Path("out/metadata.shard-1-of-4.json")))
+        
+    def test_shards_partition_directory(self):
+        """Test every file is processed by exactly one shard"""
+        everything = self.controller("metadata.json").process_directory(self.tree)
+        seen = []
+        for index in range(3):
+            swarm = self.controller(shard_path("metadata.json", index, 3))
+            results = swarm.process_directory(self.tree, shard=(index, 3))
+            seen.extend(results)
+            for file_key in results:
+                relative = Path(file_key).relative_to(self.tree).as_posix()
+                self.assertEqual(shard_of(relative, 3), index)
+        self.assertEqual(sorted(seen), sorted(everything))
+        # Partial stores next to the tree are never tagged as data
+        Path(self.tree / "metadata.shard-0-of-3.json").write_text("{}")
+        results = self.controller("shard.json").process_directory(self.tree, shard=(0, 3))
+        self.assertNotIn(str(self.tree / "metadata.shard-0-of-3.json"), results)
+        
+    def test_merge_last_writer_wins(self):
+        """Test merged entries keep the newest last_modified whatever the source order"""
+        first, second = JSONMetadataStore("a.json"), JSONMetadataStore("b.json")
+        first.save({"x.py": {"tags": ["old"], "last_modified": 1.0}, "y.py": {"tags": ["y"], "last_modified": 5.0}})
+        second.save({"x.py": {"tags": ["new"], "last_modified": 2.0}, "y.py": {"tags": ["stale"], "last_modified": 4.0}})
+        target = SQLiteMetadataStore("merged.db")
+        
+        counts = merge_stores([first, second], target)
+        
+        merged = target.load()
+        self.assertEqual(merged["x.py"]["tags"], ["new"])
+        self.assertEqual(merged["y.py"]["tags"], ["y"])
+        self.assertEqual(counts, {"merged": 3, "skipped": 1})
+        target.close()
+        
+    def test_local_processes(self):
+        """Test the multiprocessing launcher produces the same metadata as a single run"""
+        expected = self.controller("single.json").process_directory(self.tree)
+        
+        summary = run_local_shards(self.tree, 2, "metadata.json", backend="heuristic", cache_max_bytes=None)
+        
+        self.assertEqual(summary["files"], len(expected))
+        self.assertEqual(JSONMetadataStore("metadata.json").load(), expected)
+        self.assertTrue(Path("metadata.shard-1-of-2.json").exists())
+        
+    def test_cli_shard_and_merge(self):
+        """Test --shard writes per-shard metadata and the merge command combines it"""
+        with redirect_stdout(io.StringIO()):
+            for index in range(2):
+                main([str(self.tree), "-r", "--backend", "heuristic", "--cache-size", "0", "--shard", f"{index}/2"])
+            with self.assertRaises(SystemExit) as exit:
+                main(["merge", "metadata.shard-0-of-2.json", "metadata.shard-1-of-2.json", "--metadata", "all.db"])
+            self.assertEqual(exit.exception.code, 0)
+            # A missing shard fails the command, so scripts can tell
+            with self.assertRaises(SystemExit) as exit:
+                main(["merge", "metadata.shard-0-of-2.json", "missing.json", "--metadata", "other.db"])
+            self.assertEqual(exit.exception.code, 1)
+        store = SQLiteMetadataStore("all.db")
+        self.assertEqual(store.count(), 13)
+        store.close()
+
+if __name__ == '__main__':
+    unittest.main()
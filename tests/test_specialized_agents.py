@@ -2,10 +2,15 @@ import unittest
 from unittest.mock import patch, MagicMock
 from pathlib import Path
 import json
+import asyncio
+from types import SimpleNamespace
 from auto_tagger.agents.code_agent import CodeAgent
 from auto_tagger.agents.doc_agent import DocAgent
 from auto_tagger.agents.data_agent import DataAgent
 
+CODE_ANSWER = json.dumps({"language": "Python", "purpose": "Web server", "components": ["Flask application"],
+                          "tags": ["Python", "web server", "flask"]})
+
 class TestCodeAgent(unittest.TestCase):
     def setUp(self):
         self.agent = CodeAgent()
@@ -21,7 +26,7 @@ class TestCodeAgent(unittest.TestCase):
         """Test code file analysis"""
         # Mock OpenAI response
         mock_response = MagicMock()
-        mock_response.choices = [MagicMock(message=MagicMock(content="Python code file\nWeb server\nFlask application"))]
+        mock_response.choices = [MagicMock(message=MagicMock(content=CODE_ANSWER))]
         mock_openai.return_value.chat.completions.create.return_value = mock_response
         
         # Create test file
@@ -31,7 +36,7 @@ class TestCodeAgent(unittest.TestCase):
         try:
             with open(test_file, 'w') as f:
                 f.write(test_content)
-            
+                
             result = self.agent.analyze_file(test_file)
             
             self.assertIn('tags', result)
@@ -57,7 +62,9 @@ class TestDocAgent(unittest.TestCase):
         """Test documentation file analysis"""
         # Mock OpenAI response
         mock_response = MagicMock()
-        mock_response.choices = [MagicMock(message=MagicMock(content="Markdown documentation\nProject setup\nInstallation guide"))]
+        mock_response.choices = [MagicMock(message=MagicMock(content=json.dumps(
+            {"language": "Markdown", "purpose": "Project setup", "components": ["Installation guide"], "tags": ["setup"]}
+        )))]
         mock_openai.return_value.chat.completions.create.return_value = mock_response
         
         # Create test file
@@ -67,7 +74,7 @@ class TestDocAgent(unittest.TestCase):
         try:
             with open(test_file, 'w') as f:
                 f.write(test_content)
-            
+                
             result = self.agent.analyze_file(test_file)
             
             self.assertIn('tags', result)
@@ -93,7 +100,9 @@ class TestDataAgent(unittest.TestCase):
         """Test JSON file analysis"""
         # Mock OpenAI response
         mock_response = MagicMock()
-        mock_response.choices = [MagicMock(message=MagicMock(content="JSON data\nConfiguration file\nSettings"))]
+        mock_response.choices = [MagicMock(message=MagicMock(content=json.dumps(
+            {"language": "JSON", "purpose": "Configuration file", "components": ["key"], "tags": ["config"]}
+        )))]
         mock_openai.return_value.chat.completions.create.return_value = mock_response
         
         # Create test file
@@ -103,7 +112,7 @@ class TestDataAgent(unittest.TestCase):
         try:
             with open(test_file, 'w') as f:
                 f.write(test_content)
-            
+                
             result = self.agent.analyze_file(test_file)
             
             self.assertIn('tags', result)
@@ -114,5 +123,72 @@ class TestDataAgent(unittest.TestCase):
             if test_file.exists():
                 test_file.unlink()
 
+class FakeAsyncClient:
+    """Local stand-in for AsyncOpenAI that records how many requests overlap"""
+    def __init__(self, content=None, delay=0.01):
+        self.content = CODE_ANSWER if content is None else content
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+class TestAsyncAnalysis(unittest.TestCase):
+    def setUp(self):
+        self.agent = CodeAgent()
+        self.client = FakeAsyncClient()
+        self.agent.async_client = self.client
+        self.test_file = Path("test_async.py")
+        with open(self.test_file, 'w') as f:
+            f.write("def hello(): print('Hello, World!')")
+            
+    def tearDown(self):
+        if self.test_file.exists():
+            self.test_file.unlink()
+            
+    def test_analyze_file_async(self):
+        """Test async analysis goes through the async client"""
+        result = asyncio.run(self.agent.analyze_file_async(self.test_file))
+        
+        self.assertEqual(len(self.client.calls), 1)
+        self.assertEqual(self.client.calls[0]["model"], self.agent.model)
+        self.assertIn("hello", self.client.calls[0]["messages"][1]["content"])
+        self.assertEqual(result['metadata']['file_type'], '.py')
+        self.assertIn('python', result['tags'])
+        
+    def test_analyze_file_async_error(self):
+        """Test async client failures are reported like sync ones"""
+        async def failing_create(**kwargs):
+            raise RuntimeError("boom")
+        self.client.chat.completions.create = failing_create
+        
+        result = asyncio.run(self.agent.analyze_file_async(self.test_file))
+        
+        self.assertEqual(result['tags'], [])
+        self.assertEqual(result['metadata']['error'], "boom")
+        
+    def test_sync_and_async_share_prompt(self):
+        """Test the sync wrapper sends the same request as the async path"""
+        sync_client = MagicMock()
+        sync_client.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.client.content))]
+        )
+        self.agent.client = sync_client
+        
+        sync_result = self.agent.analyze_file(self.test_file)
+        async_result = asyncio.run(self.agent.analyze_file_async(self.test_file))
+        
+        self.assertEqual(sync_client.chat.completions.create.call_args.kwargs, self.client.calls[0])
+        self.assertEqual(sync_result, async_result)
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,132 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+import json
+import os
+import tempfile
+import shutil
+import sqlite3
+from auto_tagger.records import JSONMetadata
+from auto_tagger.storage import JSONMetadataStore, SQLiteMetadataStore, migrate_json_to_sqlite
+
+ENTRIES = {
+    "src/app.py": {
+        "tags": ["python", "Web"],
+        "metadata": {"file_type": ".py", "analysis": "Flask app", "size": 120},
+        "last_modified": 123456789.5,
+        "agent": "CodeAgent"
+    },
+    "docs/readme.md": {
+        "tags": ["documentation", "web"],
+        "metadata": {"file_type": ".md"},
+        "last_modified": 42.0,
+        "agent": "DocAgent"
+    }
+}
+
+class TestJSONMetadataStore(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        
+    def test_round_trip(self):
+        """Test the JSON store keeps the original metadata.json format"""
+        store = JSONMetadataStore(str(self.test_dir / "metadata.json"))
+        self.assertEqual(store.load(), {})
+        store.save(ENTRIES)
+        self.assertEqual(store.load(), ENTRIES)
+        with open(self.test_dir / "metadata.json") as f:
+            self.assertEqual(json.load(f), ENTRIES)
+            
+    @unittest.skipIf(os.name == "nt", "POSIX permissions")
+    def test_file_permissions(self):
+        """Test metadata.json gets the umask's permissions, and keeps its own on later saves"""
+        path = self.test_dir / "metadata.json"
+        store = JSONMetadataStore(str(path))
+        with patch("auto_tagger.fileio._UMASK", 0o022):
+            store.save(ENTRIES)
+            self.assertEqual(path.stat().st_mode & 0o777, 0o644)
+            os.chmod(path, 0o640)
+            store.save(dict(ENTRIES, **{"new.py": ENTRIES["src/app.py"]}))
+            self.assertEqual(path.stat().st_mode & 0o777, 0o640)
+        store.close()
+
+class TestSQLiteMetadataStore(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.db_path = str(self.test_dir / "metadata.db")
+        self.store = SQLiteMetadataStore(self.db_path)
+        
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.test_dir)
+        
+    def test_upsert_and_reload(self):
+        """Test entries are upserted per file and survive a reopen"""
+        metadata = self.store.load()
+        for path, entry in ENTRIES.items():
+            metadata[path] = entry
+        metadata["src/app.py"] = dict(ENTRIES["src/app.py"], tags=["python", "api"])
+        self.store.save(metadata)
+        self.store.close()
+        
+        self.store = SQLiteMetadataStore(self.db_path)
+        metadata = self.store.load()
+        self.assertEqual(len(metadata), 2)
+        self.assertIn("docs/readme.md", metadata)
+        self.assertNotIn("missing.py", metadata)
+        self.assertEqual(metadata["docs/readme.md"], ENTRIES["docs/readme.md"])
+        self.assertEqual(metadata["src/app.py"]["tags"], ["python", "api"])
+        self.assertEqual(list(metadata), ["src/app.py", "docs/readme.md"])
+        
+    def test_save_plain_dict_replaces_contents(self):
+        """Test saving a replacement dictionary drops stale paths"""
+        self.store.save(ENTRIES)
+        self.store.save({"docs/readme.md": ENTRIES["docs/readme.md"]})
+        self.assertEqual(dict(self.store.load()), {"docs/readme.md": ENTRIES["docs/readme.md"]})
+        
+    def test_delete(self):
+        """Test deleting an entry removes its tag links"""
+        self.store.save(ENTRIES)
+        metadata = self.store.load()
+        del metadata["src/app.py"]
+        with self.assertRaises(KeyError):
+            del metadata["src/app.py"]
+        self.assertEqual(self.store.paths_with_tag("python"), [])
+        
+    def test_paths_with_tag(self):
+        """Test tag lookups are case-insensitive"""
+        self.store.save(ENTRIES)
+        self.assertEqual(self.store.paths_with_tag("WEB"), ["src/app.py", "docs/readme.md"])
+        self.assertEqual(self.store.paths_with_tag("python"), ["src/app.py"])
+        
+    def test_schema_indexes(self):
+        """Test the path and tag indexes exist, with a single index on paths"""
+        conn = sqlite3.connect(self.db_path)
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT data FROM files WHERE path = ?", ("src/app.py",)).fetchall()
+        conn.close()
+        self.assertTrue({"idx_tags_norm", "idx_file_tags_tag"} <= indexes)
+        self.assertEqual([name for name in indexes if "files" in name], ["sqlite_autoindex_files_1"])
+        self.assertIn("USING INDEX sqlite_autoindex_files_1", plan[0][-1])
+        
+    def test_migrate_json_to_sqlite(self):
+        """Test the one-shot JSON migration"""
+        json_path = str(self.test_dir / "metadata.json")
+        JSONMetadataStore(json_path).save(ENTRIES)
+        target = str(self.test_dir / "migrated.db")
+        
+        # The source store is released, not left holding metadata.json open
+        with patch.object(JSONMetadata, "close", autospec=True, side_effect=JSONMetadata.close) as close:
+            self.assertEqual(migrate_json_to_sqlite(json_path, target), 2)
+            close.assert_called()
+        migrated = SQLiteMetadataStore(target)
+        try:
+            self.assertEqual(dict(migrated.load()), ENTRIES)
+        finally:
+            migrated.close()
+
+if __name__ == '__main__':
+    unittest.main()
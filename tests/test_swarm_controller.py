@@ -4,7 +4,13 @@ from pathlib import Path
 import json
 import tempfile
 import shutil
+import threading
+import time
+import asyncio
+from tests.test_specialized_agents import FakeAsyncClient
+from tests.test_batching import FakeBatchingClient, answer
 from auto_tagger.swarm_controller import SwarmController
+from auto_tagger.storage import SQLiteMetadataStore
 
 class TestSwarmController(unittest.TestCase):
     def setUp(self):
@@ -19,9 +25,10 @@ class TestSwarmController(unittest.TestCase):
     def tearDown(self):
         """Clean up test environment"""
         shutil.rmtree(self.test_dir)
-        if Path("metadata.json").exists():
-            Path("metadata.json").unlink()
-            
+        for state_file in ("metadata.json", "metadata.json.records", "metadata.json.scan", "tag_cache.json"):
+            if Path(state_file).exists():
+                Path(state_file).unlink()
+                
     def create_test_files(self):
         """Create test files of different types"""
         # Python file
@@ -78,6 +85,141 @@ class TestSwarmController(unittest.TestCase):
         self.assertTrue(any(str(self.test_dir / "test.md") in key for key in results))
         self.assertTrue(any(str(self.test_dir / "test.json") in key for key in results))
         
+    @patch('auto_tagger.agents.code_agent.CodeAgent.analyze_file')
+    @patch('auto_tagger.agents.doc_agent.DocAgent.analyze_file')
+    @patch('auto_tagger.agents.data_agent.DataAgent.analyze_file')
+    def test_process_directory_concurrent(self, mock_data_agent, mock_doc_agent, mock_code_agent):
+        """Test concurrent processing matches the serial result order"""
+        mock_code_agent.side_effect = lambda path: {"tags": ["python"], "metadata": {}}
+        mock_doc_agent.side_effect = lambda path: {"tags": ["documentation"], "metadata": {}}
+        mock_data_agent.side_effect = lambda path: {"tags": ["data"], "metadata": {}}
+        for i in range(10):
+            with open(self.test_dir / f"extra_{i}.py", 'w') as f:
+                f.write(f"x = {i}")
+                
+        serial = self.swarm.process_directory(self.test_dir)
+        self.swarm.metadata = {}
+        concurrent = self.swarm.process_directory(self.test_dir, max_workers=4)
+        
+        self.assertEqual(list(concurrent.keys()), list(serial.keys()))
+        self.assertEqual(concurrent, serial)
+        
+    def test_agent_concurrency_limit(self):
+        """Test that an agent's max_concurrency bounds in-flight analyses"""
+        agent = self.swarm.get_agent_for_file(Path("test.py"))
+        agent.max_concurrency = 2
+        state = {"active": 0, "peak": 0}
+        lock = threading.Lock()
+        
+        def slow_analyze(path):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.02)
+            with lock:
+                state["active"] -= 1
+            return {"tags": ["python"], "metadata": {}}
+            
+        for i in range(8):
+            with open(self.test_dir / f"extra_{i}.py", 'w') as f:
+                f.write(f"x = {i}")
+                
+        with patch.object(agent, 'analyze_file', side_effect=slow_analyze), \
+             patch('auto_tagger.agents.doc_agent.DocAgent.analyze_file', return_value={"tags": [], "metadata": {}}), \
+             patch('auto_tagger.agents.data_agent.DataAgent.analyze_file', return_value={"tags": [], "metadata": {}}):
+            self.swarm.process_directory(self.test_dir, max_workers=8)
+            
+        self.assertLessEqual(state["peak"], 2)
+        
+    def test_process_directory_async(self):
+        """Test the asyncio pipeline with fake async clients"""
+        for i in range(20):
+            with open(self.test_dir / f"extra_{i}.py", 'w') as f:
+                f.write(f"x = {i}")
+        clients = {}
+        for agent in self.swarm.agents:
+            clients[agent.name] = FakeAsyncClient(content=json.dumps(answer(f"{agent.name} analysis result")))
+            agent.async_client = clients[agent.name]
+            
+        results = asyncio.run(self.swarm.process_directory_async(self.test_dir, max_concurrency=8))
+        
+        self.assertEqual(len(results), 23)
+        self.assertEqual(len(clients["CodeAgent"].calls), 21)
+        self.assertGreater(clients["CodeAgent"].peak, 1)
+        self.assertLessEqual(clients["CodeAgent"].peak, 8)
+        self.assertEqual(results[str(self.test_dir / "test.md")]["agent"], "DocAgent")
+        self.assertEqual(self.swarm.metadata[str(self.test_dir / "test.json")]["agent"], "DataAgent")
+        # Results come back in scan order regardless of completion order
+        serial_order = sorted(str(f) for f in self.test_dir.glob("**/*") if f.is_file())
+        self.assertEqual(list(results.keys()), serial_order)
+        
+    def test_cache_reuses_analysis_for_copies(self):
+        """Test touched, renamed and copied files are re-tagged without an API call"""
+        agent = self.swarm.get_agent_for_file(Path("test.py"))
+        agent.client = MagicMock()
+        agent.client.chat.completions.create.return_value = MagicMock(
+            choices=[MagicMock(message=MagicMock(content=json.dumps(answer("Python testing helper"))))]
+        )
+        source = self.test_dir / "test.py"
+        
+        first = agent.analyze_file(source)
+        shutil.copy(source, self.test_dir / "copy.py")
+        source.rename(self.test_dir / "moved.py")
+        copied = agent.analyze_file(self.test_dir / "copy.py")
+        moved = agent.analyze_file(self.test_dir / "moved.py")
+        
+        self.assertEqual(agent.client.chat.completions.create.call_count, 1)
+        self.assertEqual(copied["tags"], first["tags"])
+        self.assertEqual(moved["metadata"]["purpose"], "Python testing helper")
+        
+        # The cache is persisted with the metadata and shared by new controllers
+        with patch('auto_tagger.agents.doc_agent.DocAgent.analyze_file', return_value={"tags": [], "metadata": {}}), \
+             patch('auto_tagger.agents.data_agent.DataAgent.analyze_file', return_value={"tags": [], "metadata": {}}):
+            self.swarm.process_directory(self.test_dir)
+        self.assertEqual(agent.client.chat.completions.create.call_count, 1)
+        self.assertTrue(Path("tag_cache.json").exists())
+        new_swarm = SwarmController()
+        self.assertEqual(len(new_swarm.cache), len(self.swarm.cache))
+        
+    def test_process_directory_batched(self):
+        """Test small files are packed into shared requests per agent"""
+        for i in range(9):
+            with open(self.test_dir / f"extra_{i}.py", 'w') as f:
+                f.write(f"x = {i}")
+        with open(self.test_dir / "large.py", 'w') as f:
+            f.write("y = 1\n" * 400)
+        clients = {}
+        for agent in self.swarm.agents:
+            clients[agent.name] = agent.client = FakeBatchingClient()
+            
+        results = self.swarm.process_directory(self.test_dir, max_workers=2, batch_tokens=400)
+        
+        self.assertEqual(len(results), 13)
+        # Ten small .py files fit one batch; the large one goes on its own
+        self.assertEqual(clients["CodeAgent"].requests, 2)
+        self.assertEqual(results[str(self.test_dir / "large.py")]["metadata"]["purpose"], "single file analysis")
+        self.assertTrue(results[str(self.test_dir / "extra_3.py")]["metadata"]["purpose"].startswith("batched file"))
+        self.assertEqual(results[str(self.test_dir / "extra_3.py")]["agent"], "CodeAgent")
+        self.assertEqual(self.swarm.batch_stats.batched_files, 10)
+        
+    @patch('auto_tagger.agents.code_agent.CodeAgent.analyze_file')
+    @patch('auto_tagger.agents.doc_agent.DocAgent.analyze_file')
+    @patch('auto_tagger.agents.data_agent.DataAgent.analyze_file')
+    def test_process_directory_skips_ignored(self, mock_data_agent, mock_doc_agent, mock_code_agent):
+        """Test ignored directories and .gitignore entries are never analyzed"""
+        mock_code_agent.side_effect = lambda path: {"tags": ["python"], "metadata": {}}
+        mock_doc_agent.side_effect = lambda path: {"tags": ["documentation"], "metadata": {}}
+        mock_data_agent.side_effect = lambda path: {"tags": ["data"], "metadata": {}}
+        for relative in ("node_modules/pkg/index.js", "build/out.py", "src/app.py"):
+            (self.test_dir / relative).parent.mkdir(parents=True, exist_ok=True)
+            (self.test_dir / relative).write_text("x = 1")
+        (self.test_dir / ".gitignore").write_text("/build\n")
+        
+        results = self.swarm.process_directory(self.test_dir)
+        
+        self.assertEqual(sorted(Path(key).relative_to(self.test_dir).as_posix() for key in results),
+                         ["src/app.py", "test.json", "test.md", "test.py"])
+                         
     def test_metadata_persistence(self):
         """Test metadata saving and loading"""
         test_metadata = {
@@ -96,6 +238,29 @@ class TestSwarmController(unittest.TestCase):
         new_swarm = SwarmController()
         self.assertEqual(new_swarm.metadata, test_metadata)
         
+    @patch('auto_tagger.agents.code_agent.CodeAgent.analyze_file')
+    @patch('auto_tagger.agents.doc_agent.DocAgent.analyze_file')
+    @patch('auto_tagger.agents.data_agent.DataAgent.analyze_file')
+    def test_sqlite_store(self, mock_data_agent, mock_doc_agent, mock_code_agent):
+        """Test processing with the SQLite backend and incremental re-runs"""
+        mock_code_agent.side_effect = lambda path: {"tags": ["python"], "metadata": {}}
+        mock_doc_agent.side_effect = lambda path: {"tags": ["documentation"], "metadata": {}}
+        mock_data_agent.side_effect = lambda path: {"tags": ["data"], "metadata": {}}
+        db_path = str(self.test_dir / "metadata.db")
+        
+        swarm = SwarmController(store=SQLiteMetadataStore(db_path))
+        results = swarm.process_directory(self.test_dir)
+        swarm.store.close()
+        self.assertEqual(len(results), 3)
+        
+        swarm = SwarmController(store=SQLiteMetadataStore(db_path))
+        rerun = swarm.process_directory(self.test_dir)
+        self.assertEqual(swarm.search_by_tag("python"), [str(self.test_dir / "test.py")])
+        swarm.store.close()
+        self.assertEqual(rerun, results)
+        self.assertEqual(mock_code_agent.call_count, 1)
+        self.assertEqual(swarm.metadata_file, db_path)
+        
     def test_search_by_tag(self):
         """Test tag search functionality"""
         # Add test metadata
@@ -115,6 +280,24 @@ class TestSwarmController(unittest.TestCase):
         self.assertIn("test2.py", python_files)
         self.assertIn("test1.py", web_files)
         self.assertIn("test3.js", web_files)
+        
+    def test_search_query(self):
+        """Test boolean queries and incremental index updates"""
+        self.swarm.metadata = {
+            "test1.py": {"tags": ["python", "web"]},
+            "test2.py": {"tags": ["python", "test"]}
+        }
+        self.assertEqual(self.swarm.search("python AND NOT test"), ["test1.py"])
+        
+        with patch('auto_tagger.agents.code_agent.CodeAgent.analyze_file',
+                   side_effect=lambda path: {"tags": ["python", "test"], "metadata": {}}), \
+             patch('auto_tagger.agents.doc_agent.DocAgent.analyze_file', return_value={"tags": [], "metadata": {}}), \
+             patch('auto_tagger.agents.data_agent.DataAgent.analyze_file', return_value={"tags": [], "metadata": {}}):
+            self.swarm.process_directory(self.test_dir)
+            
+        # The already-built index picks up the new entries without a rebuild
+        self.assertEqual(self.swarm.search("python AND test"), ["test2.py", str(self.test_dir / "test.py")])
+        self.assertEqual(self.swarm.search_by_tag("web"), ["test1.py"])
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
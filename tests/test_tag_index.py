@@ -0,0 +1,54 @@
+import unittest
+from auto_tagger.tag_index import TagIndex, QuerySyntaxError
+
+class TestTagIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = TagIndex.build([
+            ("app.py", ["Python", "web"]),
+            ("test_app.py", ["python", "test"]),
+            ("app.js", ["javascript", "web"]),
+            ("notes.md", ["documentation", "machine learning"])
+        ])
+        
+    def test_lookup_is_case_insensitive(self):
+        """Test single-tag lookups ignore case"""
+        self.assertEqual(self.index.search("PYTHON"), ["app.py", "test_app.py"])
+        self.assertEqual(self.index.search("missing"), [])
+        
+    def test_incremental_updates(self):
+        """Test re-adding and removing files keeps postings in sync"""
+        self.index.add("app.py", ["flask"])
+        self.assertEqual(self.index.search("python"), ["test_app.py"])
+        self.assertEqual(self.index.search("flask"), ["app.py"])
+        self.index.remove("test_app.py")
+        self.assertEqual(self.index.search("python"), [])
+        self.assertEqual(self.index.query("pyth*"), [])
+        self.assertNotIn("test_app.py", self.index)
+        
+    def test_boolean_queries(self):
+        """Test AND, OR, NOT, implicit AND and parentheses"""
+        self.assertEqual(self.index.query("python AND NOT test"), ["app.py"])
+        self.assertEqual(self.index.query("python OR javascript"), ["app.py", "test_app.py", "app.js"])
+        self.assertEqual(self.index.query("web python"), ["app.py"])
+        self.assertEqual(self.index.query("(python OR javascript) AND NOT web"), ["test_app.py"])
+        self.assertEqual(self.index.query("NOT web"), ["test_app.py", "notes.md"])
+        
+    def test_prefix_and_quoted_terms(self):
+        """Test trailing-* prefixes and quoted multi-word tags"""
+        self.assertEqual(self.index.query("pyth*"), ["app.py", "test_app.py"])
+        self.assertEqual(self.index.query("ja* OR doc*"), ["app.js", "notes.md"])
+        self.assertEqual(self.index.query('"machine learning"'), ["notes.md"])
+        
+    def test_lowercase_operators_are_tags(self):
+        """Test lower-case and/or/not are treated as tags"""
+        self.index.add("logic.py", ["not"])
+        self.assertEqual(self.index.query("not"), ["logic.py"])
+        
+    def test_syntax_errors(self):
+        """Test malformed queries raise QuerySyntaxError"""
+        for query in ("python AND", "(python", "python)", "OR web", '"unterminated'):
+            with self.assertRaises(QuerySyntaxError):
+                self.index.query(query)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+from pathlib import Path
+import os
+import tempfile
+import shutil
+import time
+from auto_tagger.walker import walk_entries, walk_files, CachedEntry, CachedRun, DirectoryCache, IgnoreRules, is_ignored
+
+class TestIgnoreRules(unittest.TestCase):
+    def test_patterns(self):
+        """Test basename, anchored, directory-only, ** and negated patterns"""
+        rules = [IgnoreRules(["*.log", "/build", "docs/**/draft.md", "cache/", "!keep.log"])]
+        self.assertTrue(is_ignored(rules, "debug.log", False))
+        self.assertTrue(is_ignored(rules, "src/debug.log", False))
+        self.assertFalse(is_ignored(rules, "keep.log", False))
+        self.assertTrue(is_ignored(rules, "build", True))
+        self.assertFalse(is_ignored(rules, "src/build", True))
+        self.assertTrue(is_ignored(rules, "docs/a/b/draft.md", False))
+        self.assertTrue(is_ignored(rules, "docs/draft.md", False))
+        self.assertTrue(is_ignored(rules, "src/cache", True))
+        self.assertFalse(is_ignored(rules, "src/cache", False))
+        
+    def test_nested_rules_are_relative(self):
+        """Test rules from a nested .gitignore only apply below their directory"""
+        rules = [IgnoreRules(["*.tmp"]), IgnoreRules(["/generated.py", "!important.tmp"], base="pkg")]
+        self.assertTrue(is_ignored(rules, "pkg/generated.py", False))
+        self.assertFalse(is_ignored(rules, "generated.py", False))
+        self.assertFalse(is_ignored(rules, "pkg/important.tmp", False))
+        self.assertTrue(is_ignored(rules, "important.tmp", False))
+
+class TestWalkFiles(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        for relative in ("a.py", "b.md", "image.png", "pkg/mod.py", "pkg/gen/out.py",
+                         "node_modules/lib/index.js", ".git/config.py", "pkg/sub/deep.py"):
+            path = self.test_dir / relative
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("x")
+        (self.test_dir / ".gitignore").write_text("gen/\n")
+        (self.test_dir / "pkg" / ".gitignore").write_text("deep.py\n")
+        
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        
+    def relative(self, files):
+        return [str(path.relative_to(self.test_dir)) for path, _ in files]
+        
+    def test_walk_prunes_and_filters(self):
+        """Test default ignores, .gitignore files and extension filtering"""
+        files = walk_files(self.test_dir, extensions={".py", ".md", ".js"})
+        self.assertEqual(self.relative(files), ["a.py", "b.md", "pkg/mod.py"])
+        
+    def test_walk_is_lazy(self):
+        """Test files are yielded before the walk finishes"""
+        files = walk_files(self.test_dir)
+        first, entry = next(files)
+        self.assertEqual(first.name, ".gitignore")
+        self.assertTrue(entry.is_file())
+        
+    def test_walk_options(self):
+        """Test non-recursive walks, disabled .gitignore and custom patterns"""
+        self.assertEqual(self.relative(walk_files(self.test_dir, recursive=False, extensions={".py"})), ["a.py"])
+        files = walk_files(self.test_dir, extensions={".py"}, ignore_patterns=[], use_gitignore=False,
+                           skip_names={"a.py"})
+        self.assertEqual(self.relative(files), [
+            ".git/config.py", "pkg/mod.py", "pkg/gen/out.py", "pkg/sub/deep.py"
+        ])
+        
+    def age(self):
+        """Date every directory back, out of the window in which listings are not cached"""
+        past = time.time() - 60
+        for current, _, _ in os.walk(self.test_dir):
+            os.utime(current, (past, past))
+            
+    def test_cache_skips_unchanged_directories(self):
+        """Test unchanged directories are not listed again and changed ones are"""
+        cache = DirectoryCache()
+        self.age()
+        expected = self.relative(walk_files(self.test_dir, extensions={".py"}, cache=cache))
+        self.assertEqual(expected, ["a.py", "pkg/mod.py"])
+        self.assertEqual(cache.reused, 0)
+        
+        files = list(walk_files(self.test_dir, extensions={".py"}, cache=cache))
+        self.assertEqual(self.relative(files), expected)
+        self.assertEqual(cache.reused, 3)
+        self.assertTrue(all(isinstance(entry, CachedEntry) for _, entry in files))
+        self.assertEqual(files[1][1].stat().st_size, 1)
+        
+        # A new file changes its directory's mtime
+        (self.test_dir / "pkg" / "new.py").write_text("x")
+        self.assertEqual(self.relative(walk_files(self.test_dir, extensions={".py"}, cache=cache)),
+                         ["a.py", "pkg/mod.py", "pkg/new.py"])
+        self.assertEqual(cache.reused, 2)
+        
+        # An edited .gitignore invalidates the listings of the whole subtree below it
+        self.age()
+        list(walk_files(self.test_dir, extensions={".py"}, cache=cache))
+        (self.test_dir / "pkg" / ".gitignore").write_text("new.py\n")
+        self.assertEqual(self.relative(walk_files(self.test_dir, extensions={".py"}, cache=cache)),
+                         ["a.py", "pkg/mod.py", "pkg/sub/deep.py"])
+        self.assertEqual(cache.reused, 1)
+        
+        # Listings made with other settings are not reused
+        self.assertEqual(self.relative(walk_files(self.test_dir, extensions={".md"}, cache=cache)), ["b.md"])
+        self.assertEqual(cache.reused, 0)
+
+    def test_reuse_callback_yields_runs(self):
+        """Test files of a reused listing the callback does not name come as runs in their place"""
+        many = self.test_dir / "many"
+        many.mkdir()
+        for name in "abcde":
+            (many / f"{name}.py").write_text(name)
+        cache = DirectoryCache()
+        self.age()
+        list(walk_entries(many, extensions={".py"}, cache=cache))
+        calls = []
+        def on_reuse(relative_dir, base, names, symlinks):
+            calls.append((relative_dir, names, symlinks))
+            return {"c.py"}
+        entries = list(walk_entries(many, extensions={".py"}, cache=cache, on_reuse=on_reuse))
+        self.assertEqual(calls, [("", ["a.py", "b.py", "c.py", "d.py", "e.py"], set())])
+        self.assertEqual([type(entry) for entry in entries], [CachedRun, CachedEntry, CachedRun])
+        self.assertEqual((len(entries[0]), len(entries[2])), (2, 2))
+        base = os.path.join(str(many), "")
+        self.assertEqual(list(entries[0]) + [entries[1].path] + list(entries[2]),
+                         [f"{base}{name}.py" for name in "abcde"])
+        
+        # Without names to single out, the whole listing is one run; with None, there are no runs
+        entries = list(walk_entries(many, extensions={".py"}, cache=cache, on_reuse=lambda *args: ()))
+        self.assertEqual([len(entry) for entry in entries], [5])
+        entries = list(walk_entries(many, extensions={".py"}, cache=cache, on_reuse=lambda *args: None))
+        self.assertEqual([entry.name for entry in entries], [f"{name}.py" for name in "abcde"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+import queue
+import tempfile
+import threading
+import time
+import shutil
+from auto_tagger.storage import JSONMetadataStore
+from auto_tagger.swarm_controller import SwarmController
+from auto_tagger.watcher import (
+    CHANGED, DELETED, DELETED_DIR, RESCAN, Debouncer, InotifyWatcher, PollingWatcher, Watcher,
+    inotify_available, watch
+)
+
+class TestDebouncer(unittest.TestCase):
+    def test_coalesces_bursts(self):
+        """Test a burst becomes one batch, released after the quiet period, with the last event per path"""
+        debouncer = Debouncer(quiet=0.5, max_delay=5.0)
+        self.assertIsNone(debouncer.timeout(0.0))
+        debouncer.add(CHANGED, Path("a.py"), now=0.0)
+        debouncer.add(CHANGED, Path("a.py"), now=0.2)
+        debouncer.add(CHANGED, Path("b.py"), now=0.3)
+        debouncer.add(DELETED, Path("b.py"), now=0.4)
+        self.assertFalse(debouncer.due(0.8))
+        self.assertAlmostEqual(debouncer.timeout(0.8), 0.1)
+        self.assertTrue(debouncer.due(0.9))
+        batch = debouncer.drain()
+        self.assertEqual(batch[CHANGED], [Path("a.py")])
+        self.assertEqual(batch[DELETED], [Path("b.py")])
+        self.assertIsNone(debouncer.timeout(1.0))
+        
+    def test_max_delay(self):
+        """Test a steady stream of events is still flushed after max_delay"""
+        debouncer = Debouncer(quiet=0.5, max_delay=2.0)
+        for step in range(10):
+            debouncer.add(CHANGED, Path(f"{step}.log"), now=step * 0.25)
+        self.assertTrue(debouncer.due(2.0))
+
+class WatcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.tree = self.test_dir / "tree"
+        (self.tree / "src").mkdir(parents=True)
+        (self.tree / "node_modules").mkdir()
+        (self.tree / "src" / "app.py").write_text("print('hi')\n")
+        
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        
+    def collect(self, watcher, expected, timeout: float = 5.0):
+        """Read events until every expected (kind, path) was seen"""
+        seen = set()
+        deadline = time.monotonic() + timeout
+        while not expected <= seen and time.monotonic() < deadline:
+            seen.update(watcher.read(0.1))
+        return seen
+
+@unittest.skipUnless(inotify_available(), "inotify is Linux only")
+class TestInotifyWatcher(WatcherTestCase):
+    def test_events(self):
+        """Test writes, renames, deletions and new directories are reported and ignored dirs are not"""
+        watcher = InotifyWatcher(self.tree)
+        try:
+            (self.tree / "src" / "app.py").write_text("print('changed')\n")
+            (self.tree / "src" / "app.py").rename(self.tree / "src" / "main.py")
+            (self.tree / "node_modules" / "lib.js").write_text("x")
+            (self.tree / "pkg").mkdir()
+            (self.tree / "pkg" / "util.py").write_text("x = 1\n")
+            events = self.collect(watcher, {
+                (DELETED, self.tree / "src" / "app.py"),
+                (CHANGED, self.tree / "src" / "main.py"),
+                (CHANGED, self.tree / "pkg" / "util.py")
+            })
+            self.assertIn((DELETED, self.tree / "src" / "app.py"), events)
+            self.assertIn((CHANGED, self.tree / "src" / "main.py"), events)
+            self.assertIn((CHANGED, self.tree / "pkg" / "util.py"), events)
+            self.assertFalse([path for _, path in events if "node_modules" in path.parts])
+            
+            # The new directory is watched too, and removing it is one event
+            (self.tree / "pkg" / "more.py").write_text("y = 2\n")
+            self.assertIn((CHANGED, self.tree / "pkg" / "more.py"),
+                          self.collect(watcher, {(CHANGED, self.tree / "pkg" / "more.py")}))
+            shutil.rmtree(self.tree / "pkg")
+            self.assertIn((DELETED_DIR, self.tree / "pkg"), self.collect(watcher, {(DELETED_DIR, self.tree / "pkg")}))
+            # Idle trees produce nothing
+            self.assertEqual(watcher.read(0.05), [])
+        finally:
+            watcher.close()
+
+class TestPollingWatcher(WatcherTestCase):
+    def test_events(self):
+        """Test the polling fallback diffs snapshots of the tree"""
+        watcher = PollingWatcher(self.tree, interval=0.05)
+        (self.tree / "src" / "app.py").unlink()
+        (self.tree / "src" / "new.py").write_text("x = 1\n")
+        (self.tree / "node_modules" / "lib.js").write_text("x")
+        events = self.collect(watcher, {(DELETED, self.tree / "src" / "app.py"), (CHANGED, self.tree / "src" / "new.py")})
+        self.assertEqual(events, {(DELETED, self.tree / "src" / "app.py"), (CHANGED, self.tree / "src" / "new.py")})
+
+class TestWatchMode(WatcherTestCase):
+    def setUp(self):
+        super().setUp()
+        self.store = JSONMetadataStore(str(self.tree / "metadata.json"))
+        self.swarm = SwarmController(cache_max_bytes=None, store=self.store, backend="heuristic")
+        
+    def test_apply_changes(self):
+        """Test changed files are tagged, unchanged ones skipped and deletions removed"""
+        app = self.tree / "src" / "app.py"
+        docs = self.tree / "docs"
+        docs.mkdir()
+        (docs / "guide.md").write_text("# Guide\n")
+        
+        analyses = self.swarm.apply_changes([app, docs / "guide.md", self.tree / "metadata.json"])
+        
+        self.assertEqual(set(analyses), {str(app), str(docs / "guide.md")})
+        self.assertEqual(self.swarm.apply_changes([app]), {})
+        self.assertEqual(self.swarm.search("python"), [str(app)])
+        
+        self.swarm.apply_changes([], deleted=[app], deleted_dirs=[docs])
+        
+        self.assertEqual(self.store.load(), {})
+        self.assertEqual(self.swarm.search("python"), [])
+        
+    def test_rescan_after_overflow(self):
+        """Test a rescan drops files deleted while events were lost and counts only re-tagged files"""
+        (self.tree / "src" / "old.py").write_text("old = 1\n")
+        tree = self.tree
+        
+        class Overflowing(Watcher):
+            """Changes the tree behind the watch's back once, then reports a queue overflow"""
+            overflowed = False
+            
+            def read(self, timeout):
+                if self.overflowed:
+                    time.sleep(timeout)
+                    return []
+                self.overflowed = True
+                (tree / "src" / "old.py").unlink()
+                (tree / "src" / "new.py").write_text("new = 2\n")
+                return [(RESCAN, tree)]
+                
+        stop = threading.Event()
+        batches = []
+        
+        def on_batch(counts):
+            batches.append(counts)
+            stop.set()
+            
+        with patch("auto_tagger.watcher.open_watcher", lambda directory, *args: Overflowing(directory)):
+            watch(self.swarm, self.tree, debounce=0.01, stop=stop, on_batch=on_batch)
+        self.assertEqual(batches, [{"changed": 1, "deleted": 1, "tagged": 1}])
+        self.assertEqual(sorted(self.store.load()), [str(self.tree / "src" / "app.py"), str(self.tree / "src" / "new.py")])
+        with self.assertRaises(TypeError):
+            Watcher(self.tree)
+        
+    def test_watch(self):
+        """Test a running watch tags new files within the debounce period and forgets deleted ones"""
+        stop = threading.Event()
+        batches = queue.Queue()
+        poll = None if inotify_available() else 0.05
+        thread = threading.Thread(target=watch, args=(self.swarm, self.tree),
+                                  kwargs={"debounce": 0.05, "poll_interval": poll, "stop": stop,
+                                          "on_batch": batches.put})
+        thread.start()
+        try:
+            deadline = time.monotonic() + 5
+            while str(self.tree / "src" / "app.py") not in self.store.load() and time.monotonic() < deadline:
+                time.sleep(0.02)
+            new_file = self.tree / "src" / "weather.py"
+            new_file.write_text("def forecast(city):\n    return city\n")
+            while str(new_file) not in self.swarm.metadata:
+                batches.get(timeout=5)
+            self.assertIn(str(new_file), self.store.load())
+            
+            new_file.unlink()
+            while str(new_file) in self.swarm.metadata:
+                batches.get(timeout=5)
+            self.assertNotIn(str(new_file), self.store.load())
+        finally:
+            stop.set()
+            thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+if __name__ == '__main__':
+    unittest.main()